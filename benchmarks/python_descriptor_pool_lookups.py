@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+#
+# Protocol Buffers - Google's data interchange format
+# Copyright 2023 Google LLC.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Times concurrent DescriptorPool lookups from up to 32 threads.
+
+Each thread looks up every message and enum of unittest.proto by name, in a
+pool whose files are either already built ("warm") or lazily built from a
+descriptor database by the first lookups, which then race with each other
+("cold").  The stress test of the same lookups is
+python/google/protobuf/internal/thread_safe_test.py.  Lookups only scale with
+threads on free-threaded builds of CPython; with the GIL, the rate per thread
+shows the cost of contention.  The backend under test is selected the usual
+way, e.g. with PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=python.
+
+Sample output:
+
+  backend: python
+  names: 120 per round
+  pool   threads   lookups/s   per thread
+  warm         1     6010518      6010518
+  warm        32     4016244       125508
+  cold         1        2612         2612
+  cold        32       79199         2475
+"""
+
+import argparse
+import threading
+import time
+
+from google.protobuf import descriptor_database
+from google.protobuf import descriptor_pb2
+from google.protobuf import descriptor_pool
+from google.protobuf import unittest_import_pb2
+from google.protobuf import unittest_import_public_pb2
+from google.protobuf import unittest_pb2
+from google.protobuf.internal import api_implementation
+
+_MODULES = (unittest_import_public_pb2, unittest_import_pb2, unittest_pb2)
+
+
+def _MakePool():
+  """Returns a pool which builds the files of _MODULES on first lookup."""
+  db = descriptor_database.DescriptorDatabase()
+  for module in _MODULES:
+    db.Add(descriptor_pb2.FileDescriptorProto.FromString(
+        module.DESCRIPTOR.serialized_pb))
+  return descriptor_pool.DescriptorPool(db)
+
+
+def _LookUpAll(pool, message_names, enum_names, rounds):
+  for _ in range(rounds):
+    for name in message_names:
+      pool.FindMessageTypeByName(name)
+    for name in enum_names:
+      pool.FindEnumTypeByName(name)
+
+
+def _TimeLookups(pool, thread_count, message_names, enum_names, rounds):
+  """Returns the seconds taken by thread_count threads to look up all names."""
+  barrier = threading.Barrier(thread_count + 1)
+
+  def Run():
+    barrier.wait()
+    _LookUpAll(pool, message_names, enum_names, rounds)
+
+  threads = [threading.Thread(target=Run) for _ in range(thread_count)]
+  for thread in threads:
+    thread.start()
+  barrier.wait()
+  start = time.perf_counter()
+  for thread in threads:
+    thread.join()
+  return time.perf_counter() - start
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--rounds', type=int, default=20,
+                      help='Lookups of all names per thread and timing.')
+  parser.add_argument('--repeat', type=int, default=5,
+                      help='Number of timings per row, the best is kept.')
+  parser.add_argument('--threads', type=int, nargs='+',
+                      default=[1, 2, 4, 8, 16, 32],
+                      help='Numbers of threads to time.')
+  args = parser.parse_args()
+
+  message_names = sorted(
+      desc.full_name
+      for desc in unittest_pb2.DESCRIPTOR.message_types_by_name.values())
+  enum_names = sorted(
+      desc.full_name
+      for desc in unittest_pb2.DESCRIPTOR.enum_types_by_name.values())
+  names = len(message_names) + len(enum_names)
+
+  print('backend: %s' % api_implementation.Type())
+  print('names: %d per round' % names)
+  print('%-5s %8s %11s %12s' % ('pool', 'threads', 'lookups/s', 'per thread'))
+  warm_pool = _MakePool()
+  _LookUpAll(warm_pool, message_names, enum_names, 1)
+  for label, rounds in (('warm', args.rounds), ('cold', 1)):
+    for thread_count in args.threads:
+      timings = []
+      for _ in range(args.repeat):
+        pool = warm_pool if label == 'warm' else _MakePool()
+        timings.append(_TimeLookups(pool, thread_count, message_names,
+                                    enum_names, rounds))
+      rate = names * rounds * thread_count / min(timings)
+      print('%-5s %8d %11.0f %12.0f' % (label, thread_count, rate,
+                                        rate / thread_count))
+
+
+if __name__ == '__main__':
+  main()
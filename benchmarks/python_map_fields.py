@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+#
+# Protocol Buffers - Google's data interchange format
+# Copyright 2023 Google LLC.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Times sizing, serializing and parsing Python messages with large maps.
+
+Each map field of the message is filled with the same number of entries: a
+map<int64, double>, a map<string, string> and a map<int32, Item> of small
+messages.  The backend under test is selected the usual way, e.g. with
+PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=python.
+
+Sample output:
+
+  backend: python
+  entries: 1000000
+  field      method                    sec
+  scores     ByteSize                 0.33
+  scores     SerializeToString        2.44
+  scores     FromString               5.68
+  ...
+"""
+
+import argparse
+import timeit
+
+from google.protobuf import descriptor_pb2
+from google.protobuf import descriptor_pool
+from google.protobuf import message_factory
+from google.protobuf.internal import api_implementation
+
+_FieldProto = descriptor_pb2.FieldDescriptorProto
+
+
+def _AddMapField(message_proto, name, number, key_type, value_type,
+                 value_type_name=None):
+  """Adds a map field and its entry type to a message type."""
+  entry_name = name.capitalize() + 'Entry'
+  entry = message_proto.nested_type.add(name=entry_name)
+  entry.options.map_entry = True
+  entry.field.add(name='key', number=1, type=key_type,
+                  label=_FieldProto.LABEL_OPTIONAL)
+  entry.field.add(name='value', number=2, type=value_type,
+                  label=_FieldProto.LABEL_OPTIONAL, type_name=value_type_name)
+  message_proto.field.add(
+      name=name, number=number, type=_FieldProto.TYPE_MESSAGE,
+      label=_FieldProto.LABEL_REPEATED,
+      type_name='.benchmark.%s.%s' % (message_proto.name, entry_name))
+
+
+def _MakeClass():
+  """Returns the message class of the benchmark."""
+  file_proto = descriptor_pb2.FileDescriptorProto(
+      name='python_map_fields.proto', package='benchmark', syntax='proto3')
+  item = file_proto.message_type.add(name='Item')
+  item.field.add(name='id', number=1, type=_FieldProto.TYPE_INT64,
+                 label=_FieldProto.LABEL_OPTIONAL)
+  item.field.add(name='name', number=2, type=_FieldProto.TYPE_STRING,
+                 label=_FieldProto.LABEL_OPTIONAL)
+  maps = file_proto.message_type.add(name='Maps')
+  _AddMapField(maps, 'scores', 1, _FieldProto.TYPE_INT64,
+               _FieldProto.TYPE_DOUBLE)
+  _AddMapField(maps, 'labels', 2, _FieldProto.TYPE_STRING,
+               _FieldProto.TYPE_STRING)
+  _AddMapField(maps, 'items', 3, _FieldProto.TYPE_INT32,
+               _FieldProto.TYPE_MESSAGE, '.benchmark.Item')
+
+  pool = descriptor_pool.DescriptorPool()
+  pool.Add(file_proto)
+  return message_factory.GetMessageClass(
+      pool.FindMessageTypeByName('benchmark.Maps'))
+
+
+def _Fill(message, field_name, entries):
+  """Fills one map field of the message."""
+  field = getattr(message, field_name)
+  if field_name == 'scores':
+    for i in range(entries):
+      field[i * 7919] = i / 3
+  elif field_name == 'labels':
+    for i in range(entries):
+      field['key%d' % i] = 'value%d' % i
+  else:
+    for i in range(entries):
+      item = field[i]
+      item.id = i
+      item.name = 'item'
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--entries', type=int, default=1000000,
+                      help='Number of entries per map field.')
+  parser.add_argument('--repeat', type=int, default=3,
+                      help='Number of timings per method, the best is kept.')
+  args = parser.parse_args()
+
+  maps_class = _MakeClass()
+  print('backend: %s' % api_implementation.Type())
+  print('entries: %d' % args.entries)
+  print('%-10s %-20s %8s' % ('field', 'method', 'sec'))
+  for field_name in ('scores', 'labels', 'items'):
+    message = maps_class()
+    _Fill(message, field_name, args.entries)
+    serialized = message.SerializeToString()
+    assert maps_class.FromString(serialized) == message, field_name
+
+    def ByteSize():
+      # Setting the first entry again discards the cached size of the map.
+      _Fill(message, field_name, 1)
+      return message.ByteSize()
+
+    methods = [
+        ('ByteSize', ByteSize),
+        ('SerializeToString', message.SerializeToString),
+        ('FromString', lambda: maps_class.FromString(serialized)),
+    ]
+    for name, method in methods:
+      seconds = min(timeit.repeat(method, number=1, repeat=args.repeat))
+      print('%-10s %-20s %8.2f' % (field_name, name, seconds))
+
+
+if __name__ == '__main__':
+  main()
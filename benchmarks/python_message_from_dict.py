@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+#
+# Protocol Buffers - Google's data interchange format
+# Copyright 2023 Google LLC.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Times building Python messages from dictionaries.
+
+The same nested dictionary is converted to a message with keyword arguments,
+Message.FromDict() and json_format.ParseDict().  The backend under test is
+selected the usual way, e.g. with PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=python.
+
+Sample output:
+
+  backend: python
+  method                  usec/message
+  kwargs                          12.3
+  FromDict                        12.1
+  ParseDict                       45.6
+"""
+
+import argparse
+import timeit
+
+from google.protobuf import descriptor_pb2
+from google.protobuf import descriptor_pool
+from google.protobuf import json_format
+from google.protobuf import message_factory
+from google.protobuf.internal import api_implementation
+
+_FieldProto = descriptor_pb2.FieldDescriptorProto
+
+
+def _MakeClass():
+  """Returns the message class of the benchmark."""
+  file_proto = descriptor_pb2.FileDescriptorProto(
+      name='python_message_from_dict.proto', package='benchmark',
+      syntax='proto3')
+  file_proto.enum_type.add(name='Kind').value.add(name='KIND_UNKNOWN',
+                                                  number=0)
+  file_proto.enum_type[0].value.add(name='KIND_OTHER', number=1)
+  item = file_proto.message_type.add(name='Item')
+  item.field.add(name='id', number=1, type=_FieldProto.TYPE_INT64,
+                 label=_FieldProto.LABEL_OPTIONAL)
+  item.field.add(name='name', number=2, type=_FieldProto.TYPE_STRING,
+                 label=_FieldProto.LABEL_OPTIONAL)
+  item.field.add(name='kind', number=3, type=_FieldProto.TYPE_ENUM,
+                 label=_FieldProto.LABEL_OPTIONAL, type_name='.benchmark.Kind')
+  record = file_proto.message_type.add(name='Record')
+  record.field.add(name='id', number=1, type=_FieldProto.TYPE_INT64,
+                   label=_FieldProto.LABEL_OPTIONAL)
+  record.field.add(name='title', number=2, type=_FieldProto.TYPE_STRING,
+                   label=_FieldProto.LABEL_OPTIONAL)
+  record.field.add(name='score', number=3, type=_FieldProto.TYPE_DOUBLE,
+                   label=_FieldProto.LABEL_OPTIONAL)
+  record.field.add(name='tags', number=4, type=_FieldProto.TYPE_STRING,
+                   label=_FieldProto.LABEL_REPEATED)
+  record.field.add(name='main', number=5, type=_FieldProto.TYPE_MESSAGE,
+                   label=_FieldProto.LABEL_OPTIONAL,
+                   type_name='.benchmark.Item')
+  record.field.add(name='items', number=6, type=_FieldProto.TYPE_MESSAGE,
+                   label=_FieldProto.LABEL_REPEATED,
+                   type_name='.benchmark.Item')
+
+  pool = descriptor_pool.DescriptorPool()
+  pool.Add(file_proto)
+  return message_factory.GetMessageClass(
+      pool.FindMessageTypeByName('benchmark.Record'))
+
+
+def _MakeDict(items):
+  """Returns a record, in the form accepted by all the methods."""
+  return {
+      'id': 1,
+      'title': 'record',
+      'score': 0.5,
+      'tags': ['a', 'b', 'c'],
+      'main': {'id': 2, 'name': 'main', 'kind': 'KIND_OTHER'},
+      'items': [{'id': i, 'name': 'item', 'kind': 'KIND_OTHER'}
+                for i in range(items)],
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--count', type=int, default=10000,
+                      help='Number of messages built per method.')
+  parser.add_argument('--items', type=int, default=5,
+                      help='Number of repeated sub-messages per message.')
+  args = parser.parse_args()
+
+  record_class = _MakeClass()
+  record = _MakeDict(args.items)
+  methods = [
+      ('kwargs', lambda: record_class(**record)),
+      ('FromDict', lambda: record_class.FromDict(record)),
+      ('ParseDict', lambda: json_format.ParseDict(record, record_class())),
+  ]
+  expected = methods[0][1]()
+  print('backend: %s' % api_implementation.Type())
+  print('%-20s %16s' % ('method', 'usec/message'))
+  for name, method in methods:
+    assert method() == expected, name
+    seconds = min(timeit.repeat(method, number=args.count, repeat=3))
+    print('%-20s %16.1f' % (name, seconds / args.count * 1e6))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+#
+# Protocol Buffers - Google's data interchange format
+# Copyright 2023 Google LLC.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Reports the memory used per Python message instance.
+
+Each shape is instantiated a number of times and the heap growth, as seen by
+tracemalloc, is divided by the number of instances.  The backend under test is
+selected the usual way, e.g. with PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=python.
+
+Sample output:
+
+  backend: python
+  shape                 bytes/message
+  empty                           169
+  two_ints                        329
+  ...
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from google.protobuf import descriptor_pb2
+from google.protobuf import descriptor_pool
+from google.protobuf import message_factory
+from google.protobuf.internal import api_implementation
+
+_FieldProto = descriptor_pb2.FieldDescriptorProto
+
+
+def _MakeClasses():
+  """Returns the message classes of the benchmark, by name."""
+  file_proto = descriptor_pb2.FileDescriptorProto(
+      name='python_message_memory.proto', package='benchmark', syntax='proto3')
+  file_proto.message_type.add(name='Empty')
+  scalars = file_proto.message_type.add(name='Scalars')
+  scalars.field.add(name='a', number=1, type=_FieldProto.TYPE_INT32,
+                    label=_FieldProto.LABEL_OPTIONAL)
+  scalars.field.add(name='b', number=2, type=_FieldProto.TYPE_INT64,
+                    label=_FieldProto.LABEL_OPTIONAL)
+  oneof = file_proto.message_type.add(name='Oneof')
+  oneof.oneof_decl.add(name='choice')
+  oneof.field.add(name='i', number=1, type=_FieldProto.TYPE_INT32,
+                  label=_FieldProto.LABEL_OPTIONAL, oneof_index=0)
+  oneof.field.add(name='s', number=2, type=_FieldProto.TYPE_STRING,
+                  label=_FieldProto.LABEL_OPTIONAL, oneof_index=0)
+  parent = file_proto.message_type.add(name='Parent')
+  parent.field.add(name='child', number=1, type=_FieldProto.TYPE_MESSAGE,
+                   label=_FieldProto.LABEL_OPTIONAL,
+                   type_name='.benchmark.Scalars')
+  repeated = file_proto.message_type.add(name='Repeated')
+  repeated.field.add(name='values', number=1, type=_FieldProto.TYPE_INT32,
+                     label=_FieldProto.LABEL_REPEATED)
+
+  pool = descriptor_pool.DescriptorPool()
+  pool.Add(file_proto)
+  return {
+      message_proto.name: message_factory.GetMessageClass(
+          pool.FindMessageTypeByName('benchmark.' + message_proto.name))
+      for message_proto in file_proto.message_type
+  }
+
+
+def _Shapes(classes):
+  """Returns (name, factory) pairs, one per message shape to measure."""
+  return [
+      ('empty', classes['Empty']),
+      ('two_ints', lambda: classes['Scalars'](a=1, b=2)),
+      ('oneof_unset', classes['Oneof']),
+      ('oneof_set', lambda: classes['Oneof'](i=1)),
+      ('parent_unset', classes['Parent']),
+      ('parent_with_child',
+       lambda: classes['Parent'](child=classes['Scalars'](a=1))),
+      ('repeated_3', lambda: classes['Repeated'](values=[1, 2, 3])),
+      ('parsed_two_ints',
+       lambda: classes['Scalars'].FromString(b'\x08\x01\x10\x02')),
+  ]
+
+
+def _BytesPerMessage(factory, count):
+  # Creates the field encoders, decoders and containers of the class once.
+  factory()
+  gc.collect()
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  messages = [factory() for _ in range(count)]
+  after = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  # The list itself is not part of the per message cost.
+  after -= len(messages) * 8
+  del messages
+  return (after - before) / count
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--count', type=int, default=10000,
+                      help='Number of messages allocated per shape.')
+  args = parser.parse_args()
+
+  print('backend: %s' % api_implementation.Type())
+  print('%-20s %15s' % ('shape', 'bytes/message'))
+  for name, factory in _Shapes(_MakeClasses()):
+    print('%-20s %15.0f' % (name, _BytesPerMessage(factory, args.count)))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+#
+# Protocol Buffers - Google's data interchange format
+# Copyright 2023 Google LLC.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Times parsing and serializing a FileDescriptorSet with Python messages.
+
+The payload is the FileDescriptorSet of the well-known types and
+descriptor.proto, the same kind of payload as the descriptor benchmarks of
+benchmark.cc.  The backend under test is selected the usual way, e.g. with
+PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=python.
+
+Sample output:
+
+  backend: python
+  payload: 16123 bytes
+  method                  usec     MB/s
+  FromString            1234.5     13.1
+  SerializeToString      567.8     28.4
+"""
+
+import argparse
+import timeit
+
+from google.protobuf import any_pb2
+from google.protobuf import api_pb2
+from google.protobuf import descriptor_pb2
+from google.protobuf import duration_pb2
+from google.protobuf import empty_pb2
+from google.protobuf import field_mask_pb2
+from google.protobuf import source_context_pb2
+from google.protobuf import struct_pb2
+from google.protobuf import timestamp_pb2
+from google.protobuf import type_pb2
+from google.protobuf import wrappers_pb2
+from google.protobuf.internal import api_implementation
+
+_MODULES = (any_pb2, api_pb2, descriptor_pb2, duration_pb2, empty_pb2,
+            field_mask_pb2, source_context_pb2, struct_pb2, timestamp_pb2,
+            type_pb2, wrappers_pb2)
+
+
+def _MakePayload():
+  """Returns the serialized FileDescriptorSet of the benchmark."""
+  file_set = descriptor_pb2.FileDescriptorSet()
+  for module in _MODULES:
+    file_set.file.add().ParseFromString(module.DESCRIPTOR.serialized_pb)
+  return file_set.SerializeToString()
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--number', type=int, default=100,
+                      help='Number of calls per timing.')
+  parser.add_argument('--repeat', type=int, default=5,
+                      help='Number of timings per method, the best is kept.')
+  args = parser.parse_args()
+
+  payload = _MakePayload()
+  message = descriptor_pb2.FileDescriptorSet.FromString(payload)
+  assert message.SerializeToString() == payload
+
+  print('backend: %s' % api_implementation.Type())
+  print('payload: %d bytes' % len(payload))
+  print('%-18s %10s %8s' % ('method', 'usec', 'MB/s'))
+  methods = [
+      ('FromString',
+       lambda: descriptor_pb2.FileDescriptorSet.FromString(payload)),
+      ('SerializeToString', message.SerializeToString),
+  ]
+  for name, method in methods:
+    seconds = min(timeit.repeat(method, number=args.number,
+                                repeat=args.repeat)) / args.number
+    print('%-18s %10.1f %8.1f' % (name, seconds * 1e6,
+                                  len(payload) / seconds / 1e6))
+
+
+if __name__ == '__main__':
+  main()
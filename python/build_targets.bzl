@@ -370,6 +370,11 @@ def build_targets(name):
         data = ["//src/google/protobuf:testdata"],
     )
 
+    internal_py_test(
+        name = "profiling_test",
+        srcs = ["google/protobuf/internal/profiling_test.py"],
+    )
+
     internal_py_test(
         name = "proto_builder_test",
         srcs = ["google/protobuf/internal/proto_builder_test.py"],
@@ -401,6 +406,11 @@ def build_targets(name):
         data = ["//src/google/protobuf:testdata"],
     )
 
+    internal_py_test(
+        name = "type_url_resolver_test",
+        srcs = ["google/protobuf/internal/type_url_resolver_test.py"],
+    )
+
     internal_py_test(
         name = "unknown_fields_test",
         srcs = ["google/protobuf/internal/unknown_fields_test.py"],
@@ -7,11 +7,14 @@
 
 #include "python/descriptor_pool.h"
 
+#include <stddef.h>
+
 #include "google/protobuf/descriptor.upbdefs.h"
 #include "python/convert.h"
 #include "python/descriptor.h"
 #include "python/message.h"
 #include "python/protobuf.h"
+#include "structmember.h"
 #include "upb/base/upcast.h"
 #include "upb/message/compare.h"
 #include "upb/reflection/def.h"
@@ -25,6 +28,7 @@ typedef struct {
   PyObject_HEAD;
   upb_DefPool* symtab;
   PyObject* db;  // The DescriptorDatabase underlying this pool.  May be NULL.
+  PyObject* weakreflist;  // Weak references to this pool.  May be NULL.
 } PyUpb_DescriptorPool;
 
 PyObject* PyUpb_DescriptorPool_GetDefaultPool(void) {
@@ -79,6 +83,7 @@ PyObject* PyUpb_DescriptorPool_Get(const upb_DefPool* symtab) {
 
 static void PyUpb_DescriptorPool_Dealloc(PyUpb_DescriptorPool* self) {
   PyObject_GC_UnTrack(self);
+  if (self->weakreflist) PyObject_ClearWeakRefs((PyObject*)self);
   PyUpb_DescriptorPool_Clear(self);
   upb_DefPool_Free(self->symtab);
   PyUpb_ObjCache_Delete(self->symtab);
@@ -642,9 +647,17 @@ static PyMethodDef PyUpb_DescriptorPool_Methods[] = {
      "Gets all known extensions of the given message descriptor."},
     {NULL}};
 
+// Makes the pool weakly referenceable, e.g. by the cache of resolved Any type
+// URLs.  Needs Python 3.9 or later, older versions ignore the member.
+static PyMemberDef PyUpb_DescriptorPool_Members[] = {
+    {"__weaklistoffset__", T_PYSSIZET,
+     offsetof(PyUpb_DescriptorPool, weakreflist), READONLY},
+    {NULL}};
+
 static PyType_Slot PyUpb_DescriptorPool_Slots[] = {
     {Py_tp_clear, PyUpb_DescriptorPool_Clear},
     {Py_tp_dealloc, PyUpb_DescriptorPool_Dealloc},
+    {Py_tp_members, PyUpb_DescriptorPool_Members},
     {Py_tp_methods, PyUpb_DescriptorPool_Methods},
     {Py_tp_new, PyUpb_DescriptorPool_New},
     {Py_tp_traverse, PyUpb_DescriptorPool_Traverse},
@@ -126,6 +126,7 @@ static int PyUpb_ExtensionDict_AssignSubscript(PyObject* _self, PyObject* key,
   if (val) {
     return PyUpb_Message_SetFieldValue(self->msg, f, val, PyExc_TypeError);
   } else {
+    if (!PyUpb_Message_VerifyMutable(self->msg)) return -1;
     PyUpb_Message_DoClearField(self->msg, f);
     return 0;
   }
@@ -18,6 +18,7 @@ import threading
 import warnings
 
 from google.protobuf.internal import api_implementation
+from google.protobuf.internal import profiling
 
 _USE_C_DESCRIPTORS = False
 if api_implementation.Type() != 'python':
@@ -188,7 +189,12 @@ class DescriptorBase(metaclass=DescriptorMetaclass):
     """Lazily initializes descriptor options towards the end of the build."""
     if self._loaded_options:
       return
+    with profiling.Span('ResolveOptions', getattr(self, 'full_name', self.name),
+                        getattr(self.file, 'name', None)):
+      self._LoadOptions()
 
+  def _LoadOptions(self):
+    """Implements _LazyLoadOptions()."""
     # pylint: disable=g-import-not-at-top
     from google.protobuf import descriptor_pb2
 
@@ -206,9 +212,9 @@ class DescriptorBase(metaclass=DescriptorMetaclass):
             descriptor_pb2.Edition.Value(edition), options_class()
         )
       with _lock:
-        self._loaded_options = options_class()
         if not self._features:
           self._features = features
+        self._loaded_options = options_class()
     else:
       if not self._serialized_options:
         options = self._options
@@ -220,14 +226,18 @@ class DescriptorBase(metaclass=DescriptorMetaclass):
             descriptor_pb2.Edition.Value(edition), options
         )
       with _lock:
-        self._loaded_options = options
+        if self._loaded_options:
+          return
         if not self._features:
           self._features = features
         if options.HasField('features'):
           options.ClearField('features')
           if not options.SerializeToString():
-            self._loaded_options = options_class()
+            options = options_class()
             self.has_options = False
+        # Publish the options last: the check at the top of this method runs
+        # without the lock and must never see half-initialized options.
+        self._loaded_options = options
 
   def GetOptions(self):
     """Retrieves descriptor options.
@@ -35,6 +35,7 @@ directly instead of this class.
 __author__ = 'matthewtoia@google.com (Matt Toia)'
 
 import collections
+import contextlib
 import threading
 import warnings
 
@@ -42,7 +43,9 @@ from google.protobuf import descriptor
 from google.protobuf import descriptor_database
 from google.protobuf import text_encoding
 from google.protobuf.internal import python_edition_defaults
+from google.protobuf.internal import profiling
 from google.protobuf.internal import python_message
+from google.protobuf.internal import type_url_resolver
 
 _USE_C_DESCRIPTORS = descriptor._USE_C_DESCRIPTORS  # pylint: disable=protected-access
 
@@ -79,6 +82,23 @@ def _IsMessageSetExtension(field):
 
 _edition_defaults_lock = threading.Lock()
 
+# The symbol tables of a pool, keyed by full name.
+_SYMBOL_REGISTERS = (
+    '_descriptors',
+    '_enum_descriptors',
+    '_service_descriptors',
+    '_toplevel_extensions',
+    '_top_enum_values',
+)
+
+# The extension tables of a pool, keyed by the extended message descriptor.
+_EXTENSION_REGISTERS = ('_extensions_by_name', '_extensions_by_number')
+
+# All tables in the order in which a build publishes them.  Files come last
+# so that a reader that finds a file also finds its symbols.
+_PUBLISHED_TABLES = (
+    _SYMBOL_REGISTERS + _EXTENSION_REGISTERS + ('_file_descriptors',))
+
 
 class DescriptorPool(object):
   """A collection of protobufs dynamically constructed by descriptor protos."""
@@ -108,6 +128,10 @@ class DescriptorPool(object):
 
     self._internal_db = descriptor_database.DescriptorDatabase()
     self._descriptor_db = descriptor_db
+    # Lookups never take the lock, so the dictionaries below are only ever
+    # updated with fully built descriptors; see _Building().
+    self._lock = threading.RLock()
+    self._staged = None
     self._descriptors = {}
     self._enum_descriptors = {}
     self._service_descriptors = {}
@@ -116,15 +140,90 @@ class DescriptorPool(object):
     self._top_enum_values = {}
     # We store extensions in two two-level mappings: The first key is the
     # descriptor of the message being extended, the second key is the extension
-    # full name or its tag number.
-    self._extensions_by_name = collections.defaultdict(dict)
-    self._extensions_by_number = collections.defaultdict(dict)
+    # full name or its tag number.  The inner dictionaries are replaced rather
+    # than updated when new extensions are added.
+    self._extensions_by_name = {}
+    self._extensions_by_number = {}
     self._serialized_edition_defaults = (
         python_edition_defaults._PROTOBUF_INTERNAL_PYTHON_EDITION_DEFAULTS
     )
     self._edition_defaults = None
     self._feature_cache = dict()
 
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    del state['_lock']
+    del state['_staged']
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._lock = threading.RLock()
+    self._staged = None
+
+  @contextlib.contextmanager
+  def _Building(self, tables=None):
+    """Stages the symbols registered in the block and publishes them on exit.
+
+    Writers are serialized by the pool lock, while the Find*() methods read
+    the published dictionaries without locking.  Symbols registered by a build
+    are kept in _staged until the outermost build completes, and are then
+    published with one dict.update() per table, so readers never observe a
+    partially built file.  If the build fails, nothing is published.
+
+    Args:
+      tables: Replacements for the published tables, by attribute name.  The
+        build sees these instead of the current tables, and they are swapped
+        in when it completes.  Used by ReplaceFile().
+
+    Yields:
+      dict: The staged tables; see _Register().
+    """
+    with self._lock:
+      if self._staged is not None:
+        if tables is not None:
+          raise RuntimeError('Cannot replace files during a build.')
+        yield self._staged
+        return
+      if tables is None:
+        tables = {name: getattr(self, name) for name in _PUBLISHED_TABLES}
+      staged = {
+          name: collections.ChainMap({}, tables[name])
+          for name in _PUBLISHED_TABLES
+      }
+      self._staged = staged
+      try:
+        yield staged
+      finally:
+        self._staged = None
+      self._Publish(staged)
+
+  def _Publish(self, staged):
+    """Makes the symbols staged by a build visible to readers."""
+    for name in _PUBLISHED_TABLES:
+      new_entries, table = staged[name].maps
+      table.update(new_entries)
+      if table is not getattr(self, name):
+        setattr(self, name, table)
+    if staged['_file_descriptors'].maps[0]:
+      type_url_resolver.Default().Invalidate(self)
+
+  def _Register(self, name):
+    """Returns a symbol table, including the symbols staged by the build."""
+    staged = self._staged
+    if staged is None:
+      return getattr(self, name)
+    return staged[name]
+
+  def _StagedExtensions(self, name, containing_type):
+    """Returns a private copy of the extensions of a type for the build."""
+    new_entries, table = self._staged[name].maps
+    extensions = new_entries.get(containing_type)
+    if extensions is None:
+      extensions = dict(table.get(containing_type, ()))
+      new_entries[containing_type] = extensions
+    return extensions
+
   def _CheckConflictRegister(self, desc, desc_name, file_name):
     """Check if the descriptor name conflicts with another of the same name.
 
@@ -133,12 +232,13 @@ class DescriptorPool(object):
       desc_name (str): the full name of desc.
       file_name (str): The file name of descriptor.
     """
-    for register, descriptor_type in [
-        (self._descriptors, descriptor.Descriptor),
-        (self._enum_descriptors, descriptor.EnumDescriptor),
-        (self._service_descriptors, descriptor.ServiceDescriptor),
-        (self._toplevel_extensions, descriptor.FieldDescriptor),
-        (self._top_enum_values, descriptor.EnumValueDescriptor)]:
+    for register_name, descriptor_type in [
+        ('_descriptors', descriptor.Descriptor),
+        ('_enum_descriptors', descriptor.EnumDescriptor),
+        ('_service_descriptors', descriptor.ServiceDescriptor),
+        ('_toplevel_extensions', descriptor.FieldDescriptor),
+        ('_top_enum_values', descriptor.EnumValueDescriptor)]:
+      register = self._Register(register_name)
       if desc_name in register:
         old_desc = register[desc_name]
         if isinstance(old_desc, descriptor.EnumValueDescriptor):
@@ -185,12 +285,109 @@ class DescriptorPool(object):
 
     # pylint: disable=g-import-not-at-top
     from google.protobuf import descriptor_pb2
-    file_desc_proto = descriptor_pb2.FileDescriptorProto.FromString(
-        serialized_file_desc_proto)
-    file_desc = self._ConvertFileProtoToFileDescriptor(file_desc_proto)
-    file_desc.serialized_pb = serialized_file_desc_proto
+    with profiling.Span('AddSerializedFile') as span:
+      file_desc_proto = descriptor_pb2.FileDescriptorProto.FromString(
+          serialized_file_desc_proto)
+      span.file = file_desc_proto.name
+      file_desc = self._ConvertFileProtoToFileDescriptor(file_desc_proto)
+      file_desc.serialized_pb = serialized_file_desc_proto
     return file_desc
 
+  def ReplaceFile(self, file_desc_proto):
+    """Replaces a file of the pool and rebuilds the files that depend on it.
+
+    The descriptors and message classes of files that do not depend on the
+    replaced file, directly or indirectly, are kept as they are.  The replaced
+    file and its dependents get new descriptors, and thus new message classes
+    from message_factory.GetMessageClass(); existing messages keep their old
+    classes.  Extensions that the rebuilt files declared on other messages are
+    unregistered from those messages and registered again.
+
+    Only supported by the pure python implementation.
+
+    Args:
+      file_desc_proto (FileDescriptorProto): The new version of the file.  If
+        no file with that name was built yet, it is added.
+
+    Returns:
+      FileDescriptor: Descriptor for the new version of the file.
+
+    Raises:
+      TypeError, KeyError: if the new file, or one of its dependents, cannot be
+        built with it.  The pool is left unchanged in that case.
+    """
+    # pylint: disable=g-import-not-at-top
+    from google.protobuf import descriptor_pb2
+
+    file_name = file_desc_proto.name
+    with self._lock:
+      # Files are published after their dependencies, so this order lets each
+      # dependent be rebuilt after the files it depends on.
+      affected = set([file_name])
+      dependents = []
+      for file_desc in self._file_descriptors.values():
+        if any(dep.name in affected for dep in file_desc.dependencies):
+          affected.add(file_desc.name)
+          dependents.append(file_desc)
+
+      def Unaffected(file_desc):
+        return file_desc.name not in affected
+
+      tables = {}
+      for name in _SYMBOL_REGISTERS:
+        tables[name] = {
+            full_name: desc
+            for full_name, desc in getattr(self, name).items()
+            if Unaffected(desc.type.file if isinstance(
+                desc, descriptor.EnumValueDescriptor) else desc.file)
+        }
+      removed_extensions = []
+      for name in _EXTENSION_REGISTERS:
+        tables[name] = {}
+        for containing_type, extensions in getattr(self, name).items():
+          if not Unaffected(containing_type.file):
+            continue
+          kept = {}
+          for key, extension in extensions.items():
+            if Unaffected(extension.file):
+              kept[key] = extension
+            elif name == '_extensions_by_number':
+              removed_extensions.append(extension)
+          tables[name][containing_type] = kept
+      tables['_file_descriptors'] = {
+          name: file_desc
+          for name, file_desc in self._file_descriptors.items()
+          if Unaffected(file_desc)
+      }
+
+      internal_db = self._internal_db
+      # pylint: disable=protected-access
+      if file_name in internal_db._file_desc_protos_by_file:
+        self._internal_db = descriptor_database.DescriptorDatabase()
+        for name, file_proto in internal_db._file_desc_protos_by_file.items():
+          if name != file_name:
+            self._internal_db.Add(file_proto)
+        self._internal_db.Add(file_desc_proto)
+      try:
+        with self._Building(tables):
+          self._ConvertFileProtoToFileDescriptor(file_desc_proto)
+          for file_desc in dependents:
+            self._ConvertFileProtoToFileDescriptor(
+                descriptor_pb2.FileDescriptorProto.FromString(
+                    file_desc.serialized_pb))
+      except:
+        self._internal_db = internal_db
+        raise
+
+      # Message classes of the unaffected files must not keep parsing the
+      # extensions that were just unregistered.
+      for extension in removed_extensions:
+        message_class = getattr(
+            extension.containing_type, '_concrete_class', None)
+        if getattr(message_class, '_fields_by_tag', None):
+          python_message._DetachFieldHelpers(message_class, extension)
+      return self._file_descriptors[file_name]
+
   # Never call this method. It is for internal usage only.
   def _AddDescriptor(self, desc):
     """Adds a Descriptor to the pool, non-recursively.
@@ -205,10 +402,10 @@ class DescriptorPool(object):
     if not isinstance(desc, descriptor.Descriptor):
       raise TypeError('Expected instance of descriptor.Descriptor.')
 
-    self._CheckConflictRegister(desc, desc.full_name, desc.file.name)
-
-    self._descriptors[desc.full_name] = desc
-    self._AddFileDescriptor(desc.file)
+    with self._Building() as staged:
+      self._CheckConflictRegister(desc, desc.full_name, desc.file.name)
+      staged['_descriptors'][desc.full_name] = desc
+      self._AddFileDescriptor(desc.file)
 
   # Never call this method. It is for internal usage only.
   def _AddEnumDescriptor(self, enum_desc):
@@ -223,27 +420,28 @@ class DescriptorPool(object):
     if not isinstance(enum_desc, descriptor.EnumDescriptor):
       raise TypeError('Expected instance of descriptor.EnumDescriptor.')
 
-    file_name = enum_desc.file.name
-    self._CheckConflictRegister(enum_desc, enum_desc.full_name, file_name)
-    self._enum_descriptors[enum_desc.full_name] = enum_desc
-
-    # Top enum values need to be indexed.
-    # Count the number of dots to see whether the enum is toplevel or nested
-    # in a message. We cannot use enum_desc.containing_type at this stage.
-    if enum_desc.file.package:
-      top_level = (enum_desc.full_name.count('.')
-                   - enum_desc.file.package.count('.') == 1)
-    else:
-      top_level = enum_desc.full_name.count('.') == 0
-    if top_level:
+    with self._Building() as staged:
       file_name = enum_desc.file.name
-      package = enum_desc.file.package
-      for enum_value in enum_desc.values:
-        full_name = _NormalizeFullyQualifiedName(
-            '.'.join((package, enum_value.name)))
-        self._CheckConflictRegister(enum_value, full_name, file_name)
-        self._top_enum_values[full_name] = enum_value
-    self._AddFileDescriptor(enum_desc.file)
+      self._CheckConflictRegister(enum_desc, enum_desc.full_name, file_name)
+      staged['_enum_descriptors'][enum_desc.full_name] = enum_desc
+
+      # Top enum values need to be indexed.
+      # Count the number of dots to see whether the enum is toplevel or nested
+      # in a message. We cannot use enum_desc.containing_type at this stage.
+      if enum_desc.file.package:
+        top_level = (enum_desc.full_name.count('.')
+                     - enum_desc.file.package.count('.') == 1)
+      else:
+        top_level = enum_desc.full_name.count('.') == 0
+      if top_level:
+        file_name = enum_desc.file.name
+        package = enum_desc.file.package
+        for enum_value in enum_desc.values:
+          full_name = _NormalizeFullyQualifiedName(
+              '.'.join((package, enum_value.name)))
+          self._CheckConflictRegister(enum_value, full_name, file_name)
+          staged['_top_enum_values'][full_name] = enum_value
+      self._AddFileDescriptor(enum_desc.file)
 
   # Never call this method. It is for internal usage only.
   def _AddServiceDescriptor(self, service_desc):
@@ -256,9 +454,10 @@ class DescriptorPool(object):
     if not isinstance(service_desc, descriptor.ServiceDescriptor):
       raise TypeError('Expected instance of descriptor.ServiceDescriptor.')
 
-    self._CheckConflictRegister(service_desc, service_desc.full_name,
-                                service_desc.file.name)
-    self._service_descriptors[service_desc.full_name] = service_desc
+    with self._Building() as staged:
+      self._CheckConflictRegister(service_desc, service_desc.full_name,
+                                  service_desc.file.name)
+      staged['_service_descriptors'][service_desc.full_name] = service_desc
 
   # Never call this method. It is for internal usage only.
   def _AddExtensionDescriptor(self, extension):
@@ -277,33 +476,30 @@ class DescriptorPool(object):
             extension.is_extension):
       raise TypeError('Expected an extension descriptor.')
 
-    if extension.extension_scope is None:
-      self._CheckConflictRegister(
-          extension, extension.full_name, extension.file.name)
-      self._toplevel_extensions[extension.full_name] = extension
+    with self._Building() as staged:
+      if extension.extension_scope is None:
+        self._CheckConflictRegister(
+            extension, extension.full_name, extension.file.name)
+        staged['_toplevel_extensions'][extension.full_name] = extension
 
-    try:
-      existing_desc = self._extensions_by_number[
-          extension.containing_type][extension.number]
-    except KeyError:
-      pass
-    else:
-      if extension is not existing_desc:
+      extensions_by_number = self._StagedExtensions(
+          '_extensions_by_number', extension.containing_type)
+      existing_desc = extensions_by_number.get(extension.number)
+      if existing_desc is not None and extension is not existing_desc:
         raise AssertionError(
             'Extensions "%s" and "%s" both try to extend message type "%s" '
             'with field number %d.' %
             (extension.full_name, existing_desc.full_name,
              extension.containing_type.full_name, extension.number))
 
-    self._extensions_by_number[extension.containing_type][
-        extension.number] = extension
-    self._extensions_by_name[extension.containing_type][
-        extension.full_name] = extension
+      extensions_by_number[extension.number] = extension
+      extensions_by_name = self._StagedExtensions(
+          '_extensions_by_name', extension.containing_type)
+      extensions_by_name[extension.full_name] = extension
 
-    # Also register MessageSet extensions with the type name.
-    if _IsMessageSetExtension(extension):
-      self._extensions_by_name[extension.containing_type][
-          extension.message_type.full_name] = extension
+      # Also register MessageSet extensions with the type name.
+      if _IsMessageSetExtension(extension):
+        extensions_by_name[extension.message_type.full_name] = extension
 
     if hasattr(extension.containing_type, '_concrete_class'):
       python_message._AttachFieldHelpers(
@@ -334,7 +530,8 @@ class DescriptorPool(object):
 
     if not isinstance(file_desc, descriptor.FileDescriptor):
       raise TypeError('Expected instance of descriptor.FileDescriptor.')
-    self._file_descriptors[file_desc.name] = file_desc
+    with self._Building() as staged:
+      staged['_file_descriptors'][file_desc.name] = file_desc
 
   def FindFileByName(self, file_name):
     """Gets a FileDescriptor by file name.
@@ -352,18 +549,37 @@ class DescriptorPool(object):
     try:
       return self._file_descriptors[file_name]
     except KeyError:
-      pass
+      return self._LoadFile(file_name)
 
-    try:
-      file_proto = self._internal_db.FindFileByName(file_name)
-    except KeyError as error:
-      if self._descriptor_db:
-        file_proto = self._descriptor_db.FindFileByName(file_name)
-      else:
-        raise error
-    if not file_proto:
-      raise KeyError('Cannot find a file named %s' % file_name)
-    return self._ConvertFileProtoToFileDescriptor(file_proto)
+  def _LoadFile(self, file_name):
+    """Slow path of FindFileByName(), also used to resolve build dependencies.
+
+    Args:
+      file_name (str): The path to the file to get a descriptor for.
+
+    Returns:
+      FileDescriptor: The descriptor for the named file, which may only be
+      staged by the current build.
+
+    Raises:
+      KeyError: if the file cannot be found in the pool.
+    """
+    with self._lock:
+      try:
+        return self._Register('_file_descriptors')[file_name]
+      except KeyError:
+        pass
+
+      try:
+        file_proto = self._internal_db.FindFileByName(file_name)
+      except KeyError as error:
+        if self._descriptor_db:
+          file_proto = self._descriptor_db.FindFileByName(file_name)
+        else:
+          raise error
+      if not file_proto:
+        raise KeyError('Cannot find a file named %s' % file_name)
+      return self._ConvertFileProtoToFileDescriptor(file_proto)
 
   def FindFileContainingSymbol(self, symbol):
     """Gets the FileDescriptor for the file containing the specified symbol.
@@ -387,7 +603,8 @@ class DescriptorPool(object):
 
     try:
       # Try fallback database. Build and find again if possible.
-      self._FindFileContainingSymbolInDb(symbol)
+      with self._lock:
+        self._FindFileContainingSymbolInDb(symbol)
       return self._InternalFindFileContainingSymbol(symbol)
     except KeyError:
       raise KeyError('Cannot find a file containing %s' % symbol)
@@ -455,9 +672,10 @@ class DescriptorPool(object):
     """
 
     full_name = _NormalizeFullyQualifiedName(full_name)
-    if full_name not in self._descriptors:
-      self._FindFileContainingSymbolInDb(full_name)
-    return self._descriptors[full_name]
+    try:
+      return self._descriptors[full_name]
+    except KeyError:
+      return self._FindOrLoadSymbol('_descriptors', full_name)
 
   def FindEnumTypeByName(self, full_name):
     """Loads the named enum descriptor from the pool.
@@ -473,9 +691,10 @@ class DescriptorPool(object):
     """
 
     full_name = _NormalizeFullyQualifiedName(full_name)
-    if full_name not in self._enum_descriptors:
-      self._FindFileContainingSymbolInDb(full_name)
-    return self._enum_descriptors[full_name]
+    try:
+      return self._enum_descriptors[full_name]
+    except KeyError:
+      return self._FindOrLoadSymbol('_enum_descriptors', full_name)
 
   def FindFieldByName(self, full_name):
     """Loads the named field descriptor from the pool.
@@ -538,7 +757,8 @@ class DescriptorPool(object):
       scope = self.FindMessageTypeByName(message_name)
     except KeyError:
       # Some extensions are defined at file scope.
-      scope = self._FindFileContainingSymbolInDb(full_name)
+      with self._lock:
+        scope = self._FindFileContainingSymbolInDb(full_name)
     return scope.extensions_by_name[extension_name]
 
   def FindExtensionByNumber(self, message_descriptor, number):
@@ -582,11 +802,11 @@ class DescriptorPool(object):
       full_name = message_descriptor.full_name
       all_numbers = self._descriptor_db.FindAllExtensionNumbers(full_name)
       for number in all_numbers:
-        if number in self._extensions_by_number[message_descriptor]:
+        if number in self._extensions_by_number.get(message_descriptor, ()):
           continue
         self._TryLoadExtensionFromDB(message_descriptor, number)
 
-    return list(self._extensions_by_number[message_descriptor].values())
+    return list(self._extensions_by_number.get(message_descriptor, {}).values())
 
   def _TryLoadExtensionFromDB(self, message_descriptor, number):
     """Try to Load extensions from descriptor db.
@@ -603,18 +823,21 @@ class DescriptorPool(object):
       return
 
     full_name = message_descriptor.full_name
-    file_proto = self._descriptor_db.FindFileContainingExtension(
-        full_name, number)
+    with self._lock:
+      if number in self._extensions_by_number.get(message_descriptor, ()):
+        return
+      file_proto = self._descriptor_db.FindFileContainingExtension(
+          full_name, number)
 
-    if file_proto is None:
-      return
+      if file_proto is None:
+        return
 
-    try:
-      self._ConvertFileProtoToFileDescriptor(file_proto)
-    except:
-      warn_msg = ('Unable to load proto file %s for extension number %d.' %
-                  (file_proto.name, number))
-      warnings.warn(warn_msg, RuntimeWarning)
+      try:
+        self._ConvertFileProtoToFileDescriptor(file_proto)
+      except:
+        warn_msg = ('Unable to load proto file %s for extension number %d.' %
+                    (file_proto.name, number))
+        warnings.warn(warn_msg, RuntimeWarning)
 
   def FindServiceByName(self, full_name):
     """Loads the named service descriptor from the pool.
@@ -629,9 +852,10 @@ class DescriptorPool(object):
       KeyError: if the service cannot be found in the pool.
     """
     full_name = _NormalizeFullyQualifiedName(full_name)
-    if full_name not in self._service_descriptors:
-      self._FindFileContainingSymbolInDb(full_name)
-    return self._service_descriptors[full_name]
+    try:
+      return self._service_descriptors[full_name]
+    except KeyError:
+      return self._FindOrLoadSymbol('_service_descriptors', full_name)
 
   def FindMethodByName(self, full_name):
     """Loads the named service method descriptor from the pool.
@@ -758,6 +982,28 @@ class DescriptorPool(object):
         cached = features
     return cached
 
+  def _FindOrLoadSymbol(self, register_name, full_name):
+    """Slow path of the Find*ByName() methods.
+
+    Builds the file declaring the symbol from the descriptor databases.  This
+    runs under the pool lock, so that concurrent lookups of a missing symbol
+    build its file only once.
+
+    Args:
+      register_name (str): The name of the symbol table to search.
+      full_name (str): The normalized full name of the symbol.
+
+    Returns:
+      The descriptor of the symbol.
+
+    Raises:
+      KeyError: if the symbol cannot be found.
+    """
+    with self._lock:
+      if full_name not in self._Register(register_name):
+        self._FindFileContainingSymbolInDb(full_name)
+      return self._Register(register_name)[full_name]
+
   def _FindFileContainingSymbolInDb(self, symbol):
     """Finds the file in descriptor DB containing the specified symbol.
 
@@ -793,96 +1039,102 @@ class DescriptorPool(object):
     Returns:
       A FileDescriptor matching the passed in proto.
     """
-    if file_proto.name not in self._file_descriptors:
-      built_deps = list(self._GetDeps(file_proto.dependency))
-      direct_deps = [self.FindFileByName(n) for n in file_proto.dependency]
-      public_deps = [direct_deps[i] for i in file_proto.public_dependency]
-
-      # pylint: disable=g-import-not-at-top
-      from google.protobuf import descriptor_pb2
-
-      file_descriptor = descriptor.FileDescriptor(
-          pool=self,
-          name=file_proto.name,
-          package=file_proto.package,
-          syntax=file_proto.syntax,
-          edition=descriptor_pb2.Edition.Name(file_proto.edition),
-          options=_OptionsOrNone(file_proto),
-          serialized_pb=file_proto.SerializeToString(),
-          dependencies=direct_deps,
-          public_dependencies=public_deps,
-          # pylint: disable=protected-access
-          create_key=descriptor._internal_create_key,
-      )
-      scope = {}
+    with self._Building() as staged:
+      if file_proto.name not in staged['_file_descriptors']:
+        with profiling.Span('BuildFileDescriptor', file=file_proto.name):
+          self._BuildFileDescriptor(file_proto, staged)
+
+      # Add extensions to the pool
+      def AddExtensionForNested(message_type):
+        for nested in message_type.nested_types:
+          AddExtensionForNested(nested)
+        for extension in message_type.extensions:
+          self._AddExtensionDescriptor(extension)
+
+      file_desc = staged['_file_descriptors'][file_proto.name]
+      for extension in file_desc.extensions_by_name.values():
+        self._AddExtensionDescriptor(extension)
+      for message_type in file_desc.message_types_by_name.values():
+        AddExtensionForNested(message_type)
 
-      # This loop extracts all the message and enum types from all the
-      # dependencies of the file_proto. This is necessary to create the
-      # scope of available message types when defining the passed in
-      # file proto.
-      for dependency in built_deps:
-        scope.update(self._ExtractSymbols(
-            dependency.message_types_by_name.values()))
-        scope.update((_PrefixWithDot(enum.full_name), enum)
-                     for enum in dependency.enum_types_by_name.values())
-
-      for message_type in file_proto.message_type:
-        message_desc = self._ConvertMessageDescriptor(
-            message_type, file_proto.package, file_descriptor, scope,
-            file_proto.syntax)
-        file_descriptor.message_types_by_name[message_desc.name] = (
-            message_desc)
-
-      for enum_type in file_proto.enum_type:
-        file_descriptor.enum_types_by_name[enum_type.name] = (
-            self._ConvertEnumDescriptor(enum_type, file_proto.package,
-                                        file_descriptor, None, scope, True))
-
-      for index, extension_proto in enumerate(file_proto.extension):
-        extension_desc = self._MakeFieldDescriptor(
-            extension_proto, file_proto.package, index, file_descriptor,
-            is_extension=True)
-        extension_desc.containing_type = self._GetTypeFromScope(
-            file_descriptor.package, extension_proto.extendee, scope)
-        self._SetFieldType(extension_proto, extension_desc,
-                           file_descriptor.package, scope)
-        file_descriptor.extensions_by_name[extension_desc.name] = (
-            extension_desc)
-
-      for desc_proto in file_proto.message_type:
-        self._SetAllFieldTypes(file_proto.package, desc_proto, scope)
-
-      if file_proto.package:
-        desc_proto_prefix = _PrefixWithDot(file_proto.package)
-      else:
-        desc_proto_prefix = ''
+      return file_desc
 
-      for desc_proto in file_proto.message_type:
-        desc = self._GetTypeFromScope(
-            desc_proto_prefix, desc_proto.name, scope)
-        file_descriptor.message_types_by_name[desc_proto.name] = desc
+  def _BuildFileDescriptor(self, file_proto, staged):
+    """Builds the descriptors of a file and stages them."""
+    built_deps = list(self._GetDeps(file_proto.dependency))
+    direct_deps = [self._LoadFile(n) for n in file_proto.dependency]
+    public_deps = [direct_deps[i] for i in file_proto.public_dependency]
 
-      for index, service_proto in enumerate(file_proto.service):
-        file_descriptor.services_by_name[service_proto.name] = (
-            self._MakeServiceDescriptor(service_proto, index, scope,
-                                        file_proto.package, file_descriptor))
+    # pylint: disable=g-import-not-at-top
+    from google.protobuf import descriptor_pb2
 
-      self._file_descriptors[file_proto.name] = file_descriptor
+    file_descriptor = descriptor.FileDescriptor(
+        pool=self,
+        name=file_proto.name,
+        package=file_proto.package,
+        syntax=file_proto.syntax,
+        edition=descriptor_pb2.Edition.Name(file_proto.edition),
+        options=_OptionsOrNone(file_proto),
+        serialized_pb=file_proto.SerializeToString(),
+        dependencies=direct_deps,
+        public_dependencies=public_deps,
+        # pylint: disable=protected-access
+        create_key=descriptor._internal_create_key,
+    )
+    scope = {}
+
+    # This loop extracts all the message and enum types from all the
+    # dependencies of the file_proto. This is necessary to create the
+    # scope of available message types when defining the passed in
+    # file proto.
+    for dependency in built_deps:
+      scope.update(self._ExtractSymbols(
+          dependency.message_types_by_name.values()))
+      scope.update((_PrefixWithDot(enum.full_name), enum)
+                   for enum in dependency.enum_types_by_name.values())
+
+    for message_type in file_proto.message_type:
+      message_desc = self._ConvertMessageDescriptor(
+          message_type, file_proto.package, file_descriptor, scope,
+          file_proto.syntax)
+      file_descriptor.message_types_by_name[message_desc.name] = (
+          message_desc)
+
+    for enum_type in file_proto.enum_type:
+      file_descriptor.enum_types_by_name[enum_type.name] = (
+          self._ConvertEnumDescriptor(enum_type, file_proto.package,
+                                      file_descriptor, None, scope, True))
+
+    for index, extension_proto in enumerate(file_proto.extension):
+      extension_desc = self._MakeFieldDescriptor(
+          extension_proto, file_proto.package, index, file_descriptor,
+          is_extension=True)
+      extension_desc.containing_type = self._GetTypeFromScope(
+          file_descriptor.package, extension_proto.extendee, scope)
+      self._SetFieldType(extension_proto, extension_desc,
+                         file_descriptor.package, scope)
+      file_descriptor.extensions_by_name[extension_desc.name] = (
+          extension_desc)
 
-    # Add extensions to the pool
-    def AddExtensionForNested(message_type):
-      for nested in message_type.nested_types:
-        AddExtensionForNested(nested)
-      for extension in message_type.extensions:
-        self._AddExtensionDescriptor(extension)
+    for desc_proto in file_proto.message_type:
+      self._SetAllFieldTypes(file_proto.package, desc_proto, scope)
 
-    file_desc = self._file_descriptors[file_proto.name]
-    for extension in file_desc.extensions_by_name.values():
-      self._AddExtensionDescriptor(extension)
-    for message_type in file_desc.message_types_by_name.values():
-      AddExtensionForNested(message_type)
+    if file_proto.package:
+      desc_proto_prefix = _PrefixWithDot(file_proto.package)
+    else:
+      desc_proto_prefix = ''
 
-    return file_desc
+    for desc_proto in file_proto.message_type:
+      desc = self._GetTypeFromScope(
+          desc_proto_prefix, desc_proto.name, scope)
+      file_descriptor.message_types_by_name[desc_proto.name] = desc
+
+    for index, service_proto in enumerate(file_proto.service):
+      file_descriptor.services_by_name[service_proto.name] = (
+          self._MakeServiceDescriptor(service_proto, index, scope,
+                                      file_proto.package, file_descriptor))
+
+    staged['_file_descriptors'][file_proto.name] = file_descriptor
 
   def _ConvertMessageDescriptor(self, desc_proto, package=None, file_desc=None,
                                 scope=None, syntax=None):
@@ -976,7 +1228,7 @@ class DescriptorPool(object):
 
     scope[_PrefixWithDot(desc_name)] = desc
     self._CheckConflictRegister(desc, desc.full_name, desc.file.name)
-    self._descriptors[desc_name] = desc
+    self._staged['_descriptors'][desc_name] = desc
     return desc
 
   def _ConvertEnumDescriptor(self, enum_proto, package=None, file_desc=None,
@@ -1019,7 +1271,7 @@ class DescriptorPool(object):
                                      create_key=descriptor._internal_create_key)
     scope['.%s' % enum_name] = desc
     self._CheckConflictRegister(desc, desc.full_name, desc.file.name)
-    self._enum_descriptors[enum_name] = desc
+    self._staged['_enum_descriptors'][enum_name] = desc
 
     # Add top level enum values.
     if top_level:
@@ -1027,7 +1279,7 @@ class DescriptorPool(object):
         full_name = _NormalizeFullyQualifiedName(
             '.'.join((package, value.name)))
         self._CheckConflictRegister(value, full_name, file_name)
-        self._top_enum_values[full_name] = value
+        self._staged['_top_enum_values'][full_name] = value
 
     return desc
 
@@ -1244,7 +1496,7 @@ class DescriptorPool(object):
         # pylint: disable=protected-access
         create_key=descriptor._internal_create_key)
     self._CheckConflictRegister(desc, desc.full_name, desc.file.name)
-    self._service_descriptors[service_name] = desc
+    self._staged['_service_descriptors'][service_name] = desc
     return desc
 
   def _MakeMethodDescriptor(self, method_proto, service_name, package, scope,
@@ -1310,7 +1562,7 @@ class DescriptorPool(object):
     for dependency in dependencies:
       if dependency not in visited:
         visited.add(dependency)
-        dep_desc = self.FindFileByName(dependency)
+        dep_desc = self._LoadFile(dependency)
         yield dep_desc
         public_files = [d.name for d in dep_desc.public_dependencies]
         yield from self._GetDeps(public_files, visited)
@@ -15,6 +15,7 @@ in generated code.
 __author__ = 'jieluo@google.com (Jie Luo)'
 
 from google.protobuf.internal import enum_type_wrapper
+from google.protobuf.internal import profiling
 from google.protobuf.internal import python_message
 from google.protobuf import message as _message
 from google.protobuf import reflection as _reflection
@@ -30,6 +31,13 @@ def BuildMessageAndEnumDescriptors(file_des, module):
     file_des: FileDescriptor of the .proto file
     module: Generated _pb2 module
   """
+  profiling.GeneratedFileAdded(file_des.name)
+  with profiling.Span('BuildMessageAndEnumDescriptors', file=file_des.name):
+    _BuildMessageAndEnumDescriptors(file_des, module)
+
+
+def _BuildMessageAndEnumDescriptors(file_des, module):
+  """Implements BuildMessageAndEnumDescriptors()."""
 
   def BuildNestedDescriptors(msg_des, prefix):
     for (name, nested_msg) in msg_des.nested_types_by_name.items():
@@ -53,6 +61,12 @@ def BuildTopDescriptorsAndMessages(file_des, module_name, module):
     module_name: str, the name of generated _pb2 module
     module: Generated _pb2 module
   """
+  with profiling.Span('BuildTopDescriptorsAndMessages', file=file_des.name):
+    _BuildTopDescriptorsAndMessages(file_des, module_name, module)
+
+
+def _BuildTopDescriptorsAndMessages(file_des, module_name, module):
+  """Implements BuildTopDescriptorsAndMessages()."""
 
   def BuildMessage(msg_des):
     create_dict = {}
@@ -60,9 +74,10 @@ def BuildTopDescriptorsAndMessages(file_des, module_name, module):
       create_dict[name] = BuildMessage(nested_msg)
     create_dict['DESCRIPTOR'] = msg_des
     create_dict['__module__'] = module_name
-    message_class = _reflection.GeneratedProtocolMessageType(
-        msg_des.name, (_message.Message,), create_dict)
-    _sym_db.RegisterMessage(message_class)
+    with profiling.Span('CreateClass', msg_des.full_name, file_des.name):
+      message_class = _reflection.GeneratedProtocolMessageType(
+          msg_des.name, (_message.Message,), create_dict)
+      _sym_db.RegisterMessage(message_class)
     return message_class
 
   # top level enums
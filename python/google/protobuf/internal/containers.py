@@ -22,6 +22,7 @@ import copy
 import pickle
 from typing import (
     Any,
+    Dict,
     Iterable,
     Iterator,
     List,
@@ -47,6 +48,9 @@ class BaseContainer(Sequence[_T]):
   # Minimizes memory usage and disallows assignment to other attributes.
   __slots__ = ['_message_listener', '_values']
 
+  # Whether the container belongs to a frozen message.
+  _frozen = False
+
   def __init__(self, message_listener: Any) -> None:
     """
     Args:
@@ -90,9 +94,13 @@ class BaseContainer(Sequence[_T]):
     if 'sort_function' in kwargs:
       kwargs['cmp'] = kwargs.pop('sort_function')
     self._values.sort(*args, **kwargs)
+    if len(self._values) > 1:
+      self._message_listener.Modified()
 
   def reverse(self) -> None:
     self._values.reverse()
+    if len(self._values) > 1:
+      self._message_listener.Modified()
 
 
 # TODO: Remove this. BaseContainer does *not* conform to
@@ -192,7 +200,7 @@ class RepeatedScalarFieldContainer(BaseContainer[_T], MutableSequence[_T]):
     if self is other:
       return True
     # Special case for the same type which should be common and fast.
-    if isinstance(other, self.__class__):
+    if isinstance(other, RepeatedScalarFieldContainer):
       return other._values == self._values
     # We are presumably comparing against some other sequence type.
     return other == self._values
@@ -210,6 +218,18 @@ class RepeatedScalarFieldContainer(BaseContainer[_T], MutableSequence[_T]):
     raise pickle.PickleError(
         "Can't pickle repeated scalar fields, convert to list first")
 
+  def _Freeze(self) -> None:
+    """Makes the container immutable, for frozen messages."""
+    self.__class__ = _FrozenRepeatedScalarFieldContainer
+
+  def _Thaw(
+      self, message_listener: Any
+  ) -> 'RepeatedScalarFieldContainer[_T]':
+    """Returns a mutable copy of this frozen container."""
+    clone = RepeatedScalarFieldContainer(message_listener, self._type_checker)
+    clone._values = self._values[:]
+    return clone
+
 
 # TODO: Constrain T to be a subtype of Message.
 class RepeatedCompositeFieldContainer(BaseContainer[_T], MutableSequence[_T]):
@@ -280,6 +300,40 @@ class RepeatedCompositeFieldContainer(BaseContainer[_T], MutableSequence[_T]):
       values.append(new_element)
     listener.Modified()
 
+  def extend_from_dicts(self, rows: Iterable[Dict[str, Any]]) -> None:
+    """Appends a new element for each dict of field values in rows.
+
+    This is the same as calling add(**row) for each row, except that the parent
+    message is marked as modified once, and that no element is appended if a
+    row is invalid.
+    """
+    message_class = self._message_descriptor._concrete_class
+    new_elements = []
+    for row in rows:
+      if not isinstance(row, dict):
+        raise TypeError('Expected a dict of field values, got %s.' %
+                        type(row).__name__)
+      new_elements.append(message_class.FromDict(row))
+    self._ExtendNew(new_elements)
+
+  def extend_from_tuples(
+      self, rows: Iterable[Sequence[Any]], fields: Sequence[str]) -> None:
+    """Appends a new element for each row of values of the given fields.
+
+    This is the same as extend_from_dicts() with dict(zip(fields, row)) for
+    each row, but the fields are looked up once for all rows.
+    """
+    message_class = self._message_descriptor._concrete_class
+    self._ExtendNew(message_class._FromTuples(fields, rows))
+
+  def _ExtendNew(self, new_elements: List[_T]) -> None:
+    """Appends new elements without copying them."""
+    listener = self._message_listener
+    for new_element in new_elements:
+      new_element._SetListener(listener)
+    self._values.extend(new_elements)
+    listener.Modified()
+
   def MergeFrom(
       self,
       other: Union['RepeatedCompositeFieldContainer[_T]', Iterable[_T]],
@@ -324,11 +378,31 @@ class RepeatedCompositeFieldContainer(BaseContainer[_T], MutableSequence[_T]):
     """Compares the current instance with another one."""
     if self is other:
       return True
-    if not isinstance(other, self.__class__):
+    if not isinstance(other, RepeatedCompositeFieldContainer):
       raise TypeError('Can only compare repeated composite fields against '
                       'other repeated composite fields.')
     return self._values == other._values
 
+  def _Freeze(self) -> None:
+    """Makes the container and its elements immutable."""
+    for element in self._values:
+      element._Freeze()
+    self.__class__ = _FrozenRepeatedCompositeFieldContainer
+
+  def _Thaw(
+      self, message_listener: Any
+  ) -> 'RepeatedCompositeFieldContainer[_T]':
+    """Returns a mutable copy of this frozen container.
+
+    The elements are copied with _Thaw() too, so the copy shares their frozen
+    sub-messages until they are accessed.
+    """
+    clone = RepeatedCompositeFieldContainer(
+        message_listener, self._message_descriptor)
+    clone._values = [
+        element._Thaw(message_listener) for element in self._values]
+    return clone
+
 
 class ScalarMap(MutableMapping[_K, _V]):
   """Simple, type-checked, dict-like container for holding repeated scalars."""
@@ -337,6 +411,9 @@ class ScalarMap(MutableMapping[_K, _V]):
   __slots__ = ['_key_checker', '_value_checker', '_values', '_message_listener',
                '_entry_descriptor']
 
+  # Whether the map belongs to a frozen message.
+  _frozen = False
+
   def __init__(
       self,
       message_listener: Any,
@@ -431,6 +508,17 @@ class ScalarMap(MutableMapping[_K, _V]):
   def GetEntryClass(self) -> Any:
     return self._entry_descriptor._concrete_class
 
+  def _Freeze(self) -> None:
+    """Makes the map immutable, for frozen messages."""
+    self.__class__ = _FrozenScalarMap
+
+  def _Thaw(self, message_listener: Any) -> 'ScalarMap[_K, _V]':
+    """Returns a mutable copy of this frozen map."""
+    clone = ScalarMap(message_listener, self._key_checker, self._value_checker,
+                      self._entry_descriptor)
+    clone._values = self._values.copy()
+    return clone
+
 
 class MessageMap(MutableMapping[_K, _V]):
   """Simple, type-checked, dict-like container for with submessage values."""
@@ -439,6 +527,9 @@ class MessageMap(MutableMapping[_K, _V]):
   __slots__ = ['_key_checker', '_values', '_message_listener',
                '_message_descriptor', '_entry_descriptor']
 
+  # Whether the map belongs to a frozen message.
+  _frozen = False
+
   def __init__(
       self,
       message_listener: Any,
@@ -552,6 +643,60 @@ class MessageMap(MutableMapping[_K, _V]):
   def GetEntryClass(self) -> Any:
     return self._entry_descriptor._concrete_class
 
+  def _Freeze(self) -> None:
+    """Makes the map and its values immutable."""
+    for value in self._values.values():
+      value._Freeze()
+    self.__class__ = _FrozenMessageMap
+
+  def _Thaw(self, message_listener: Any) -> 'MessageMap[_K, _V]':
+    """Returns a mutable copy of this frozen map, thawing its values."""
+    clone = MessageMap(message_listener, self._message_descriptor,
+                       self._key_checker, self._entry_descriptor)
+    clone._values = {
+        key: value._Thaw(message_listener)
+        for key, value in self._values.items()}
+    return clone
+
+
+def _RaiseFrozen(self, *args, **kwargs):
+  raise ValueError('Cannot modify a frozen message.')
+
+
+def _FrozenContainerClass(container_class, mutators):
+  """Returns a subclass of container_class whose mutators raise ValueError.
+
+  Freezing a container replaces its class, so that the containers of mutable
+  messages do not need to check whether they are frozen.
+  """
+  namespace = dict.fromkeys(mutators, _RaiseFrozen)
+  namespace['__slots__'] = ()
+  namespace['_frozen'] = True
+  if issubclass(container_class, collections.abc.MutableMapping):
+    # Maps insert missing keys on lookup.
+    def __getitem__(self, key):
+      if key not in self:
+        _RaiseFrozen(self)
+      return container_class.__getitem__(self, key)
+    namespace['__getitem__'] = __getitem__
+  return type('Frozen' + container_class.__name__, (container_class,),
+              namespace)
+
+
+_FrozenRepeatedScalarFieldContainer = _FrozenContainerClass(
+    RepeatedScalarFieldContainer,
+    ('append', 'insert', 'extend', 'MergeFrom', 'remove', 'pop',
+     '__setitem__', '__delitem__', 'sort', 'reverse'))
+_FrozenRepeatedCompositeFieldContainer = _FrozenContainerClass(
+    RepeatedCompositeFieldContainer,
+    ('add', 'append', 'insert', 'extend', 'extend_from_dicts',
+     'extend_from_tuples', 'MergeFrom', 'remove', 'pop', '__setitem__',
+     '__delitem__', 'sort', 'reverse'))
+_FrozenScalarMap = _FrozenContainerClass(
+    ScalarMap, ('__setitem__', '__delitem__', 'MergeFrom', 'clear'))
+_FrozenMessageMap = _FrozenContainerClass(
+    MessageMap, ('__delitem__', 'MergeFrom', 'clear'))
+
 
 class _UnknownField:
   """A parsed unknown field."""
@@ -57,9 +57,13 @@ we repeatedly read a tag, look up the corresponding decoder, and invoke it.
 
 __author__ = 'kenton@google.com (Kenton Varda)'
 
+import contextlib
 import math
 import struct
+import sys
+import threading
 
+from google.protobuf import descriptor
 from google.protobuf import message
 from google.protobuf.internal import containers
 from google.protobuf.internal import encoder
@@ -71,6 +75,57 @@ from google.protobuf.internal import wire_format
 _DecodeError = message.DecodeError
 
 
+class _DecodeOptions(threading.local):
+  """Options of the parses of the current thread.
+
+  Attributes:
+    alias_buffer: Whether the values of bytes fields and unknown fields are
+      memoryviews over the parsed buffer instead of copies of its bytes.  The
+      memoryviews keep the buffer alive for as long as the message holds them.
+    retain_buffer: Whether the parsed messages keep the span of the buffer they
+      were parsed from, which they serialize to while they are not modified.
+  """
+
+  alias_buffer = False
+  retain_buffer = False
+
+
+_options = _DecodeOptions()
+
+
+@contextlib.contextmanager
+def AliasingBuffer():
+  """Makes the parses of the current thread alias the parsed buffer.
+
+  Within this context, the bytes fields and unknown fields of the parsed
+  messages are memoryviews over the parsed buffer instead of copies.  Unlike
+  bytes, memoryviews cannot be ordered.
+  """
+  previous = _options.alias_buffer
+  _options.alias_buffer = True
+  try:
+    yield
+  finally:
+    _options.alias_buffer = previous
+
+
+@contextlib.contextmanager
+def RetainingBuffer():
+  """Makes the parsed messages of the current thread retain the parsed buffer.
+
+  Within this context, each parsed message keeps a memoryview of the span of
+  the buffer it was parsed from.  Until the message is modified, a
+  non-deterministic serialization writes this span instead of encoding its
+  fields.
+  """
+  previous = _options.retain_buffer
+  _options.retain_buffer = True
+  try:
+    yield
+  finally:
+    _options.retain_buffer = previous
+
+
 def _VarintDecoder(mask, result_type):
   """Return an encoder for a basic varint value (does not include tag).
 
@@ -141,6 +196,129 @@ _DecodeSignedVarint = _SignedVarintDecoder(64, int)
 _DecodeVarint32 = _VarintDecoder((1 << 32) - 1, int)
 _DecodeSignedVarint32 = _SignedVarintDecoder(32, int)
 
+# Packed varints spanning at least this many bytes are decoded with NumPy, if
+# the application has imported it.
+_NUMPY_MIN_PACKED_SIZE = 256
+
+
+def _DecodeVarints(data):
+  """Decodes the varints of a packed field.
+
+  Args:
+    data: bytes, the concatenated varints.
+
+  Returns:
+    The list of the values, as unsigned 64-bit integers.
+  """
+  values = []
+  append = values.append
+  result = 0
+  shift = 0
+  for b in data:
+    if b & 0x80:
+      result |= (b & 0x7f) << shift
+      shift += 7
+      if shift >= 64:
+        raise _DecodeError('Too many bytes when decoding varint.')
+    else:
+      append((result | (b << shift)) & 0xffffffffffffffff)
+      result = 0
+      shift = 0
+  if shift:
+    raise _DecodeError('Packed element was truncated.')
+  return values
+
+
+def _DecodeVarintsWithNumpy(numpy, data):
+  """Like _DecodeVarints(), but returns a uint64 array computed with NumPy.
+
+  The bytes ending the varints are located first, then the 7-bit groups of
+  each varint are shifted into place and summed.
+  """
+  array = numpy.frombuffer(data, numpy.uint8)
+  ends = numpy.flatnonzero(array < 0x80)
+  if not len(ends) or ends[-1] != len(array) - 1:
+    raise _DecodeError('Packed element was truncated.')
+  starts = numpy.empty_like(ends)
+  starts[0] = 0
+  starts[1:] = ends[:-1] + 1
+  lengths = ends - starts + 1
+  if lengths.max() > 10:
+    raise _DecodeError('Too many bytes when decoding varint.')
+  shifts = (numpy.arange(len(array)) - numpy.repeat(starts, lengths)) * 7
+  groups = (array & 0x7f).astype(numpy.uint64) << shifts.astype(numpy.uint64)
+  return numpy.add.reduceat(groups, starts)
+
+
+def _PackedVarintDecoder(convert, convert_small, convert_array):
+  """Returns a function decoding all the values of a packed varint field.
+
+  The returned function takes the buffer and the start and end positions of
+  the packed values, and returns the list of the values.
+
+  Args:
+      convert:  A function converting the list of the varints, as unsigned
+        64-bit integers, to field values.  None if they are the field values.
+      convert_small:  Like convert, for varints of one byte each.
+      convert_array:  A function converting a NumPy uint64 array of the varints
+        to an array of the field values, given the numpy module.
+  """
+
+  local_DecodeVarints = _DecodeVarints
+  min_numpy_size = _NUMPY_MIN_PACKED_SIZE
+
+  def DecodePacked(buffer, pos, end):
+    data = buffer[pos:end].tobytes()
+    if data.isascii():
+      # The varints are one byte each, which are their values.
+      values = list(data)
+      return convert_small(values) if convert_small else values
+    if len(data) >= min_numpy_size:
+      numpy = sys.modules.get('numpy')
+      if numpy is not None:
+        return convert_array(
+            numpy, _DecodeVarintsWithNumpy(numpy, data)).tolist()
+    values = local_DecodeVarints(data)
+    return convert(values) if convert else values
+
+  return DecodePacked
+
+
+def _ZigZagDecodeValues(values):
+  return [(value >> 1) ^ -(value & 1) for value in values]
+
+
+def _ZigZagDecodeArray(numpy, values):
+  return (values >> 1).view(numpy.int64) ^ -(values & 1).view(numpy.int64)
+
+
+_DecodePackedInt32 = _PackedVarintDecoder(
+    lambda values: [((value & 0xffffffff) ^ 0x80000000) - 0x80000000
+                    for value in values],
+    None,
+    lambda numpy, values: values.astype(numpy.uint32).view(numpy.int32))
+_DecodePackedInt64 = _PackedVarintDecoder(
+    lambda values: [(value ^ (1 << 63)) - (1 << 63) for value in values],
+    None,
+    lambda numpy, values: values.view(numpy.int64))
+_DecodePackedUInt32 = _PackedVarintDecoder(
+    lambda values: [value & 0xffffffff for value in values],
+    None,
+    lambda numpy, values: values.astype(numpy.uint32))
+_DecodePackedUInt64 = _PackedVarintDecoder(
+    None, None, lambda numpy, values: values)
+_DecodePackedSInt32 = _PackedVarintDecoder(
+    lambda values: _ZigZagDecodeValues(
+        [value & 0xffffffff for value in values]),
+    _ZigZagDecodeValues,
+    lambda numpy, values: _ZigZagDecodeArray(numpy, values & 0xffffffff))
+_DecodePackedSInt64 = _PackedVarintDecoder(
+    _ZigZagDecodeValues, _ZigZagDecodeValues, _ZigZagDecodeArray)
+_DecodePackedBool = _PackedVarintDecoder(
+    lambda values: list(map(bool, values)),
+    lambda values: list(map(bool, values)),
+    lambda numpy, values: values != 0)
+
 
 def ReadTag(buffer, pos):
   """Read a tag from the memoryview, and return a (tag_bytes, new_pos) tuple.
@@ -171,18 +349,37 @@ def ReadTag(buffer, pos):
 # --------------------------------------------------------------------
 
 
-def _SimpleDecoder(wire_type, decode_value):
+def _SimpleDecoder(wire_type, decode_value, decode_packed=None):
   """Return a constructor for a decoder for fields of a particular type.
 
   Args:
       wire_type:  The field's wire type.
       decode_value:  A function which decodes an individual value, e.g.
         _DecodeVarint()
+      decode_packed:  A function which decodes all the values of a packed
+        field at once, e.g. _DecodePackedInt32(), or None to decode them one
+        by one with decode_value.
   """
 
   def SpecificDecoder(field_number, is_repeated, is_packed, key, new_default,
                       clear_if_default=False):
-    if is_packed:
+    if is_packed and decode_packed is not None:
+      local_DecodeVarint = _DecodeVarint
+      def DecodePackedField(buffer, pos, end, message, field_dict):
+        value = field_dict.get(key)
+        if value is None:
+          value = field_dict.setdefault(key, new_default(message))
+        (endpoint, pos) = local_DecodeVarint(buffer, pos)
+        endpoint += pos
+        if endpoint > end:
+          raise _DecodeError('Truncated message.')
+        # The decoded values have the type of the field: they are added without
+        # going through the type checker of the container.
+        # pylint: disable=protected-access
+        value._values.extend(decode_packed(buffer, pos, endpoint))
+        return endpoint
+      return DecodePackedField
+    elif is_packed:
       local_DecodeVarint = _DecodeVarint
       def DecodePackedField(buffer, pos, end, message, field_dict):
         value = field_dict.get(key)
@@ -234,34 +431,40 @@ def _SimpleDecoder(wire_type, decode_value):
   return SpecificDecoder
 
 
-def _ModifiedDecoder(wire_type, decode_value, modify_value):
+def _ModifiedValueDecoder(decode_value, modify_value):
+  """Returns a function decoding a value with decode_value, then invoking
+  modify_value on it.  Usually modify_value is ZigZagDecode.
+  """
+
+  def InnerDecode(buffer, pos):
+    (result, new_pos) = decode_value(buffer, pos)
+    return (modify_value(result), new_pos)
+  return InnerDecode
+
+
+def _ModifiedDecoder(wire_type, decode_value, modify_value,
+                     decode_packed=None):
   """Like SimpleDecoder but additionally invokes modify_value on every value
   before storing it.  Usually modify_value is ZigZagDecode.
   """
 
   # Reusing _SimpleDecoder is slightly slower than copying a bunch of code, but
   # not enough to make a significant difference.
-
-  def InnerDecode(buffer, pos):
-    (result, new_pos) = decode_value(buffer, pos)
-    return (modify_value(result), new_pos)
-  return _SimpleDecoder(wire_type, InnerDecode)
+  return _SimpleDecoder(
+      wire_type, _ModifiedValueDecoder(decode_value, modify_value),
+      decode_packed)
 
 
-def _StructPackDecoder(wire_type, format):
-  """Return a constructor for a decoder for a fixed-width field.
+def _StructPackValueDecoder(format):
+  """Returns a function decoding a fixed-width value.
 
   Args:
-      wire_type:  The field's wire type.
       format:  The format string to pass to struct.unpack().
   """
 
   value_size = struct.calcsize(format)
   local_unpack = struct.unpack
 
-  # Reusing _SimpleDecoder is slightly slower than copying a bunch of code, but
-  # not enough to make a significant difference.
-
   # Note that we expect someone up-stack to catch struct.error and convert
   # it to _DecodeError -- this way we don't have to set up exception-
   # handling blocks every time we parse one value.
@@ -270,11 +473,48 @@ def _StructPackDecoder(wire_type, format):
     new_pos = pos + value_size
     result = local_unpack(format, buffer[pos:new_pos])[0]
     return (result, new_pos)
-  return _SimpleDecoder(wire_type, InnerDecode)
+  return InnerDecode
+
+
+def _PackedStructDecoder(format):
+  """Returns a function decoding all the values of a packed fixed-width field
+  with a single struct.unpack() call.
+
+  Args:
+      format:  The format string of a single value, e.g. '<I'.
+  """
 
+  value_size = struct.calcsize(format)
+  byte_order = format[0]
+  value_format = format[1:]
+  local_unpack = struct.unpack
 
-def _FloatDecoder():
-  """Returns a decoder for a float field.
+  def DecodePacked(buffer, pos, end):
+    (count, remainder) = divmod(end - pos, value_size)
+    if remainder:
+      raise _DecodeError('Packed element was truncated.')
+    return local_unpack(
+        '%s%d%s' % (byte_order, count, value_format), buffer[pos:end])
+
+  return DecodePacked
+
+
+def _StructPackDecoder(wire_type, format):
+  """Return a constructor for a decoder for a fixed-width field.
+
+  Args:
+      wire_type:  The field's wire type.
+      format:  The format string to pass to struct.unpack().
+  """
+
+  # Reusing _SimpleDecoder is slightly slower than copying a bunch of code, but
+  # not enough to make a significant difference.
+  return _SimpleDecoder(wire_type, _StructPackValueDecoder(format),
+                        _PackedStructDecoder(format))
+
+
+def _FloatValueDecoder():
+  """Returns a function decoding a float value.
 
   This code works around a bug in struct.unpack for non-finite 32-bit
   floating-point values.
@@ -315,11 +555,11 @@ def _FloatDecoder():
     # handling blocks every time we parse one value.
     result = local_unpack('<f', float_bytes)[0]
     return (result, new_pos)
-  return _SimpleDecoder(wire_format.WIRETYPE_FIXED32, InnerDecode)
+  return InnerDecode
 
 
-def _DoubleDecoder():
-  """Returns a decoder for a double field.
+def _DoubleValueDecoder():
+  """Returns a function decoding a double value.
 
   This code works around a bug in struct.unpack for not-a-number.
   """
@@ -355,7 +595,7 @@ def _DoubleDecoder():
     # handling blocks every time we parse one value.
     result = local_unpack('<d', double_bytes)[0]
     return (result, new_pos)
-  return _SimpleDecoder(wire_format.WIRETYPE_FIXED64, InnerDecode)
+  return InnerDecode
 
 
 def EnumDecoder(field_number, is_repeated, is_packed, key, new_default,
@@ -397,7 +637,7 @@ def EnumDecoder(field_number, is_repeated, is_packed, key, new_default,
                                        wire_format.WIRETYPE_VARINT)
 
           message._unknown_fields.append(
-              (tag_bytes, buffer[value_start_pos:pos].tobytes()))
+              tag_bytes + buffer[value_start_pos:pos].tobytes())
           # pylint: enable=protected-access
       if pos > endpoint:
         if element in enum_type.values_by_number:
@@ -436,7 +676,7 @@ def EnumDecoder(field_number, is_repeated, is_packed, key, new_default,
           if not message._unknown_fields:
             message._unknown_fields = []
           message._unknown_fields.append(
-              (tag_bytes, buffer[pos:new_pos].tobytes()))
+              tag_bytes + buffer[pos:new_pos].tobytes())
         # pylint: enable=protected-access
         # Predict that the next tag is another copy of the same repeated
         # field.
@@ -477,7 +717,7 @@ def EnumDecoder(field_number, is_repeated, is_packed, key, new_default,
         tag_bytes = encoder.TagBytes(field_number,
                                      wire_format.WIRETYPE_VARINT)
         message._unknown_fields.append(
-            (tag_bytes, buffer[value_start_pos:pos].tobytes()))
+            tag_bytes + buffer[value_start_pos:pos].tobytes())
         # pylint: enable=protected-access
       return pos
     return DecodeField
@@ -487,18 +727,22 @@ def EnumDecoder(field_number, is_repeated, is_packed, key, new_default,
 
 
 Int32Decoder = _SimpleDecoder(
-    wire_format.WIRETYPE_VARINT, _DecodeSignedVarint32)
+    wire_format.WIRETYPE_VARINT, _DecodeSignedVarint32, _DecodePackedInt32)
 
 Int64Decoder = _SimpleDecoder(
-    wire_format.WIRETYPE_VARINT, _DecodeSignedVarint)
+    wire_format.WIRETYPE_VARINT, _DecodeSignedVarint, _DecodePackedInt64)
 
-UInt32Decoder = _SimpleDecoder(wire_format.WIRETYPE_VARINT, _DecodeVarint32)
-UInt64Decoder = _SimpleDecoder(wire_format.WIRETYPE_VARINT, _DecodeVarint)
+UInt32Decoder = _SimpleDecoder(
+    wire_format.WIRETYPE_VARINT, _DecodeVarint32, _DecodePackedUInt32)
+UInt64Decoder = _SimpleDecoder(
+    wire_format.WIRETYPE_VARINT, _DecodeVarint, _DecodePackedUInt64)
 
 SInt32Decoder = _ModifiedDecoder(
-    wire_format.WIRETYPE_VARINT, _DecodeVarint32, wire_format.ZigZagDecode)
+    wire_format.WIRETYPE_VARINT, _DecodeVarint32, wire_format.ZigZagDecode,
+    _DecodePackedSInt32)
 SInt64Decoder = _ModifiedDecoder(
-    wire_format.WIRETYPE_VARINT, _DecodeVarint, wire_format.ZigZagDecode)
+    wire_format.WIRETYPE_VARINT, _DecodeVarint, wire_format.ZigZagDecode,
+    _DecodePackedSInt64)
 
 # Note that Python conveniently guarantees that when using the '<' prefix on
 # formats, they will also have the same size across all platforms (as opposed
@@ -508,11 +752,15 @@ Fixed32Decoder  = _StructPackDecoder(wire_format.WIRETYPE_FIXED32, '<I')
 Fixed64Decoder  = _StructPackDecoder(wire_format.WIRETYPE_FIXED64, '<Q')
 SFixed32Decoder = _StructPackDecoder(wire_format.WIRETYPE_FIXED32, '<i')
 SFixed64Decoder = _StructPackDecoder(wire_format.WIRETYPE_FIXED64, '<q')
-FloatDecoder = _FloatDecoder()
-DoubleDecoder = _DoubleDecoder()
+FloatDecoder = _SimpleDecoder(
+    wire_format.WIRETYPE_FIXED32, _FloatValueDecoder(),
+    _PackedStructDecoder('<f'))
+DoubleDecoder = _SimpleDecoder(
+    wire_format.WIRETYPE_FIXED64, _DoubleValueDecoder(),
+    _PackedStructDecoder('<d'))
 
 BoolDecoder = _ModifiedDecoder(
-    wire_format.WIRETYPE_VARINT, _DecodeVarint, bool)
+    wire_format.WIRETYPE_VARINT, _DecodeVarint, bool, _DecodePackedBool)
 
 
 def StringDecoder(field_number, is_repeated, is_packed, key, new_default,
@@ -523,9 +771,9 @@ def StringDecoder(field_number, is_repeated, is_packed, key, new_default,
 
   def _ConvertToUnicode(memview):
     """Convert byte to unicode."""
-    byte_str = memview.tobytes()
     try:
-      value = str(byte_str, 'utf-8')
+      # Decoding the memoryview directly avoids copying it to bytes first.
+      value = str(memview, 'utf-8')
     except UnicodeDecodeError as e:
       # add more information to the error message and re-raise it.
       e.reason = '%s in field: %s' % (e, key.full_name)
@@ -573,6 +821,7 @@ def BytesDecoder(field_number, is_repeated, is_packed, key, new_default,
   """Returns a decoder for a bytes field."""
 
   local_DecodeVarint = _DecodeVarint
+  local_options = _options
 
   assert not is_packed
   if is_repeated:
@@ -588,7 +837,12 @@ def BytesDecoder(field_number, is_repeated, is_packed, key, new_default,
         new_pos = pos + size
         if new_pos > end:
           raise _DecodeError('Truncated string.')
-        value.append(buffer[pos:new_pos].tobytes())
+        if local_options.alias_buffer:
+          # The type checker of the container only accepts bytes.
+          # pylint: disable=protected-access
+          value._values.append(buffer[pos:new_pos])
+        else:
+          value.append(buffer[pos:new_pos].tobytes())
         # Predict that the next tag is another copy of the same repeated field.
         pos = new_pos + tag_len
         if buffer[new_pos:pos] != tag_bytes or new_pos == end:
@@ -603,6 +857,8 @@ def BytesDecoder(field_number, is_repeated, is_packed, key, new_default,
         raise _DecodeError('Truncated string.')
       if clear_if_default and not size:
         field_dict.pop(key, None)
+      elif local_options.alias_buffer:
+        field_dict[key] = buffer[pos:new_pos]
       else:
         field_dict[key] = buffer[pos:new_pos].tobytes()
       return new_pos
@@ -792,7 +1048,7 @@ def MessageSetItemDecoder(descriptor):
       if not message._unknown_fields:
         message._unknown_fields = []
       message._unknown_fields.append(
-          (MESSAGE_SET_ITEM_TAG, buffer[message_set_item_start:pos].tobytes()))
+          MESSAGE_SET_ITEM_TAG + buffer[message_set_item_start:pos].tobytes())
       # pylint: enable=protected-access
 
     return pos
@@ -840,39 +1096,162 @@ def UnknownMessageSetItemDecoder():
 
 # --------------------------------------------------------------------
 
+_FieldDescriptor = descriptor.FieldDescriptor
+
+# Functions decoding a single key or value of a map entry, by field type.  The
+# string, bytes and message decoders are built by _MapEntryFieldDecoder().
+_MAP_ENTRY_VALUE_DECODERS = {
+    _FieldDescriptor.TYPE_INT32: _DecodeSignedVarint32,
+    _FieldDescriptor.TYPE_INT64: _DecodeSignedVarint,
+    _FieldDescriptor.TYPE_UINT32: _DecodeVarint32,
+    _FieldDescriptor.TYPE_UINT64: _DecodeVarint,
+    _FieldDescriptor.TYPE_SINT32: _ModifiedValueDecoder(
+        _DecodeVarint32, wire_format.ZigZagDecode),
+    _FieldDescriptor.TYPE_SINT64: _ModifiedValueDecoder(
+        _DecodeVarint, wire_format.ZigZagDecode),
+    _FieldDescriptor.TYPE_FIXED32: _StructPackValueDecoder('<I'),
+    _FieldDescriptor.TYPE_FIXED64: _StructPackValueDecoder('<Q'),
+    _FieldDescriptor.TYPE_SFIXED32: _StructPackValueDecoder('<i'),
+    _FieldDescriptor.TYPE_SFIXED64: _StructPackValueDecoder('<q'),
+    _FieldDescriptor.TYPE_FLOAT: _FloatValueDecoder(),
+    _FieldDescriptor.TYPE_DOUBLE: _DoubleValueDecoder(),
+    _FieldDescriptor.TYPE_BOOL: _ModifiedValueDecoder(_DecodeVarint, bool),
+    _FieldDescriptor.TYPE_ENUM: _DecodeSignedVarint32,
+}
+
+_MAP_ENTRY_WIRE_TYPES = {
+    _FieldDescriptor.TYPE_FIXED32: wire_format.WIRETYPE_FIXED32,
+    _FieldDescriptor.TYPE_SFIXED32: wire_format.WIRETYPE_FIXED32,
+    _FieldDescriptor.TYPE_FLOAT: wire_format.WIRETYPE_FIXED32,
+    _FieldDescriptor.TYPE_FIXED64: wire_format.WIRETYPE_FIXED64,
+    _FieldDescriptor.TYPE_SFIXED64: wire_format.WIRETYPE_FIXED64,
+    _FieldDescriptor.TYPE_DOUBLE: wire_format.WIRETYPE_FIXED64,
+    _FieldDescriptor.TYPE_STRING: wire_format.WIRETYPE_LENGTH_DELIMITED,
+    _FieldDescriptor.TYPE_BYTES: wire_format.WIRETYPE_LENGTH_DELIMITED,
+    _FieldDescriptor.TYPE_MESSAGE: wire_format.WIRETYPE_LENGTH_DELIMITED,
+}
+
+
+def _MapEntryFieldDecoder(field):
+  """Returns the tag and a value decoder for the key or value of map entries.
+
+  The decoder of message values returns the (start, end) span of the message in
+  the buffer instead of a value, for the caller to parse it in place.
+  """
+
+  tag_bytes = encoder.TagBytes(
+      field.number,
+      _MAP_ENTRY_WIRE_TYPES.get(field.type, wire_format.WIRETYPE_VARINT))
+  local_DecodeVarint = _DecodeVarint
+
+  if field.type == _FieldDescriptor.TYPE_STRING:
+    def DecodeString(buffer, pos):
+      (size, pos) = local_DecodeVarint(buffer, pos)
+      new_pos = pos + size
+      try:
+        value = str(buffer[pos:new_pos], 'utf-8')
+      except UnicodeDecodeError as e:
+        # add more information to the error message and re-raise it.
+        e.reason = '%s in field: %s' % (e, field.full_name)
+        raise
+      return (value, new_pos)
+    return tag_bytes, DecodeString
+  elif field.type == _FieldDescriptor.TYPE_BYTES:
+    local_options = _options
+    def DecodeBytes(buffer, pos):
+      (size, pos) = local_DecodeVarint(buffer, pos)
+      new_pos = pos + size
+      if local_options.alias_buffer:
+        return (buffer[pos:new_pos], new_pos)
+      return (buffer[pos:new_pos].tobytes(), new_pos)
+    return tag_bytes, DecodeBytes
+  elif field.type == _FieldDescriptor.TYPE_MESSAGE:
+    def DecodeSpan(buffer, pos):
+      (size, pos) = local_DecodeVarint(buffer, pos)
+      new_pos = pos + size
+      return ((pos, new_pos), new_pos)
+    return tag_bytes, DecodeSpan
+  return tag_bytes, _MAP_ENTRY_VALUE_DECODERS[field.type]
+
+
 def MapDecoder(field_descriptor, new_default, is_message_map):
-  """Returns a decoder for a map field."""
+  """Returns a decoder for a map field.
+
+  The keys and values are read directly from the entries, without parsing them
+  into entry messages.  Entries with a value which is not a known value of a
+  closed enum are kept whole in the unknown fields of the message, as in the
+  other implementations.
+  """
 
   key = field_descriptor
   tag_bytes = encoder.TagBytes(field_descriptor.number,
                                wire_format.WIRETYPE_LENGTH_DELIMITED)
   tag_len = len(tag_bytes)
   local_DecodeVarint = _DecodeVarint
-  # Can't read _concrete_class yet; might not be initialized.
+  local_ReadTag = ReadTag
+  local_SkipField = SkipField
   message_type = field_descriptor.message_type
+  key_field = message_type.fields_by_name['key']
+  value_field = message_type.fields_by_name['value']
+  key_tag, decode_key = _MapEntryFieldDecoder(key_field)
+  value_tag, decode_value = _MapEntryFieldDecoder(value_field)
+  default_key = key_field.default_value
+  default_value = None if is_message_map else value_field.default_value
+  if (value_field.type == _FieldDescriptor.TYPE_ENUM and
+      value_field.enum_type.is_closed):
+    enum_values = value_field.enum_type.values_by_number
+  else:
+    enum_values = None
 
   def DecodeMap(buffer, pos, end, message, field_dict):
-    submsg = message_type._concrete_class()
     value = field_dict.get(key)
     if value is None:
       value = field_dict.setdefault(key, new_default(message))
+    values = value._values  # pylint: disable=protected-access
     while 1:
       # Read length.
+      entry_start = pos
       (size, pos) = local_DecodeVarint(buffer, pos)
       new_pos = pos + size
       if new_pos > end:
         raise _DecodeError('Truncated message.')
-      # Read sub-message.
-      submsg.Clear()
-      if submsg._InternalParse(buffer, pos, new_pos) != new_pos:
-        # The only reason _InternalParse would return early is if it
-        # encountered an end-group tag.
-        raise _DecodeError('Unexpected end-group tag.')
+      # Read the key and value of the entry.
+      entry_key = default_key
+      entry_value = default_value
+      spans = []
+      while pos < new_pos:
+        (entry_tag, pos) = local_ReadTag(buffer, pos)
+        if entry_tag == key_tag:
+          (entry_key, pos) = decode_key(buffer, pos)
+        elif entry_tag == value_tag:
+          (entry_value, pos) = decode_value(buffer, pos)
+          if is_message_map:
+            spans.append(entry_value)
+        else:
+          pos = local_SkipField(buffer, pos, new_pos, entry_tag)
+          if pos == -1:
+            raise _DecodeError('Unexpected end-group tag.')
+      if pos != new_pos:
+        raise _DecodeError('Truncated message.')
 
       if is_message_map:
-        value[submsg.key].CopyFrom(submsg.value)
+        submsg = values.get(entry_key)
+        if submsg is None:
+          submsg = value[entry_key]
+        else:
+          submsg.Clear()
+        for (start, stop) in spans:
+          if submsg._InternalParse(buffer, start, stop) != stop:
+            # The only reason _InternalParse would return early is if it
+            # encountered an end-group tag.
+            raise _DecodeError('Unexpected end-group tag.')
+      elif enum_values is not None and entry_value not in enum_values:
+        if not message._unknown_fields:
+          message._unknown_fields = []
+        message._unknown_fields.append(
+            tag_bytes + buffer[entry_start:new_pos].tobytes())
       else:
-        value[submsg.key] = submsg.value
+        values[entry_key] = entry_value
 
       # Predict that the next tag is another copy of the same repeated field.
       pos = new_pos + tag_len
@@ -934,6 +1313,28 @@ def _SkipGroup(buffer, pos, end):
     pos = new_pos
 
 
+def _SplitUnknownFields(spans):
+  """Splits the unknown fields of a message into individual fields.
+
+  Args:
+    spans: The _unknown_fields of a message, a sequence of bytes (or
+      memoryviews) each holding one or more serialized fields.
+
+  Returns:
+    A list of (tag_bytes, value_bytes) tuples, one per field, in order.
+  """
+  fields = []
+  for span in spans:
+    buffer = memoryview(span)
+    pos = 0
+    end = len(buffer)
+    while pos != end:
+      (tag_bytes, value_pos) = ReadTag(buffer, pos)
+      pos = SkipField(buffer, value_pos, end, tag_bytes)
+      fields.append((tag_bytes, buffer[value_pos:pos].tobytes()))
+  return fields
+
+
 def _DecodeUnknownFieldSet(buffer, pos, end_pos=None):
   """Decode UnknownFieldSet.  Returns the UnknownFieldSet and new position."""
 
@@ -9,9 +9,12 @@
 """Test decoder."""
 
 import io
+import struct
 import unittest
 
+from google.protobuf import message
 from google.protobuf.internal import decoder
+from google.protobuf.internal import encoder
 from google.protobuf.internal import testing_refleaks
 
 
@@ -52,6 +55,62 @@ class DecoderTest(unittest.TestCase):
     size = decoder._DecodeVarint(input_io)
     self.assertEqual(size, None)
 
+  def test_decode_packed_varints(self):
+    values = [0, 1, 127, 128, 300, 2**31 - 1, 2**32 - 1, 2**63, 2**64 - 1]
+    data = b''.join(encoder._VarintBytes(value) for value in values)
+    buffer = memoryview(b'xx' + data)
+    end = len(buffer)
+    self.assertEqual(values, decoder._DecodePackedUInt64(buffer, 2, end))
+    self.assertEqual([value & 0xffffffff for value in values],
+                     decoder._DecodePackedUInt32(buffer, 2, end))
+    self.assertEqual([0, 1, 127, 128, 300, 2**31 - 1, 2**32 - 1, -2**63, -1],
+                     decoder._DecodePackedInt64(buffer, 2, end))
+    self.assertEqual([0, 1, 127, 128, 300, 2**31 - 1, -1, 0, -1],
+                     decoder._DecodePackedInt32(buffer, 2, end))
+    self.assertEqual([0, -1, -64, 64, 150, -2**30, -2**31, 0, -2**31],
+                     decoder._DecodePackedSInt32(buffer, 2, end))
+    self.assertEqual([0, -1, -64, 64, 150, -2**30, -2**31, 2**62, -2**63],
+                     decoder._DecodePackedSInt64(buffer, 2, end))
+    self.assertEqual([False] + [True] * 8,
+                     decoder._DecodePackedBool(buffer, 2, end))
+    # Varints of one byte each.
+    self.assertEqual([0, -1, 1], decoder._DecodePackedSInt32(
+        memoryview(b'\x00\x01\x02'), 0, 3))
+    self.assertEqual([], decoder._DecodePackedInt32(memoryview(b''), 0, 0))
+
+  def test_decode_packed_varints_errors(self):
+    with self.assertRaisesRegex(message.DecodeError, 'truncated'):
+      decoder._DecodePackedInt32(memoryview(b'\x01\x80'), 0, 2)
+    with self.assertRaisesRegex(message.DecodeError, 'Too many bytes'):
+      decoder._DecodePackedInt32(memoryview(b'\xff' * 10 + b'\x01'), 0, 11)
+
+  def test_decode_packed_varints_with_numpy(self):
+    try:
+      import numpy  # pylint: disable=g-import-not-at-top,unused-import
+    except ImportError:
+      self.skipTest('numpy is not installed.')
+    values = list(range(-1000, 1000)) + [2**31 - 1, -2**31]
+    data = b''.join(
+        encoder._VarintBytes(value & 0xffffffffffffffff) for value in values)
+    self.assertGreaterEqual(len(data), decoder._NUMPY_MIN_PACKED_SIZE)
+    buffer = memoryview(data)
+    self.assertEqual(values,
+                     decoder._DecodePackedInt32(buffer, 0, len(buffer)))
+    self.assertEqual(values,
+                     decoder._DecodePackedInt64(buffer, 0, len(buffer)))
+    with self.assertRaisesRegex(message.DecodeError, 'truncated'):
+      decoder._DecodePackedInt32(buffer, 0, len(buffer) - 1)
+    with self.assertRaisesRegex(message.DecodeError, 'Too many bytes'):
+      decoder._DecodePackedInt32(
+          memoryview(data + b'\xff' * 10 + b'\x01'), 0, len(data) + 11)
+
+  def test_decode_packed_fixed(self):
+    buffer = memoryview(struct.pack('<3d', 0.5, -1.0, 1e300))
+    self.assertEqual((0.5, -1.0, 1e300),
+                     decoder._PackedStructDecoder('<d')(buffer, 0, 24))
+    with self.assertRaisesRegex(message.DecodeError, 'truncated'):
+      decoder._PackedStructDecoder('<d')(buffer, 0, 20)
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -1136,6 +1136,134 @@ class AddDescriptorTest(unittest.TestCase):
         pool._AddFileDescriptor(0)
 
 
+@unittest.skipIf(api_implementation.Type() != 'python',
+                 'Only pure python supports ReplaceFile()')
+class ReplaceFileTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.pool = descriptor_pool.DescriptorPool()
+    self.extendable_file = self._File(
+        'replace/extendable.proto', message='Extendable')
+    self.extendable_file.message_type[0].extension_range.add(
+        start=100, end=200)
+    self.base_file = self._File(
+        'replace/base.proto', message='Base',
+        dependency=['replace/extendable.proto'])
+    self.base_file.extension.add(
+        name='base_ext', number=100, extendee='.replace.Extendable',
+        type=descriptor.FieldDescriptor.TYPE_INT32,
+        label=descriptor.FieldDescriptor.LABEL_OPTIONAL)
+    self.user_file = self._File(
+        'replace/user.proto', message='User',
+        dependency=['replace/base.proto'])
+    self.user_file.message_type[0].field.add(
+        name='base', number=1, type_name='.replace.Base',
+        type=descriptor.FieldDescriptor.TYPE_MESSAGE,
+        label=descriptor.FieldDescriptor.LABEL_OPTIONAL)
+    for file_proto in (self.extendable_file, self.base_file, self.user_file):
+      self.pool.AddSerializedFile(file_proto.SerializeToString())
+
+  def _File(self, name, message, dependency=()):
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name=name, package='replace', dependency=dependency)
+    file_proto.message_type.add(name=message).field.add(
+        name='a', number=1,
+        type=descriptor.FieldDescriptor.TYPE_INT32,
+        label=descriptor.FieldDescriptor.LABEL_OPTIONAL)
+    return file_proto
+
+  def testAddExtensionAfterParsingItsTag(self):
+    small_file = self._File('replace/small.proto', message='Small')
+    small_file.message_type[0].extension_range.add(start=2, end=16)
+    self.pool.AddSerializedFile(small_file.SerializeToString())
+    small_desc = self.pool.FindMessageTypeByName('replace.Small')
+    small_class = message_factory.GetMessageClass(small_desc)
+    # Parsed while field 2 is unknown, so the parse loop knows it as unknown.
+    self.assertEqual(
+        b'\x10\x05', small_class.FromString(b'\x10\x05').SerializeToString())
+
+    ext_file = self._File(
+        'replace/small_ext.proto', message='SmallExt',
+        dependency=['replace/small.proto'])
+    ext_file.extension.add(
+        name='small_ext', number=2, extendee='.replace.Small',
+        type=descriptor.FieldDescriptor.TYPE_INT32,
+        label=descriptor.FieldDescriptor.LABEL_OPTIONAL)
+    self.pool.AddSerializedFile(ext_file.SerializeToString())
+    ext = self.pool.FindExtensionByNumber(small_desc, 2)
+    self.assertEqual(5, small_class.FromString(b'\x10\x05').Extensions[ext])
+
+  def testReplaceRebuildsDependents(self):
+    extendable_desc = self.pool.FindMessageTypeByName('replace.Extendable')
+    extendable_class = message_factory.GetMessageClass(extendable_desc)
+    old_base = self.pool.FindMessageTypeByName('replace.Base')
+    old_user_class = message_factory.GetMessageClass(
+        self.pool.FindMessageTypeByName('replace.User'))
+    # Parsed before the replacement, so the parse loop knows the extension.
+    old_ext = self.pool.FindExtensionByNumber(extendable_desc, 100)
+    self.assertEqual(
+        5, extendable_class.FromString(b'\xa0\x06\x05').Extensions[old_ext])
+
+    new_base_file = copy.deepcopy(self.base_file)
+    new_base_file.message_type[0].field.add(
+        name='b', number=2,
+        type=descriptor.FieldDescriptor.TYPE_STRING,
+        label=descriptor.FieldDescriptor.LABEL_OPTIONAL)
+    new_base_file.extension[0].number = 101
+    file_desc = self.pool.ReplaceFile(new_base_file)
+
+    self.assertIs(file_desc, self.pool.FindFileByName('replace/base.proto'))
+    base = self.pool.FindMessageTypeByName('replace.Base')
+    self.assertIsNot(old_base, base)
+    self.assertIn('b', base.fields_by_name)
+    user = self.pool.FindMessageTypeByName('replace.User')
+    self.assertIs(base, user.fields_by_name['base'].message_type)
+    self.assertIsNot(old_user_class, message_factory.GetMessageClass(user))
+    self.assertIs(old_base, old_user_class.DESCRIPTOR.fields_by_name[
+        'base'].message_type)
+
+    # Files which do not depend on the replaced one are kept.
+    self.assertIs(extendable_desc,
+                  self.pool.FindMessageTypeByName('replace.Extendable'))
+    self.assertIs(extendable_class,
+                  message_factory.GetMessageClass(extendable_desc))
+
+    # The extension moved to another number.
+    with self.assertRaises(KeyError):
+      self.pool.FindExtensionByNumber(extendable_desc, 100)
+    new_ext = self.pool.FindExtensionByNumber(extendable_desc, 101)
+    self.assertIs(new_ext, self.pool.FindExtensionByName('replace.base_ext'))
+    msg = extendable_class.FromString(b'\xa0\x06\x05\xa8\x06\x07')
+    self.assertEqual([new_ext], [field for field, _ in msg.ListFields()])
+    self.assertEqual(7, msg.Extensions[new_ext])
+    self.assertIn(b'\xa0\x06\x05', msg.SerializeToString())
+
+  def testFailedReplaceLeavesPoolUnchanged(self):
+    base = self.pool.FindMessageTypeByName('replace.Base')
+    user = self.pool.FindMessageTypeByName('replace.User')
+    new_base_file = copy.deepcopy(self.base_file)
+    new_base_file.message_type[0].name = 'Renamed'
+    with self.assertRaises(KeyError):
+      self.pool.ReplaceFile(new_base_file)
+    self.assertIs(base, self.pool.FindMessageTypeByName('replace.Base'))
+    self.assertIs(user, self.pool.FindMessageTypeByName('replace.User'))
+    with self.assertRaises(KeyError):
+      self.pool.FindMessageTypeByName('replace.Renamed')
+
+  def testReplaceLazilyAddedFile(self):
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(self.extendable_file)
+    pool.Add(self.base_file)
+    new_base_file = copy.deepcopy(self.base_file)
+    new_base_file.message_type[0].name = 'Renamed'
+    pool.ReplaceFile(new_base_file)
+    self.assertEqual('replace.Renamed',
+                     pool.FindMessageTypeByName('replace.Renamed').full_name)
+    with self.assertRaises(KeyError):
+      pool.FindMessageTypeByName('replace.Base')
+
+
 @testing_refleaks.TestCase
 class FeatureSetDefaults(unittest.TestCase):
 
@@ -44,6 +44,7 @@ sizer rather than when calling them.  In particular:
 __author__ = 'kenton@google.com (Kenton Varda)'
 
 import struct
+import threading
 
 from google.protobuf.internal import wire_format
 
@@ -54,6 +55,27 @@ _POS_INF = 1e10000
 _NEG_INF = -_POS_INF
 
 
+class _EncodeOptions(threading.local):
+  """State of the serializations of the current thread.
+
+  Attributes:
+    encoded_strings: None, or during a serialization, a dict mapping the ids of
+      the long non-ASCII strings sized by StringSizer to the strings and their
+      UTF-8 encodings, which StringEncoder then writes instead of encoding the
+      strings again.
+  """
+
+  encoded_strings = None
+
+
+_options = _EncodeOptions()
+
+# The length from which the UTF-8 encodings of non-ASCII strings are kept
+# during a serialization.  Shorter strings are encoded again faster than their
+# encodings are stored and found.
+_MIN_CACHED_STRING_LENGTH = 256
+
+
 def _VarintSize(value):
   """Compute the size of a varint value."""
   if value <= 0x7f: return 1
@@ -203,27 +225,64 @@ BoolSizer = _FixedSizer(1)
 
 
 def StringSizer(field_number, is_repeated, is_packed):
-  """Returns a sizer for a string field."""
+  """Returns a sizer for a string field.
+
+  The length of an ASCII string is its UTF-8 size, so only the other strings
+  are encoded to be sized.  During a serialization, the encodings of the long
+  ones are kept for StringEncoder.
+  """
 
   tag_size = _TagSize(field_number)
   local_VarintSize = _VarintSize
+  local_KeepEncoded = _KeepEncoded
   local_len = len
   assert not is_packed
   if is_repeated:
     def RepeatedFieldSize(value):
       result = tag_size * len(value)
       for element in value:
-        l = local_len(element.encode('utf-8'))
+        if element.isascii():
+          l = local_len(element)
+        else:
+          encoded = element.encode('utf-8')
+          l = local_len(encoded)
+          if local_len(element) >= _MIN_CACHED_STRING_LENGTH:
+            local_KeepEncoded(element, encoded)
         result += local_VarintSize(l) + l
       return result
     return RepeatedFieldSize
   else:
     def FieldSize(value):
-      l = local_len(value.encode('utf-8'))
+      if value.isascii():
+        l = local_len(value)
+      else:
+        encoded = value.encode('utf-8')
+        l = local_len(encoded)
+        if local_len(value) >= _MIN_CACHED_STRING_LENGTH:
+          local_KeepEncoded(value, encoded)
       return tag_size + local_VarintSize(l) + l
     return FieldSize
 
 
+def _KeepEncoded(value, encoded):
+  """Keeps the encoding of a long non-ASCII string during a serialization."""
+  encoded_strings = _options.encoded_strings
+  if encoded_strings is not None:
+    # The entry keeps the string alive, so that its id is not reused.
+    encoded_strings[id(value)] = (value, encoded)
+
+
+def _EncodeLongString(value):
+  """Returns the UTF-8 encoding of a long string, kept by StringSizer if the
+  string is not ASCII and was sized during the current serialization."""
+  encoded_strings = _options.encoded_strings
+  if encoded_strings:
+    entry = encoded_strings.pop(id(value), None)
+    if entry is not None:
+      return entry[1]
+  return value.encode('utf-8')
+
+
 def BytesSizer(field_number, is_repeated, is_packed):
   """Returns a sizer for a bytes field."""
 
@@ -315,27 +374,29 @@ def MessageSetItemSizer(field_number):
 # Map is special: it needs custom logic to compute its size properly.
 
 
-def MapSizer(field_descriptor, is_message_map):
-  """Returns a sizer for a map field."""
+def MapSizer(field_descriptor, key_sizer, value_sizer):
+  """Returns a sizer for a map field.
 
-  # Can't look at field_descriptor.message_type._concrete_class because it may
-  # not have been initialized yet.
-  message_type = field_descriptor.message_type
-  message_sizer = MessageSizer(field_descriptor.number, False, False)
+  Args:
+    field_descriptor: The descriptor of the map field.
+    key_sizer: The sizer of the key field of the map entries, field number 1.
+    value_sizer: The sizer of the value field of the map entries, field
+      number 2.  For message maps, it calls ByteSize() on the values, which
+      also updates their cached sizes for the encoder.
+
+  The entries are sized from their keys and values, without creating entry
+  messages.
+  """
+
+  tag_size = _TagSize(field_descriptor.number)
+  local_VarintSize = _VarintSize
 
   def FieldSize(map_value):
-    total = 0
-    for key in map_value:
-      value = map_value[key]
-      # It's wasteful to create the messages and throw them away one second
-      # later since we'll do the same for the actual encode.  But there's not an
-      # obvious way to avoid this within the current design without tons of code
-      # duplication. For message map, value.ByteSize() should be called to
-      # update the status.
-      entry_msg = message_type._concrete_class(key=key, value=value)
-      total += message_sizer(entry_msg)
-      if is_message_map:
-        value.ByteSize()
+    total = tag_size * len(map_value)
+    # pylint: disable=protected-access
+    for key, value in map_value._values.items():
+      entry_size = key_sizer(key) + value_sizer(value)
+      total += local_VarintSize(entry_size) + entry_size
     return total
 
   return FieldSize
@@ -350,13 +411,15 @@ def _VarintEncoder():
   local_int2byte = struct.Struct('>B').pack
 
   def EncodeVarint(write, value, unused_deterministic=None):
-    bits = value & 0x7f
-    value >>= 7
-    while value:
-      write(local_int2byte(0x80|bits))
-      bits = value & 0x7f
+    if value <= 0x7f:
+      return write(local_int2byte(value))
+    # Longer varints are written at once rather than byte by byte.
+    varint = bytearray()
+    while value > 0x7f:
+      varint.append(0x80 | (value & 0x7f))
       value >>= 7
-    return write(local_int2byte(bits))
+    varint.append(value)
+    return write(bytes(varint))
 
   return EncodeVarint
 
@@ -365,18 +428,12 @@ def _SignedVarintEncoder():
   """Return an encoder for a basic signed varint value (does not include
   tag)."""
 
-  local_int2byte = struct.Struct('>B').pack
+  local_EncodeVarint = _VarintEncoder()
 
   def EncodeSignedVarint(write, value, unused_deterministic=None):
     if value < 0:
       value += (1 << 64)
-    bits = value & 0x7f
-    value >>= 7
-    while value:
-      write(local_int2byte(0x80|bits))
-      bits = value & 0x7f
-      value >>= 7
-    return write(local_int2byte(bits))
+    return local_EncodeVarint(write, value)
 
   return EncodeSignedVarint
 
@@ -399,12 +456,69 @@ def TagBytes(field_number, wire_type):
 
   return bytes(_VarintBytes(wire_format.PackTag(field_number, wire_type)))
 
+
+def _PackedVarintsBytes(values):
+  """Returns the payload of a packed varint field: the concatenated varints of
+  a list of non-negative integers, built in one buffer."""
+
+  if not values:
+    return b''
+  if min(values) >= 0 and max(values) <= 0x7f:
+    # The varints are one byte each, which are their values.
+    return bytes(values)
+  payload = bytearray()
+  append = payload.append
+  for value in values:
+    while value > 0x7f:
+      append(0x80 | (value & 0x7f))
+      value >>= 7
+    append(value)
+  return bytes(payload)
+
+
+def _PackedSignedVarintsBytes(values):
+  """Like _PackedVarintsBytes(), but negative values are encoded on 64 bits."""
+
+  if values and min(values) < 0:
+    values = [value + (1 << 64) if value < 0 else value for value in values]
+  return _PackedVarintsBytes(values)
+
+
+def _PackedZigZagVarintsBytes(values):
+  """Like _PackedVarintsBytes(), but the values are ZigZag encoded first."""
+
+  return _PackedVarintsBytes(
+      [(value << 1) ^ (value >> 63) for value in values])
+
+
+def _PackedBoolsBytes(values):
+  """Returns the payload of a packed bool field."""
+
+  return bytes(map(bool, values))
+
 # --------------------------------------------------------------------
 # As with sizers (see above), we have a number of common encoder
 # implementations.
 
 
-def _SimpleEncoder(wire_type, encode_value, compute_value_size):
+def _PackedEncoder(field_number, encode_values):
+  """Returns an encoder for a packed field, which encodes all its values at
+  once with encode_values, e.g. _PackedVarintsBytes()."""
+
+  tag_bytes = TagBytes(field_number, wire_format.WIRETYPE_LENGTH_DELIMITED)
+  local_EncodeVarint = _EncodeVarint
+
+  def EncodePackedField(write, value, deterministic):
+    write(tag_bytes)
+    payload = encode_values(value._values)  # pylint: disable=protected-access
+    local_EncodeVarint(write, len(payload), deterministic)
+    return write(payload)
+
+  return EncodePackedField
+
+
+def _SimpleEncoder(wire_type, encode_value, compute_value_size,
+                   encode_values=None):
   """Return a constructor for an encoder for fields of a particular type.
 
   Args:
@@ -413,10 +527,15 @@ def _SimpleEncoder(wire_type, encode_value, compute_value_size):
         _EncodeVarint().
       compute_value_size:  A function which computes the size of an individual
         value, e.g. _VarintSize().
+      encode_values:  A function which returns the payload of a packed field
+        from the list of its values, e.g. _PackedVarintsBytes(), or None to
+        encode them one by one with encode_value.
   """
 
   def SpecificEncoder(field_number, is_repeated, is_packed):
-    if is_packed:
+    if is_packed and encode_values is not None:
+      return _PackedEncoder(field_number, encode_values)
+    elif is_packed:
       tag_bytes = TagBytes(field_number, wire_format.WIRETYPE_LENGTH_DELIMITED)
       local_EncodeVarint = _EncodeVarint
       def EncodePackedField(write, value, deterministic):
@@ -445,12 +564,15 @@ def _SimpleEncoder(wire_type, encode_value, compute_value_size):
   return SpecificEncoder
 
 
-def _ModifiedEncoder(wire_type, encode_value, compute_value_size, modify_value):
+def _ModifiedEncoder(wire_type, encode_value, compute_value_size, modify_value,
+                     encode_values=None):
   """Like SimpleEncoder but additionally invokes modify_value on every value
   before passing it to encode_value.  Usually modify_value is ZigZagEncode."""
 
   def SpecificEncoder(field_number, is_repeated, is_packed):
-    if is_packed:
+    if is_packed and encode_values is not None:
+      return _PackedEncoder(field_number, encode_values)
+    elif is_packed:
       tag_bytes = TagBytes(field_number, wire_format.WIRETYPE_LENGTH_DELIMITED)
       local_EncodeVarint = _EncodeVarint
       def EncodePackedField(write, value, deterministic):
@@ -488,6 +610,8 @@ def _StructPackEncoder(wire_type, format):
   """
 
   value_size = struct.calcsize(format)
+  byte_order = format[0]
+  value_format = format[1:]
 
   def SpecificEncoder(field_number, is_repeated, is_packed):
     local_struct_pack = struct.pack
@@ -496,9 +620,11 @@ def _StructPackEncoder(wire_type, format):
       local_EncodeVarint = _EncodeVarint
       def EncodePackedField(write, value, deterministic):
         write(tag_bytes)
-        local_EncodeVarint(write, len(value) * value_size, deterministic)
-        for element in value:
-          write(local_struct_pack(format, element))
+        values = value._values  # pylint: disable=protected-access
+        local_EncodeVarint(write, len(values) * value_size, deterministic)
+        # All the values are packed with a single call.
+        return write(local_struct_pack(
+            '%s%d%s' % (byte_order, len(values), value_format), *values))
       return EncodePackedField
     elif is_repeated:
       tag_bytes = TagBytes(field_number, wire_type)
@@ -555,6 +681,9 @@ def _FloatingPointEncoder(wire_type, format):
     raise ValueError('Can\'t encode floating-point values that are '
                      '%d bytes long (only 4 or 8)' % value_size)
 
+  byte_order = format[0]
+  value_format = format[1:]
+
   def SpecificEncoder(field_number, is_repeated, is_packed):
     local_struct_pack = struct.pack
     if is_packed:
@@ -562,10 +691,16 @@ def _FloatingPointEncoder(wire_type, format):
       local_EncodeVarint = _EncodeVarint
       def EncodePackedField(write, value, deterministic):
         write(tag_bytes)
-        local_EncodeVarint(write, len(value) * value_size, deterministic)
-        for element in value:
-          # This try/except block is going to be faster than any code that
-          # we could write to check whether element is finite.
+        values = value._values  # pylint: disable=protected-access
+        local_EncodeVarint(write, len(values) * value_size, deterministic)
+        # All the values are packed with a single call, unless one of them
+        # needs to be encoded specially.
+        try:
+          return write(local_struct_pack(
+              '%s%d%s' % (byte_order, len(values), value_format), *values))
+        except SystemError:
+          pass
+        for element in values:
           try:
             write(local_struct_pack(format, element))
           except SystemError:
@@ -600,14 +735,16 @@ def _FloatingPointEncoder(wire_type, format):
 
 
 Int32Encoder = Int64Encoder = EnumEncoder = _SimpleEncoder(
-    wire_format.WIRETYPE_VARINT, _EncodeSignedVarint, _SignedVarintSize)
+    wire_format.WIRETYPE_VARINT, _EncodeSignedVarint, _SignedVarintSize,
+    _PackedSignedVarintsBytes)
 
 UInt32Encoder = UInt64Encoder = _SimpleEncoder(
-    wire_format.WIRETYPE_VARINT, _EncodeVarint, _VarintSize)
+    wire_format.WIRETYPE_VARINT, _EncodeVarint, _VarintSize,
+    _PackedVarintsBytes)
 
 SInt32Encoder = SInt64Encoder = _ModifiedEncoder(
     wire_format.WIRETYPE_VARINT, _EncodeVarint, _VarintSize,
-    wire_format.ZigZagEncode)
+    wire_format.ZigZagEncode, _PackedZigZagVarintsBytes)
 
 # Note that Python conveniently guarantees that when using the '<' prefix on
 # formats, they will also have the same size across all platforms (as opposed
@@ -627,17 +764,7 @@ def BoolEncoder(field_number, is_repeated, is_packed):
   false_byte = b'\x00'
   true_byte = b'\x01'
   if is_packed:
-    tag_bytes = TagBytes(field_number, wire_format.WIRETYPE_LENGTH_DELIMITED)
-    local_EncodeVarint = _EncodeVarint
-    def EncodePackedField(write, value, deterministic):
-      write(tag_bytes)
-      local_EncodeVarint(write, len(value), deterministic)
-      for element in value:
-        if element:
-          write(true_byte)
-        else:
-          write(false_byte)
-    return EncodePackedField
+    return _PackedEncoder(field_number, _PackedBoolsBytes)
   elif is_repeated:
     tag_bytes = TagBytes(field_number, wire_format.WIRETYPE_VARINT)
     def EncodeRepeatedField(write, value, unused_deterministic=None):
@@ -659,23 +786,34 @@ def BoolEncoder(field_number, is_repeated, is_packed):
 
 
 def StringEncoder(field_number, is_repeated, is_packed):
-  """Returns an encoder for a string field."""
+  """Returns an encoder for a string field.
+
+  The strings sized by StringSizer during the same serialization are not
+  encoded again.
+  """
 
   tag = TagBytes(field_number, wire_format.WIRETYPE_LENGTH_DELIMITED)
   local_EncodeVarint = _EncodeVarint
+  local_EncodeLongString = _EncodeLongString
   local_len = len
   assert not is_packed
   if is_repeated:
     def EncodeRepeatedField(write, value, deterministic):
       for element in value:
-        encoded = element.encode('utf-8')
+        if local_len(element) < _MIN_CACHED_STRING_LENGTH:
+          encoded = element.encode('utf-8')
+        else:
+          encoded = local_EncodeLongString(element)
         write(tag)
         local_EncodeVarint(write, local_len(encoded), deterministic)
         write(encoded)
     return EncodeRepeatedField
   else:
     def EncodeField(write, value, deterministic):
-      encoded = value.encode('utf-8')
+      if local_len(value) < _MIN_CACHED_STRING_LENGTH:
+        encoded = value.encode('utf-8')
+      else:
+        encoded = local_EncodeLongString(value)
       write(tag)
       local_EncodeVarint(write, local_len(encoded), deterministic)
       return write(encoded)
@@ -782,8 +920,9 @@ def MessageSetItemEncoder(field_number):
 # As before, Map is special.
 
 
-def MapEncoder(field_descriptor):
-  """Encoder for extensions of MessageSet.
+def MapEncoder(field_descriptor, key_encoder, value_encoder, key_sizer=None,
+               value_sizer=None):
+  """Encoder for map fields.
 
   Maps always have a wire format like this:
     message MapEntry {
@@ -791,16 +930,40 @@ def MapEncoder(field_descriptor):
       value_type value = 2;
     }
     repeated MapEntry map = N;
+
+  The entries are written from their keys and values with the encoders of the
+  key and value fields, without creating entry messages.  Each entry is
+  serialized to a buffer before its size is written, so that its key and value
+  are not sized first.  If the sizers of the key and value fields are given,
+  which they are for message values, entries are sized and written directly
+  instead, so that nested messages are not copied into every enclosing entry.
   """
-  # Can't look at field_descriptor.message_type._concrete_class because it may
-  # not have been initialized yet.
-  message_type = field_descriptor.message_type
-  encode_message = MessageEncoder(field_descriptor.number, False, False)
+  tag = TagBytes(field_descriptor.number, wire_format.WIRETYPE_LENGTH_DELIMITED)
+  local_EncodeVarint = _EncodeVarint
+
+  if value_sizer is not None:
+    def EncodeSizedField(write, value, deterministic):
+      values = value._values  # pylint: disable=protected-access
+      value_keys = sorted(values) if deterministic else values
+      for key in value_keys:
+        entry_value = values[key]
+        write(tag)
+        local_EncodeVarint(
+            write, key_sizer(key) + value_sizer(entry_value), deterministic)
+        key_encoder(write, key, deterministic)
+        value_encoder(write, entry_value, deterministic)
+    return EncodeSizedField
 
   def EncodeField(write, value, deterministic):
-    value_keys = sorted(value.keys()) if deterministic else value
+    values = value._values  # pylint: disable=protected-access
+    value_keys = sorted(values) if deterministic else values
     for key in value_keys:
-      entry_msg = message_type._concrete_class(key=key, value=value[key])
-      encode_message(write, entry_msg, deterministic)
+      chunks = []
+      key_encoder(chunks.append, key, deterministic)
+      value_encoder(chunks.append, values[key], deterministic)
+      entry = b''.join(chunks)
+      write(tag)
+      local_EncodeVarint(write, len(entry), deterministic)
+      write(entry)
 
   return EncodeField
@@ -8,6 +8,7 @@
 """Contains _ExtensionDict class to represent extensions.
 """
 
+from google.protobuf.internal import containers
 from google.protobuf.internal import type_checkers
 from google.protobuf.descriptor import FieldDescriptor
 
@@ -59,6 +60,9 @@ class _ExtensionDict(object):
 
     result = self._extended_message._fields.get(extension_handle)
     if result is not None:
+      if self._extended_message._frozen_cache is None:
+        # The value may be shared with a frozen message.
+        result = self._extended_message._UnshareField(extension_handle, result)
       return result
 
     if extension_handle.label == FieldDescriptor.LABEL_REPEATED:
@@ -82,6 +86,9 @@ class _ExtensionDict(object):
       # dict.
       return extension_handle.default_value
 
+    if self._extended_message._frozen_cache is not None:
+      result._Freeze()
+
     # Atomically check if another thread has preempted us and, if not, swap
     # in the new object we just created.  If someone has preempted us, we
     # take that object and discard ours.
@@ -135,10 +142,13 @@ class _ExtensionDict(object):
           'Cannot assign to extension "%s" because it is a repeated or '
           'composite type.' % extension_handle.full_name)
 
+    # pylint: disable=protected-access
+    if self._extended_message._frozen_cache is not None:
+      containers._RaiseFrozen(self._extended_message)
+
     # It's slightly wasteful to lookup the type checker each time,
     # but we expect this to be a vanishingly uncommon case anyway.
     type_checker = type_checkers.GetTypeChecker(extension_handle)
-    # pylint: disable=protected-access
     self._extended_message._fields[extension_handle] = (
         type_checker.CheckValue(value))
     self._extended_message._Modified()
@@ -156,7 +166,7 @@ class _ExtensionDict(object):
       Extension field descriptor.
     """
     descriptor = self._extended_message.DESCRIPTOR
-    extensions = descriptor.file.pool._extensions_by_name[descriptor]
+    extensions = descriptor.file.pool._extensions_by_name.get(descriptor, {})
     return extensions.get(name, None)
 
   def _FindExtensionByNumber(self, number):
@@ -169,7 +179,7 @@ class _ExtensionDict(object):
       Extension field descriptor.
     """
     descriptor = self._extended_message.DESCRIPTOR
-    extensions = descriptor.file.pool._extensions_by_number[descriptor]
+    extensions = descriptor.file.pool._extensions_by_number.get(descriptor, {})
     return extensions.get(number, None)
 
   def __iter__(self):
@@ -0,0 +1,210 @@
+# Protocol Buffers - Google's data interchange format
+# Copyright 2008 Google Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Conversion between sequences of messages and columns of NumPy arrays.
+
+Columns are first extracted into flat buffers, which the upb backend fills in
+C without creating wrappers for the messages.  ColumnBuffers() below fills
+them with the message API, for the other backends.  Buffers are laid out like
+Arrow arrays: variable length values are described by int64 offsets into a
+data buffer.  NumPy is only imported when the buffers are wrapped in arrays.
+"""
+
+import array
+import operator
+
+from google.protobuf import descriptor
+
+_FieldDescriptor = descriptor.FieldDescriptor
+
+# array.array type codes of the fields stored in fixed size slots.
+_TYPECODES = {
+    _FieldDescriptor.CPPTYPE_INT32: 'i',
+    _FieldDescriptor.CPPTYPE_ENUM: 'i',
+    _FieldDescriptor.CPPTYPE_INT64: 'q',
+    _FieldDescriptor.CPPTYPE_UINT32: 'I',
+    _FieldDescriptor.CPPTYPE_UINT64: 'Q',
+    _FieldDescriptor.CPPTYPE_FLOAT: 'f',
+    _FieldDescriptor.CPPTYPE_DOUBLE: 'd',
+    _FieldDescriptor.CPPTYPE_BOOL: 'B',
+}
+
+# NumPy dtypes of the same fields, by name.
+_DTYPES = {
+    _FieldDescriptor.CPPTYPE_INT32: 'int32',
+    _FieldDescriptor.CPPTYPE_ENUM: 'int32',
+    _FieldDescriptor.CPPTYPE_INT64: 'int64',
+    _FieldDescriptor.CPPTYPE_UINT32: 'uint32',
+    _FieldDescriptor.CPPTYPE_UINT64: 'uint64',
+    _FieldDescriptor.CPPTYPE_FLOAT: 'float32',
+    _FieldDescriptor.CPPTYPE_DOUBLE: 'float64',
+    _FieldDescriptor.CPPTYPE_BOOL: 'bool',
+}
+
+
+def ResolvePath(message_descriptor, path):
+  """Returns the field descriptors along a dotted column path.
+
+  Args:
+    message_descriptor: The descriptor of the messages.
+    path: A field name, or a dotted path through singular message fields to a
+      scalar or repeated scalar field.
+
+  Raises:
+    ValueError: if the path does not name such a field.
+  """
+  fields = []
+  for name in path.split('.'):
+    if fields:
+      parent = fields[-1]
+      if (parent.cpp_type != _FieldDescriptor.CPPTYPE_MESSAGE or
+          parent.label == _FieldDescriptor.LABEL_REPEATED):
+        raise ValueError('Column %s goes through field %s, which is not a '
+                         'singular message field.' % (path, parent.full_name))
+      message_descriptor = parent.message_type
+    field = message_descriptor.fields_by_name.get(name)
+    if field is None:
+      raise ValueError('Protocol message %s has no "%s" field.' %
+                       (message_descriptor.name, name))
+    fields.append(field)
+  if fields[-1].cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE:
+    raise ValueError('Column %s is a message field, not a scalar field.' %
+                     path)
+  return fields
+
+
+def _IsVariableLength(field):
+  return field.cpp_type == _FieldDescriptor.CPPTYPE_STRING
+
+
+def ColumnBuffers(messages, paths):
+  """Returns the buffers of the columns of some messages.
+
+  Args:
+    messages: A sequence of messages of the same type.
+    paths: A list of paths returned by ResolvePath().
+
+  Returns:
+    A list with a tuple of buffers per path:
+      (values,) for scalar fields,
+      (offsets, data) for string and bytes fields,
+      (offsets, values) for repeated scalar fields,
+      (offsets, value_offsets, data) for repeated string and bytes fields.
+
+  Raises:
+    TypeError: if a message is not of the type the paths start from.
+  """
+  if paths:
+    message_descriptor = paths[0][0].containing_type
+    for message in messages:
+      message_type = getattr(message, 'DESCRIPTOR', None)
+      if not isinstance(message_type, descriptor.Descriptor):
+        raise TypeError('Expected a message object, but got %r.' % (message,))
+      if message_type is not message_descriptor:
+        raise TypeError('Expected message of type %s, got %s.' %
+                        (message_descriptor.full_name, message_type.full_name))
+  columns = []
+  for path in paths:
+    getter = operator.attrgetter('.'.join(field.name for field in path))
+    field = path[-1]
+    values = [getter(message) for message in messages]
+    if field.label == _FieldDescriptor.LABEL_REPEATED:
+      offsets = array.array('q', [0])
+      offset = 0
+      for value in values:
+        offset += len(value)
+        offsets.append(offset)
+      values = [element for value in values for element in value]
+      columns.append((offsets,) + _ValueBuffers(field, values))
+    else:
+      columns.append(_ValueBuffers(field, values))
+  return columns
+
+
+def _ValueBuffers(field, values):
+  if not _IsVariableLength(field):
+    return (array.array(_TYPECODES[field.cpp_type], values),)
+  if field.type == _FieldDescriptor.TYPE_STRING:
+    values = [value.encode('utf-8') for value in values]
+  offsets = array.array('q', [0])
+  offset = 0
+  for value in values:
+    offset += len(value)
+    offsets.append(offset)
+  return (offsets, b''.join(values))
+
+
+def ToArrays(paths, buffers):
+  """Wraps the buffers returned for some paths in NumPy arrays."""
+  # pylint: disable=g-import-not-at-top
+  import numpy
+  columns = []
+  for path, column in zip(paths, buffers):
+    field = path[-1]
+    arrays = [numpy.frombuffer(buffer, numpy.int64) for buffer in column[:-1]]
+    if _IsVariableLength(field):
+      arrays.append(numpy.frombuffer(column[-1], numpy.uint8))
+    else:
+      arrays.append(numpy.frombuffer(column[-1], _DTYPES[field.cpp_type]))
+    if field.label == _FieldDescriptor.LABEL_REPEATED and len(arrays) == 3:
+      arrays = [arrays[0], (arrays[1], arrays[2])]
+    columns.append(arrays[0] if len(arrays) == 1 else tuple(arrays))
+  return columns
+
+
+def _ToList(values):
+  return values.tolist() if hasattr(values, 'tolist') else list(values)
+
+
+def _Split(offsets, values):
+  offsets = _ToList(offsets)
+  return [values[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+def _RowValues(field, column, repeated):
+  """Returns the values of a column as a list with one Python value per row."""
+  if repeated:
+    offsets, values = column
+    return _Split(offsets, _RowValues(field, values, False))
+  if not _IsVariableLength(field):
+    return _ToList(column)
+  offsets, data = column
+  values = _Split(offsets, bytes(data))
+  if field.type == _FieldDescriptor.TYPE_STRING:
+    values = [value.decode('utf-8') for value in values]
+  return values
+
+
+def FromColumns(message_class, columns):
+  """Builds messages from columns in the format returned by ToArrays().
+
+  Args:
+    message_class: The class of the messages.
+    columns: A dict mapping column paths to columns.
+
+  Returns:
+    A list of messages, in which the field of every column is set.
+
+  Raises:
+    ValueError: if a path is invalid or the columns have different lengths.
+  """
+  rows = None
+  for path, column in columns.items():
+    fields = ResolvePath(message_class.DESCRIPTOR, path)
+    field = fields[-1]
+    values = _RowValues(field, column,
+                        field.label == _FieldDescriptor.LABEL_REPEATED)
+    if rows is None:
+      rows = [{} for _ in values]
+    elif len(values) != len(rows):
+      raise ValueError('Column %s has %d rows, expected %d.' %
+                       (path, len(values), len(rows)))
+    for row, value in zip(rows, values):
+      for parent in fields[:-1]:
+        row = row.setdefault(parent.name, {})
+      row[field.name] = value
+  return [message_class.FromDict(row) for row in rows or ()]
@@ -0,0 +1,171 @@
+# Protocol Buffers - Google's data interchange format
+# Copyright 2008 Google Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Compares messages field by field, for proto.equals().
+
+Unlike ==, the comparison can ignore the order of repeated fields and accept a
+tolerance on float and double values.  It stops at the first difference.
+"""
+
+import math
+
+from google.protobuf import descriptor
+from google.protobuf import message
+from google.protobuf.internal import decoder
+
+_FieldDescriptor = descriptor.FieldDescriptor
+_FLOAT_TYPES = frozenset(
+    [_FieldDescriptor.CPPTYPE_FLOAT, _FieldDescriptor.CPPTYPE_DOUBLE])
+
+
+def _UnknownFields(message):
+  """Returns the sorted (tag_bytes, value_bytes) unknown fields of a python
+  message."""
+  # pylint: disable=protected-access
+  return sorted(decoder._SplitUnknownFields(
+      getattr(message, '_unknown_fields', ())))
+
+
+class _Comparator(object):
+  """Compares messages, stopping at the first difference."""
+
+  def __init__(self, ignore_repeated_order, float_tolerance):
+    self._ignore_repeated_order = ignore_repeated_order
+    self._float_tolerance = float_tolerance
+
+  def MessagesEqual(self, a, b):
+    if a is b:
+      return True
+    values_b = dict(b.ListFields())
+    for field, value in a.ListFields():
+      other_value = values_b.pop(field, None)
+      if other_value is None:
+        if not self._IsImplicitDefault(field, value):
+          return False
+      elif not self._FieldsEqual(field, value, other_value):
+        return False
+    for field, value in values_b.items():
+      if not self._IsImplicitDefault(field, value):
+        return False
+    # Only the python backend exposes its unknown fields without parsing them.
+    return _UnknownFields(a) == _UnknownFields(b)
+
+  def _IsImplicitDefault(self, field, value):
+    """Returns whether a field set in one message only is equal to the unset
+    field of the other message, which is the case for float fields without
+    presence within the tolerance of 0."""
+    return (field.cpp_type in _FLOAT_TYPES and not field.has_presence and
+            field.label != _FieldDescriptor.LABEL_REPEATED and
+            self._ValuesEqual(field, value, 0.0))
+
+  def _ValuesEqual(self, field, a, b):
+    if field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE:
+      return self.MessagesEqual(a, b)
+    if field.cpp_type in _FLOAT_TYPES and self._float_tolerance is not None:
+      return math.isclose(a, b, rel_tol=0, abs_tol=self._float_tolerance)
+    return a == b
+
+  def _FieldsEqual(self, field, a, b):
+    if field.label != _FieldDescriptor.LABEL_REPEATED:
+      return self._ValuesEqual(field, a, b)
+    if (field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE and
+        field.message_type._is_map_entry):  # pylint: disable=protected-access
+      if len(a) != len(b):
+        return False
+      value_field = field.message_type.fields_by_name['value']
+      for key in a:
+        if key not in b or not self._ValuesEqual(value_field, a[key], b[key]):
+          return False
+      return True
+    if len(a) != len(b):
+      return False
+    for i, (element_a, element_b) in enumerate(zip(a, b)):
+      if not self._ValuesEqual(field, element_a, element_b):
+        if not self._ignore_repeated_order:
+          return False
+        if self._float_tolerance is not None:
+          # Elements equal within the tolerance may have to be matched with
+          # other elements than those at the same index.
+          return self._MatchedEqual(field, a, b)
+        return self._UnorderedEqual(field, a[i:], b[i:])
+    return True
+
+  def _UnorderedEqual(self, field, a, b):
+    """Matches the elements of two sequences of the same length in any order.
+
+    Exact equality is transitive, so each element is matched with the first
+    equal element left.
+    """
+    unmatched = list(b)
+    for element in a:
+      for i, other_element in enumerate(unmatched):
+        if self._ValuesEqual(field, element, other_element):
+          del unmatched[i]
+          break
+      else:
+        return False
+    return True
+
+  def _MatchedEqual(self, field, a, b):
+    """Matches the elements of two sequences of the same length in any order.
+
+    Equality within a tolerance is not transitive, so an element may have to be
+    matched with another element than the first equal one: the elements are
+    matched along augmenting paths, which rematch the elements matched before
+    (Kuhn's algorithm).
+    """
+    size = len(b)
+    match_of_a = [None] * size
+    match_of_b = [None] * size
+    for i in range(size):
+      # The element of a from which the search reached each element of b.
+      reached_from = [None] * size
+      rows = [i]
+      free = None
+      while rows and free is None:
+        row = rows.pop()
+        for j in range(size):
+          if (reached_from[j] is not None or
+              not self._ValuesEqual(field, a[row], b[j])):
+            continue
+          reached_from[j] = row
+          if match_of_b[j] is None:
+            free = j
+            break
+          rows.append(match_of_b[j])
+      if free is None:
+        return False
+      # Rematches the elements along the path, from its unmatched end.
+      j = free
+      while j is not None:
+        row = reached_from[j]
+        previous = match_of_a[row]
+        match_of_a[row] = j
+        match_of_b[j] = row
+        j = previous
+    return True
+
+
+def Equals(a, b, ignore_repeated_order, float_tolerance):
+  """Returns whether two messages are equal.
+
+  Args:
+    a: A message.
+    b: Another object, which is only equal to a if it is a message of the same
+      type.
+    ignore_repeated_order: If true, repeated fields are equal if their elements
+      are equal in any order.
+    float_tolerance: None, or the maximum absolute difference between equal
+      float and double values.
+
+  Returns:
+    Whether the messages have the same fields, with equal values.  Unknown
+    fields are compared as with ==.
+  """
+  if not isinstance(b, message.Message) or b.DESCRIPTOR is not a.DESCRIPTOR:
+    return False
+  return _Comparator(ignore_repeated_order, float_tolerance).MessagesEqual(a, b)
@@ -0,0 +1,64 @@
+# Protocol Buffers - Google's data interchange format
+# Copyright 2008 Google Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Converts messages to dicts of Python values, for proto.to_dict().
+
+Fields are keyed by name and keep their Python values, e.g. enums stay
+numbers and bytes are not base64 encoded, unlike with json_format.  Message
+types can be given converters, e.g. to return Timestamps as datetimes.
+"""
+
+from google.protobuf import descriptor
+
+_FieldDescriptor = descriptor.FieldDescriptor
+
+
+def _ValueToDict(field, value, converters):
+  if field.cpp_type != _FieldDescriptor.CPPTYPE_MESSAGE:
+    if field.type == _FieldDescriptor.TYPE_BYTES:
+      # Bytes parsed with zero_copy are memoryviews.
+      return bytes(value)
+    return value
+  if converters:
+    converter = converters.get(field.message_type.full_name)
+    if converter is not None:
+      return converter(value)
+  return ToDict(value, converters)
+
+
+def ToDict(message, converters):
+  """Returns the fields set in a message, as a dict of Python values.
+
+  Args:
+    message: The message to convert.
+    converters: None, or a dict mapping full names of message types to
+      functions converting a message of that type to a Python value, which
+      is used instead of a dict.
+
+  Returns:
+    A dict mapping the names of the fields set in the message, excluding
+    extensions, to their values.
+  """
+  result = {}
+  for field, value in message.ListFields():
+    if field.is_extension:
+      continue
+    if field.label == _FieldDescriptor.LABEL_REPEATED:
+      if field.type == _FieldDescriptor.TYPE_BYTES:
+        value = [bytes(element) for element in value]
+      elif field.cpp_type != _FieldDescriptor.CPPTYPE_MESSAGE:
+        value = list(value)
+      elif field.message_type._is_map_entry:  # pylint: disable=protected-access
+        value_field = field.message_type.fields_by_name['value']
+        value = {key: _ValueToDict(value_field, value[key], converters)
+                 for key in value}
+      else:
+        value = [_ValueToDict(field, element, converters) for element in value]
+    else:
+      value = _ValueToDict(field, value, converters)
+    result[field.name] = value
+  return result
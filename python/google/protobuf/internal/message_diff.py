@@ -0,0 +1,155 @@
+# Protocol Buffers - Google's data interchange format
+# Copyright 2008 Google Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Computes the fields which differ between two messages.
+
+Only the sub-messages which differ are walked: identical sub-messages are
+skipped after comparing them with ==, which the upb backend implements in C.
+"""
+
+from google.protobuf import descriptor
+
+_FieldDescriptor = descriptor.FieldDescriptor
+
+
+def _SetFields(message):
+  return {
+      field: value
+      for field, value in message.ListFields()
+      if not field.is_extension
+  }
+
+
+def _IsMapEntry(field):
+  return (field.type == _FieldDescriptor.TYPE_MESSAGE and
+          field.message_type.has_options and
+          field.message_type.GetOptions().map_entry)
+
+
+def _MissingValue(field):
+  """Returns the value reported for a field which is not set."""
+  if field.label == _FieldDescriptor.LABEL_REPEATED or field.has_presence:
+    return None
+  return field.default_value
+
+
+def _DiffKeyed(old, new):
+  """Returns the values of two dicts which differ, or None if they are equal."""
+  old_values = {}
+  new_values = {}
+  for key, value in old.items():
+    if key not in new:
+      old_values[key] = value
+    elif new[key] != value:
+      old_values[key] = value
+      new_values[key] = new[key]
+  for key, value in new.items():
+    if key not in old:
+      new_values[key] = value
+  if not old_values and not new_values:
+    return None
+  return old_values, new_values
+
+
+def _ByKey(elements, key_name, path):
+  by_key = {}
+  for element in elements:
+    key = getattr(element, key_name)
+    if key in by_key:
+      raise ValueError('Duplicate key %r in field %s.' % (key, path))
+    by_key[key] = element
+  return by_key
+
+
+def _CheckRepeatedKeys(message_descriptor, repeated_keys):
+  """Raises ValueError unless repeated_keys are valid for a message type."""
+  for path, key_name in repeated_keys.items():
+    field = None
+    descriptor_ = message_descriptor
+    for name in path.split('.'):
+      if field is not None:
+        if (field.label == _FieldDescriptor.LABEL_REPEATED or
+            field.cpp_type != _FieldDescriptor.CPPTYPE_MESSAGE):
+          raise ValueError('Field %s is not a message field.' % field.name)
+        descriptor_ = field.message_type
+      field = descriptor_.fields_by_name.get(name)
+      if field is None:
+        raise ValueError('%s has no field named %s.' %
+                         (descriptor_.full_name, name))
+    if (field.label != _FieldDescriptor.LABEL_REPEATED or
+        field.cpp_type != _FieldDescriptor.CPPTYPE_MESSAGE or
+        _IsMapEntry(field)):
+      raise ValueError('Field %s is not a repeated message field.' % path)
+    key_field = field.message_type.fields_by_name.get(key_name)
+    if (key_field is None or
+        key_field.label == _FieldDescriptor.LABEL_REPEATED or
+        key_field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE):
+      raise ValueError('%s has no scalar field named %s.' %
+                       (field.message_type.full_name, key_name))
+
+
+def _DiffMessages(old, new, prefix, repeated_keys, changes):
+  old_fields = _SetFields(old)
+  new_fields = _SetFields(new)
+  fields = sorted(old_fields.keys() | new_fields.keys(),
+                  key=lambda field: field.number)
+  for field in fields:
+    path = prefix + field.name
+    old_value = old_fields.get(field)
+    new_value = new_fields.get(field)
+    if field.label == _FieldDescriptor.LABEL_REPEATED:
+      if _IsMapEntry(field):
+        change = _DiffKeyed(old_value or {}, new_value or {})
+      elif path in repeated_keys:
+        key_name = repeated_keys[path]
+        change = _DiffKeyed(_ByKey(old_value or (), key_name, path),
+                            _ByKey(new_value or (), key_name, path))
+      else:
+        old_value = list(old_value or ())
+        new_value = list(new_value or ())
+        change = None if old_value == new_value else (old_value, new_value)
+      if change is not None:
+        changes[path] = change
+    elif old_value is None or new_value is None:
+      changes[path] = (
+          _MissingValue(field) if old_value is None else old_value,
+          _MissingValue(field) if new_value is None else new_value)
+    elif old_value == new_value:
+      continue
+    elif field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE:
+      _DiffMessages(old_value, new_value, path + '.', repeated_keys, changes)
+    else:
+      changes[path] = (old_value, new_value)
+
+
+def Diff(old, new, repeated_keys):
+  """Returns the fields which differ between two messages of the same type.
+
+  Args:
+    old: A message.
+    new: A message of the same type.
+    repeated_keys: A dict mapping paths of repeated message fields to the name
+      of the field identifying their elements.
+
+  Returns:
+    A dict mapping the paths of the fields which differ to their old and new
+    values, see proto.diff().
+
+  Raises:
+    TypeError: if the messages are of different types.
+    ValueError: if a path of repeated_keys is not a repeated message field, its
+      key is not a scalar field of its elements, or two elements of the field
+      have the same key.
+  """
+  if new.DESCRIPTOR is not old.DESCRIPTOR:
+    raise TypeError('Cannot diff a %s with a %s.' %
+                    (old.DESCRIPTOR.full_name, new.DESCRIPTOR.full_name))
+  _CheckRepeatedKeys(old.DESCRIPTOR, repeated_keys)
+  changes = {}
+  if old is not new and old != new:
+    _DiffMessages(old, new, '', repeated_keys, changes)
+  return changes
@@ -137,6 +137,47 @@ class MessageFactoryTest(unittest.TestCase):
         self.assertRaises(TypeError, msg1.Extensions._FindExtensionByName, 0)
         self.assertRaises(TypeError, msg1.Extensions._FindExtensionByNumber, '')
 
+  def testGetMessageClassesForFilesLazy(self):
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(self.factory_test1_fd)
+    pool.Add(self.factory_test2_fd)
+    messages = message_factory.GetMessageClassesForFiles(
+        [self.factory_test2_fd.name], pool, lazy=True)
+    name = 'google.protobuf.python.internal.Factory2Message'
+    self.assertIn(name, messages)
+    self.assertEqual(len(self.factory_test2_fd.message_type), len(messages))
+    desc = pool.FindMessageTypeByName(name)
+    self.assertIsNone(getattr(desc, '_concrete_class', None))
+    cls = messages[name]
+    self.assertIs(cls, message_factory.GetMessageClass(desc))
+    self.assertIs(cls, messages[name])
+    self._ExerciseDynamicClass(cls)
+    with self.assertRaises(KeyError):
+      messages['google.protobuf.python.internal.Factory1Message']
+
+  def testGetMessageClassesForDeeplyNestedSchema(self):
+    depth = 1500
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name='google/protobuf/internal/deep_chain.proto',
+        package='google.protobuf.python.internal')
+    for i in range(depth):
+      msg_proto = file_proto.message_type.add(name='Link%d' % i)
+      if i + 1 < depth:
+        msg_proto.field.add(
+            name='next',
+            number=1,
+            label=descriptor.FieldDescriptor.LABEL_OPTIONAL,
+            type=descriptor.FieldDescriptor.TYPE_MESSAGE,
+            type_name='Link%d' % (i + 1))
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    messages = message_factory.GetMessageClassesForFiles(
+        [file_proto.name], pool)
+    self.assertEqual(depth, len(messages))
+    msg = messages['google.protobuf.python.internal.Link0']()
+    msg.next.next.SetInParent()
+    self.assertEqual(b'\n\x02\n\x00', msg.SerializeToString())
+
   def testDuplicateExtensionNumber(self):
     pool = descriptor_pool.DescriptorPool()
 
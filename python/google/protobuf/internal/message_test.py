@@ -119,6 +119,54 @@ class MessageTest(unittest.TestCase):
     with self.assertRaises(BadArgError):
       golden_message.SerializeToString(deterministic=BadArg())
 
+  def testSerializeNestedMessagesWithCachedSizes(self, message_module):
+    msg = message_module.NestedTestAllTypes()
+    msg.payload.optional_string = '€'
+    msg.child.payload.optional_string = 'ascii'
+    serialized = msg.SerializeToString()
+    self.assertEqual(b'\n\t\x12\x07r\x05ascii\x12\x05r\x03\xe2\x82\xac',
+                     serialized)
+    self.assertEqual(msg.ByteSize(), len(serialized))
+    self.assertEqual(serialized, msg.SerializeToString())
+    # Modifying a message after its size was cached updates its parents.
+    msg.child.payload.optional_string = '€€'
+    self.assertEqual(
+        msg, message_module.NestedTestAllTypes.FromString(
+            msg.SerializeToString()))
+    self.assertEqual(msg.ByteSize(), len(msg.SerializeToString()))
+
+  def testSerializeLongNonAsciiStrings(self, message_module):
+    text = '€' * 1000
+    msg = message_module.NestedTestAllTypes()
+    msg.child.payload.optional_string = text
+    msg.child.payload.repeated_string.extend([text, text[1:], text])
+    msg.child.child.payload.optional_string = text
+    serialized = msg.SerializeToString()
+    self.assertEqual(msg.ByteSize(), len(serialized))
+    self.assertEqual(
+        msg, message_module.NestedTestAllTypes.FromString(serialized))
+    self.assertEqual(serialized, msg.SerializeToString())
+    msg.child.payload.repeated_string[1] = text[2:]
+    self.assertEqual(
+        msg, message_module.NestedTestAllTypes.FromString(
+            msg.SerializeToString()))
+    self.assertIsNone(encoder._options.encoded_strings)
+
+  def testSerializeDeeplyNestedMessages(self, message_module):
+    depth = 400
+    msg = message_module.NestedTestAllTypes()
+    node = msg
+    for _ in range(depth):
+      node = node.child
+    node.payload.optional_bytes = b'x' * 1000
+    expected = b'z' + encoder._VarintBytes(1000) + b'x' * 1000
+    expected = b'\x12' + encoder._VarintBytes(len(expected)) + expected
+    for _ in range(depth):
+      expected = b'\n' + encoder._VarintBytes(len(expected)) + expected
+    self.assertEqual(expected, msg.SerializeToString())
+    self.assertEqual(expected, msg.SerializeToString(deterministic=True))
+    self.assertEqual(len(expected), msg.ByteSize())
+
   def testPickleSupport(self, message_module):
     golden_message = message_module.TestAllTypes()
     test_util.SetAllFields(golden_message)
@@ -451,6 +499,43 @@ class MessageTest(unittest.TestCase):
         '}\n')
     self.assertEqual(sub_msg.bb, 1)
 
+  def testExtendRepeatedCompositeFieldFromDicts(self, message_module):
+    rows = [
+        {'payload': {'optional_int32': 1, 'repeated_string': ['a', 'b']}},
+        {'payload': {'optional_nested_enum': 'BAR'}, 'child': None},
+        {},
+    ]
+    msg = message_module.NestedTestAllTypes()
+    msg.child.repeated_child.extend_from_dicts(rows)
+    self.assertTrue(msg.HasField('child'))
+    expected = message_module.NestedTestAllTypes()
+    for row in rows:
+      expected.child.repeated_child.add(**row)
+    self.assertEqual(expected, msg)
+    self.assertEqual(expected.SerializeToString(), msg.SerializeToString())
+
+    with self.assertRaises(ValueError):
+      msg.child.repeated_child.extend_from_dicts([{}, {'no_such_field': 1}])
+    with self.assertRaisesRegex(TypeError,
+                                r'^Expected a dict of field values, got int\.$'):
+      msg.child.repeated_child.extend_from_dicts([{}, 1])
+    self.assertEqual(3, len(msg.child.repeated_child))
+
+  def testExtendRepeatedCompositeFieldFromTuples(self, message_module):
+    msg = message_module.TestAllTypes()
+    msg.repeated_nested_message.extend_from_tuples(
+        [(1,), (None,), (3,)], fields=('bb',))
+    msg.repeated_nested_message.extend_from_tuples(((4,),), ['bb'])
+    self.assertEqual([1, 0, 3, 4], [m.bb for m in msg.repeated_nested_message])
+    self.assertEqual(msg, message_module.TestAllTypes.FromString(
+        msg.SerializeToString()))
+
+    with self.assertRaises(ValueError):
+      msg.repeated_nested_message.extend_from_tuples([(5,), (6, 7)], ('bb',))
+    with self.assertRaises(ValueError):
+      msg.repeated_nested_message.extend_from_tuples([(5,)], ('no_such_field',))
+    self.assertEqual(4, len(msg.repeated_nested_message))
+
   def testAssignRepeatedField(self, message_module):
     msg = message_module.NestedTestAllTypes()
     msg.payload.repeated_int32[:] = [1, 2, 3, 4]
@@ -951,6 +1036,17 @@ class MessageTest(unittest.TestCase):
     self.assertEqual('oneof_nested_message',
                      m2.child.payload.WhichOneof('oneof_field'))
 
+  def testOneofNestedMessageModifiedAfterSerialize(self, message_module):
+    m = message_module.NestedTestAllTypes()
+    m.child.child.payload.oneof_uint32 = 11
+    m.SerializeToString()
+    m.child.child.payload.oneof_nested_message.bb = 12
+    self.assertEqual('oneof_nested_message',
+                     m.child.child.payload.WhichOneof('oneof_field'))
+    m2 = message_module.NestedTestAllTypes.FromString(m.SerializeToString())
+    self.assertEqual(m, m2)
+    self.assertEqual(12, m2.child.child.payload.oneof_nested_message.bb)
+
   def testOneofNestedMessageInit(self, message_module):
     m = message_module.TestAllTypes(
         oneof_nested_message=message_module.TestAllTypes.NestedMessage())
@@ -1337,6 +1433,47 @@ class MessageTest(unittest.TestCase):
     self.assertIn('oneof_bytes', m)
     self.assertNotIn('oneof_string', m)
 
+  def testView(self, message_module):
+    m = message_module.TestAllTypes()
+    test_util.SetAllFields(m)
+    view = m.view()
+    self.assertIs(m.DESCRIPTOR, view.DESCRIPTOR)
+    self.assertEqual(m.optional_int32, view.optional_int32)
+    self.assertEqual(m.optional_string, view.optional_string)
+    self.assertEqual(m.optional_nested_message.bb,
+                     view.optional_nested_message.bb)
+    self.assertEqual(list(m.repeated_string), list(view.repeated_string))
+    self.assertEqual(len(m.repeated_nested_message),
+                     len(view.repeated_nested_message))
+    self.assertEqual([n.bb for n in m.repeated_nested_message],
+                     [n.bb for n in view.repeated_nested_message])
+    self.assertEqual(m.repeated_nested_message[-1].bb,
+                     view.repeated_nested_message[-1].bb)
+    self.assertEqual([n.bb for n in m.repeated_nested_message[::-1]],
+                     [n.bb for n in view.repeated_nested_message[::-1]])
+    self.assertTrue(view.HasField('optional_nested_message'))
+    self.assertEqual(m.WhichOneof('oneof_field'), view.WhichOneof('oneof_field'))
+    self.assertIs(view, view.view())
+    with self.assertRaises(IndexError):
+      view.repeated_nested_message[len(m.repeated_nested_message)]
+    with self.assertRaises(AttributeError):
+      view.optional_int32 = 1
+    with self.assertRaises(AttributeError):
+      view.not_a_field
+    with self.assertRaises(ValueError):
+      view.HasField('not_a_field')
+
+  def testViewOfEmptyMessage(self, message_module):
+    m = message_module.TestAllTypes()
+    view = m.view()
+    self.assertEqual(0, view.optional_nested_message.bb)
+    self.assertEqual(0, len(view.repeated_nested_message))
+    self.assertIsNone(view.WhichOneof('oneof_field'))
+    self.assertFalse(view.HasField('optional_nested_message'))
+    self.assertFalse(m.HasField('optional_nested_message'))
+    self.assertEqual(0, m.optional_nested_message.view().bb)
+    self.assertFalse(m.HasField('optional_nested_message'))
+
 
 # Class to test proto2-only features (required, extensions, etc.)
 @testing_refleaks.TestCase
@@ -1452,6 +1589,20 @@ class Proto2Test(unittest.TestCase):
     with self.assertRaises(ValueError):
       m.unknown_map_field[1] = 123
 
+  def testParseUnknownEnumMapValue(self):
+    m = map_proto2_unittest_pb2.TestEnumMapPlusExtra()
+    m.known_map_field[0] = map_proto2_unittest_pb2.E_PROTO2_MAP_ENUM_FOO
+    m.unknown_map_field[1] = map_proto2_unittest_pb2.E_PROTO2_MAP_ENUM_EXTRA
+    serialized = m.SerializeToString()
+
+    m2 = map_proto2_unittest_pb2.TestEnumMap.FromString(serialized)
+    self.assertEqual({0: 0}, dict(m2.known_map_field))
+    # The entry with an unknown value is kept in the unknown fields.
+    self.assertEqual({}, dict(m2.unknown_map_field))
+    m3 = map_proto2_unittest_pb2.TestEnumMapPlusExtra.FromString(
+        m2.SerializeToString())
+    self.assertEqual(m, m3)
+
   def testDeepCopyClosedEnum(self):
     m = map_proto2_unittest_pb2.TestEnumMap()
     m.known_map_field[123] = 0
@@ -1645,6 +1796,41 @@ class Proto2Test(unittest.TestCase):
     self.assertEqual(100, msg.optional_int32)
     self.assertEqual(200, msg.optional_fixed32)
 
+  def testFromDict(self):
+    field_values = {
+        'optional_int32': 100,
+        'optional_string': None,
+        'optional_nested_message': {'bb': 200},
+        'optional_foreign_message': {},
+        'optional_nested_enum': 'BAZ',
+        'repeated_nested_message': [{'bb': 300}, {}],
+        'repeated_nested_enum': ['FOO', unittest_pb2.TestAllTypes.BAR],
+        'oneof_nested_message': {'bb': 400},
+    }
+    msg = unittest_pb2.TestAllTypes.FromDict(field_values)
+    self.assertIsInstance(msg, unittest_pb2.TestAllTypes)
+    self.assertEqual(unittest_pb2.TestAllTypes(**field_values), msg)
+    self.assertEqual(200, msg.optional_nested_message.bb)
+    self.assertFalse(msg.HasField('optional_string'))
+    self.assertTrue(msg.HasField('optional_foreign_message'))
+    self.assertEqual(2, len(msg.repeated_nested_message))
+    self.assertEqual('oneof_nested_message', msg.WhichOneof('oneof_field'))
+    self.assertEqual(unittest_pb2.TestAllTypes(),
+                     unittest_pb2.TestAllTypes.FromDict({}))
+
+    map_msg = map_unittest_pb2.TestMap.FromDict({
+        'map_int32_int32': {1: 2},
+        'map_int32_foreign_message': {3: unittest_pb2.ForeignMessage(c=4)},
+    })
+    self.assertEqual(2, map_msg.map_int32_int32[1])
+    self.assertEqual(4, map_msg.map_int32_foreign_message[3].c)
+
+    with self.assertRaises(ValueError):
+      unittest_pb2.TestAllTypes.FromDict({'INVALID_FIELD': 1})
+    with self.assertRaises(TypeError):
+      unittest_pb2.TestAllTypes.FromDict(
+          {'optional_nested_message': {'bb': 'INVALID_VALUE_TYPE'}})
+
   def test_documentation(self):
     # Also used by the interactive help() function.
     doc = pydoc.html.document(unittest_pb2.TestAllTypes, 'message')
@@ -2454,6 +2640,26 @@ class Proto3Test(unittest.TestCase):
         map_string_foreign_message=msg1.map_string_foreign_message)
     self.assertEqual(42, msg2.map_string_foreign_message['test'].c)
 
+  def testMapView(self):
+    msg = map_unittest_pb2.TestMap()
+    msg.map_int32_int32[1] = 2
+    msg.map_string_foreign_message['a'].c = 5
+    view = msg.view()
+    self.assertEqual({1: 2}, dict(view.map_int32_int32))
+    self.assertEqual(['a'], list(view.map_string_foreign_message))
+    self.assertEqual(5, view.map_string_foreign_message['a'].c)
+    with self.assertRaises(KeyError):
+      view.map_string_foreign_message['b']
+    self.assertNotIn('b', msg.map_string_foreign_message)
+    self.assertEqual(0, len(view.map_int32_foreign_message))
+    with self.assertRaises(TypeError):
+      view.map_int32_int32[5] = 6
+    with self.assertRaises(TypeError):
+      del view.map_int32_int32[1]
+    with self.assertRaises(TypeError):
+      view.map_int32_foreign_message[1] = view.map_string_foreign_message['a']
+    self.assertEqual({1: 2}, dict(msg.map_int32_int32))
+
   def testMapFieldRaisesCorrectError(self):
     # Should raise a TypeError when given a non-iterable.
     with self.assertRaises(TypeError):
@@ -2707,6 +2913,26 @@ class PackedFieldTest(unittest.TestCase):
                    b'\x72\x01\x01')
     self.assertEqual(golden_data, message.SerializeToString())
 
+  def testPackedFieldsMultipleValues(self):
+    message = packed_field_test_pb2.TestPackedTypes(
+        repeated_int32=[0, 127, 128, -1],
+        repeated_uint64=[1, 300, 2**64 - 1],
+        repeated_sint64=[0, -1, 1, -64, 64],
+        repeated_fixed32=[1, 2],
+        repeated_double=[1.0, float('-inf')],
+        repeated_bool=[True, False, True])
+    golden_data = (b'\x0A\x0E\x00\x7f\x80\x01'
+                   b'\xff\xff\xff\xff\xff\xff\xff\xff\xff\x01'
+                   b'\x22\x0D\x01\xac\x02'
+                   b'\xff\xff\xff\xff\xff\xff\xff\xff\xff\x01'
+                   b'\x32\x06\x00\x01\x02\x7f\x80\x01'
+                   b'\x3A\x08\x01\x00\x00\x00\x02\x00\x00\x00'
+                   b'\x62\x10\x00\x00\x00\x00\x00\x00\xf0\x3f'
+                   b'\x00\x00\x00\x00\x00\x00\xf0\xff'
+                   b'\x6A\x03\x01\x00\x01')
+    self.assertEqual(golden_data, message.SerializeToString())
+    self.assertEqual(len(golden_data), message.ByteSize())
+
   def testUnpackedFields(self):
     message = packed_field_test_pb2.TestUnpackedTypes()
     self.setMessage(message)
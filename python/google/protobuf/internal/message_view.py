@@ -0,0 +1,114 @@
+# Protocol Buffers - Google's data interchange format
+# Copyright 2008 Google Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Read-only views of messages, returned by Message.view().
+
+A MessageView reads the fields of the message it wraps.  Sub-messages are
+returned as views, repeated fields as read-only sequences and map fields as
+read-only mappings, and all attribute assignments raise.
+"""
+
+import collections.abc
+
+from google.protobuf import descriptor
+
+_FieldDescriptor = descriptor.FieldDescriptor
+
+
+def _IsMapField(field):
+  return (field.type == _FieldDescriptor.TYPE_MESSAGE and
+          field.message_type._is_map_entry)  # pylint: disable=protected-access
+
+
+def _Wrap(field, value):
+  if field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE:
+    return MessageView(value)
+  return value
+
+
+class MessageView(object):
+  """A read-only view of a message.
+
+  Fields are read as attributes.  Sub-messages are returned as views,
+  repeated fields as read-only sequences and map fields as read-only mappings.
+  """
+
+  __slots__ = ('_message',)
+
+  def __init__(self, message):
+    object.__setattr__(self, '_message', message)
+
+  @property
+  def DESCRIPTOR(self):
+    return self._message.DESCRIPTOR
+
+  def HasField(self, field_name):
+    return self._message.HasField(field_name)
+
+  def WhichOneof(self, oneof_group):
+    return self._message.WhichOneof(oneof_group)
+
+  def view(self):
+    return self
+
+  def __getattr__(self, name):
+    message = self._message
+    field = message.DESCRIPTOR.fields_by_name.get(name)
+    if field is None:
+      raise AttributeError(name)
+    if _IsMapField(field):
+      return _MapView(field.message_type.fields_by_name['value'],
+                      getattr(message, name))
+    if field.label == _FieldDescriptor.LABEL_REPEATED:
+      return _RepeatedView(field, getattr(message, name))
+    return _Wrap(field, getattr(message, name))
+
+  def __setattr__(self, name, value):
+    raise AttributeError(
+        'Cannot set attribute %r of a read-only message view.' % name)
+
+  __hash__ = None
+
+
+class _RepeatedView(collections.abc.Sequence):
+  """A read-only view of a repeated field."""
+
+  __slots__ = ('_field', '_values')
+
+  def __init__(self, field, values):
+    self._field = field
+    self._values = values
+
+  def __len__(self):
+    return len(self._values)
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [_Wrap(self._field, value) for value in self._values[index]]
+    return _Wrap(self._field, self._values[index])
+
+
+class _MapView(collections.abc.Mapping):
+  """A read-only view of a map field."""
+
+  __slots__ = ('_value_field', '_map')
+
+  def __init__(self, value_field, map_value):
+    self._value_field = value_field
+    self._map = map_value
+
+  def __len__(self):
+    return len(self._map)
+
+  def __iter__(self):
+    return iter(self._map)
+
+  def __getitem__(self, key):
+    # Looking up a missing key of a message map would insert it.
+    if key not in self._map:
+      raise KeyError(key)
+    return _Wrap(self._value_field, self._map[key])
@@ -11,6 +11,7 @@ import unittest
 
 import numpy as np
 
+from google.protobuf import proto
 from google.protobuf.internal import testing_refleaks
 from google.protobuf import unittest_pb2
 
@@ -188,5 +189,138 @@ class NumpyProtoIndexingTest(unittest.TestCase):
                                          buffer=np.array([0]),
                                          dtype=int)]
 
+
+@testing_refleaks.TestCase
+class NumpyColumnsTest(unittest.TestCase):
+
+  def _Messages(self):
+    container = unittest_pb2.TestAllTypes()
+    for i in range(3):
+      container.repeated_nested_message.add(bb=i)
+    messages = [
+        unittest_pb2.TestAllTypes(
+            optional_int32=-1, optional_uint64=2**64 - 1, optional_bool=True,
+            optional_string='h\xe9', optional_bytes=b'\x00',
+            repeated_double=[0.5, 1.5], repeated_string=['a', 'bc'],
+            optional_nested_message={'bb': 7},
+            optional_nested_enum=unittest_pb2.TestAllTypes.BAZ),
+        unittest_pb2.TestAllTypes(),
+        unittest_pb2.TestAllTypes(
+            optional_int32=3, optional_string='xyz', repeated_string=['']),
+    ]
+    return container, messages
+
+  def testToColumns(self):
+    _, messages = self._Messages()
+    columns = proto.to_columns(messages, [
+        'optional_int32', 'optional_uint64', 'optional_bool',
+        'optional_float', 'optional_nested_enum', 'optional_nested_message.bb'
+    ])
+    np.testing.assert_array_equal(columns['optional_int32'], [-1, 0, 3])
+    self.assertEqual(columns['optional_int32'].dtype, np.int32)
+    np.testing.assert_array_equal(columns['optional_uint64'], [2**64 - 1, 0, 0])
+    self.assertEqual(columns['optional_uint64'].dtype, np.uint64)
+    np.testing.assert_array_equal(columns['optional_bool'], [True, False, False])
+    self.assertEqual(columns['optional_bool'].dtype, np.bool_)
+    self.assertEqual(columns['optional_float'].dtype, np.float32)
+    np.testing.assert_array_equal(columns['optional_nested_enum'], [3, 1, 1])
+    np.testing.assert_array_equal(columns['optional_nested_message.bb'],
+                                  [7, 0, 0])
+
+  def testToColumnsVariableLength(self):
+    _, messages = self._Messages()
+    columns = proto.to_columns(
+        messages, ['optional_string', 'optional_bytes', 'repeated_double',
+                   'repeated_string'])
+    offsets, data = columns['optional_string']
+    np.testing.assert_array_equal(offsets, [0, 3, 3, 6])
+    self.assertEqual(offsets.dtype, np.int64)
+    self.assertEqual(data.tobytes(), 'h\xe9xyz'.encode('utf-8'))
+    offsets, data = columns['optional_bytes']
+    np.testing.assert_array_equal(offsets, [0, 1, 1, 1])
+    self.assertEqual(data.tobytes(), b'\x00')
+    offsets, values = columns['repeated_double']
+    np.testing.assert_array_equal(offsets, [0, 2, 2, 2])
+    np.testing.assert_array_equal(values, [0.5, 1.5])
+    offsets, (value_offsets, data) = columns['repeated_string']
+    np.testing.assert_array_equal(offsets, [0, 2, 2, 3])
+    np.testing.assert_array_equal(value_offsets, [0, 1, 3, 3])
+    self.assertEqual(data.tobytes(), b'abc')
+
+  def testToColumnsRepeatedField(self):
+    container, _ = self._Messages()
+    columns = proto.to_columns(container.repeated_nested_message, ['bb'])
+    np.testing.assert_array_equal(columns['bb'], [0, 1, 2])
+    columns = proto.to_columns(container.repeated_nested_message[1:], ['bb'])
+    np.testing.assert_array_equal(columns['bb'], [1, 2])
+
+  def testToColumnsEmpty(self):
+    columns = proto.to_columns(
+        [], ['optional_int32', 'optional_string'],
+        message_class=unittest_pb2.TestAllTypes)
+    self.assertEqual(columns['optional_int32'].shape, (0,))
+    np.testing.assert_array_equal(columns['optional_string'][0], [0])
+    with self.assertRaises(ValueError):
+      proto.to_columns([], ['optional_int32'])
+
+  def testToColumnsMixedTypes(self):
+    _, messages = self._Messages()
+    for other in (unittest_pb2.TestAllTypes.NestedMessage(), 1):
+      with self.assertRaises(TypeError):
+        proto.to_columns(messages + [other], ['optional_int32'])
+
+  def testToColumnsInvalidPath(self):
+    _, messages = self._Messages()
+    for path in ('unknown', 'optional_nested_message', 'repeated_nested_message',
+                 'repeated_nested_message.bb', 'optional_int32.bb'):
+      with self.assertRaises(ValueError):
+        proto.to_columns(messages, [path])
+
+  def testFromColumns(self):
+    _, messages = self._Messages()
+    fields = ['optional_int32', 'optional_uint64', 'optional_bool',
+              'optional_string', 'optional_bytes', 'optional_nested_enum',
+              'optional_nested_message.bb', 'repeated_double',
+              'repeated_string']
+    columns = proto.to_columns(messages, fields)
+    rows = proto.from_columns(unittest_pb2.TestAllTypes, columns)
+    self.assertEqual(rows, [
+        unittest_pb2.TestAllTypes(
+            optional_int32=-1, optional_uint64=2**64 - 1, optional_bool=True,
+            optional_string='h\xe9', optional_bytes=b'\x00',
+            repeated_double=[0.5, 1.5], repeated_string=['a', 'bc'],
+            optional_nested_message={'bb': 7},
+            optional_nested_enum=unittest_pb2.TestAllTypes.BAZ),
+        unittest_pb2.TestAllTypes(
+            optional_int32=0, optional_uint64=0, optional_bool=False,
+            optional_string='', optional_bytes=b'',
+            optional_nested_message={'bb': 0},
+            optional_nested_enum=unittest_pb2.TestAllTypes.FOO),
+        unittest_pb2.TestAllTypes(
+            optional_int32=3, optional_uint64=0, optional_bool=False,
+            optional_string='xyz', optional_bytes=b'', repeated_string=[''],
+            optional_nested_message={'bb': 0},
+            optional_nested_enum=unittest_pb2.TestAllTypes.FOO),
+    ])
+    self.assertEqual(proto.to_columns(rows, fields).keys(), columns.keys())
+
+  def testFromColumnsLists(self):
+    rows = proto.from_columns(unittest_pb2.TestAllTypes, {
+        'optional_int32': [1, 2],
+        'optional_string': ([0, 1, 3], b'abc'),
+        'repeated_int32': ([0, 0, 2], [4, 5]),
+    })
+    self.assertEqual(rows, [
+        unittest_pb2.TestAllTypes(optional_int32=1, optional_string='a'),
+        unittest_pb2.TestAllTypes(optional_int32=2, optional_string='bc',
+                                  repeated_int32=[4, 5]),
+    ])
+    with self.assertRaises(ValueError):
+      proto.from_columns(unittest_pb2.TestAllTypes, {
+          'optional_int32': [1, 2],
+          'optional_int64': [1],
+      })
+
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,255 @@
+# Protocol Buffers - Google's data interchange format
+# Copyright 2008 Google Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Profiles the time spent loading protocol buffer modules.
+
+Call enable() before importing the _pb2 modules of interest, or set the
+PROTOCOL_BUFFERS_PYTHON_PROFILE environment variable.  The following spans
+are then recorded, per .proto file:
+
+* import: executing a generated _pb2 module, including its dependencies.
+* AddSerializedFile: adding the serialized file to the descriptor pool.
+* BuildFileDescriptor: converting a FileDescriptorProto to descriptors
+  (python backend only; the other backends build in C).
+* BuildMessageAndEnumDescriptors, BuildTopDescriptorsAndMessages: the
+  builder calls of generated code.
+* CreateClass: creating a message class, from generated code or
+  message_factory.
+* ResolveOptions: parsing descriptor options and resolving features
+  (python backend only).
+
+With the upb and cpp backends AddSerializedFile is implemented in C, so its
+span is derived from the generated code instead: it covers the time between
+the last dependency import of a _pb2 module and its first builder call.
+
+Example usage::
+
+  from google.protobuf.internal import profiling
+  profiling.enable()
+  import my_proto_pb2
+  print(profiling.report())
+  profiling.dump_chrome_trace('/tmp/protobuf_trace.json')
+
+If the environment variable is set to a path ending in '.json', a Chrome
+trace is written to that path when the process exits; otherwise the report is
+printed to stderr.
+"""
+
+import atexit
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+from google.protobuf.internal import api_implementation
+
+_ENV_VAR = 'PROTOCOL_BUFFERS_PYTHON_PROFILE'
+
+Event = collections.namedtuple(
+    'Event', ['category', 'name', 'file', 'start_ns', 'duration_ns', 'tid'])
+
+_enabled = False
+_events = []
+_events_lock = threading.Lock()
+# Per thread stack of the _pb2 modules being executed.
+_imports = threading.local()
+
+
+class Span(object):
+  """Context manager recording one event while profiling is enabled.
+
+  The file attribute may be set inside of the block, once it is known.
+  """
+
+  __slots__ = ('category', 'name', 'file', '_start')
+
+  def __init__(self, category, name=None, file=None):
+    self.category = category
+    self.name = name
+    self.file = file
+    self._start = None
+
+  def __enter__(self):
+    if _enabled:
+      self._start = time.perf_counter_ns()
+    return self
+
+  def __exit__(self, exc_type, exc_value, exc_tb):
+    if self._start is not None:
+      _Record(self.category, self.name or self.file, self.file, self._start,
+              time.perf_counter_ns() - self._start)
+
+
+def _Record(category, name, file, start_ns, duration_ns):
+  event = Event(category, name, file, start_ns, duration_ns,
+                threading.get_ident())
+  with _events_lock:
+    _events.append(event)
+
+
+def GeneratedFileAdded(file_name):
+  """Called by the builder once generated code added its file to the pool."""
+  if not _enabled or api_implementation.Type() == 'python':
+    return
+  stack = getattr(_imports, 'stack', None)
+  if not stack:
+    return
+  frame = stack[-1]
+  now = time.perf_counter_ns()
+  start = max(frame[0], frame[1])
+  _Record('AddSerializedFile', file_name, file_name, start, now - start)
+
+
+class _TimedLoader(object):
+  """Wraps the loader of a _pb2 module to record its execution."""
+
+  def __init__(self, loader):
+    self._loader = loader
+
+  def __getattr__(self, name):
+    return getattr(self._loader, name)
+
+  def create_module(self, spec):
+    return self._loader.create_module(spec)
+
+  def exec_module(self, module):
+    stack = getattr(_imports, 'stack', None)
+    if stack is None:
+      stack = _imports.stack = []
+    start = time.perf_counter_ns()
+    # [start of the module, end of its last nested _pb2 import]
+    stack.append([start, start])
+    try:
+      self._loader.exec_module(module)
+    finally:
+      stack.pop()
+      end = time.perf_counter_ns()
+      if stack:
+        stack[-1][1] = end
+      descriptor = getattr(module, 'DESCRIPTOR', None)
+      _Record('import', module.__name__,
+              getattr(descriptor, 'name', None), start, end - start)
+
+
+class _Pb2Finder(object):
+  """Meta path finder that times the execution of _pb2 modules."""
+
+  def find_spec(self, fullname, path, target=None):
+    if not _enabled or not fullname.endswith('_pb2'):
+      return None
+    for finder in sys.meta_path:
+      if finder is self or not hasattr(finder, 'find_spec'):
+        continue
+      spec = finder.find_spec(fullname, path, target)
+      if spec is not None:
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+          spec.loader = _TimedLoader(spec.loader)
+        return spec
+    return None
+
+
+_FINDER = _Pb2Finder()
+
+
+def enable():
+  """Starts recording events."""
+  global _enabled
+  _enabled = True
+  if _FINDER not in sys.meta_path:
+    sys.meta_path.insert(0, _FINDER)
+
+
+def disable():
+  """Stops recording events.  Recorded events are kept."""
+  global _enabled
+  _enabled = False
+  if _FINDER in sys.meta_path:
+    sys.meta_path.remove(_FINDER)
+
+
+def is_enabled():
+  return _enabled
+
+
+def reset():
+  """Drops the recorded events."""
+  with _events_lock:
+    del _events[:]
+
+
+def events():
+  """Returns the recorded events, as a list of Event tuples."""
+  with _events_lock:
+    return list(_events)
+
+
+def report(limit=None):
+  """Returns a report of the time spent per file and category.
+
+  Args:
+    limit (int): The maximum number of rows, or None for all of them.
+
+  Returns:
+    str: The rows sorted by decreasing total time.  Spans nest, so the time
+    of an import includes the time of everything it triggered.
+  """
+  totals = collections.defaultdict(lambda: [0, 0])
+  for event in events():
+    total = totals[(event.category, event.file or event.name)]
+    total[0] += event.duration_ns
+    total[1] += 1
+  rows = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+  if limit is not None:
+    rows = rows[:limit]
+  lines = ['%10s %6s  %-30s %s' % ('total ms', 'count', 'category', 'file')]
+  for (category, file), (duration_ns, count) in rows:
+    lines.append('%10.3f %6d  %-30s %s' %
+                 (duration_ns / 1e6, count, category, file))
+  return '\n'.join(lines)
+
+
+def dump_chrome_trace(path_or_file):
+  """Writes the events in the Chrome trace event format.
+
+  The output can be loaded in chrome://tracing or https://ui.perfetto.dev.
+
+  Args:
+    path_or_file: A file name, or a writable text file object.
+  """
+  pid = os.getpid()
+  trace_events = []
+  for event in events():
+    trace_events.append({
+        'name': event.name,
+        'cat': event.category,
+        'ph': 'X',
+        'ts': event.start_ns / 1000.0,
+        'dur': event.duration_ns / 1000.0,
+        'pid': pid,
+        'tid': event.tid,
+        'args': {'file': event.file},
+    })
+  trace = {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+  if hasattr(path_or_file, 'write'):
+    json.dump(trace, path_or_file)
+  else:
+    with open(path_or_file, 'w') as f:
+      json.dump(trace, f)
+
+
+def _DumpAtExit(destination):
+  if destination.endswith('.json'):
+    dump_chrome_trace(destination)
+  else:
+    sys.stderr.write(report() + '\n')
+
+
+if os.getenv(_ENV_VAR):
+  enable()
+  atexit.register(_DumpAtExit, os.getenv(_ENV_VAR))
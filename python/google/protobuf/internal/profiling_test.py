@@ -0,0 +1,123 @@
+# Protocol Buffers - Google's data interchange format
+# Copyright 2008 Google Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Tests for google.protobuf.internal.profiling."""
+
+import importlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from google.protobuf import descriptor_pb2
+from google.protobuf import descriptor_pool
+from google.protobuf import message_factory
+from google.protobuf.internal import profiling
+
+_MODULE_NAME = 'profiling_test_generated_pb2'
+_FILE_NAME = 'google/protobuf/internal/profiling_test_generated.proto'
+
+# A minimal generated module, in the shape emitted by protoc.
+_MODULE_TEMPLATE = """
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf.internal import builder as _builder
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(%r)
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, %r, _globals)
+"""
+
+
+def _MakeFile(name, package):
+  file_proto = descriptor_pb2.FileDescriptorProto(name=name, package=package)
+  message_proto = file_proto.message_type.add(name='Profiled')
+  message_proto.nested_type.add(name='Nested')
+  message_proto.field.add(
+      name='nested', number=1, type_name='.%s.Profiled.Nested' % package,
+      type=descriptor_pb2.FieldDescriptorProto.TYPE_MESSAGE,
+      label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL)
+  return file_proto
+
+
+class ProfilingTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    profiling.reset()
+    profiling.enable()
+    self.addCleanup(profiling.reset)
+    self.addCleanup(profiling.disable)
+
+  def testSpansAreOnlyRecordedWhileEnabled(self):
+    profiling.disable()
+    with profiling.Span('test', 'disabled'):
+      pass
+    profiling.enable()
+    with profiling.Span('test', 'enabled') as span:
+      span.file = 'enabled.proto'
+    self.assertEqual([('test', 'enabled', 'enabled.proto')],
+                     [event[:3] for event in profiling.events()])
+
+  def testGeneratedModuleImport(self):
+    tmp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, tmp_dir)
+    serialized = _MakeFile(
+        _FILE_NAME, 'protobuf_unittest.profiling').SerializeToString()
+    with open(os.path.join(tmp_dir, _MODULE_NAME + '.py'), 'w') as f:
+      f.write(_MODULE_TEMPLATE % (serialized, _MODULE_NAME))
+    sys.path.insert(0, tmp_dir)
+    self.addCleanup(sys.path.remove, tmp_dir)
+    self.addCleanup(sys.modules.pop, _MODULE_NAME, None)
+    importlib.invalidate_caches()
+
+    module = importlib.import_module(_MODULE_NAME)
+    self.assertEqual('Profiled', module.Profiled.DESCRIPTOR.name)
+
+    recorded = set((event.category, event.file) for event in profiling.events())
+    for category in ('import', 'AddSerializedFile',
+                     'BuildMessageAndEnumDescriptors',
+                     'BuildTopDescriptorsAndMessages', 'CreateClass'):
+      self.assertIn((category, _FILE_NAME), recorded)
+    class_names = [event.name for event in profiling.events()
+                   if event.category == 'CreateClass']
+    self.assertIn('protobuf_unittest.profiling.Profiled', class_names)
+    self.assertIn('protobuf_unittest.profiling.Profiled.Nested', class_names)
+
+  def testDynamicClassCreation(self):
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(_MakeFile('dynamic.proto', 'dynamic'))
+    message_factory.GetMessageClass(
+        pool.FindMessageTypeByName('dynamic.Profiled'))
+    self.assertIn(('CreateClass', 'dynamic.Profiled', 'dynamic.proto'),
+                  [event[:3] for event in profiling.events()])
+
+  def testReportAndChromeTrace(self):
+    with profiling.Span('slow', file='slow.proto'):
+      with profiling.Span('fast', file='fast.proto'):
+        pass
+    lines = profiling.report().splitlines()
+    self.assertIn('category', lines[0])
+    self.assertEqual(3, len(lines))
+    self.assertTrue(lines[1].rstrip().endswith('slow.proto'))
+    self.assertEqual(2, len(profiling.report(limit=1).splitlines()))
+
+    output = io.StringIO()
+    profiling.dump_chrome_trace(output)
+    trace = json.loads(output.getvalue())
+    events = sorted(trace['traceEvents'], key=lambda event: event['ts'])
+    self.assertEqual(['slow', 'fast'], [event['cat'] for event in events])
+    self.assertEqual('X', events[0]['ph'])
+    self.assertGreaterEqual(events[0]['dur'], events[1]['dur'])
+
+
+if __name__ == '__main__':
+  unittest.main()
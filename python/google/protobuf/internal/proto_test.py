@@ -8,17 +8,23 @@
 
 """Tests Nextgen Pythonic protobuf APIs."""
 
+import copy
+import datetime
 import io
 import unittest
 
+from google.protobuf import json_format
 from google.protobuf import proto
+from google.protobuf.internal import api_implementation
 from google.protobuf.internal import encoder
 from google.protobuf.internal import test_util
 from google.protobuf.internal import testing_refleaks
 
 from google.protobuf.internal import _parameterized
+from google.protobuf import map_unittest_pb2
 from google.protobuf import unittest_pb2
 from google.protobuf import unittest_proto3_arena_pb2
+from google.protobuf.util import json_format_proto3_pb2
 
 
 @_parameterized.named_parameters(('_proto2', unittest_pb2),
@@ -74,11 +80,652 @@ class ProtoTest(unittest.TestCase):
         str(context.exception),
     )
 
+  def test_parse_in_arena(self, message_module):
+    msg = message_module.TestAllTypes()
+    test_util.SetAllFields(msg)
+    payload = proto.serialize(msg)
+    with proto.arena() as arena:
+      parsed = [
+          proto.parse(message_module.TestAllTypes, payload, arena=arena),
+          message_module.TestAllTypes.FromString(payload, arena=arena),
+      ]
+      parsed[0].repeated_nested_message.append(
+          parsed[1].optional_nested_message)
+      parsed[1].optional_nested_message.bb = 1234
+    self.assertTrue(arena.closed)
+    self.assertNotEqual(msg, parsed[0])
+    self.assertEqual(1234, parsed[1].optional_nested_message.bb)
+    del parsed[0].repeated_nested_message[-1]
+    self.assertEqual(msg, parsed[0])
+    # Messages survive their arena objects.
+    del arena
+    self.assertEqual(payload, proto.serialize(parsed[0]))
+
+  def test_parse_zero_copy(self, message_module):
+    msg = message_module.TestAllTypes()
+    test_util.SetAllFields(msg)
+    payload = proto.serialize(msg)
+    parsed = proto.parse(message_module.TestAllTypes, payload, zero_copy=True)
+    self.assertEqual(msg, parsed)
+    self.assertEqual(msg.repeated_bytes[0], parsed.repeated_bytes[0])
+    if api_implementation.Type() == 'python':
+      self.assertIsInstance(parsed.optional_bytes, memoryview)
+      self.assertIs(payload, parsed.optional_bytes.obj)
+    self.assertEqual(payload, proto.serialize(parsed))
+    self.assertEqual(proto.to_dict(msg), proto.to_dict(parsed))
+    self.assertIsInstance(proto.to_dict(parsed)['optional_bytes'], bytes)
+    self.assertIsInstance(proto.to_dict(parsed)['repeated_bytes'][0], bytes)
+    self.assertEqual(sorted(msg.repeated_bytes, reverse=True),
+                     sorted(parsed.repeated_bytes, key=bytes, reverse=True))
+    parsed.repeated_bytes.sort(key=bytes, reverse=True)
+    self.assertEqual(sorted(msg.repeated_bytes, reverse=True),
+                     parsed.repeated_bytes)
+    parsed = proto.parse(
+        map_unittest_pb2.TestMap,
+        proto.serialize(map_unittest_pb2.TestMap(map_int32_bytes={1: b'a'})),
+        zero_copy=True)
+    self.assertEqual({'map_int32_bytes': {1: b'a'}}, proto.to_dict(parsed))
+    self.assertIsInstance(proto.to_dict(parsed)['map_int32_bytes'][1], bytes)
+
+    empty = proto.parse(
+        unittest_pb2.TestEmptyMessage, payload, zero_copy=True)
+    self.assertEqual(unittest_pb2.TestEmptyMessage.FromString(payload), empty)
+    self.assertEqual(payload, proto.serialize(empty))
+    # Messages parsed afterwards copy the payload again.
+    self.assertIsInstance(
+        message_module.TestAllTypes.FromString(payload).optional_bytes, bytes)
+
+  def test_parse_zero_copy_frozen(self, message_module):
+    msg = message_module.TestAllTypes()
+    test_util.SetAllFields(msg)
+    payload = bytearray(proto.serialize(msg))
+    frozen = proto.frozen(
+        proto.parse(message_module.TestAllTypes, payload, zero_copy=True))
+    self.assertEqual(hash(proto.frozen(msg)), hash(frozen))
+    # The frozen message does not alias the payload.
+    payload[:] = bytes(len(payload))
+    self.assertEqual(msg, frozen)
+
+    # A bytes map value and an unknown field.
+    data = proto.serialize(
+        map_unittest_pb2.TestMap(map_int32_bytes={1: b'a'})) + b'\x82\x08\x01b'
+    msg = map_unittest_pb2.TestMap.FromString(data)
+    payload = bytearray(data)
+    frozen = proto.frozen(
+        proto.parse(map_unittest_pb2.TestMap, payload, zero_copy=True))
+    self.assertEqual(hash(proto.frozen(msg)), hash(frozen))
+    payload[:] = bytes(len(payload))
+    self.assertEqual(msg, frozen)
+    self.assertEqual(data, proto.serialize(frozen))
+
+  def test_parse_retain_buffer(self, message_module):
+    msg = message_module.TestAllTypes()
+    test_util.SetAllFields(msg)
+    payload = proto.serialize(msg)
+    parsed = proto.parse(
+        message_module.TestAllTypes, payload, retain_buffer=True)
+    self.assertEqual(msg, parsed)
+    self.assertEqual(payload, proto.serialize(parsed))
+    for message in (msg, parsed):
+      message.optional_int32 = 1
+      message.repeated_nested_message[1].bb = 2
+      message.optional_nested_message.ClearField('bb')
+    self.assertEqual(proto.serialize(msg), proto.serialize(parsed))
+    self.assertEqual(msg.ByteSize(), parsed.ByteSize())
+
+    # optional_nested_message, with bb set twice.
+    payload = b'\x92\x01\x04\x08\x01\x08\x02'
+    parsed = proto.parse(
+        message_module.TestAllTypes, payload, retain_buffer=True)
+    parsed.optional_int32 = 1
+    if api_implementation.Type() == 'python':
+      # The sub-message is not modified, and written as it was parsed.
+      self.assertEqual(b'\x08\x01' + payload, proto.serialize(parsed))
+    else:
+      self.assertEqual(b'\x08\x01\x92\x01\x02\x08\x02', proto.serialize(parsed))
+    parsed.optional_nested_message.bb = 3
+    self.assertEqual(b'\x08\x01\x92\x01\x02\x08\x03', proto.serialize(parsed))
+
+    # Reordering repeated fields modifies the message.
+    payload = proto.serialize(message_module.TestAllTypes(
+        repeated_int32=[1, 2, 3],
+        repeated_nested_message=[{'bb': 1}, {'bb': 2}]))
+    parsed = proto.parse(
+        message_module.TestAllTypes, payload, retain_buffer=True)
+    parsed.repeated_int32.sort(reverse=True)
+    parsed.repeated_nested_message.sort(key=lambda value: -value.bb)
+    self.assertEqual(
+        message_module.TestAllTypes(
+            repeated_int32=[3, 2, 1],
+            repeated_nested_message=[{'bb': 2}, {'bb': 1}]),
+        message_module.TestAllTypes.FromString(proto.serialize(parsed)))
+    parsed = proto.parse(
+        message_module.TestAllTypes, payload, retain_buffer=True)
+    parsed.repeated_int32.reverse()
+    parsed.repeated_nested_message.reverse()
+    self.assertEqual(
+        message_module.TestAllTypes(
+            repeated_int32=[3, 2, 1],
+            repeated_nested_message=[{'bb': 2}, {'bb': 1}]),
+        message_module.TestAllTypes.FromString(proto.serialize(parsed)))
+
+    empty = proto.parse(
+        unittest_pb2.TestEmptyMessage, payload, retain_buffer=True)
+    empty.DiscardUnknownFields()
+    self.assertEqual(b'', proto.serialize(empty))
+
+  def test_parse_retain_buffer_deterministic(self, message_module):
+    # map_int32_int32 with the keys 5 and 1, in that order.
+    payload = b'\n\x04\x08\x05\x10\n\n\x04\x08\x01\x10\x0b'
+    parsed = proto.parse(map_unittest_pb2.TestMap, payload, retain_buffer=True)
+    self.assertEqual(
+        map_unittest_pb2.TestMap.FromString(payload).SerializeToString(
+            deterministic=True),
+        parsed.SerializeToString(deterministic=True))
+    if api_implementation.Type() == 'python':
+      self.assertEqual(
+          b'\n\x04\x08\x01\x10\x0b\n\x04\x08\x05\x10\n',
+          parsed.SerializeToString(deterministic=True))
+      self.assertEqual(payload, parsed.SerializeToString())
+
+  def test_parse_in_closed_arena(self, message_module):
+    arena = proto.arena()
+    arena.close()
+    with self.assertRaises(ValueError):
+      message_module.TestAllTypes.FromString(b'', arena=arena)
+    with self.assertRaises(ValueError):
+      with arena:
+        pass
+
+  def test_frozen(self, message_module):
+    msg = message_module.TestAllTypes()
+    test_util.SetAllFields(msg)
+    frozen = proto.frozen(msg)
+    self.assertTrue(proto.is_frozen(frozen))
+    self.assertFalse(proto.is_frozen(msg))
+    self.assertIs(frozen, proto.frozen(frozen))
+    self.assertEqual(msg, frozen)
+    self.assertTrue(proto.is_frozen(frozen.optional_nested_message))
+    msg.optional_int32 = 0
+    self.assertNotEqual(msg, frozen)
+
+    mutations = [
+        lambda: setattr(frozen, 'optional_int32', 1),
+        lambda: setattr(frozen.optional_nested_message, 'bb', 1),
+        lambda: frozen.repeated_int32.append(1),
+        lambda: frozen.repeated_nested_message.add(),
+        lambda: frozen.repeated_nested_message[0].ClearField('bb'),
+        lambda: frozen.ClearField('optional_int32'),
+        lambda: frozen.Clear(),
+        lambda: frozen.MergeFrom(msg),
+        lambda: frozen.CopyFrom(msg),
+        lambda: frozen.ParseFromString(b''),
+    ]
+    for mutation in mutations:
+      with self.assertRaisesRegex(ValueError,
+                                  r'^Cannot modify a frozen message\.$'):
+        mutation()
+    self.assertNotEqual(msg, frozen)
+
+    # Copies of frozen messages are mutable.
+    copy = message_module.TestAllTypes()
+    copy.CopyFrom(frozen)
+    copy.optional_int32 = 1
+    self.assertEqual(1, copy.optional_int32)
+
+  def test_frozen_unset_fields(self, message_module):
+    frozen = proto.frozen(message_module.TestAllTypes())
+    self.assertEqual(0, frozen.optional_nested_message.bb)
+    self.assertEqual(0, len(frozen.repeated_nested_message))
+    with self.assertRaises(ValueError):
+      frozen.optional_nested_message.bb = 1
+    with self.assertRaises(ValueError):
+      frozen.optional_nested_message.SetInParent()
+    with self.assertRaises(ValueError):
+      frozen.repeated_nested_message.add()
+    with self.assertRaises(ValueError):
+      frozen.repeated_string.extend(['a'])
+    self.assertFalse(frozen.HasField('optional_nested_message'))
+    self.assertEqual(b'', frozen.SerializeToString())
+
+  def test_frozen_caches(self, message_module):
+    msg = message_module.TestAllTypes()
+    test_util.SetAllFields(msg)
+    frozen = proto.frozen(msg)
+    self.assertEqual(proto.serialize(msg), proto.serialize(frozen))
+    self.assertIs(proto.serialize(frozen), proto.serialize(frozen))
+    json = json_format.MessageToJson(frozen)
+    self.assertEqual(json_format.MessageToJson(msg), json)
+    self.assertIs(json, json_format.MessageToJson(frozen))
+    self.assertNotEqual(json, json_format.MessageToJson(frozen, indent=0))
+
+  def test_frozen_hash(self, message_module):
+    msg = message_module.TestAllTypes(optional_int32=1)
+    frozen = proto.frozen(msg)
+    with self.assertRaises(TypeError):
+      hash(msg)
+    self.assertEqual(hash(frozen), hash(proto.frozen(msg)))
+    cache = {frozen: 'value'}
+    self.assertEqual('value', cache[proto.frozen(msg)])
+    self.assertNotIn(proto.frozen(message_module.TestAllTypes()), cache)
+
+  def test_frozen_hash_consistent_with_eq(self, message_module):
+    map_a = map_unittest_pb2.TestMap()
+    map_b = map_unittest_pb2.TestMap()
+    for key in (5, 1):
+      map_a.map_int32_foreign_message[key].c = key
+    for key in (1, 5):
+      map_b.map_int32_foreign_message[key].c = key
+    pairs = [
+        (unittest_pb2.TestAllTypes(optional_double=0.0),
+         unittest_pb2.TestAllTypes(optional_double=-0.0)),
+        (unittest_pb2.TestEmptyMessage.FromString(b'\x08\x01\x10\x02'),
+         unittest_pb2.TestEmptyMessage.FromString(b'\x10\x02\x08\x01')),
+        (map_a, map_b),
+    ]
+    if api_implementation.Type() == 'upb':
+      # upb compares doubles bitwise, so 0.0 and -0.0 are not equal.
+      del pairs[0]
+    for a, b in pairs:
+      a = proto.frozen(a)
+      b = proto.frozen(b)
+      self.assertEqual(a, b)
+      self.assertEqual(hash(a), hash(b))
+      self.assertEqual(1, len({a, b}))
+
+  def test_frozen_copy(self, message_module):
+    msg = message_module.TestAllTypes()
+    test_util.SetAllFields(msg)
+    frozen = proto.frozen(msg)
+    clone = copy.deepcopy(frozen)
+    self.assertFalse(proto.is_frozen(clone))
+    self.assertEqual(frozen, clone)
+    clone.optional_nested_message.bb = 1
+    clone.repeated_nested_message[0].bb = 2
+    clone.repeated_int32.append(3)
+    clone.ClearField('optional_foreign_message')
+    self.assertFalse(proto.is_frozen(clone.optional_import_message))
+    self.assertEqual(1, clone.optional_nested_message.bb)
+    self.assertEqual(2, clone.repeated_nested_message[0].bb)
+    self.assertEqual(3, clone.repeated_int32[-1])
+    self.assertFalse(clone.HasField('optional_foreign_message'))
+    self.assertEqual(msg, frozen)
+
+    # Copies of copies, and merging into copies.
+    clone = copy.deepcopy(copy.deepcopy(frozen))
+    clone.MergeFrom(msg)
+    clone.MergeFromString(proto.serialize(msg))
+    expected = copy.deepcopy(msg)
+    expected.MergeFrom(msg)
+    expected.MergeFromString(proto.serialize(msg))
+    self.assertEqual(expected, clone)
+    self.assertEqual(msg, frozen)
+
+    clone = message_module.TestAllTypes()
+    clone.CopyFrom(frozen)
+    clone.DiscardUnknownFields()
+    self.assertEqual(proto.serialize(msg), proto.serialize(clone))
+    self.assertEqual(msg, frozen)
+
+    # The values listed by ListFields() can be modified, like through getters.
+    clone = message_module.TestAllTypes()
+    clone.CopyFrom(frozen)
+    for field, value in clone.ListFields():
+      if field.name == 'optional_nested_message':
+        value.bb = 3
+      elif field.name == 'repeated_nested_message':
+        value[0].bb = 4
+      elif field.name == 'repeated_int32':
+        value.append(5)
+    self.assertEqual(3, clone.optional_nested_message.bb)
+    self.assertEqual(4, clone.repeated_nested_message[0].bb)
+    self.assertEqual(5, clone.repeated_int32[-1])
+    self.assertEqual(msg, frozen)
+
+  def test_frozen_copy_oneof(self, message_module):
+    frozen = proto.frozen(
+        message_module.TestAllTypes(
+            oneof_nested_message=message_module.TestAllTypes.NestedMessage(
+                bb=1)))
+    clone = copy.deepcopy(frozen)
+    self.assertEqual('oneof_nested_message', clone.WhichOneof('oneof_field'))
+    clone.oneof_nested_message.bb = 2
+    clone.oneof_uint32 = 3
+    self.assertEqual('oneof_uint32', clone.WhichOneof('oneof_field'))
+    self.assertEqual(1, frozen.oneof_nested_message.bb)
+
+  def test_to_dict(self, message_module):
+    msg = message_module.TestAllTypes()
+    test_util.SetAllFields(msg)
+    values = proto.to_dict(msg)
+    self.assertEqual(msg.optional_int64, values['optional_int64'])
+    self.assertIsInstance(values['optional_int64'], int)
+    self.assertEqual(msg.optional_bytes, values['optional_bytes'])
+    self.assertEqual(msg.optional_nested_enum, values['optional_nested_enum'])
+    self.assertEqual({'bb': msg.optional_nested_message.bb},
+                     values['optional_nested_message'])
+    self.assertEqual(list(msg.repeated_int32), values['repeated_int32'])
+    self.assertEqual([{'bb': element.bb}
+                      for element in msg.repeated_nested_message],
+                     values['repeated_nested_message'])
+    self.assertEqual(msg, proto.from_dict(message_module.TestAllTypes, values))
+    self.assertEqual({}, proto.to_dict(message_module.TestAllTypes()))
+    self.assertEqual(
+        {}, proto.to_dict(message_module.TestAllTypes().optional_nested_message))
+
+  def test_equals(self, message_module):
+    msg = message_module.TestAllTypes()
+    test_util.SetAllFields(msg)
+    other = message_module.TestAllTypes.FromString(msg.SerializeToString())
+    self.assertTrue(proto.equals(msg, other))
+    self.assertTrue(proto.equals(msg, other, ignore_repeated_order=True,
+                                 float_tolerance=0.0))
+    other.repeated_nested_message[0].bb += 1
+    self.assertFalse(proto.equals(msg, other))
+    self.assertFalse(proto.equals(msg, other, ignore_repeated_order=True))
+    self.assertFalse(proto.equals(msg, message_module.ForeignMessage(),
+                                  ignore_repeated_order=True))
+
+  def test_equals_ignore_repeated_order(self, message_module):
+    msg = message_module.TestAllTypes(
+        repeated_int32=[1, 2, 2, 3],
+        repeated_string=['a', 'b'],
+        repeated_nested_message=[{'bb': 1}, {'bb': 2}])
+    other = message_module.TestAllTypes(
+        repeated_int32=[1, 2, 3, 2],
+        repeated_string=['b', 'a'],
+        repeated_nested_message=[{'bb': 2}, {'bb': 1}])
+    self.assertFalse(proto.equals(msg, other))
+    self.assertTrue(proto.equals(msg, other, ignore_repeated_order=True))
+    other.repeated_int32[3] = 3
+    self.assertFalse(proto.equals(msg, other, ignore_repeated_order=True))
+
+  def test_equals_ignore_repeated_order_within_tolerance(self, message_module):
+    # Matching 1.0 with 1.4, within the tolerance, leaves 1.5 and 0.95.
+    self.assertTrue(proto.equals(
+        message_module.TestAllTypes(repeated_double=[1.0, 1.5]),
+        message_module.TestAllTypes(repeated_double=[1.4, 0.95]),
+        ignore_repeated_order=True, float_tolerance=0.5))
+    self.assertTrue(proto.equals(
+        message_module.TestAllTypes(repeated_double=[1.0, 1.5, 2.0]),
+        message_module.TestAllTypes(repeated_double=[1.4, 1.9, 0.95]),
+        ignore_repeated_order=True, float_tolerance=0.5))
+    self.assertFalse(proto.equals(
+        message_module.TestAllTypes(repeated_double=[1.0, 1.5, 2.0]),
+        message_module.TestAllTypes(repeated_double=[1.4, 1.9, 0.45]),
+        ignore_repeated_order=True, float_tolerance=0.5))
+    self.assertFalse(proto.equals(
+        message_module.TestAllTypes(repeated_double=[1.0, 1.5]),
+        message_module.TestAllTypes(repeated_double=[1.4, 0.95]),
+        float_tolerance=0.5))
+
+  def test_equals_float_tolerance(self, message_module):
+    msg = message_module.TestAllTypes(
+        optional_double=1.0, repeated_float=[0.5],
+        optional_nested_message={'bb': 1})
+    other = message_module.TestAllTypes(
+        optional_double=1.0 + 1e-9, repeated_float=[0.5 + 1e-6],
+        optional_nested_message={'bb': 1})
+    self.assertFalse(proto.equals(msg, other))
+    self.assertTrue(proto.equals(msg, other, float_tolerance=1e-5))
+    self.assertFalse(proto.equals(msg, other, float_tolerance=1e-12))
+    msg.optional_nested_message.bb = 2
+    self.assertFalse(proto.equals(msg, other, float_tolerance=1e-5))
+
 
 _EXPECTED_PROTO3 = b'\x04r\x02hi\x06\x08\x01r\x02hi\x06\x08\x02r\x02hi'
 _EXPECTED_PROTO2 = b'\x06\x08\x00r\x02hi\x06\x08\x01r\x02hi\x06\x08\x02r\x02hi'
 
 
+@testing_refleaks.TestCase
+class FrozenTest(unittest.TestCase):
+
+  def test_frozen_map(self):
+    msg = map_unittest_pb2.TestMap()
+    msg.map_int32_int32[1] = 2
+    msg.map_int32_foreign_message[3].c = 4
+    frozen = proto.frozen(msg)
+    self.assertEqual(2, frozen.map_int32_int32[1])
+    self.assertEqual(4, frozen.map_int32_foreign_message[3].c)
+    mutations = [
+        lambda: frozen.map_int32_int32.__setitem__(1, 3),
+        lambda: frozen.map_int32_int32.__delitem__(1),
+        lambda: frozen.map_int32_int32.clear(),
+        # Looking up a missing key would insert it.
+        lambda: frozen.map_int32_int32[5],
+        lambda: frozen.map_int32_foreign_message[5],
+        lambda: setattr(frozen.map_int32_foreign_message[3], 'c', 5),
+        lambda: frozen.map_string_string.update(a='b'),
+    ]
+    for mutation in mutations:
+      with self.assertRaises(ValueError):
+        mutation()
+    self.assertEqual(msg, frozen)
+
+  def test_frozen_map_copy(self):
+    msg = map_unittest_pb2.TestMap()
+    msg.map_int32_int32[1] = 2
+    msg.map_int32_foreign_message[3].c = 4
+    frozen = proto.frozen(msg)
+    clone = copy.deepcopy(frozen)
+    clone.map_int32_int32[1] = 3
+    clone.map_int32_foreign_message[3].c = 5
+    clone.map_int32_foreign_message[6].c = 7
+    self.assertEqual(3, clone.map_int32_int32[1])
+    self.assertEqual(5, clone.map_int32_foreign_message[3].c)
+    self.assertEqual(7, clone.map_int32_foreign_message[6].c)
+    self.assertEqual(msg, frozen)
+
+  def test_frozen_extension_copy(self):
+    msg = unittest_pb2.TestAllExtensions()
+    test_util.SetAllExtensions(msg)
+    frozen = proto.frozen(msg)
+    clone = copy.deepcopy(frozen)
+    clone.Extensions[unittest_pb2.optional_nested_message_extension].bb = 1
+    clone.Extensions[unittest_pb2.repeated_int32_extension].append(2)
+    self.assertEqual(
+        1, clone.Extensions[unittest_pb2.optional_nested_message_extension].bb)
+    self.assertEqual(
+        2, clone.Extensions[unittest_pb2.repeated_int32_extension][-1])
+    self.assertEqual(msg, frozen)
+
+
+@testing_refleaks.TestCase
+class DictTest(unittest.TestCase):
+
+  def test_map_to_dict(self):
+    msg = map_unittest_pb2.TestMap()
+    msg.map_int32_int32[1] = 2
+    msg.map_string_string['a'] = 'b'
+    msg.map_int32_foreign_message[3].c = 4
+    msg.map_int32_foreign_message[5].SetInParent()
+    values = proto.to_dict(msg)
+    self.assertEqual(
+        {
+            'map_int32_int32': {1: 2},
+            'map_string_string': {'a': 'b'},
+            'map_int32_foreign_message': {3: {'c': 4}, 5: {}},
+        },
+        values,
+    )
+    self.assertEqual(msg, proto.from_dict(map_unittest_pb2.TestMap, values))
+
+  def test_extensions_not_included(self):
+    msg = unittest_pb2.TestAllExtensions()
+    msg.Extensions[unittest_pb2.optional_int32_extension] = 1
+    self.assertEqual({}, proto.to_dict(msg))
+
+  def test_datetime(self):
+    timestamp = datetime.datetime(
+        2020, 1, 2, 3, 4, 5, 6, tzinfo=datetime.timezone.utc)
+    msg = json_format_proto3_pb2.TestTimestamp()
+    msg.value.FromDatetime(timestamp)
+    msg.repeated_value.add().FromDatetime(timestamp)
+    self.assertEqual({'value': {'seconds': msg.value.seconds, 'nanos': 6000},
+                      'repeated_value': [{'seconds': msg.value.seconds,
+                                          'nanos': 6000}]},
+                     proto.to_dict(msg))
+    values = proto.to_dict(msg, use_datetime=True)
+    self.assertEqual({'value': timestamp, 'repeated_value': [timestamp]},
+                     values)
+    self.assertEqual(
+        msg, proto.from_dict(json_format_proto3_pb2.TestTimestamp, values))
+
+    msg = json_format_proto3_pb2.TestDuration()
+    msg.value.seconds = 1
+    msg.repeated_value.add(nanos=2000)
+    values = proto.to_dict(msg, use_datetime=True)
+    self.assertEqual(
+        {'value': datetime.timedelta(seconds=1),
+         'repeated_value': [datetime.timedelta(microseconds=2)]},
+        values)
+    self.assertEqual(
+        msg, proto.from_dict(json_format_proto3_pb2.TestDuration, values))
+
+
+@testing_refleaks.TestCase
+class EqualsTest(unittest.TestCase):
+
+  def test_float_presence(self):
+    # An unset field without presence has the default value 0.
+    self.assertTrue(proto.equals(
+        unittest_proto3_arena_pb2.TestAllTypes(optional_float=1e-9),
+        unittest_proto3_arena_pb2.TestAllTypes(), float_tolerance=1e-6))
+    self.assertFalse(proto.equals(
+        unittest_pb2.TestAllTypes(optional_float=0.0),
+        unittest_pb2.TestAllTypes(), float_tolerance=1.0))
+
+  def test_map(self):
+    msg = map_unittest_pb2.TestMap()
+    msg.map_int32_double[1] = 1.0
+    msg.map_int32_foreign_message[2].c = 3
+    other = map_unittest_pb2.TestMap()
+    other.map_int32_double[1] = 1.0001
+    other.map_int32_foreign_message[2].c = 3
+    self.assertTrue(proto.equals(msg, other, float_tolerance=0.001))
+    self.assertFalse(proto.equals(msg, other, float_tolerance=1e-6))
+    other.map_int32_double[1] = 1.0
+    other.map_int32_foreign_message[4].c = 3
+    self.assertFalse(proto.equals(msg, other, float_tolerance=0.001))
+
+  def test_extensions_and_unknown_fields(self):
+    msg = unittest_pb2.TestAllExtensions()
+    msg.Extensions[unittest_pb2.optional_int32_extension] = 1
+    other = unittest_pb2.TestAllExtensions()
+    self.assertFalse(proto.equals(msg, other, ignore_repeated_order=True))
+    other.Extensions[unittest_pb2.optional_int32_extension] = 1
+    self.assertTrue(proto.equals(msg, other, ignore_repeated_order=True))
+    # Field 500 is not defined in TestAllTypes.
+    unknown = unittest_pb2.TestAllTypes.FromString(b'\xa0\x1f\x01')
+    self.assertFalse(proto.equals(unknown, unittest_pb2.TestAllTypes(),
+                                  ignore_repeated_order=True))
+    self.assertTrue(proto.equals(
+        unknown, unittest_pb2.TestAllTypes.FromString(b'\xa0\x1f\x01'),
+        ignore_repeated_order=True))
+
+
+@testing_refleaks.TestCase
+class DiffTest(unittest.TestCase):
+
+  def test_diff(self):
+    old = unittest_pb2.TestAllTypes(
+        optional_int32=1, optional_string='a',
+        optional_nested_message={'bb': 1},
+        optional_foreign_message={'c': 1},
+        repeated_int32=[1, 2])
+    new = unittest_pb2.TestAllTypes(
+        optional_int32=2, optional_string='a',
+        optional_nested_message={'bb': 2},
+        optional_foreign_message={'c': 1},
+        optional_import_message={'d': 1},
+        repeated_int32=[2, 1])
+    mask, changes = proto.diff(old, new)
+    self.assertEqual(['optional_int32', 'optional_nested_message.bb',
+                      'optional_import_message', 'repeated_int32'],
+                     mask.paths)
+    self.assertEqual({
+        'optional_int32': (1, 2),
+        'optional_nested_message.bb': (1, 2),
+        'optional_import_message': (None, new.optional_import_message),
+        'repeated_int32': ([1, 2], [2, 1]),
+    }, changes)
+    mask.MergeMessage(new, old, replace_message_field=True,
+                      replace_repeated_field=True)
+    self.assertEqual(new, old)
+
+  def test_diff_equal(self):
+    msg = unittest_pb2.TestAllTypes()
+    test_util.SetAllFields(msg)
+    mask, changes = proto.diff(msg, copy.deepcopy(msg))
+    self.assertEqual([], mask.paths)
+    self.assertEqual({}, changes)
+    with self.assertRaises(TypeError):
+      proto.diff(msg, unittest_pb2.TestAllExtensions())
+
+  def test_diff_unset_scalar(self):
+    mask, changes = proto.diff(
+        unittest_proto3_arena_pb2.TestAllTypes(optional_int32=1),
+        unittest_proto3_arena_pb2.TestAllTypes(optional_float=1.0))
+    self.assertEqual(['optional_int32', 'optional_float'], mask.paths)
+    self.assertEqual({'optional_int32': (1, 0), 'optional_float': (0.0, 1.0)},
+                     changes)
+    _, changes = proto.diff(unittest_pb2.TestAllTypes(optional_int32=1),
+                            unittest_pb2.TestAllTypes())
+    self.assertEqual({'optional_int32': (1, None)}, changes)
+
+  def test_diff_map(self):
+    old = map_unittest_pb2.TestMap()
+    old.map_int32_int32[1] = 1
+    old.map_int32_int32[2] = 2
+    old.map_int32_foreign_message[3].c = 3
+    new = map_unittest_pb2.TestMap()
+    new.map_int32_int32[1] = 1
+    new.map_int32_int32[2] = 3
+    new.map_int32_int32[4] = 4
+    new.map_int32_foreign_message[3].c = 3
+    mask, changes = proto.diff(old, new)
+    self.assertEqual(['map_int32_int32'], mask.paths)
+    self.assertEqual({'map_int32_int32': ({2: 2}, {2: 3, 4: 4})}, changes)
+
+  def test_diff_repeated_keys(self):
+    old = unittest_pb2.TestAllTypes(repeated_nested_message=[
+        {'bb': 1}, {'bb': 2}])
+    new = unittest_pb2.TestAllTypes(repeated_nested_message=[
+        {'bb': 2}, {'bb': 3}])
+    _, changes = proto.diff(
+        old, new, repeated_keys={'repeated_nested_message': 'bb'})
+    self.assertEqual({'repeated_nested_message': (
+        {1: old.repeated_nested_message[0]},
+        {3: new.repeated_nested_message[1]})}, changes)
+    with self.assertRaises(ValueError):
+      proto.diff(unittest_pb2.TestAllTypes(repeated_int32=[1]),
+                 unittest_pb2.TestAllTypes(),
+                 repeated_keys={'repeated_int32': 'bb'})
+    # Duplicate keys cannot be matched.
+    with self.assertRaises(ValueError):
+      proto.diff(
+          unittest_pb2.TestAllTypes(
+              repeated_nested_message=[{'bb': 1}, {'bb': 1}]),
+          unittest_pb2.TestAllTypes(repeated_nested_message=[{'bb': 1}]),
+          repeated_keys={'repeated_nested_message': 'bb'})
+    # The keys are checked even if the messages are equal.
+    msg = unittest_pb2.TestAllTypes()
+    for repeated_keys in ({'optional_int32': 'x'},
+                          {'repeated_int32': 'bb'},
+                          {'no_such_field': 'bb'},
+                          {'optional_nested_message.bb': 'bb'},
+                          {'repeated_nested_message': 'no_such_field'},
+                          {'repeated_nested_message.bb': 'bb'}):
+      with self.assertRaises(ValueError):
+        proto.diff(msg, msg, repeated_keys=repeated_keys)
+    nested = unittest_pb2.NestedTestAllTypes()
+    nested.child.payload.repeated_nested_message.add(bb=1)
+    _, changes = proto.diff(
+        unittest_pb2.NestedTestAllTypes(), nested,
+        repeated_keys={'child.payload.repeated_nested_message': 'bb'})
+    self.assertEqual({'child': (None, nested.child)}, changes)
+
+
 @_parameterized.named_parameters(
     ('_proto2', unittest_pb2, _EXPECTED_PROTO2),
     ('_proto3', unittest_proto3_arena_pb2, _EXPECTED_PROTO3),
@@ -31,6 +31,7 @@ import datetime
 from io import BytesIO
 import struct
 import sys
+import types
 import warnings
 import weakref
 
@@ -46,6 +47,7 @@ from google.protobuf.internal import enum_type_wrapper
 from google.protobuf.internal import extension_dict
 from google.protobuf.internal import message_listener as message_listener_mod
 from google.protobuf.internal import type_checkers
+from google.protobuf.internal import type_url_resolver
 from google.protobuf.internal import well_known_types
 from google.protobuf.internal import wire_format
 
@@ -55,6 +57,13 @@ _StructFullTypeName = 'google.protobuf.Struct'
 _ListValueFullTypeName = 'google.protobuf.ListValue'
 _ExtensionDict = extension_dict._ExtensionDict
 
+# NullMessageListener is stateless, so all messages without a parent share it.
+_NULL_LISTENER = message_listener_mod.NullMessageListener()
+# The oneof state of messages that never had a oneof member set.  It is
+# replaced by a dict the first time one is set.
+_NO_ONEOFS = types.MappingProxyType({})
+
+
 class GeneratedProtocolMessageType(type):
 
   """Metaclass for protocol message classes created at runtime from Descriptors.
@@ -165,6 +174,9 @@ class GeneratedProtocolMessageType(type):
 
     cls._message_set_decoders_by_tag = {}
     cls._fields_by_tag = {}
+    # The decoders of the tags parsed so far, see _AddMergeFromStringMethod().
+    cls._decoders_by_tag = {}
+    cls._decoders_by_byte = [None] * 128
     if (descriptor.has_options and
         descriptor.GetOptions().message_set_wire_format):
       cls._message_set_decoders_by_tag[decoder.MESSAGE_SET_ITEM_TAG] = (
@@ -245,7 +257,9 @@ def _AddSlots(message_descriptor, dictionary):
                              '_unknown_fields',
                              '_is_present_in_parent',
                              '_listener',
-                             '_listener_for_children',
+                             '_child_listener',
+                             '_frozen_cache',
+                             '_serialized',
                              '__weakref__',
                              '_oneofs']
 
@@ -276,6 +290,7 @@ def _AttachFieldHelpers(cls, field_descriptor):
   def AddFieldByTag(wiretype, is_packed):
     tag_bytes = encoder.TagBytes(field_descriptor.number, wiretype)
     cls._fields_by_tag[tag_bytes] = (field_descriptor, is_packed)
+    _ForgetDecoderByTag(cls, tag_bytes)
 
   AddFieldByTag(
       type_checkers.FIELD_TYPE_TO_WIRE_TYPE[field_descriptor.type], False
@@ -287,6 +302,22 @@ def _AttachFieldHelpers(cls, field_descriptor):
     AddFieldByTag(wire_format.WIRETYPE_LENGTH_DELIMITED, True)
 
 
+def _DetachFieldHelpers(cls, field_descriptor):
+  """Stops parsing field_descriptor, e.g. an unregistered extension, in cls."""
+  fields_by_tag = cls._fields_by_tag
+  for tag_bytes, (field, _) in list(fields_by_tag.items()):
+    if field is field_descriptor:
+      del fields_by_tag[tag_bytes]
+      _ForgetDecoderByTag(cls, tag_bytes)
+
+
+def _ForgetDecoderByTag(cls, tag_bytes):
+  """Discards the decoder of tag_bytes cached by the parse loop of cls."""
+  cls._decoders_by_tag.pop(tag_bytes, None)
+  if len(tag_bytes) == 1:
+    cls._decoders_by_byte[tag_bytes[0]] = None
+
+
 def _MaybeAddEncoder(cls, field_descriptor):
   if hasattr(field_descriptor, '_encoder'):
     return
@@ -295,9 +326,20 @@ def _MaybeAddEncoder(cls, field_descriptor):
   is_packed = field_descriptor.is_packed
 
   if is_map_entry:
-    field_encoder = encoder.MapEncoder(field_descriptor)
-    sizer = encoder.MapSizer(field_descriptor,
-                             _IsMessageMapField(field_descriptor))
+    entry_fields = field_descriptor.message_type.fields_by_name
+    key_type = entry_fields['key'].type
+    value_type = entry_fields['value'].type
+    key_encoder = type_checkers.TYPE_TO_ENCODER[key_type](1, False, False)
+    value_encoder = type_checkers.TYPE_TO_ENCODER[value_type](2, False, False)
+    key_sizer = type_checkers.TYPE_TO_SIZER[key_type](1, False, False)
+    value_sizer = type_checkers.TYPE_TO_SIZER[value_type](2, False, False)
+    if value_type == _FieldDescriptor.TYPE_MESSAGE:
+      field_encoder = encoder.MapEncoder(
+          field_descriptor, key_encoder, value_encoder, key_sizer, value_sizer)
+    else:
+      field_encoder = encoder.MapEncoder(
+          field_descriptor, key_encoder, value_encoder)
+    sizer = encoder.MapSizer(field_descriptor, key_sizer, value_sizer)
   elif _IsMessageSetExtension(field_descriptor):
     field_encoder = encoder.MessageSetItemEncoder(field_descriptor.number)
     sizer = encoder.MessageSetItemSizer(field_descriptor.number)
@@ -476,115 +518,229 @@ def _ReraiseTypeErrorWithFieldName(message_name, field_name):
   raise exc.with_traceback(sys.exc_info()[2])
 
 
-def _AddInitMethod(message_descriptor, cls):
-  """Adds an __init__ method to cls."""
+def _GetIntegerEnumValue(enum_type, value):
+  """Convert a string or integer enum value to an integer.
 
-  def _GetIntegerEnumValue(enum_type, value):
-    """Convert a string or integer enum value to an integer.
+  If the value is a string, it is converted to the enum value in
+  enum_type with the same name.  If the value is not a string, it's
+  returned as-is.  (No conversion or bounds-checking is done.)
+  """
+  if isinstance(value, str):
+    try:
+      return enum_type.values_by_name[value].number
+    except KeyError:
+      raise ValueError('Enum type %s: unknown label "%s"' % (
+          enum_type.full_name, value))
+  return value
 
-    If the value is a string, it is converted to the enum value in
-    enum_type with the same name.  If the value is not a string, it's
-    returned as-is.  (No conversion or bounds-checking is done.)
-    """
-    if isinstance(value, str):
-      try:
-        return enum_type.values_by_name[value].number
-      except KeyError:
-        raise ValueError('Enum type %s: unknown label "%s"' % (
-            enum_type.full_name, value))
-    return value
 
-  def init(self, **kwargs):
-    self._cached_byte_size = 0
-    self._cached_byte_size_dirty = len(kwargs) > 0
-    self._fields = {}
-    # Contains a mapping from oneof field descriptors to the descriptor
-    # of the currently set field in that oneof field.
-    self._oneofs = {}
+def _InitSubMessage(message, value):
+  """Sets a new element of a repeated or map field from a constructor value.
 
-    # _unknown_fields is () when empty for efficiency, and will be turned into
-    # a list if fields are added.
-    self._unknown_fields = ()
-    self._is_present_in_parent = False
-    self._listener = message_listener_mod.NullMessageListener()
-    self._listener_for_children = _Listener(self)
-    for field_name, field_value in kwargs.items():
-      field = _GetFieldByName(message_descriptor, field_name)
-      if field is None:
-        raise TypeError('%s() got an unexpected keyword argument "%s"' %
-                        (message_descriptor.name, field_name))
-      if field_value is None:
-        # field=None is the same as no field at all.
-        continue
-      if field.label == _FieldDescriptor.LABEL_REPEATED:
+  The value is a dict of field values, a message, or the Python value of a well
+  known type, e.g. a datetime for a Timestamp.
+  """
+  if isinstance(value, dict):
+    message._InitFields(value)
+  elif (isinstance(value, message_mod.Message) or
+        not hasattr(message, '_internal_assign')):
+    message.MergeFrom(value)
+  else:
+    message._internal_assign(value)
+
+
+def _FieldInitializer(message_descriptor, cls, field):
+  """Returns a function setting a field from a constructor keyword argument.
+
+  The function is specialized for the type of the field, so that constructing
+  a message does not branch on the field type for every argument.
+
+  Args:
+    message_descriptor: The descriptor of the message.
+    cls: The class of the message.
+    field: A FieldDescriptor for the field.
+  """
+  field_name = field.name
+  message_type = field.message_type
+
+  if field.label == _FieldDescriptor.LABEL_REPEATED:
+    if _IsMapField(field):
+      if _IsMessageMapField(field):
+        def InitMessageMap(self, field_value):
+          field_copy = field._default_constructor(self)
+          for key in field_value:
+            _InitSubMessage(field_copy[key], field_value[key])
+          self._fields[field] = field_copy
+        return InitMessageMap
+
+      def InitScalarMap(self, field_value):
         field_copy = field._default_constructor(self)
-        if field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE:  # Composite
-          if _IsMapField(field):
-            if _IsMessageMapField(field):
-              for key in field_value:
-                field_copy[key].MergeFrom(field_value[key])
-            else:
-              field_copy.update(field_value)
+        field_copy.update(field_value)
+        self._fields[field] = field_copy
+      return InitScalarMap
+
+    if field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE:
+      def InitRepeatedMessage(self, field_value):
+        field_copy = field._default_constructor(self)
+        for val in field_value:
+          if isinstance(val, dict):
+            field_copy.add(**val)
           else:
-            for val in field_value:
-              if isinstance(val, dict):
-                field_copy.add(**val)
-              else:
-                field_copy.add().MergeFrom(val)
-        else:  # Scalar
-          if field.cpp_type == _FieldDescriptor.CPPTYPE_ENUM:
-            field_value = [_GetIntegerEnumValue(field.enum_type, val)
-                           for val in field_value]
-          field_copy.extend(field_value)
+            _InitSubMessage(field_copy.add(), val)
         self._fields[field] = field_copy
-      elif field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE:
+      return InitRepeatedMessage
+
+    if field.cpp_type == _FieldDescriptor.CPPTYPE_ENUM:
+      enum_type = field.enum_type
+      def InitRepeatedEnum(self, field_value):
         field_copy = field._default_constructor(self)
-        new_val = None
-        if isinstance(field_value, message_mod.Message):
-          new_val = field_value
-        elif isinstance(field_value, dict):
-          if field.message_type.full_name == _StructFullTypeName:
-            field_copy.Clear()
-            if len(field_value) == 1 and 'fields' in field_value:
-              try:
-                field_copy.update(field_value)
-              except:
-                # Fall back to init normal message field
-                field_copy.Clear()
-                new_val = field.message_type._concrete_class(**field_value)
-            else:
+        field_copy.extend(
+            [_GetIntegerEnumValue(enum_type, val) for val in field_value])
+        self._fields[field] = field_copy
+      return InitRepeatedEnum
+
+    def InitRepeatedScalar(self, field_value):
+      field_copy = field._default_constructor(self)
+      field_copy.extend(field_value)
+      self._fields[field] = field_copy
+    return InitRepeatedScalar
+
+  if field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE:
+    def InitMessage(self, field_value):
+      field_copy = field._default_constructor(self)
+      if isinstance(field_value, dict):
+        if message_type.full_name == _StructFullTypeName:
+          field_copy.Clear()
+          if len(field_value) == 1 and 'fields' in field_value:
+            try:
               field_copy.update(field_value)
+            except:
+              # Fall back to init normal message field
+              field_copy.Clear()
+              field_copy._InitFields(field_value)
           else:
-            new_val = field.message_type._concrete_class(**field_value)
-        elif hasattr(field_copy, '_internal_assign'):
-          field_copy._internal_assign(field_value)
+            field_copy.update(field_value)
         else:
-          raise TypeError(
-              'Message field {0}.{1} must be initialized with a '
-              'dict or instance of same class, got {2}.'.format(
-                  message_descriptor.name,
-                  field_name,
-                  type(field_value).__name__,
-              )
-          )
-
-        if new_val:
-          try:
-            field_copy.MergeFrom(new_val)
-          except TypeError:
-            _ReraiseTypeErrorWithFieldName(message_descriptor.name, field_name)
-        self._fields[field] = field_copy
-      else:
-        if field.cpp_type == _FieldDescriptor.CPPTYPE_ENUM:
-          field_value = _GetIntegerEnumValue(field.enum_type, field_value)
+          # Set the fields in place, rather than merging from a new message.
+          field_copy._InitFields(field_value)
+        field_copy._Modified()
+      elif isinstance(field_value, message_mod.Message):
         try:
-          setattr(self, field_name, field_value)
+          field_copy.MergeFrom(field_value)
         except TypeError:
           _ReraiseTypeErrorWithFieldName(message_descriptor.name, field_name)
+      elif hasattr(field_copy, '_internal_assign'):
+        field_copy._internal_assign(field_value)
+      else:
+        raise TypeError(
+            'Message field {0}.{1} must be initialized with a '
+            'dict or instance of same class, got {2}.'.format(
+                message_descriptor.name,
+                field_name,
+                type(field_value).__name__,
+            )
+        )
+      self._fields[field] = field_copy
+    return InitMessage
+
+  setter = getattr(cls, _PropertyName(field_name)).fset
+  if field.cpp_type == _FieldDescriptor.CPPTYPE_ENUM:
+    enum_type = field.enum_type
+    def InitEnum(self, field_value):
+      try:
+        setter(self, _GetIntegerEnumValue(enum_type, field_value))
+      except TypeError:
+        _ReraiseTypeErrorWithFieldName(message_descriptor.name, field_name)
+    return InitEnum
+
+  def InitScalar(self, field_value):
+    try:
+      setter(self, field_value)
+    except TypeError:
+      _ReraiseTypeErrorWithFieldName(message_descriptor.name, field_name)
+  return InitScalar
+
+
+def _AddInitMethod(message_descriptor, cls):
+  """Adds an __init__ method to cls."""
+
+  # Maps keyword argument names to the functions returned by
+  # _FieldInitializer().  Filled on first use of each field, since the classes
+  # of nested messages may not exist yet.
+  initializers = {}
+
+  def GetInitializer(field_name):
+    initializer = initializers.get(field_name)
+    if initializer is None:
+      field = _GetFieldByName(message_descriptor, field_name)
+      initializer = _FieldInitializer(message_descriptor, cls, field)
+      initializers[field_name] = initializer
+    return initializer
+
+  def InitFields(self, field_values):
+    for field_name, field_value in field_values.items():
+      initializer = initializers.get(field_name) or GetInitializer(field_name)
+      if field_value is not None:
+        # field=None is the same as no field at all.
+        initializer(self, field_value)
+
+  def init(self, **kwargs):
+    self._cached_byte_size = 0
+    self._cached_byte_size_dirty = len(kwargs) > 0
+    self._fields = {}
+    # Contains a mapping from oneof field descriptors to the descriptor
+    # of the currently set field in that oneof field.  _NO_ONEOFS when empty
+    # for efficiency, and will be turned into a dict if a oneof is set.
+    self._oneofs = _NO_ONEOFS
+
+    # _unknown_fields is () when empty for efficiency, and will be turned into
+    # a list if fields are added.  Each element holds one or more serialized
+    # fields, which are written back verbatim.
+    self._unknown_fields = ()
+    self._is_present_in_parent = False
+    self._listener = _NULL_LISTENER
+    # Created by _listener_for_children, once the message gets a child.
+    self._child_listener = None
+    # Values cached by a frozen message, None while it is mutable.
+    self._frozen_cache = None
+    # The span of the buffer the message was parsed from, when parsed with
+    # decoder.RetainingBuffer().  It is serialized instead of the fields while
+    # the message is not modified.
+    self._serialized = None
+    if kwargs:
+      InitFields(self, kwargs)
+
+  def FromDict(field_values):
+    message = cls()
+    if field_values:
+      message._cached_byte_size_dirty = True
+      InitFields(message, field_values)
+    return message
+
+  def FromTuples(field_names, rows):
+    """Returns a list of new messages, each with the named fields set from the
+    values of a row."""
+    row_initializers = [GetInitializer(name) for name in field_names]
+    messages = []
+    for row in rows:
+      if len(row) != len(row_initializers):
+        raise ValueError('Expected %d field values, got %d.' %
+                         (len(row_initializers), len(row)))
+      message = cls()
+      if row_initializers:
+        message._cached_byte_size_dirty = True
+        for initializer, field_value in zip(row_initializers, row):
+          if field_value is not None:
+            initializer(message, field_value)
+      messages.append(message)
+    return messages
 
   init.__module__ = None
   init.__doc__ = None
   cls.__init__ = init
+  cls._InitFields = InitFields
+  cls._FromTuples = staticmethod(FromTuples)
+  cls.FromDict = staticmethod(FromDict)
 
 
 def _GetFieldByName(message_descriptor, field_name):
@@ -669,6 +825,8 @@ def _AddPropertiesForRepeatedField(field, cls):
     if field_value is None:
       # Construct a new object to represent this field.
       field_value = field._default_constructor(self)
+      if self._frozen_cache is not None:
+        field_value._Freeze()
 
       # Atomically check if another thread has preempted us and, if not, swap
       # in the new object we just created.  If someone has preempted us, we
@@ -677,6 +835,8 @@ def _AddPropertiesForRepeatedField(field, cls):
       #   in CPython but we haven't investigated others.  This warning appears
       #   in several other locations in this file.
       field_value = self._fields.setdefault(field, field_value)
+    elif field_value._frozen and self._frozen_cache is None:
+      field_value = _ThawField(self, field, field_value)
     return field_value
   getter.__module__ = None
   getter.__doc__ = 'Getter for %s.' % proto_field_name
@@ -716,6 +876,8 @@ def _AddPropertiesForNonRepeatedScalarField(field, cls):
 
   def field_setter(self, new_value):
     # pylint: disable=protected-access
+    if self._frozen_cache is not None:
+      containers._RaiseFrozen(self)
     # Testing the value for truthiness captures all of the proto3 defaults
     # (0, 0.0, enum 0, and False).
     try:
@@ -768,6 +930,8 @@ def _AddPropertiesForNonRepeatedCompositeField(field, cls):
     if field_value is None:
       # Construct a new object to represent this field.
       field_value = field._default_constructor(self)
+      if self._frozen_cache is not None:
+        field_value._Freeze()
 
       # Atomically check if another thread has preempted us and, if not, swap
       # in the new object we just created.  If someone has preempted us, we
@@ -776,6 +940,9 @@ def _AddPropertiesForNonRepeatedCompositeField(field, cls):
       #   in CPython but we haven't investigated others.  This warning appears
       #   in several other locations in this file.
       field_value = self._fields.setdefault(field, field_value)
+    elif (field_value._frozen_cache is not None and
+          self._frozen_cache is None):
+      field_value = _ThawField(self, field, field_value)
     return field_value
   getter.__module__ = None
   getter.__doc__ = 'Getter for %s.' % proto_field_name
@@ -822,7 +989,11 @@ def _AddPropertiesForExtensions(descriptor, cls):
     pool = descriptor.file.pool
 
 def _AddStaticMethods(cls):
-  def FromString(s):
+  def FromString(s, arena=None):
+    # Pure python messages are garbage collected individually, the arena is
+    # only checked for consistency with the upb backend.
+    if arena is not None and arena.closed:
+      raise ValueError('Arena is closed.')
     message = cls()
     message.MergeFromString(s)
     return message
@@ -841,12 +1012,26 @@ def _IsPresent(item):
     return True
 
 
+def _ListPresentFields(self):
+  """Returns the fields of ListFields(), without copying shared frozen values.
+
+  For the methods which only read the values.
+  """
+  all_fields = [item for item in self._fields.items() if _IsPresent(item)]
+  all_fields.sort(key = lambda item: item[0].number)
+  return all_fields
+
+
 def _AddListFieldsMethod(message_descriptor, cls):
   """Helper for _AddMessageMethods()."""
 
   def ListFields(self):
-    all_fields = [item for item in self._fields.items() if _IsPresent(item)]
-    all_fields.sort(key = lambda item: item[0].number)
+    all_fields = _ListPresentFields(self)
+    if self._frozen_cache is None:
+      # Like the getters, return mutable copies of the values shared with a
+      # frozen message.
+      all_fields = [(field, _UnshareField(self, field, value))
+                    for field, value in all_fields]
     return all_fields
 
   cls.ListFields = ListFields
@@ -894,6 +1079,8 @@ def _AddHasFieldMethod(message_descriptor, cls):
 def _AddClearFieldMethod(message_descriptor, cls):
   """Helper for _AddMessageMethods()."""
   def ClearField(self, field_name):
+    if self._frozen_cache is not None:
+      containers._RaiseFrozen(self)
     try:
       field = message_descriptor.fields_by_name[field_name]
     except KeyError:
@@ -933,6 +1120,8 @@ def _AddClearExtensionMethod(cls):
   """Helper for _AddMessageMethods()."""
   def ClearExtension(self, field_descriptor):
     extension_dict._VerifyExtensionHandle(self, field_descriptor)
+    if self._frozen_cache is not None:
+      containers._RaiseFrozen(self)
 
     # Similar to ClearField(), above.
     if field_descriptor in self._fields:
@@ -971,10 +1160,6 @@ def _InternalUnpackAny(msg):
   # TODO: Don't use the factory of generated messages.
   # To make Any work with custom factories, use the message factory of the
   # parent message.
-  # pylint: disable=g-import-not-at-top
-  from google.protobuf import symbol_database
-  factory = symbol_database.Default()
-
   type_url = msg.type_url
 
   if not type_url:
@@ -982,22 +1167,37 @@ def _InternalUnpackAny(msg):
 
   # TODO: For now we just strip the hostname.  Better logic will be
   # required.
-  type_name = type_url.split('/')[-1]
-  descriptor = factory.pool.FindMessageTypeByName(type_name)
-
-  if descriptor is None:
-    return None
-
-  # Unable to import message_factory at top because of circular import.
-  # pylint: disable=g-import-not-at-top
-  from google.protobuf import message_factory
-  message_class = message_factory.GetMessageClass(descriptor)
+  message_class = type_url_resolver.Default().Resolve(type_url)
   message = message_class()
 
   message.ParseFromString(msg.value)
   return message
 
 
+def _FieldsEqual(fields, other_fields):
+  """Returns whether two _fields dicts have the same present fields.
+
+  This is equivalent to comparing the results of ListFields(), but stops at the
+  first difference and does not build or sort the lists.
+  """
+  count = 0
+  for item in fields.items():
+    if _IsPresent(item):
+      field, value = item
+      other_value = other_fields.get(field)
+      if other_value is None or not _IsPresent((field, other_value)):
+        return False
+      # Like the comparison of lists, which also considers identical NaN
+      # values equal.
+      if value is not other_value and value != other_value:
+        return False
+      count += 1
+  for item in other_fields.items():
+    if _IsPresent(item):
+      count -= 1
+  return count == 0
+
+
 def _AddEqualsMethod(message_descriptor, cls):
   """Helper for _AddMessageMethods()."""
   def __eq__(self, other):
@@ -1017,21 +1217,27 @@ def _AddEqualsMethod(message_descriptor, cls):
     if self is other:
       return True
 
-    if self.DESCRIPTOR.full_name == _AnyFullTypeName:
+    # Identical payloads are compared as bytes, without parsing them.
+    if self.DESCRIPTOR.full_name == _AnyFullTypeName and (
+        self.type_url != other.type_url or self.value != other.value):
       any_a = _InternalUnpackAny(self)
       any_b = _InternalUnpackAny(other)
       if any_a and any_b:
         return any_a == any_b
 
-    if not self.ListFields() == other.ListFields():
+    if not _FieldsEqual(self._fields, other._fields):
       return False
 
+    if not self._unknown_fields and not other._unknown_fields:
+      return True
+    if self._unknown_fields == other._unknown_fields:
+      return True
     # TODO: Fix UnknownFieldSet to consider MessageSet extensions,
     # then use it for the comparison.
-    unknown_fields = list(self._unknown_fields)
-    unknown_fields.sort()
-    other_unknown_fields = list(other._unknown_fields)
-    other_unknown_fields.sort()
+    # pylint: disable=protected-access
+    unknown_fields = sorted(decoder._SplitUnknownFields(self._unknown_fields))
+    other_unknown_fields = sorted(
+        decoder._SplitUnknownFields(other._unknown_fields))
     return unknown_fields == other_unknown_fields
 
   cls.__eq__ = __eq__
@@ -1101,6 +1307,8 @@ def _AddByteSizeMethod(message_descriptor, cls):
     if not self._cached_byte_size_dirty:
       return self._cached_byte_size
 
+    # The message was modified since it was parsed.
+    self._serialized = None
     size = 0
     descriptor = self.DESCRIPTOR
     if descriptor._is_map_entry:
@@ -1112,15 +1320,16 @@ def _AddByteSizeMethod(message_descriptor, cls):
       _MaybeAddEncoder(cls, value_field)
       size += value_field._sizer(self.value)
     else:
-      for field_descriptor, field_value in self.ListFields():
+      for field_descriptor, field_value in _ListPresentFields(self):
         _MaybeAddEncoder(cls, field_descriptor)
         size += field_descriptor._sizer(field_value)
-      for tag_bytes, value_bytes in self._unknown_fields:
-        size += len(tag_bytes) + len(value_bytes)
+      for unknown_fields in self._unknown_fields:
+        size += len(unknown_fields)
 
     self._cached_byte_size = size
     self._cached_byte_size_dirty = False
-    self._listener_for_children.dirty = False
+    if self._child_listener is not None:
+      self._child_listener.dirty = False
     return size
 
   cls.ByteSize = ByteSize
@@ -1130,12 +1339,21 @@ def _AddSerializeToStringMethod(message_descriptor, cls):
   """Helper for _AddMessageMethods()."""
 
   def SerializeToString(self, **kwargs):
+    cache = self._frozen_cache
+    if cache is not None:
+      key = ('SerializeToString', kwargs.get('deterministic'))
+      serialized = cache.get(key)
+      if serialized is not None:
+        return serialized
     # Check if the message has all of its required fields set.
     if not self.IsInitialized():
       raise message_mod.EncodeError(
           'Message %s is missing required fields: %s' % (
           self.DESCRIPTOR.full_name, ','.join(self.FindInitializationErrors())))
-    return self.SerializePartialToString(**kwargs)
+    serialized = self.SerializePartialToString(**kwargs)
+    if cache is not None:
+      cache[key] = serialized
+    return serialized
   cls.SerializeToString = SerializeToString
 
 
@@ -1143,9 +1361,25 @@ def _AddSerializePartialToStringMethod(message_descriptor, cls):
   """Helper for _AddMessageMethods()."""
 
   def SerializePartialToString(self, **kwargs):
+    cache = self._frozen_cache
+    if cache is not None:
+      key = ('SerializePartialToString', kwargs.get('deterministic'))
+      serialized = cache.get(key)
+      if serialized is not None:
+        return serialized
     out = BytesIO()
-    self._InternalSerialize(out.write, **kwargs)
-    return out.getvalue()
+    # Strings encoded to size sub-messages are not encoded again to write them.
+    options = encoder._options  # pylint: disable=protected-access
+    previous = options.encoded_strings
+    options.encoded_strings = {}
+    try:
+      self._InternalSerialize(out.write, **kwargs)
+    finally:
+      options.encoded_strings = previous
+    serialized = out.getvalue()
+    if cache is not None:
+      cache[key] = serialized
+    return serialized
   cls.SerializePartialToString = SerializePartialToString
 
   def InternalSerialize(self, write_bytes, deterministic=None):
@@ -1154,6 +1388,12 @@ def _AddSerializePartialToStringMethod(message_descriptor, cls):
           api_implementation.IsPythonDefaultSerializationDeterministic())
     else:
       deterministic = bool(deterministic)
+    if (not deterministic and self._serialized is not None and
+        not self._cached_byte_size_dirty):
+      # The message was not modified since it was parsed.  A deterministic
+      # serialization encodes it instead, since the parsed span may not be
+      # deterministic.
+      return write_bytes(self._serialized)
 
     descriptor = self.DESCRIPTOR
     if descriptor._is_map_entry:
@@ -1165,18 +1405,19 @@ def _AddSerializePartialToStringMethod(message_descriptor, cls):
       _MaybeAddEncoder(cls, value_field)
       value_field._encoder(write_bytes, self.value, deterministic)
     else:
-      for field_descriptor, field_value in self.ListFields():
+      for field_descriptor, field_value in _ListPresentFields(self):
         _MaybeAddEncoder(cls, field_descriptor)
         field_descriptor._encoder(write_bytes, field_value, deterministic)
-      for tag_bytes, value_bytes in self._unknown_fields:
-        write_bytes(tag_bytes)
-        write_bytes(value_bytes)
+      for unknown_fields in self._unknown_fields:
+        write_bytes(unknown_fields)
   cls._InternalSerialize = InternalSerialize
 
 
 def _AddMergeFromStringMethod(message_descriptor, cls):
   """Helper for _AddMessageMethods()."""
   def MergeFromString(self, serialized):
+    if self._frozen_cache is not None:
+      containers._RaiseFrozen(self)
     serialized = memoryview(serialized)
     length = len(serialized)
     try:
@@ -1194,8 +1435,36 @@ def _AddMergeFromStringMethod(message_descriptor, cls):
 
   local_ReadTag = decoder.ReadTag
   local_SkipField = decoder.SkipField
+  local_options = decoder._options  # pylint: disable=protected-access
   fields_by_tag = cls._fields_by_tag
   message_set_decoders_by_tag = cls._message_set_decoders_by_tag
+  # The parse loop dispatches on the raw bytes of the tags.  The decoders of
+  # one-byte tags, i.e. of the fields numbered up to 15, are found by indexing
+  # a list with the byte, the others in a dict.  Both are filled by
+  # FindDecoder() the first time a tag is parsed.  It also resolves MessageSet
+  # items and wraps the decoders of oneof fields, which the loop thus does not
+  # test for.  The one-byte tags of unknown fields are cached as False, so
+  # that they are not looked up again.
+  decoders_by_tag = cls._decoders_by_tag
+  decoders_by_byte = cls._decoders_by_byte
+
+  def FindDecoder(tag_bytes):
+    """Returns the decoder of a tag, or None if the field is unknown."""
+    field_decoder, _ = message_set_decoders_by_tag.get(tag_bytes, (None, None))
+    if field_decoder is None:
+      field_des, is_packed = fields_by_tag.get(tag_bytes, (None, None))
+      if field_des is None:
+        if len(tag_bytes) == 1:
+          decoders_by_byte[tag_bytes[0]] = False
+        return None
+      _MaybeAddDecoder(cls, field_des)
+      field_decoder = field_des._decoders[is_packed]
+      if field_des.containing_oneof:
+        field_decoder = _OneofFieldDecoder(field_decoder, field_des)
+    decoders_by_tag[tag_bytes] = field_decoder
+    if len(tag_bytes) == 1:
+      decoders_by_byte[tag_bytes[0]] = field_decoder
+    return field_decoder
 
   def InternalParse(self, buffer, pos, end):
     """Create a message from serialized bytes.
@@ -1212,46 +1481,91 @@ def _AddMergeFromStringMethod(message_descriptor, cls):
     # Guard against internal misuse, since this function is called internally
     # quite extensively, and its easy to accidentally pass bytes.
     assert isinstance(buffer, memoryview)
+    if not local_options.retain_buffer:
+      return ParseFields(self, buffer, pos, end)
+    # pylint: disable=protected-access
+    is_empty = not self._fields and not self._unknown_fields
+    start = pos
+    pos = ParseFields(self, buffer, pos, end)
+    if is_empty:
+      # The message serializes to the span it was parsed from, as long as it is
+      # not modified.  Its sub-messages were parsed the same way, so they are
+      # not modified either.
+      self._serialized = buffer[start:pos]
+      self._cached_byte_size = pos - start
+      self._cached_byte_size_dirty = False
+      if self._child_listener is not None:
+        self._child_listener.dirty = False
+    else:
+      # The message was merged with the span, which it no longer serializes to.
+      # Its size is computed so that it is not modified either.
+      self.ByteSize()
+    return pos
+  cls._InternalParse = InternalParse
+
+  def ParseFields(self, buffer, pos, end):
+    """Parses the fields of buffer[pos:end] into self, see InternalParse."""
     self._Modified()
     field_dict = self._fields
+    if field_dict:
+      # Decoders merge into the values they find in field_dict.
+      _UnshareFields(self)
     while pos != end:
+      tag_byte = buffer[pos]
+      if tag_byte < 0x80:
+        field_decoder = decoders_by_byte[tag_byte]
+        if field_decoder:
+          pos = field_decoder(buffer, pos + 1, end, self, field_dict)
+          continue
+      else:
+        field_decoder = None
       (tag_bytes, new_pos) = local_ReadTag(buffer, pos)
-      field_decoder, field_des = message_set_decoders_by_tag.get(
-          tag_bytes, (None, None)
-      )
+      if field_decoder is None:
+        field_decoder = decoders_by_tag.get(tag_bytes)
+        if field_decoder is None:
+          field_decoder = FindDecoder(tag_bytes)
       if field_decoder:
         pos = field_decoder(buffer, new_pos, end, self, field_dict)
-        continue
-      field_des, is_packed = fields_by_tag.get(tag_bytes, (None, None))
-      if field_des is None:
-        if not self._unknown_fields:   # pylint: disable=protected-access
-          self._unknown_fields = []    # pylint: disable=protected-access
-        # pylint: disable=protected-access
-        (tag, _) = decoder._DecodeVarint(tag_bytes, 0)
-        field_number, wire_type = wire_format.UnpackTag(tag)
-        if field_number == 0:
-          raise message_mod.DecodeError('Field number 0 is illegal.')
-        # TODO: remove old_pos.
-        old_pos = new_pos
-        (data, new_pos) = decoder._DecodeUnknownField(
-            buffer, new_pos, wire_type)  # pylint: disable=protected-access
-        if new_pos == -1:
-          return pos
-        # TODO: remove _unknown_fields.
-        new_pos = local_SkipField(buffer, old_pos, end, tag_bytes)
+      else:
+        # Skip the run of unknown fields starting here, and keep it as a single
+        # span of the buffer.
+        start = pos
+        while True:
+          # pylint: disable=protected-access
+          (tag, _) = decoder._DecodeVarint(tag_bytes, 0)
+          if not tag >> wire_format.TAG_TYPE_BITS:
+            raise message_mod.DecodeError('Field number 0 is illegal.')
+          new_pos = local_SkipField(buffer, new_pos, end, tag_bytes)
+          if new_pos == -1:
+            break
+          pos = new_pos
+          if pos == end:
+            break
+          (tag_bytes, new_pos) = local_ReadTag(buffer, pos)
+          if (tag_bytes in fields_by_tag or
+              tag_bytes in message_set_decoders_by_tag):
+            break
+        if pos != start:
+          if not self._unknown_fields:   # pylint: disable=protected-access
+            self._unknown_fields = []    # pylint: disable=protected-access
+          unknown_fields = buffer[start:pos]
+          if not local_options.alias_buffer:
+            unknown_fields = unknown_fields.tobytes()
+          self._unknown_fields.append(unknown_fields)
         if new_pos == -1:
           return pos
-        self._unknown_fields.append(
-            (tag_bytes, buffer[old_pos:new_pos].tobytes()))
-        pos = new_pos
-      else:
-        _MaybeAddDecoder(cls, field_des)
-        field_decoder = field_des._decoders[is_packed]
-        pos = field_decoder(buffer, new_pos, end, self, field_dict)
-        if field_des.containing_oneof:
-          self._UpdateOneofState(field_des)
     return pos
-  cls._InternalParse = InternalParse
+
+
+def _OneofFieldDecoder(field_decoder, field):
+  """Wraps the decoder of a field of a oneof to also set the oneof state."""
+
+  def DecodeOneofField(buffer, pos, end, message, field_dict):
+    pos = field_decoder(buffer, pos, end, message, field_dict)
+    message._UpdateOneofState(field)  # pylint: disable=protected-access
+    return pos
+
+  return DecodeOneofField
 
 
 def _AddIsInitializedMethod(message_descriptor, cls):
@@ -1315,7 +1629,7 @@ def _AddIsInitializedMethod(message_descriptor, cls):
       if not self.HasField(field.name):
         errors.append(field.name)
 
-    for field, value in self.ListFields():
+    for field, value in _ListPresentFields(self):
       if field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE:
         if field.is_extension:
           name = '(%s)' % field.full_name
@@ -1368,6 +1682,8 @@ def _AddMergeFromMethod(cls):
                                    _FullyQualifiedClassName(msg.__class__)))
 
     assert msg is not self
+    if self._frozen_cache is not None:
+      containers._RaiseFrozen(self)
     self._Modified()
 
     fields = self._fields
@@ -1376,17 +1692,30 @@ def _AddMergeFromMethod(cls):
       if field.label == LABEL_REPEATED:
         field_value = fields.get(field)
         if field_value is None:
+          if value._frozen:
+            # Frozen values are shared, and copied on first access.
+            fields[field] = value
+            continue
           # Construct a new object to represent this field.
           field_value = field._default_constructor(self)
           fields[field] = field_value
+        elif field_value._frozen:
+          field_value = _ThawField(self, field, field_value)
         field_value.MergeFrom(value)
       elif field.cpp_type == CPPTYPE_MESSAGE:
         if value._is_present_in_parent:
           field_value = fields.get(field)
           if field_value is None:
+            if value._frozen_cache is not None:
+              fields[field] = value
+              if field.containing_oneof:
+                self._UpdateOneofState(field)
+              continue
             # Construct a new object to represent this field.
             field_value = field._default_constructor(self)
             fields[field] = field_value
+          elif field_value._frozen_cache is not None:
+            field_value = _ThawField(self, field, field_value)
           field_value.MergeFrom(value)
       else:
         self._fields[field] = value
@@ -1420,11 +1749,13 @@ def _AddWhichOneofMethod(message_descriptor, cls):
 
 
 def _Clear(self):
+  if self._frozen_cache is not None:
+    containers._RaiseFrozen(self)
   # Clear fields.
   self._fields = {}
   self._unknown_fields = ()
 
-  self._oneofs = {}
+  self._oneofs = _NO_ONEOFS
   self._Modified()
 
 
@@ -1435,6 +1766,11 @@ def _UnknownFields(self):
 
 
 def _DiscardUnknownFields(self):
+  if self._frozen_cache is not None:
+    containers._RaiseFrozen(self)
+  _UnshareFields(self)
+  if self._unknown_fields:
+    self._Modified()
   self._unknown_fields = []
   for field, value in self.ListFields():
     if field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE:
@@ -1449,9 +1785,90 @@ def _DiscardUnknownFields(self):
         value.DiscardUnknownFields()
 
 
+def _Freeze(self):
+  if self._frozen_cache is not None:
+    return
+  self._frozen_cache = {}
+  for field, value in list(self._fields.items()):
+    # Bytes parsed with zero_copy are memoryviews over a buffer which may be
+    # mutable, so they are copied.  bytes() returns bytes objects unchanged.
+    if field.type == _FieldDescriptor.TYPE_BYTES:
+      if field.label == _FieldDescriptor.LABEL_REPEATED:
+        value._values[:] = map(bytes, value._values)
+      else:
+        self._fields[field] = bytes(value)
+    elif (_IsMapField(field) and
+          field.message_type.fields_by_name['value'].type ==
+          _FieldDescriptor.TYPE_BYTES):
+      values = value._values
+      for key, item in values.items():
+        values[key] = bytes(item)
+    if (field.label == _FieldDescriptor.LABEL_REPEATED or
+        field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE):
+      value._Freeze()
+  if self._unknown_fields:
+    self._unknown_fields = [bytes(span) for span in self._unknown_fields]
+
+
+def _FrozenCache(self):
+  return self._frozen_cache
+
+
+def _Thaw(self, listener):
+  """Returns a mutable copy of a frozen message.
+
+  The copy shares the frozen sub-messages and repeated fields of self, which
+  _ThawField() copies in turn when they are first accessed through the copy.
+  Copying a large frozen message and changing a few fields thus only copies
+  the path to the changed fields.
+  """
+  clone = type(self)()
+  clone._fields = self._fields.copy()
+  if self._oneofs is not _NO_ONEOFS:
+    clone._oneofs = self._oneofs.copy()
+  if self._unknown_fields:
+    clone._unknown_fields = list(self._unknown_fields)
+  clone._cached_byte_size = self._cached_byte_size
+  clone._cached_byte_size_dirty = self._cached_byte_size_dirty
+  clone._serialized = self._serialized
+  clone._is_present_in_parent = self._is_present_in_parent
+  clone._SetListener(listener)
+  return clone
+
+
+def _ThawField(self, field, value):
+  """Replaces the frozen value of a field of a mutable message by a copy."""
+  if field.label == _FieldDescriptor.LABEL_REPEATED:
+    listener = self._listener_for_children
+  elif field.containing_oneof is not None:
+    listener = _OneofListener(self, field)
+  else:
+    listener = self._listener_for_children
+  value = value._Thaw(listener)
+  self._fields[field] = value
+  return value
+
+
+def _UnshareField(self, field, value):
+  """Returns the value of a field of a mutable message, thawing it if frozen."""
+  if field.label == _FieldDescriptor.LABEL_REPEATED:
+    if value._frozen:
+      return _ThawField(self, field, value)
+  elif field.cpp_type == _FieldDescriptor.CPPTYPE_MESSAGE:
+    if value._frozen_cache is not None:
+      return _ThawField(self, field, value)
+  return value
+
+
+def _UnshareFields(self):
+  """Thaws all the frozen values of the fields of a mutable message."""
+  for field, value in self._fields.items():
+    _UnshareField(self, field, value)
+
+
 def _SetListener(self, listener):
   if listener is None:
-    self._listener = message_listener_mod.NullMessageListener()
+    self._listener = _NULL_LISTENER
   else:
     self._listener = listener
 
@@ -1480,6 +1897,10 @@ def _AddMessageMethods(message_descriptor, cls):
   cls.Clear = _Clear
   cls.DiscardUnknownFields = _DiscardUnknownFields
   cls._SetListener = _SetListener
+  cls._Freeze = _Freeze
+  cls._FrozenCache = _FrozenCache
+  cls._Thaw = _Thaw
+  cls._UnshareField = _UnshareField
 
 
 def _AddPrivateHelperMethods(message_descriptor, cls):
@@ -1495,10 +1916,7 @@ def _AddPrivateHelperMethods(message_descriptor, cls):
     #   changed such that it does stuff even when _cached_byte_size_dirty is
     #   already true, the callers need to be updated.
     if not self._cached_byte_size_dirty:
-      self._cached_byte_size_dirty = True
-      self._listener_for_children.dirty = True
-      self._is_present_in_parent = True
-      self._listener.Modified()
+      _MarkModified(self)
 
   def _UpdateOneofState(self, field):
     """Sets field as the active field in its containing oneof.
@@ -1506,14 +1924,34 @@ def _AddPrivateHelperMethods(message_descriptor, cls):
     Will also delete currently active field in the oneof, if it is different
     from the argument. Does not mark the message as modified.
     """
+    if self._oneofs is _NO_ONEOFS:
+      self._oneofs = {field.containing_oneof: field}
+      return
     other_field = self._oneofs.setdefault(field.containing_oneof, field)
     if other_field is not field:
       del self._fields[other_field]
       self._oneofs[field.containing_oneof] = field
 
+  def _GetListenerForChildren(self):
+    """Returns the listener for child messages and containers, creating it on
+    first use so that messages without children don't pay for it.
+    """
+    listener = self._child_listener
+    if listener is None:
+      # A listener which is not dirty forwards the next modification to this
+      # message, which is always correct.
+      listener = self._child_listener = _Listener(self)
+    return listener
+
+  def SetInParent(self):
+    if self._frozen_cache is not None:
+      containers._RaiseFrozen(self)
+    self._Modified()
+
   cls._Modified = Modified
-  cls.SetInParent = Modified
+  cls.SetInParent = SetInParent
   cls._UpdateOneofState = _UpdateOneofState
+  cls._listener_for_children = property(_GetListenerForChildren)
 
 
 class _Listener(object):
@@ -1530,6 +1968,8 @@ class _Listener(object):
   This helper class is at the heart of this support.
   """
 
+  __slots__ = ('_parent_message_weakref', 'dirty')
+
   def __init__(self, parent_message):
     """Args:
       parent_message: The message whose _Modified() method we should call when
@@ -1538,11 +1978,12 @@ class _Listener(object):
     # This listener establishes a back reference from a child (contained) object
     # to its parent (containing) object.  We make this a weak reference to avoid
     # creating cyclic garbage when the client finishes with the 'parent' object
-    # in the tree.
+    # in the tree.  A weakref.ref rather than a weakref.proxy, so that the
+    # parent is dereferenced once rather than on each of its attributes.
     if isinstance(parent_message, weakref.ProxyType):
-      self._parent_message_weakref = parent_message
+      self._parent_message_weakref = lambda: parent_message
     else:
-      self._parent_message_weakref = weakref.proxy(parent_message)
+      self._parent_message_weakref = weakref.ref(parent_message)
 
     # As an optimization, we also indicate directly on the listener whether
     # or not the parent message is dirty.  This way we can avoid traversing
@@ -1552,19 +1993,17 @@ class _Listener(object):
   def Modified(self):
     if self.dirty:
       return
-    try:
-      # Propagate the signal to our parents iff this is the first field set.
-      self._parent_message_weakref._Modified()
-    except ReferenceError:
-      # We can get here if a client has kept a reference to a child object,
-      # and is now setting a field on it, but the child's parent has been
-      # garbage-collected.  This is not an error.
-      pass
+    # Propagate the signal to our parents iff this is the first field set.
+    parent_message = self._parent_message_weakref()
+    if parent_message is not None:
+      _MarkModified(parent_message)
 
 
 class _OneofListener(_Listener):
   """Special listener implementation for setting composite oneof fields."""
 
+  __slots__ = ('_field',)
+
   def __init__(self, parent_message, field):
     """Args:
       parent_message: The message whose _Modified() method we should call when
@@ -1576,8 +2015,45 @@ class _OneofListener(_Listener):
 
   def Modified(self):
     """Also updates the state of the containing oneof in the parent message."""
+    parent_message = self._parent_message_weakref()
+    if parent_message is None:
+      return
     try:
-      self._parent_message_weakref._UpdateOneofState(self._field)
-      super(_OneofListener, self).Modified()
+      parent_message._UpdateOneofState(self._field)
     except ReferenceError:
-      pass
+      return
+    super(_OneofListener, self).Modified()
+
+
+def _MarkModified(message):
+  """Marks a message and its not yet modified ancestors as modified.
+
+  This walks up the tree in a loop rather than through the _Modified() and
+  Modified() methods of each message and listener on the way, which would cost
+  two calls per level.
+  """
+  try:
+    while not message._cached_byte_size_dirty:
+      message._cached_byte_size_dirty = True
+      if message._child_listener is not None:
+        message._child_listener.dirty = True
+      message._is_present_in_parent = True
+      listener = message._listener
+      listener_type = type(listener)
+      if listener_type is not _Listener and listener_type is not _OneofListener:
+        # The null listener of a message without parent.
+        listener.Modified()
+        return
+      parent_message = listener._parent_message_weakref()
+      if parent_message is None:
+        return
+      if listener_type is _OneofListener:
+        parent_message._UpdateOneofState(listener._field)
+      if listener.dirty:
+        return
+      message = parent_message
+  except ReferenceError:
+    # We can get here if a client has kept a reference to a child object,
+    # and is now setting a field on it, but the child's parent has been
+    # garbage-collected.  This is not an error.
+    pass
@@ -219,6 +219,31 @@ class ReflectionTest(unittest.TestCase):
     self.assertEqual(11, nested.bb)
     self.assertFalse(proto.HasField('oneof_nested_message'))
 
+  def testModifyingChildAfterByteSize(self, message_module):
+    proto = message_module.TestAllTypes(optional_int32=1)
+    size = proto.ByteSize()
+    proto.optional_nested_message.bb = 5
+    self.assertTrue(proto.HasField('optional_nested_message'))
+    self.assertGreater(proto.ByteSize(), size)
+    proto.optional_nested_message.bb = 300
+    self.assertEqual(
+        proto,
+        message_module.TestAllTypes.FromString(proto.SerializeToString()))
+
+  def testLazyChildListenerAndOneofState(self, message_module):
+    if api_implementation.Type() != 'python':
+      return
+    # pylint: disable=protected-access
+    proto = message_module.TestAllTypes(optional_int32=1, oneof_uint32=2)
+    proto.ByteSize()
+    self.assertIsNone(proto._child_listener)
+    proto.optional_nested_message.bb = 5
+    self.assertIsNotNone(proto._child_listener)
+    proto.Clear()
+    self.assertIsNone(proto.WhichOneof('oneof_field'))
+    proto.oneof_string = 'abc'
+    self.assertEqual('oneof_string', proto.WhichOneof('oneof_field'))
+
   def testGetDefaultMessageAfterDisconnectingDefaultMessage(
       self, message_module):
     proto = message_module.TestAllTypes()
@@ -11,6 +11,11 @@ import threading
 import time
 import unittest
 
+from google.protobuf import descriptor_database
+from google.protobuf import descriptor_pb2
+from google.protobuf import descriptor_pool
+from google.protobuf import unittest_import_pb2
+from google.protobuf import unittest_import_public_pb2
 from google.protobuf import unittest_pb2
 
 
@@ -50,6 +55,64 @@ class ThreadSafeTest(unittest.TestCase):
 
     self.assertEqual(count * 2, self.success)
 
+  def testDescriptorPoolConcurrentLookups(self):
+    thread_count = 32
+    rounds = 5
+    lock = threading.Lock()
+    errors = []
+    message_names = sorted(
+        desc.full_name
+        for desc in unittest_pb2.DESCRIPTOR.message_types_by_name.values())
+    enum_names = sorted(
+        desc.full_name
+        for desc in unittest_pb2.DESCRIPTOR.enum_types_by_name.values())
+
+    def LookUp(pool, barrier):
+      barrier.wait()
+      try:
+        for name in message_names:
+          desc = pool.FindMessageTypeByName(name)
+          # A lookup must never return a descriptor whose file is still being
+          # built by another thread.
+          for field in desc.fields:
+            if field.type == field.TYPE_MESSAGE:
+              assert field.message_type is not None, field.full_name
+            elif field.type == field.TYPE_ENUM:
+              assert field.enum_type is not None, field.full_name
+        for name in enum_names:
+          pool.FindEnumTypeByName(name)
+        pool.FindExtensionByName('protobuf_unittest.optional_int32_extension')
+        pool.FindServiceByName('protobuf_unittest.TestService')
+        pool.FindFileByName(unittest_import_pb2.DESCRIPTOR.name)
+      except Exception as e:  # pylint: disable=broad-except
+        with lock:
+          errors.append(e)
+      else:
+        with lock:
+          self.success += 1
+
+    for _ in range(rounds):
+      # A fresh pool lazily builds its files from the database, so that the
+      # first lookups of all threads race with each other.
+      db = descriptor_database.DescriptorDatabase()
+      for module in (unittest_import_public_pb2, unittest_import_pb2,
+                     unittest_pb2):
+        db.Add(descriptor_pb2.FileDescriptorProto.FromString(
+            module.DESCRIPTOR.serialized_pb))
+      pool = descriptor_pool.DescriptorPool(db)
+      barrier = threading.Barrier(thread_count)
+      threads = [
+          threading.Thread(target=LookUp, args=(pool, barrier))
+          for _ in range(thread_count)
+      ]
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+
+    self.assertEqual([], errors)
+    self.assertEqual(thread_count * rounds, self.success)
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,140 @@
+# Protocol Buffers - Google's data interchange format
+# Copyright 2008 Google Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Resolves Any type URLs to message classes.
+
+json_format, text_format and the pure python Any comparison all need to turn
+a type URL such as 'type.googleapis.com/foo.Bar' into a message class.  Doing
+so means splitting the URL, looking the name up in a descriptor pool and
+fetching the message class for the descriptor, which is noticeable when a
+payload contains thousands of Any messages.  This module caches the resolved
+classes in a bounded LRU cache per descriptor pool.  The pools and classes are
+only weakly referenced, so that a pool which is dropped frees its entries.
+
+Pure python descriptor pools invalidate their entries whenever new files are
+registered.  Only successful lookups are cached, so symbols that are added to
+any pool later are always found.
+"""
+
+import collections
+import threading
+import weakref
+
+_DEFAULT_MAXSIZE = 1024
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class TypeUrlResolver(object):
+  """A bounded LRU cache of type URL to message class resolutions."""
+
+  def __init__(self, maxsize=_DEFAULT_MAXSIZE):
+    """Initializes the resolver.
+
+    Args:
+      maxsize (int): The maximum number of resolved type URLs to keep per
+        descriptor pool.
+    """
+    if maxsize < 1:
+      raise ValueError('maxsize must be positive, got %d' % maxsize)
+    self._maxsize = maxsize
+    # Maps each pool to an OrderedDict of type URL to a weak reference to the
+    # message class, in LRU order.  Message classes reference their pool, so
+    # strong values would keep the keys alive.
+    self._caches = weakref.WeakKeyDictionary()
+    self._lock = threading.Lock()
+    self._hits = 0
+    self._misses = 0
+
+  def Resolve(self, type_url, pool=None):
+    """Returns the message class for a type URL.
+
+    Args:
+      type_url (str): A type URL, e.g. 'type.googleapis.com/foo.Bar'.  A bare
+        full message name is accepted as well.
+      pool (DescriptorPool): The pool to search, or None to use the default
+        pool.
+
+    Returns:
+      The message class for the type URL.
+
+    Raises:
+      KeyError: if the message type can not be found in the pool.
+    """
+    if pool is None:
+      # pylint: disable=g-import-not-at-top
+      from google.protobuf import descriptor_pool
+      pool = descriptor_pool.Default()
+    with self._lock:
+      try:
+        cache = self._caches.get(pool)
+      except TypeError:
+        # The pool can not be weakly referenced, e.g. with the upb backend
+        # before Python 3.9, so it is not cached.
+        cache = None
+      class_ref = cache.get(type_url) if cache else None
+      message_class = class_ref() if class_ref else None
+      if message_class is not None:
+        self._hits += 1
+        cache.move_to_end(type_url)
+        return message_class
+      self._misses += 1
+
+    # The pool lookup may build new files and call back into Invalidate(), so
+    # it must happen outside of the lock.
+    # pylint: disable=g-import-not-at-top
+    from google.protobuf import message_factory
+    type_name = type_url.split('/')[-1]
+    message_descriptor = pool.FindMessageTypeByName(type_name)
+    message_class = message_factory.GetMessageClass(message_descriptor)
+
+    with self._lock:
+      try:
+        cache = self._caches.setdefault(pool, collections.OrderedDict())
+      except TypeError:
+        return message_class
+      cache[type_url] = weakref.ref(message_class)
+      cache.move_to_end(type_url)
+      if len(cache) > self._maxsize:
+        cache.popitem(last=False)
+    return message_class
+
+  def Invalidate(self, pool=None):
+    """Drops cached resolutions.
+
+    Args:
+      pool (DescriptorPool): Only drop the entries resolved against this pool.
+        If None, the whole cache is cleared.
+    """
+    with self._lock:
+      if pool is None:
+        self._caches.clear()
+        return
+      try:
+        self._caches.pop(pool, None)
+      except TypeError:
+        pass
+
+  def CacheInfo(self):
+    """Returns a CacheInfo(hits, misses, maxsize, currsize) tuple."""
+    with self._lock:
+      return CacheInfo(self._hits, self._misses, self._maxsize,
+                       sum(len(cache) for cache in self._caches.values()))
+
+  def ResetCounters(self):
+    """Resets the hit and miss counters."""
+    with self._lock:
+      self._hits = 0
+      self._misses = 0
+
+
+_DEFAULT = TypeUrlResolver()
+
+
+def Default():
+  return _DEFAULT
@@ -0,0 +1,116 @@
+# Protocol Buffers - Google's data interchange format
+# Copyright 2008 Google Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file or at
+# https://developers.google.com/open-source/licenses/bsd
+
+"""Tests for google.protobuf.internal.type_url_resolver."""
+
+import gc
+import unittest
+import weakref
+
+from google.protobuf import any_pb2
+from google.protobuf import descriptor_pb2
+from google.protobuf import descriptor_pool
+from google.protobuf import json_format
+from google.protobuf import text_format
+from google.protobuf.internal import api_implementation
+from google.protobuf.internal import factory_test1_pb2
+from google.protobuf.internal import type_url_resolver
+
+from google.protobuf import unittest_pb2
+
+
+class TypeUrlResolverTest(unittest.TestCase):
+
+  def testResolveAndCounters(self):
+    resolver = type_url_resolver.TypeUrlResolver()
+    type_url = 'type.googleapis.com/protobuf_unittest.TestAllTypes'
+    self.assertIs(resolver.Resolve(type_url), unittest_pb2.TestAllTypes)
+    self.assertIs(resolver.Resolve(type_url), unittest_pb2.TestAllTypes)
+    self.assertIs(
+        resolver.Resolve('protobuf_unittest.TestAllTypes'),
+        unittest_pb2.TestAllTypes)
+    info = resolver.CacheInfo()
+    self.assertEqual(1, info.hits)
+    self.assertEqual(2, info.misses)
+    self.assertEqual(2, info.currsize)
+    resolver.ResetCounters()
+    self.assertEqual((0, 0), resolver.CacheInfo()[:2])
+
+  def testUnknownTypeIsNotCached(self):
+    resolver = type_url_resolver.TypeUrlResolver()
+    with self.assertRaises(KeyError):
+      resolver.Resolve('type.googleapis.com/does.not.Exist')
+    self.assertEqual(0, resolver.CacheInfo().currsize)
+
+  def testLeastRecentlyUsedEviction(self):
+    resolver = type_url_resolver.TypeUrlResolver(maxsize=2)
+    resolver.Resolve('protobuf_unittest.TestAllTypes')
+    resolver.Resolve('protobuf_unittest.ForeignMessage')
+    resolver.Resolve('protobuf_unittest.TestAllTypes')
+    resolver.Resolve('protobuf_unittest.TestEmptyMessage')
+    self.assertEqual(2, resolver.CacheInfo().currsize)
+    resolver.ResetCounters()
+    resolver.Resolve('protobuf_unittest.TestAllTypes')
+    resolver.Resolve('protobuf_unittest.ForeignMessage')
+    self.assertEqual((1, 1), resolver.CacheInfo()[:2])
+
+  def testInvalidMaxsize(self):
+    with self.assertRaises(ValueError):
+      type_url_resolver.TypeUrlResolver(maxsize=0)
+
+  def testInvalidatePool(self):
+    resolver = type_url_resolver.TypeUrlResolver()
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(descriptor_pb2.FileDescriptorProto.FromString(
+        factory_test1_pb2.DESCRIPTOR.serialized_pb))
+    resolver.Resolve('google.protobuf.python.internal.Factory1Message', pool)
+    resolver.Resolve('protobuf_unittest.TestAllTypes')
+    resolver.Invalidate(pool)
+    self.assertEqual(1, resolver.CacheInfo().currsize)
+    resolver.Invalidate()
+    self.assertEqual(0, resolver.CacheInfo().currsize)
+
+  @unittest.skipIf(api_implementation.Type() != 'python',
+                   'Only the python descriptor pool notifies the resolver.')
+  def testPoolMutationInvalidates(self):
+    resolver = type_url_resolver.Default()
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(descriptor_pb2.FileDescriptorProto.FromString(
+        factory_test1_pb2.DESCRIPTOR.serialized_pb))
+    resolver.Resolve('google.protobuf.python.internal.Factory1Message', pool)
+    self.assertIn(pool, resolver._caches)
+    pool.AddSerializedFile(descriptor_pb2.DESCRIPTOR.serialized_pb)
+    self.assertNotIn(pool, resolver._caches)
+
+  def testDroppedPoolIsFreed(self):
+    resolver = type_url_resolver.TypeUrlResolver()
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(descriptor_pb2.FileDescriptorProto.FromString(
+        factory_test1_pb2.DESCRIPTOR.serialized_pb))
+    resolver.Resolve('google.protobuf.python.internal.Factory1Message', pool)
+    pool_ref = weakref.ref(pool)
+    del pool
+    gc.collect()
+    self.assertIsNone(pool_ref())
+    self.assertEqual(0, resolver.CacheInfo().currsize)
+
+  def testAnyHandlingUsesCache(self):
+    resolver = type_url_resolver.Default()
+    any_msg = any_pb2.Any()
+    any_msg.Pack(unittest_pb2.TestAllTypes(optional_int32=5))
+    resolver.ResetCounters()
+    for _ in range(3):
+      self.assertEqual(
+          json_format.MessageToDict(any_msg)['optionalInt32'], 5)
+      self.assertIn('optional_int32: 5', text_format.MessageToString(any_msg))
+    info = resolver.CacheInfo()
+    self.assertGreaterEqual(info.hits, 4)
+    self.assertLessEqual(info.misses, 2)
+
+
+if __name__ == '__main__':
+  unittest.main()
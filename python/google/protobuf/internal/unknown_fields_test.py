@@ -110,6 +110,38 @@ class UnknownFieldsTest(unittest.TestCase):
     message.ParseFromString(self.all_fields.SerializeToString())
     self.assertNotEqual(self.empty_message, message)
 
+  def testEqualsSplitUnknownFields(self):
+    # The same unknown fields, parsed at once or in two pieces.
+    first = unittest_pb2.TestAllTypes(optional_int32=1, optional_string='a')
+    second = unittest_pb2.TestAllTypes(repeated_int64=[2, 3])
+    message = unittest_pb2.TestEmptyMessage()
+    message.MergeFromString(first.SerializeToString())
+    message.MergeFromString(second.SerializeToString())
+    other_message = unittest_pb2.TestEmptyMessage.FromString(
+        first.SerializeToString() + second.SerializeToString())
+    self.assertEqual(other_message, message)
+    self.assertEqual(other_message.SerializeToString(),
+                     message.SerializeToString())
+    self.assertEqual(other_message.ByteSize(), message.ByteSize())
+
+  def testInterleavedUnknownFields(self):
+    unknown_data = (b'\x10\x05'  # 2: 5
+                    b'\x1d\x01\x00\x00\x00'  # 3: fixed32 1
+                    b'\x22\x02ab')  # 4: 'ab'
+    message = unittest_pb2.TestAllTypes.NestedMessage()
+    message.ParseFromString(b'\x08\x01' + unknown_data + b'\x08\x02' +
+                            unknown_data[:2])
+    self.assertEqual(2, message.bb)
+    self.assertEqual(b'\x08\x02' + unknown_data + unknown_data[:2],
+                     message.SerializeToString())
+    self.assertEqual(
+        [(2, wire_format.WIRETYPE_VARINT, 5),
+         (3, wire_format.WIRETYPE_FIXED32, 1),
+         (4, wire_format.WIRETYPE_LENGTH_DELIMITED, b'ab'),
+         (2, wire_format.WIRETYPE_VARINT, 5)],
+        [(field.field_number, field.wire_type, field.data)
+         for field in unknown_fields.UnknownFieldSet(message)])
+
   def testDiscardUnknownFields(self):
     self.empty_message.DiscardUnknownFields()
     self.assertEqual(b'', self.empty_message.SerializeToString())
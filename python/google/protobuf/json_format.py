@@ -28,9 +28,9 @@ from operator import methodcaller
 import re
 
 from google.protobuf import descriptor
-from google.protobuf import message_factory
 from google.protobuf import symbol_database
 from google.protobuf.internal import type_checkers
+from google.protobuf.internal import type_url_resolver
 
 
 _INT_TYPES = frozenset([
@@ -112,6 +112,15 @@ def MessageToJson(
   Returns:
     A string containing the JSON formatted protocol buffer message.
   """
+  # Frozen messages cache their JSON representation for each set of options.
+  cache = message._FrozenCache()  # pylint: disable=protected-access
+  if cache is not None:
+    key = ('MessageToJson', preserving_proto_field_name, indent, sort_keys,
+           use_integers_for_enums, descriptor_pool, float_precision,
+           ensure_ascii, always_print_fields_with_no_presence)
+    json_string = cache.get(key)
+    if json_string is not None:
+      return json_string
   printer = _Printer(
       preserving_proto_field_name,
       use_integers_for_enums,
@@ -119,7 +128,10 @@ def MessageToJson(
       float_precision,
       always_print_fields_with_no_presence
   )
-  return printer.ToJsonString(message, indent, sort_keys, ensure_ascii)
+  json_string = printer.ToJsonString(message, indent, sort_keys, ensure_ascii)
+  if cache is not None:
+    cache[key] = json_string
+  return json_string
 
 
 def MessageToDict(
@@ -413,14 +425,12 @@ def _CreateMessageFromTypeUrl(type_url, descriptor_pool):
   """Creates a message from a type URL."""
   db = symbol_database.Default()
   pool = db.pool if descriptor_pool is None else descriptor_pool
-  type_name = type_url.split('/')[-1]
   try:
-    message_descriptor = pool.FindMessageTypeByName(type_name)
+    message_class = type_url_resolver.Default().Resolve(type_url, pool)
   except KeyError as e:
     raise TypeError(
         'Can not find message descriptor by type_url: {0}'.format(type_url)
     ) from e
-  message_class = message_factory.GetMessageClass(message_descriptor)
   return message_class()
 
 
@@ -13,6 +13,8 @@
 
 __author__ = 'robinson@google.com (Will Robinson)'
 
+import collections.abc
+
 class Error(Exception):
   """Base error type for this module."""
   pass
@@ -65,7 +67,14 @@ class Message(object):
     return not self == other_msg
 
   def __hash__(self):
-    raise TypeError('unhashable object')
+    cache = self._FrozenCache()
+    if cache is None:
+      raise TypeError('unhashable object')
+    value = cache.get('__hash__')
+    if value is None:
+      value = cache['__hash__'] = hash(
+          (self.DESCRIPTOR.full_name, _HashableFields(self)))
+    return value
 
   def __str__(self):
     """Outputs a human-readable representation of the message."""
@@ -313,6 +322,26 @@ class Message(object):
     """
     raise NotImplementedError
 
+  def view(self):
+    """Returns a read-only view of the message.
+
+    Fields are read from the view like from the message.  Sub-messages are
+    returned as views as well, repeated fields as sequences and map fields as
+    mappings.  Changes to the message after the view is created are not
+    guaranteed to be visible through it.
+
+    With the upb backend, traversing a large message through a view is cheaper
+    than through the message, because no wrapper objects are cached for the
+    sub-messages that are read.
+
+    Returns:
+      A read-only view supporting field access, HasField(), WhichOneof() and
+      DESCRIPTOR.
+    """
+    # pylint: disable=g-import-not-at-top
+    from google.protobuf.internal import message_view
+    return message_view.MessageView(self)
+
   def HasExtension(self, field_descriptor):
     """Checks if a certain extension is present for this message.
 
@@ -365,9 +394,40 @@ class Message(object):
     raise NotImplementedError
 
   @classmethod
-  def FromString(cls, s):
+  def FromString(cls, s, arena=None):
+    """Creates a new message, parsed from the serialized bytes.
+
+    Args:
+      s (bytes): Serialized message to parse.
+      arena: An arena returned by :func:`google.protobuf.proto.arena`, to
+        allocate the message in.  None to give the message its own arena.
+
+    Returns:
+      Message: The parsed message.
+
+    Raises:
+      DecodeError: if the input cannot be parsed.
+      ValueError: if the arena is closed.
+    """
     raise NotImplementedError
 
+  @classmethod
+  def FromDict(cls, field_values):
+    """Creates a new message, with fields set from a dictionary.
+
+    This is the same as cls(**field_values): keys are field names, and values
+    may be dictionaries for message fields, lists of dictionaries for repeated
+    message fields and enum labels for enum fields.  Unlike
+    json_format.ParseDict(), values are not converted from their JSON form.
+
+    Args:
+      field_values (dict): Values of the fields to set, by field name.
+
+    Returns:
+      Message: The new message.
+    """
+    return cls(**field_values)
+
   def _SetListener(self, message_listener):
     """Internal method used by the protocol message implementation.
     Clients should not call this directly.
@@ -389,6 +449,48 @@ class Message(object):
     """
     raise NotImplementedError
 
+  def _Freeze(self):
+    """Internal method used by :func:`google.protobuf.proto.frozen`.
+    Clients should not call this directly.
+
+    Makes this message and all of its sub-messages immutable.  The message must
+    not be a sub-message of a mutable message.
+    """
+    raise NotImplementedError
+
+  def _FrozenCache(self):
+    """Internal method used by the protocol message implementation.
+    Clients should not call this directly.
+
+    Returns the dict in which a frozen message caches values derived from its
+    contents, like its serialization, or None if the message is not frozen.
+    """
+    return None
+
+  def _ToDict(self, converters):
+    """Internal method used by :func:`google.protobuf.proto.to_dict`.
+    Clients should not call this directly.
+
+    Returns the fields set in this message, excluding extensions, as a dict.
+    converters is None or a dict mapping full names of message types to
+    functions converting sub-messages of those types.
+    """
+    # pylint: disable=g-import-not-at-top
+    from google.protobuf.internal import message_dict
+    return message_dict.ToDict(self, converters)
+
+  def _Equals(self, other, ignore_repeated_order, float_tolerance):
+    """Internal method used by :func:`google.protobuf.proto.equals`.
+    Clients should not call this directly.
+
+    Returns whether other is a message of the same type with equal fields.
+    ignore_repeated_order and float_tolerance are the options of equals().
+    """
+    # pylint: disable=g-import-not-at-top
+    from google.protobuf.internal import message_compare
+    return message_compare.Equals(
+        self, other, ignore_repeated_order, float_tolerance)
+
   def __getstate__(self):
     """Support the pickle protocol."""
     return dict(serialized=self.SerializePartialToString())
@@ -420,3 +522,19 @@ def _InternalConstructMessage(full_name):
   from google.protobuf import symbol_database  # pylint:disable=g-import-not-at-top
 
   return symbol_database.Default().GetSymbol(full_name)()
+
+
+def _HashableFields(message):
+  """Returns the fields set in a frozen message, as a hashable tuple.
+
+  Unknown fields are left out, since == does not compare them in order, and
+  values which are equal hash the same, e.g. 0.0 and -0.0.
+  """
+  fields = []
+  for field, value in message.ListFields():
+    if isinstance(value, collections.abc.Mapping):
+      value = frozenset(value.items())
+    elif field.label == field.LABEL_REPEATED:
+      value = tuple(value)
+    fields.append((field.number, value))
+  return tuple(fields)
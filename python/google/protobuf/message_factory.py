@@ -16,11 +16,13 @@ my_proto_instance = message_classes['some.proto.package.MessageName']()
 
 __author__ = 'matthewtoia@google.com (Matt Toia)'
 
+import collections.abc
 import warnings
 
 from google.protobuf import descriptor_pool
 from google.protobuf import message
 from google.protobuf.internal import api_implementation
+from google.protobuf.internal import profiling
 
 if api_implementation.Type() == 'python':
   from google.protobuf.internal import python_message as message_impl
@@ -50,24 +52,33 @@ def GetMessageClass(descriptor):
   return _InternalCreateMessageClass(descriptor)
 
 
-def GetMessageClassesForFiles(files, pool):
+def GetMessageClassesForFiles(files, pool, lazy=False):
   """Gets all the messages from specified files.
 
   This will find and resolve dependencies, failing if the descriptor
   pool cannot satisfy them.
 
+  The message types reachable from the files are collected once and their
+  classes are created dependencies first, so that each descriptor is visited
+  a single time however many files refer to it.
+
   Args:
     files: The file names to extract messages from.
     pool: The descriptor pool to find the files including the dependent files.
+    lazy: If True, message classes are only created when they are first looked
+      up in the returned mapping.
 
   Returns:
-    A dictionary mapping proto names to the message classes.
+    A dictionary mapping proto names to the message classes. If lazy is True,
+    a read-only mapping which creates the classes on first access.
   """
-  result = {}
-  for file_name in files:
-    file_desc = pool.FindFileByName(file_name)
+  file_descs = [pool.FindFileByName(file_name) for file_name in files]
+  descriptors = {}
+  roots = []
+  for file_desc in file_descs:
     for desc in file_desc.message_types_by_name.values():
-      result[desc.full_name] = GetMessageClass(desc)
+      descriptors[desc.full_name] = desc
+      roots.append(desc)
 
     # While the extension FieldDescriptors are created by the descriptor pool,
     # the python classes created in the factory need them to be registered
@@ -79,7 +90,6 @@ def GetMessageClassesForFiles(files, pool):
     # an error if they were different.
 
     for extension in file_desc.extensions_by_name.values():
-      _ = GetMessageClass(extension.containing_type)
       if api_implementation.Type() != 'python':
         # TODO: Remove this check here. Duplicate extension
         # register check should be in descriptor_pool.
@@ -87,12 +97,80 @@ def GetMessageClassesForFiles(files, pool):
             extension.containing_type, extension.number
         ):
           raise ValueError('Double registration of Extensions')
+      roots.append(extension.containing_type)
       # Recursively load protos for extension field, in order to be able to
       # fully represent the extension. This matches the behavior for regular
       # fields too.
       if extension.message_type:
-        GetMessageClass(extension.message_type)
-  return result
+        roots.append(extension.message_type)
+
+  if lazy:
+    return _LazyMessageClasses(descriptors)
+  _CreateMessageClasses(roots)
+  return {
+      full_name: GetMessageClass(desc)
+      for full_name, desc in descriptors.items()
+  }
+
+
+def _MessageTypeDependencies(descriptor):
+  """Returns the message types _InternalCreateMessageClass() builds first."""
+  dependencies = [
+      field.message_type for field in descriptor.fields if field.message_type
+  ]
+  for extension in descriptor.extensions:
+    dependencies.append(extension.containing_type)
+    if extension.message_type:
+      dependencies.append(extension.message_type)
+  return dependencies
+
+
+def _CreateMessageClasses(roots):
+  """Creates the classes of message types and of everything they refer to.
+
+  The message types are walked once, without recursion, and the classes are
+  created in post order.  Dependencies thus already have a class when
+  _InternalCreateMessageClass() looks for them, which keeps deeply nested
+  schemas from exhausting the Python stack.
+
+  Args:
+    roots: The message descriptors to create classes for.
+  """
+  visited = set()
+  stack = [(desc, False) for desc in reversed(roots)]
+  while stack:
+    desc, dependencies_done = stack.pop()
+    if dependencies_done:
+      GetMessageClass(desc)
+      continue
+    if desc in visited or getattr(desc, '_concrete_class', None):
+      continue
+    visited.add(desc)
+    stack.append((desc, True))
+    for dependency in reversed(_MessageTypeDependencies(desc)):
+      if dependency not in visited:
+        stack.append((dependency, False))
+
+
+class _LazyMessageClasses(collections.abc.Mapping):
+  """Maps proto names to message classes that are created on first access."""
+
+  def __init__(self, descriptors):
+    self._descriptors = descriptors
+
+  def __getitem__(self, full_name):
+    desc = self._descriptors[full_name]
+    _CreateMessageClasses([desc])
+    return GetMessageClass(desc)
+
+  def __contains__(self, full_name):
+    return full_name in self._descriptors
+
+  def __iter__(self):
+    return iter(self._descriptors)
+
+  def __len__(self):
+    return len(self._descriptors)
 
 
 def _InternalCreateMessageClass(descriptor):
@@ -105,15 +183,17 @@ def _InternalCreateMessageClass(descriptor):
     A class describing the passed in descriptor.
   """
   descriptor_name = descriptor.name
-  result_class = _GENERATED_PROTOCOL_MESSAGE_TYPE(
-      descriptor_name,
-      (message.Message,),
-      {
-          'DESCRIPTOR': descriptor,
-          # If module not set, it wrongly points to message_factory module.
-          '__module__': None,
-      },
-  )
+  with profiling.Span('CreateClass', descriptor.full_name,
+                      getattr(descriptor.file, 'name', None)):
+    result_class = _GENERATED_PROTOCOL_MESSAGE_TYPE(
+        descriptor_name,
+        (message.Message,),
+        {
+            'DESCRIPTOR': descriptor,
+            # If module not set, it wrongly points to message_factory module.
+            '__module__': None,
+        },
+    )
   for field in descriptor.fields:
     if field.message_type:
       GetMessageClass(field.message_type)
@@ -206,12 +286,14 @@ class MessageFactory(object):
     return GetMessageClassesForFiles(files, self.pool)
 
 
-def GetMessages(file_protos, pool=None):
+def GetMessages(file_protos, pool=None, lazy=False):
   """Builds a dictionary of all the messages available in a set of files.
 
   Args:
     file_protos: Iterable of FileDescriptorProto to build messages out of.
     pool: The descriptor pool to add the file protos.
+    lazy: If True, message classes are only created when they are first looked
+      up in the returned mapping.
 
   Returns:
     A dictionary mapping proto names to the message classes. This will include
@@ -233,5 +315,5 @@ def GetMessages(file_protos, pool=None):
   while file_by_name:
     _AddFile(file_by_name.popitem()[1])
   return GetMessageClassesForFiles(
-      [file_proto.name for file_proto in file_protos], des_pool
+      [file_proto.name for file_proto in file_protos], des_pool, lazy=lazy
   )
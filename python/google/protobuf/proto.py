@@ -7,9 +7,11 @@
 
 """Contains the Nextgen Pythonic protobuf APIs."""
 
+import datetime
 import io
-from typing import Type, TypeVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type, TypeVar
 
+from google.protobuf.internal import api_implementation
 from google.protobuf.internal import decoder
 from google.protobuf.internal import encoder
 from google.protobuf.message import Message
@@ -31,21 +33,343 @@ def serialize(message: _MESSAGE, deterministic: bool = None) -> bytes:
   return message.SerializeToString(deterministic=deterministic)
 
 
-def parse(message_class: Type[_MESSAGE], payload: bytes) -> _MESSAGE:
+def parse(
+    message_class: Type[_MESSAGE],
+    payload: bytes,
+    arena=None,
+    zero_copy: bool = False,
+    retain_buffer: bool = False,
+) -> _MESSAGE:
   """Given a serialized data in binary form, deserialize it into a Message.
 
   Args:
     message_class: The message meta class.
     payload: A serialized bytes in binary form.
+    arena: An arena returned by arena() to allocate the message in, or None.
+    zero_copy: With the python backend, the values of bytes fields and the
+      unknown fields of the parsed messages are memoryviews over payload
+      instead of copies, which keep payload alive.  Payload must then not be
+      modified while the message is in use.  Memoryviews compare equal to
+      bytes but cannot be ordered, so sort bytes values with key=bytes.
+      to_dict() still returns bytes, and frozen() copies the memoryviews to
+      bytes, so that frozen messages are hashable.  The other backends always
+      copy.
+    retain_buffer: With the python backend, the parsed message and its
+      sub-messages keep memoryviews of the spans of payload they were parsed
+      from.  Serializing the message afterwards only encodes the messages
+      modified since the parse, and writes the other ones as the spans they
+      were parsed from.  A deterministic serialization encodes the whole
+      message.  Payload must then not be modified while the message is in use.
+      The other backends encode the whole message.
 
   Returns:
     A new message deserialized from payload.
   """
+  if zero_copy and api_implementation.Type() == 'python':
+    with decoder.AliasingBuffer():
+      return parse(message_class, payload, arena=arena,
+                   retain_buffer=retain_buffer)
+  if retain_buffer and api_implementation.Type() == 'python':
+    with decoder.RetainingBuffer():
+      return parse(message_class, payload, arena=arena)
+  if arena is not None:
+    return message_class.FromString(payload, arena=arena)
   new_message = message_class()
   new_message.ParseFromString(payload)
   return new_message
 
 
+class _Arena(object):
+  """Arena of the python and cpp backends, whose messages own their memory."""
+
+  __slots__ = ('closed',)
+
+  def __init__(self):
+    self.closed = False
+
+  def close(self):
+    self.closed = True
+
+  def __enter__(self):
+    if self.closed:
+      raise ValueError('Arena is closed.')
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+
+def arena():
+  """Returns an arena to allocate many messages from.
+
+  With the upb backend, messages parsed with an arena share its memory instead
+  of each owning an arena of their own, which saves an allocation per message
+  and releases the whole batch at once.  This suits request scoped messages::
+
+    with proto.arena() as a:
+      msgs = [proto.parse(Foo, payload, arena=a) for payload in payloads]
+      ...
+
+  Leaving the with block closes the arena: no new messages may be allocated in
+  it.  Messages which are still referenced remain valid, the memory of the
+  arena is released once the last of them is deleted.  With the other backends
+  the arena has no effect on memory management.
+
+  Returns:
+    A context manager, which is also passed to FromString(arena=...).
+  """
+  if api_implementation.Type() == 'upb':
+    # pylint: disable=protected-access
+    return api_implementation._c_module.Arena()
+  return _Arena()
+
+
+def frozen(message: _MESSAGE) -> _MESSAGE:
+  """Returns a deeply immutable copy of the message.
+
+  Any attempt to modify the frozen message or one of its sub-messages or
+  containers raises ValueError.  Frozen messages cache their serialization and
+  JSON representation the first time they are computed, and are hashable, so
+  they can be used as dict keys.  They can be shared between threads without
+  copying.
+
+  With the python backend, copies of a frozen message made with CopyFrom(),
+  MergeFrom() or copy.deepcopy() share its sub-messages and repeated fields
+  until they are first accessed through the copy, so a frozen message is a
+  cheap template for messages that differ from it in a few fields.
+
+  Frozen messages are not supported by the cpp backend.
+
+  Args:
+    message: The message to freeze.  It is left unchanged.
+
+  Returns:
+    A frozen copy of the message, or the message itself if it is frozen.
+  """
+  # pylint: disable=protected-access
+  if message._FrozenCache() is not None:
+    return message
+  copy = type(message)()
+  copy.CopyFrom(message)
+  copy._Freeze()
+  return copy
+
+
+def is_frozen(message: Message) -> bool:
+  """Returns whether the message is frozen, see frozen()."""
+  # pylint: disable=protected-access
+  return message._FrozenCache() is not None
+
+
+# Converters of the sub-messages which to_dict() returns as datetime objects.
+_DATETIME_CONVERTERS = {
+    'google.protobuf.Timestamp':
+        lambda value: value.ToDatetime(tzinfo=datetime.timezone.utc),
+    'google.protobuf.Duration': lambda value: value.ToTimedelta(),
+}
+
+
+def to_dict(message: Message, use_datetime: bool = False) -> Dict[str, Any]:
+  """Returns the fields set in a message as a dict of Python values.
+
+  Unlike json_format.MessageToDict(), values keep their Python types: 64-bit
+  integers are ints, bytes fields are bytes and enum fields are ints.  Keys
+  are the field names from the .proto file.  Sub-messages are converted to
+  dicts, repeated fields to lists and map fields to dicts.  Extensions and
+  unknown fields are not included.
+
+  With the upb backend, the whole message is converted in C.
+
+  Args:
+    message: The message to convert.
+    use_datetime: If true, Timestamp sub-messages are converted to UTC
+      datetime.datetime objects, and Duration sub-messages to
+      datetime.timedelta objects.
+
+  Returns:
+    A dict which from_dict() converts back to an equal message.
+  """
+  # pylint: disable=protected-access
+  return message._ToDict(_DATETIME_CONVERTERS if use_datetime else None)
+
+
+def from_dict(
+    message_class: Type[_MESSAGE], values: Dict[str, Any]
+) -> _MESSAGE:
+  """Creates a message from a dict of Python values, such as to_dict() returns.
+
+  Sub-messages may be given as dicts or messages, and Timestamp and Duration
+  sub-messages also as datetime.datetime and datetime.timedelta objects.  Enum
+  fields accept ints and labels.
+
+  Args:
+    message_class: The message class to instantiate.
+    values: The values of the fields to set, by field name.
+
+  Returns:
+    A new message of type message_class.
+  """
+  return message_class.FromDict(values)
+
+
+def equals(
+    a: Message,
+    b: Message,
+    ignore_repeated_order: bool = False,
+    float_tolerance: Optional[float] = None,
+) -> bool:
+  """Returns whether two messages of the same type are equal.
+
+  Without options, this is the same as a == b.  The comparison stops at the
+  first difference found.  With the upb backend, the messages are compared in
+  C, also when options are given.
+
+  Args:
+    a: A message.
+    b: A message, which is never equal to a if it is of another type.
+    ignore_repeated_order: If true, repeated fields are equal if their elements
+      are equal in any order.  Elements are matched greedily, which is
+      quadratic in the number of elements from the first difference on.
+    float_tolerance: If set, float and double values are equal if they differ
+      by at most this amount.  An unset float field without presence is equal
+      to a value within the tolerance of 0.
+
+  Returns:
+    Whether the messages have the same fields with equal values.  With options,
+    Any messages are compared by their packed bytes, without unpacking them.
+  """
+  if not ignore_repeated_order and float_tolerance is None:
+    return a == b
+  # pylint: disable=protected-access
+  return a._Equals(b, ignore_repeated_order, float_tolerance)
+
+
+def diff(
+    old: _MESSAGE,
+    new: _MESSAGE,
+    repeated_keys: Optional[Dict[str, str]] = None,
+) -> Tuple[Any, Dict[str, Tuple[Any, Any]]]:
+  """Returns the fields which differ between two messages of the same type.
+
+  Paths are field names, dotted through sub-messages set in both messages, as
+  in a FieldMask.  Sub-messages set in only one message, repeated fields and
+  map fields are reported as a whole, so merging new into old with the
+  returned FieldMask, replacing message and repeated fields, gives a message
+  equal to new.  Extensions and unknown fields are not compared.
+
+  The values reported for a path are:
+    scalar fields: the old and new values, None if a field with presence is
+      not set.
+    message fields: the old and new sub-messages, None if not set.
+    repeated fields: lists of the old and new elements.
+    map fields, and repeated message fields whose path is in repeated_keys:
+      dicts of the old and new values whose key was removed, added or changed.
+
+  Identical sub-messages are skipped with ==, which is implemented in C by the
+  upb backend, so only the parts of the messages which differ are walked.
+
+  Args:
+    old: The old version of a message.
+    new: The new version of the message.
+    repeated_keys: A dict mapping paths of repeated message fields to the name
+      of a scalar field of their elements identifying them, which must be
+      unique.  Elements of these fields are matched by key, like map values.
+
+  Returns:
+    A FieldMask with the paths of the fields which differ, and a dict mapping
+    each of these paths to a tuple of the old and new values.
+
+  Raises:
+    TypeError: if the messages are of different types.
+    ValueError: if a path of repeated_keys is not a repeated message field, its
+      key is not a scalar field of its elements, or two elements of the field
+      have the same key.
+  """
+  # pylint: disable=g-import-not-at-top
+  from google.protobuf import field_mask_pb2
+  from google.protobuf.internal import message_diff
+
+  changes = message_diff.Diff(old, new, repeated_keys or {})
+  return field_mask_pb2.FieldMask(paths=list(changes)), changes
+
+
+def to_columns(
+    messages: Sequence[Message],
+    fields: Sequence[str],
+    message_class: Optional[Type[Message]] = None,
+) -> Dict[str, Any]:
+  """Returns fields of a sequence of messages as columns of NumPy arrays.
+
+  Each column is a field name, or a dotted path through singular message
+  fields, such as 'header.id'.  An unset sub-message on the path contributes
+  default values.  Columns are laid out like Arrow arrays, with int64 offsets
+  delimiting the variable length values of each row:
+
+    scalar fields: an array with one value per message.
+    string and bytes fields: (offsets, data), data being a uint8 array of the
+      UTF-8 or raw bytes of the values.
+    repeated scalar fields: (offsets, values).
+    repeated string and bytes fields: (offsets, (value_offsets, data)).
+
+  With the upb backend, the buffers are filled in C directly from the
+  messages.  NumPy is required, pyarrow is not.
+
+  Args:
+    messages: A repeated message field, or a sequence of messages of the same
+      type.
+    fields: The paths of the columns.
+    message_class: The class of the messages, only needed when there are none.
+
+  Returns:
+    A dict mapping each path to its column.
+
+  Raises:
+    ValueError: if a path does not lead to a scalar or repeated scalar field.
+  """
+  # pylint: disable=g-import-not-at-top
+  from google.protobuf.internal import message_columns
+
+  if message_class is None:
+    if not messages:
+      raise ValueError('message_class is required when there are no messages.')
+    message_class = type(messages[0])
+  paths = [
+      message_columns.ResolvePath(message_class.DESCRIPTOR, field)
+      for field in fields
+  ]
+  if api_implementation.Type() == 'upb':
+    # pylint: disable=protected-access
+    buffers = api_implementation._c_module._ColumnBuffers(messages, paths)
+  else:
+    buffers = message_columns.ColumnBuffers(messages, paths)
+  return dict(zip(fields, message_columns.ToArrays(paths, buffers)))
+
+
+def from_columns(
+    message_class: Type[_MESSAGE], columns: Dict[str, Any]
+) -> List[_MESSAGE]:
+  """Creates messages from columns, such as to_columns() returns.
+
+  Columns may also hold lists instead of arrays, and bytes instead of uint8
+  data arrays.  The field of every column is set in every message, even to its
+  default value.
+
+  Args:
+    message_class: The class of the messages.
+    columns: A dict mapping paths to columns, in the layout of to_columns().
+
+  Returns:
+    A list of messages of type message_class, one per row.
+
+  Raises:
+    ValueError: if a path is invalid or the columns have different lengths.
+  """
+  # pylint: disable=g-import-not-at-top
+  from google.protobuf.internal import message_columns
+
+  return message_columns.FromColumns(message_class, columns)
+
+
 def serialize_length_prefixed(message: _MESSAGE, output: io.BytesIO) -> None:
   """Writes the size of the message as a varint and the serialized message.
 
@@ -2297,7 +2297,32 @@ int InternalSetScalar(CMessage* self, const FieldDescriptor* field_descriptor,
   return InternalSetNonOneofScalar(self->message, field_descriptor, arg);
 }
 
-PyObject* FromString(PyTypeObject* cls, PyObject* serialized) {
+PyObject* FromString(PyTypeObject* cls, PyObject* args, PyObject* kwargs) {
+  static const char* kwlist[] = {"", "arena", nullptr};
+  PyObject* serialized;
+  PyObject* arena = Py_None;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:FromString",
+                                   const_cast<char**>(kwlist), &serialized,
+                                   &arena)) {
+    return nullptr;
+  }
+  // Messages of this implementation manage their own memory, the arena is
+  // only checked for consistency with the other implementations.
+  if (arena != Py_None) {
+    ScopedPyObjectPtr closed(PyObject_GetAttrString(arena, "closed"));
+    if (closed == nullptr) {
+      return nullptr;
+    }
+    int is_closed = PyObject_IsTrue(closed.get());
+    if (is_closed < 0) {
+      return nullptr;
+    }
+    if (is_closed) {
+      PyErr_SetString(PyExc_ValueError, "Arena is closed.");
+      return nullptr;
+    }
+  }
+
   PyObject* py_cmsg =
       PyObject_CallObject(reinterpret_cast<PyObject*>(cls), nullptr);
   if (py_cmsg == nullptr) {
@@ -2463,7 +2488,8 @@ static PyMethodDef Methods[] = {
      "Discards the unknown fields."},
     {"FindInitializationErrors", (PyCFunction)FindInitializationErrors,
      METH_NOARGS, "Finds unset required fields."},
-    {"FromString", (PyCFunction)FromString, METH_O | METH_CLASS,
+    {"FromString", (PyCFunction)FromString,
+     METH_VARARGS | METH_KEYWORDS | METH_CLASS,
      "Creates new method instance from given serialized data."},
     {"HasExtension", (PyCFunction)HasExtension, METH_O,
      "Checks if a message field is set."},
@@ -28,6 +28,7 @@ import re
 
 from google.protobuf.internal import decoder
 from google.protobuf.internal import type_checkers
+from google.protobuf.internal import type_url_resolver
 from google.protobuf import descriptor
 from google.protobuf import text_encoding
 from google.protobuf import unknown_fields
@@ -335,16 +336,11 @@ def _BuildMessageFromTypeName(type_name, descriptor_pool):
     A Message instance of type matching type_name, or None if the a Descriptor
     wasn't found matching type_name.
   """
-  # pylint: disable=g-import-not-at-top
-  if descriptor_pool is None:
-    from google.protobuf import descriptor_pool as pool_mod
-    descriptor_pool = pool_mod.Default()
-  from google.protobuf import message_factory
   try:
-    message_descriptor = descriptor_pool.FindMessageTypeByName(type_name)
+    message_type = type_url_resolver.Default().Resolve(
+        type_name, descriptor_pool)
   except KeyError:
     return None
-  message_type = message_factory.GetMessageClass(message_descriptor)
   return message_type()
 
 
@@ -67,19 +67,23 @@ else:
       if (msg_des.has_options and
           msg_des.GetOptions().message_set_wire_format):
         local_decoder = decoder.UnknownMessageSetItemDecoder()
-        for _, buffer in unknown_fields:
+        for _, buffer in decoder._SplitUnknownFields(unknown_fields):
           (field_number, data) = local_decoder(memoryview(buffer))
           InternalAdd(field_number, wire_format.WIRETYPE_LENGTH_DELIMITED, data)
       else:
-        for tag_bytes, buffer in unknown_fields:
-          # pylint: disable=protected-access
-          (tag, _) = decoder._DecodeVarint(tag_bytes, 0)
-          field_number, wire_type = wire_format.UnpackTag(tag)
-          if field_number == 0:
-            raise RuntimeError('Field number 0 is illegal.')
-          (data, _) = decoder._DecodeUnknownField(
-              memoryview(buffer), 0, wire_type)
-          InternalAdd(field_number, wire_type, data)
+        # The fields are decoded directly from the serialized spans they are
+        # stored in.
+        for span in unknown_fields:
+          buffer = memoryview(span)
+          pos = 0
+          while pos != len(buffer):
+            (tag_bytes, pos) = decoder.ReadTag(buffer, pos)
+            (tag, _) = decoder._DecodeVarint(tag_bytes, 0)
+            field_number, wire_type = wire_format.UnpackTag(tag)
+            if field_number == 0:
+              raise RuntimeError('Field number 0 is illegal.')
+            (data, pos) = decoder._DecodeUnknownField(buffer, pos, wire_type)
+            InternalAdd(field_number, wire_type, data)
 
     def __getitem__(self, index):
       size = len(self._values)
@@ -113,9 +113,17 @@ void PyUpb_MapContainer_Invalidate(PyObject* obj) {
 
 upb_Map* PyUpb_MapContainer_EnsureReified(PyObject* _self) {
   PyUpb_MapContainer* self = (PyUpb_MapContainer*)_self;
-  self->version++;
   upb_Map* map = PyUpb_MapContainer_GetIfReified(self);
-  if (map) return map;  // Already writable.
+  if (map) {
+    if (upb_Map_IsFrozen(map)) {
+      PyUpb_Message_SetFrozenError();
+      return NULL;
+    }
+    self->version++;
+    return map;  // Already writable.
+  }
+  if (!PyUpb_Message_VerifyMutable(self->ptr.parent)) return NULL;
+  self->version++;
 
   const upb_FieldDef* f = PyUpb_MapContainer_GetField(self);
   upb_Arena* arena = PyUpb_Arena_Get(self->arena);
@@ -151,6 +159,7 @@ static int PyUpb_MapContainer_AssignSubscript(PyObject* _self, PyObject* key,
                                               PyObject* val) {
   PyUpb_MapContainer* self = (PyUpb_MapContainer*)_self;
   upb_Map* map = PyUpb_MapContainer_EnsureReified(_self);
+  if (!map) return -1;
   const upb_FieldDef* f = PyUpb_MapContainer_GetField(self);
   const upb_MessageDef* entry_m = upb_FieldDef_MessageSubDef(f);
   const upb_FieldDef* key_f = upb_MessageDef_Field(entry_m, 0);
@@ -182,6 +191,7 @@ static PyObject* PyUpb_MapContainer_Subscript(PyObject* _self, PyObject* key) {
   if (!PyUpb_PyToUpb(key, key_f, &u_key, NULL)) return NULL;
   if (!map || !upb_Map_Get(map, u_key, &u_val)) {
     map = PyUpb_MapContainer_EnsureReified(_self);
+    if (!map) return NULL;
     upb_Arena* arena = PyUpb_Arena_Get(self->arena);
     if (upb_FieldDef_IsSubMessage(val_f)) {
       const upb_MessageDef* m = upb_FieldDef_MessageSubDef(val_f);
@@ -213,6 +223,7 @@ static int PyUpb_MapContainer_Contains(PyObject* _self, PyObject* key) {
 
 static PyObject* PyUpb_MapContainer_Clear(PyObject* _self, PyObject* key) {
   upb_Map* map = PyUpb_MapContainer_EnsureReified(_self);
+  if (!map) return NULL;
   upb_Map_Clear(map);
   Py_RETURN_NONE;
 }
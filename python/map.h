@@ -31,6 +31,7 @@ PyObject* PyUpb_MapContainer_GetOrCreateWrapper(upb_Map* map,
 void PyUpb_MapContainer_Reify(PyObject* self, upb_Map* map);
 
 // Reifies this map object if it is not already reified.
+// Returns NULL and sets a ValueError if the message it belongs to is frozen.
 upb_Map* PyUpb_MapContainer_EnsureReified(PyObject* self);
 
 // Invalidates any existing iterators for the map `obj`.
@@ -7,10 +7,14 @@
 
 #include "python/message.h"
 
+#include <math.h>
+#include <string.h>
+
 #include "python/convert.h"
 #include "python/descriptor.h"
 #include "python/extension_dict.h"
 #include "python/map.h"
+#include "python/message_view.h"
 #include "python/repeated.h"
 #include "upb/message/compare.h"
 #include "upb/message/copy.h"
@@ -189,6 +193,8 @@ typedef struct PyUpb_Message {
   PyObject* ext_dict;  // Weak pointer to extension dict, if any.
   // name->obj dict for non-present msg/map/repeated, NULL if none.
   PyUpb_WeakMap* unset_subobj_map;
+  // Dict of values cached by a frozen message, NULL if none.
+  PyObject* frozen_cache;
   int version;
 } PyUpb_Message;
 
@@ -238,16 +244,49 @@ upb_Message* PyUpb_Message_GetIfReified(PyObject* _self) {
   return PyUpb_Message_IsStub(self) ? NULL : self->ptr.msg;
 }
 
-static PyObject* PyUpb_Message_New(PyObject* cls, PyObject* unused_args,
-                                   PyObject* unused_kwargs) {
+// A message is frozen if its data is, or for an unset sub-message, if the
+// message that would own it is.
+static bool PyUpb_Message_IsFrozen(PyUpb_Message* self) {
+  while (PyUpb_Message_IsStub(self)) self = self->ptr.parent;
+  return upb_Message_IsFrozen(self->ptr.msg);
+}
+
+void PyUpb_Message_SetFrozenError(void) {
+  PyErr_SetString(PyExc_ValueError, "Cannot modify a frozen message.");
+}
+
+bool PyUpb_Message_VerifyMutable(PyObject* self) {
+  if (!PyUpb_Message_IsFrozen((PyUpb_Message*)self)) return true;
+  PyUpb_Message_SetFrozenError();
+  return false;
+}
+
+// Sets `*cache` to a borrowed reference to the dict of cached values of a
+// frozen message, or to NULL if the message is not frozen.  Returns false and
+// sets an exception on failure.
+static bool PyUpb_Message_GetFrozenCache(PyUpb_Message* self,
+                                         PyObject** cache) {
+  if (!self->frozen_cache && PyUpb_Message_IsFrozen(self)) {
+    self->frozen_cache = PyDict_New();
+    if (!self->frozen_cache) return false;
+  }
+  *cache = self->frozen_cache;
+  return true;
+}
+
+// Creates a new, empty message of type `cls`, allocated in `arena`.  Takes a
+// new reference to `arena`.
+static PyObject* PyUpb_Message_NewInArena(PyObject* cls, PyObject* arena) {
   const upb_MessageDef* msgdef = PyUpb_MessageMeta_GetMsgdef(cls);
   const upb_MiniTable* layout = upb_MessageDef_MiniTable(msgdef);
   PyUpb_Message* msg = (void*)PyType_GenericAlloc((PyTypeObject*)cls, 0);
   msg->def = (uintptr_t)msgdef;
-  msg->arena = PyUpb_Arena_New();
+  msg->arena = arena;
+  Py_INCREF(arena);
   msg->ptr.msg = upb_Message_New(layout, PyUpb_Arena_Get(msg->arena));
   msg->unset_subobj_map = NULL;
   msg->ext_dict = NULL;
+  msg->frozen_cache = NULL;
   msg->version = 0;
 
   PyObject* ret = &msg->ob_base;
@@ -255,19 +294,28 @@ static PyObject* PyUpb_Message_New(PyObject* cls, PyObject* unused_args,
   return ret;
 }
 
+static PyObject* PyUpb_Message_New(PyObject* cls, PyObject* unused_args,
+                                   PyObject* unused_kwargs) {
+  PyObject* arena = PyUpb_Arena_New();
+  PyObject* ret = PyUpb_Message_NewInArena(cls, arena);
+  Py_DECREF(arena);
+  return ret;
+}
+
 /*
- * PyUpb_Message_LookupName()
+ * PyUpb_MessageDef_LookupName()
  *
- * Tries to find a field or oneof named `py_name` in the message object `self`.
+ * Tries to find a field or oneof named `py_name` in the message type `msgdef`.
  * The user must pass `f` and/or `o` to indicate whether a field or a oneof name
  * is expected.  If the name is found and it has an expected type, the function
  * sets `*f` or `*o` respectively and returns true.  Otherwise returns false
  * and sets an exception of type `exc_type` if provided.
  */
-static bool PyUpb_Message_LookupName(PyUpb_Message* self, PyObject* py_name,
-                                     const upb_FieldDef** f,
-                                     const upb_OneofDef** o,
-                                     PyObject* exc_type) {
+static bool PyUpb_MessageDef_LookupName(const upb_MessageDef* msgdef,
+                                        PyObject* py_name,
+                                        const upb_FieldDef** f,
+                                        const upb_OneofDef** o,
+                                        PyObject* exc_type) {
   assert(f || o);
   Py_ssize_t size;
   const char* name = NULL;
@@ -282,7 +330,6 @@ static bool PyUpb_Message_LookupName(PyUpb_Message* self, PyObject* py_name,
                  py_name);
     return false;
   }
-  const upb_MessageDef* msgdef = _PyUpb_Message_GetMsgdef(self);
 
   if (!upb_MessageDef_FindByNameWithSize(msgdef, name, size, f, o)) {
     if (exc_type) {
@@ -311,16 +358,48 @@ static bool PyUpb_Message_LookupName(PyUpb_Message* self, PyObject* py_name,
   return true;
 }
 
-static bool PyUpb_Message_InitMessageMapEntry(PyObject* dst, PyObject* src) {
-  if (!src || !dst) return false;
+static bool PyUpb_Message_LookupName(PyUpb_Message* self, PyObject* py_name,
+                                     const upb_FieldDef** f,
+                                     const upb_OneofDef** o,
+                                     PyObject* exc_type) {
+  return PyUpb_MessageDef_LookupName(_PyUpb_Message_GetMsgdef(self), py_name,
+                                     f, o, exc_type);
+}
 
-  PyObject* ok = PyObject_CallMethod(dst, "CopyFrom", "O", src);
+const upb_FieldDef* PyUpb_Message_LookupField(const upb_MessageDef* m,
+                                              PyObject* py_name) {
+  const upb_FieldDef* f;
+  if (!PyUpb_MessageDef_LookupName(m, py_name, &f, NULL, PyExc_ValueError)) {
+    return NULL;
+  }
+  return f;
+}
+
+// Sets a new element of a repeated or map field from `src`, which is a dict of
+// field values, a message, or the Python value of a well known type, e.g. a
+// datetime for a Timestamp.
+static bool PyUpb_Message_InitSubMessage(PyObject* dst, PyObject* src) {
+  if (PyDict_Check(src)) {
+    return PyUpb_Message_InitAttributes(dst, NULL, src) >= 0;
+  }
+  PyObject* ok;
+  if (!PyUpb_Message_TryCheck(src) &&
+      PyObject_HasAttrString(dst, "_internal_assign")) {
+    ok = PyObject_CallMethod(dst, "_internal_assign", "O", src);
+  } else {
+    ok = PyObject_CallMethod(dst, "CopyFrom", "O", src);
+  }
   if (!ok) return false;
   Py_DECREF(ok);
 
   return true;
 }
 
+static bool PyUpb_Message_InitMessageMapEntry(PyObject* dst, PyObject* src) {
+  if (!src || !dst) return false;
+  return PyUpb_Message_InitSubMessage(dst, src);
+}
+
 int PyUpb_Message_InitMapAttributes(PyObject* map, PyObject* value,
                                     const upb_FieldDef* f) {
   const upb_MessageDef* entry_m = upb_FieldDef_MessageSubDef(f);
@@ -386,10 +465,7 @@ static bool PyUpb_Message_InitRepeatedMessageAttribute(PyObject* _self,
       if (!m) goto err;
     } else {
       m = PyUpb_RepeatedCompositeContainer_Add(repeated, NULL, NULL);
-      if (!m) goto err;
-      PyObject* merged = PyUpb_Message_MergeFrom(m, e);
-      if (!merged) goto err;
-      Py_DECREF(merged);
+      if (!m || !PyUpb_Message_InitSubMessage(m, e)) goto err;
     }
     Py_DECREF(e);
     Py_DECREF(m);
@@ -489,6 +565,22 @@ static bool PyUpb_Message_InitScalarAttribute(upb_Message* msg,
   return true;
 }
 
+// Sets field `f` of `msg`, the data of `_self`, from a non-None constructor
+// argument.
+static bool PyUpb_Message_InitAttribute(PyObject* _self, upb_Message* msg,
+                                        const upb_FieldDef* f, PyObject* name,
+                                        PyObject* value, upb_Arena* arena) {
+  if (upb_FieldDef_IsMap(f)) {
+    return PyUpb_Message_InitMapAttribute(_self, name, f, value);
+  } else if (upb_FieldDef_IsRepeated(f)) {
+    return PyUpb_Message_InitRepeatedAttribute(_self, name, value);
+  } else if (upb_FieldDef_IsSubMessage(f)) {
+    return PyUpb_Message_InitMessageAttribute(_self, name, f, value);
+  } else {
+    return PyUpb_Message_InitScalarAttribute(msg, f, value, arena);
+  }
+}
+
 int PyUpb_Message_InitAttributes(PyObject* _self, PyObject* args,
                                  PyObject* kwargs) {
   assert(!PyErr_Occurred());
@@ -504,6 +596,7 @@ int PyUpb_Message_InitAttributes(PyObject* _self, PyObject* args,
   Py_ssize_t pos = 0;
   PyObject* name;
   PyObject* value;
+  if (!PyUpb_Message_VerifyMutable(_self)) return -1;
   PyUpb_Message_EnsureReified(self);
   upb_Message* msg = PyUpb_Message_GetMsg(self);
   upb_Arena* arena = PyUpb_Arena_Get(self->arena);
@@ -520,14 +613,8 @@ int PyUpb_Message_InitAttributes(PyObject* _self, PyObject* args,
 
     assert(!PyErr_Occurred());
 
-    if (upb_FieldDef_IsMap(f)) {
-      if (!PyUpb_Message_InitMapAttribute(_self, name, f, value)) return -1;
-    } else if (upb_FieldDef_IsRepeated(f)) {
-      if (!PyUpb_Message_InitRepeatedAttribute(_self, name, value)) return -1;
-    } else if (upb_FieldDef_IsSubMessage(f)) {
-      if (!PyUpb_Message_InitMessageAttribute(_self, name, f, value)) return -1;
-    } else {
-      if (!PyUpb_Message_InitScalarAttribute(msg, f, value, arena)) return -1;
+    if (!PyUpb_Message_InitAttribute(_self, msg, f, name, value, arena)) {
+      return -1;
     }
     if (PyErr_Occurred()) return -1;
   }
@@ -536,6 +623,60 @@ int PyUpb_Message_InitAttributes(PyObject* _self, PyObject* args,
   return 0;
 }
 
+// Sets field `f` of a new message from a non-None constructor argument.  The
+// Python object of the message is only needed by fields which are not scalars,
+// so it is created in `*py_msg` on first use.
+static bool PyUpb_Message_InitNewAttribute(upb_Message* msg,
+                                           const upb_MessageDef* m,
+                                           PyObject* arena, PyObject** py_msg,
+                                           const upb_FieldDef* f,
+                                           PyObject* name, PyObject* value) {
+  if (!upb_FieldDef_IsRepeated(f) && !upb_FieldDef_IsSubMessage(f)) {
+    return PyUpb_Message_InitScalarAttribute(msg, f, value,
+                                             PyUpb_Arena_Get(arena));
+  }
+  if (!*py_msg) *py_msg = PyUpb_Message_Get(msg, m, arena);
+  return PyUpb_Message_InitAttribute(*py_msg, msg, f, name, value,
+                                     PyUpb_Arena_Get(arena)) &&
+         !PyErr_Occurred();
+}
+
+bool PyUpb_Message_InitNewFromDict(upb_Message* msg, const upb_MessageDef* m,
+                                   PyObject* arena, PyObject* kwargs) {
+  PyObject* py_msg = NULL;
+  Py_ssize_t pos = 0;
+  PyObject* name;
+  PyObject* value;
+  bool ok = true;
+  while (ok && PyDict_Next(kwargs, &pos, &name, &value)) {
+    const upb_FieldDef* f = PyUpb_Message_LookupField(m, name);
+    if (!f) {
+      ok = false;
+    } else if (value != Py_None) {
+      ok = PyUpb_Message_InitNewAttribute(msg, m, arena, &py_msg, f, name,
+                                          value);
+    }
+  }
+  Py_XDECREF(py_msg);
+  return ok;
+}
+
+bool PyUpb_Message_InitNewFromValues(upb_Message* msg, const upb_MessageDef* m,
+                                     PyObject* arena, PyObject* names,
+                                     const upb_FieldDef* const* fields,
+                                     PyObject* const* values) {
+  PyObject* py_msg = NULL;
+  bool ok = true;
+  Py_ssize_t n = PyTuple_GET_SIZE(names);
+  for (Py_ssize_t i = 0; ok && i < n; i++) {
+    if (values[i] == Py_None) continue;  // Ignored.
+    ok = PyUpb_Message_InitNewAttribute(msg, m, arena, &py_msg, fields[i],
+                                        PyTuple_GET_ITEM(names, i), values[i]);
+  }
+  Py_XDECREF(py_msg);
+  return ok;
+}
+
 static int PyUpb_Message_Init(PyObject* _self, PyObject* args,
                               PyObject* kwargs) {
   if (args != NULL && PyTuple_Size(args) != 0) {
@@ -557,6 +698,7 @@ static PyObject* PyUpb_Message_NewStub(PyObject* parent, const upb_FieldDef* f,
   msg->ptr.parent = (PyUpb_Message*)parent;
   msg->unset_subobj_map = NULL;
   msg->ext_dict = NULL;
+  msg->frozen_cache = NULL;
   msg->version = 0;
 
   Py_DECREF(cls);
@@ -825,6 +967,7 @@ static void PyUpb_Message_Dealloc(PyObject* _self) {
     PyUpb_WeakMap_Free(self->unset_subobj_map);
   }
 
+  Py_XDECREF(self->frozen_cache);
   Py_DECREF(self->arena);
 
   // We do not use PyUpb_Dealloc() here because Message is a base type and for
@@ -854,6 +997,7 @@ PyObject* PyUpb_Message_Get(upb_Message* u_msg, const upb_MessageDef* m,
   py_msg->ptr.msg = u_msg;
   py_msg->unset_subobj_map = NULL;
   py_msg->ext_dict = NULL;
+  py_msg->frozen_cache = NULL;
   py_msg->version = 0;
   ret = &py_msg->ob_base;
   Py_DECREF(cls);
@@ -909,8 +1053,22 @@ PyObject* PyUpb_Message_GetStub(PyUpb_Message* self,
 PyObject* PyUpb_Message_GetPresentWrapper(PyUpb_Message* self,
                                           const upb_FieldDef* field) {
   assert(!PyUpb_Message_IsStub(self));
-  upb_MutableMessageValue mutval =
-      upb_Message_Mutable(self->ptr.msg, field, PyUpb_Arena_Get(self->arena));
+  upb_MutableMessageValue mutval;
+  if (upb_Message_IsFrozen(self->ptr.msg)) {
+    // Creating the container would modify the message, so absent containers
+    // of frozen messages are stubs.
+    upb_MessageValue val = upb_Message_GetFieldByDef(self->ptr.msg, field);
+    if (upb_FieldDef_IsMap(field)) {
+      if (!val.map_val) return PyUpb_Message_GetStub(self, field);
+      mutval.map = (upb_Map*)val.map_val;
+    } else {
+      if (!val.array_val) return PyUpb_Message_GetStub(self, field);
+      mutval.array = (upb_Array*)val.array_val;
+    }
+  } else {
+    mutval = upb_Message_Mutable(self->ptr.msg, field,
+                                 PyUpb_Arena_Get(self->arena));
+  }
   if (upb_FieldDef_IsMap(field)) {
     return PyUpb_MapContainer_GetOrCreateWrapper(mutval.map, field,
                                                  self->arena);
@@ -973,6 +1131,7 @@ int PyUpb_Message_SetFieldValue(PyObject* _self, const upb_FieldDef* field,
     return -1;
   }
 
+  if (!PyUpb_Message_VerifyMutable(_self)) return -1;
   PyUpb_Message_EnsureReified(self);
 
   if (upb_FieldDef_IsSubMessage(field)) {
@@ -1266,6 +1425,7 @@ PyObject* PyUpb_Message_MergeFrom(PyObject* self, PyObject* arg) {
                  Py_TYPE(self), Py_TYPE(arg));
     return NULL;
   }
+  if (!PyUpb_Message_VerifyMutable(self)) return NULL;
   // OPT: exit if src is empty.
   PyObject* subargs = PyTuple_New(0);
   PyObject* serialized =
@@ -1286,6 +1446,7 @@ static PyObject* PyUpb_Message_CopyFrom(PyObject* _self, PyObject* arg) {
                  Py_TYPE(_self), Py_TYPE(arg));
     return NULL;
   }
+  if (!PyUpb_Message_VerifyMutable(_self)) return NULL;
   if (_self == arg) {
     Py_RETURN_NONE;
   }
@@ -1310,6 +1471,7 @@ static PyObject* PyUpb_Message_CopyFrom(PyObject* _self, PyObject* arg) {
 
 static PyObject* PyUpb_Message_SetInParent(PyObject* _self, PyObject* arg) {
   PyUpb_Message* self = (void*)_self;
+  if (!PyUpb_Message_VerifyMutable(_self)) return NULL;
   PyUpb_Message_EnsureReified(self);
   Py_RETURN_NONE;
 }
@@ -1327,6 +1489,7 @@ PyObject* PyUpb_Message_MergeFromString(PyObject* _self, PyObject* arg) {
   Py_ssize_t size;
   PyObject* bytes = NULL;
 
+  if (!PyUpb_Message_VerifyMutable(_self)) return NULL;
   if (PyMemoryView_Check(arg)) {
     bytes = PyBytes_FromObject(arg);
     // Cannot fail when passed something of the correct type.
@@ -1364,6 +1527,7 @@ PyObject* PyUpb_Message_MergeFromString(PyObject* _self, PyObject* arg) {
 }
 
 static PyObject* PyUpb_Message_ParseFromString(PyObject* self, PyObject* arg) {
+  if (!PyUpb_Message_VerifyMutable(self)) return NULL;
   PyObject* tmp = PyUpb_Message_Clear((PyUpb_Message*)self);
   Py_DECREF(tmp);
   return PyUpb_Message_MergeFromString(self, arg);
@@ -1383,6 +1547,7 @@ static PyObject* PyUpb_Message_ByteSize(PyObject* self, PyObject* args) {
 }
 
 static PyObject* PyUpb_Message_Clear(PyUpb_Message* self) {
+  if (!PyUpb_Message_VerifyMutable((PyObject*)self)) return NULL;
   PyUpb_Message_EnsureReified(self);
   const upb_MessageDef* msgdef = _PyUpb_Message_GetMsgdef(self);
   PyUpb_WeakMap* subobj_map = self->unset_subobj_map;
@@ -1450,6 +1615,7 @@ void PyUpb_Message_DoClearField(PyObject* _self, const upb_FieldDef* f) {
 
 static PyObject* PyUpb_Message_ClearExtension(PyObject* _self, PyObject* arg) {
   PyUpb_Message* self = (void*)_self;
+  if (!PyUpb_Message_VerifyMutable(_self)) return NULL;
   PyUpb_Message_EnsureReified(self);
   const upb_FieldDef* f = PyUpb_Message_GetExtensionDef(_self, arg);
   if (!f) return NULL;
@@ -1465,6 +1631,7 @@ static PyObject* PyUpb_Message_ClearField(PyObject* _self, PyObject* arg) {
   //   msg = FooMessage()
   //   msg.foo.Clear()
   //   assert msg.HasField("foo")
+  if (!PyUpb_Message_VerifyMutable(_self)) return NULL;
   PyUpb_Message_EnsureReified(self);
 
   const upb_FieldDef* f;
@@ -1480,6 +1647,7 @@ static PyObject* PyUpb_Message_ClearField(PyObject* _self, PyObject* arg) {
 
 static PyObject* PyUpb_Message_DiscardUnknownFields(PyUpb_Message* self,
                                                     PyObject* arg) {
+  if (!PyUpb_Message_VerifyMutable((PyObject*)self)) return NULL;
   PyUpb_Message_EnsureReified(self);
   const upb_MessageDef* msgdef = _PyUpb_Message_GetMsgdef(self);
   upb_Message_DiscardUnknown(self->ptr.msg, msgdef, 64);
@@ -1520,11 +1688,25 @@ static PyObject* PyUpb_Message_FindInitializationErrors(PyObject* _self,
   return ret;
 }
 
-static PyObject* PyUpb_Message_FromString(PyObject* cls, PyObject* serialized) {
+static PyObject* PyUpb_Message_FromString(PyObject* cls, PyObject* args,
+                                          PyObject* kwargs) {
+  static const char* kwlist[] = {"", "arena", NULL};
+  PyObject* serialized;
+  PyObject* arena = Py_None;
   PyObject* ret = NULL;
   PyObject* length = NULL;
 
-  ret = PyObject_CallObject(cls, NULL);
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O:FromString",
+                                   (char**)kwlist, &serialized, &arena)) {
+    return NULL;
+  }
+  if (arena == Py_None) {
+    ret = PyObject_CallObject(cls, NULL);
+  } else if (PyUpb_Arena_Verify(arena)) {
+    // Messages sharing an arena skip the per message arena allocation, and
+    // are all freed together.
+    ret = PyUpb_Message_NewInArena(cls, arena);
+  }
   if (ret == NULL) goto err;
   length = PyUpb_Message_MergeFromString(ret, serialized);
   if (length == NULL) goto err;
@@ -1618,6 +1800,23 @@ PyObject* PyUpb_Message_SerializeInternal(PyObject* _self, PyObject* args,
     return NULL;
   }
 
+  // Frozen messages cache their serialization.
+  PyObject* cache;
+  PyObject* key = NULL;
+  if (!PyUpb_Message_GetFrozenCache(self, &cache)) return NULL;
+  if (cache) {
+    key = Py_BuildValue(
+        "(sO)", check_required ? "SerializeToString" : "SerializePartialToString",
+        deterministic ? Py_True : Py_False);
+    if (!key) return NULL;
+    PyObject* cached = PyDict_GetItemWithError(cache, key);
+    if (cached || PyErr_Occurred()) {
+      Py_DECREF(key);
+      Py_XINCREF(cached);
+      return cached;
+    }
+  }
+
   upb_Arena* arena = upb_Arena_New();
   const upb_MiniTable* layout = upb_MessageDef_MiniTable(msgdef);
   size_t size = 0;
@@ -1643,8 +1842,10 @@ PyObject* PyUpb_Message_SerializeInternal(PyObject* _self, PyObject* args,
   }
 
   ret = PyBytes_FromStringAndSize(pb, size);
+  if (ret && key && PyDict_SetItem(cache, key, ret) < 0) Py_CLEAR(ret);
 
 done:
+  Py_XDECREF(key);
   upb_Arena_Free(arena);
   return ret;
 }
@@ -1660,6 +1861,25 @@ PyObject* PyUpb_Message_SerializePartialToString(PyObject* _self,
   return PyUpb_Message_SerializeInternal(_self, args, kwargs, false);
 }
 
+// Frozen messages are hashable.  The hash is computed by
+// message.Message.__hash__(), like for the other backends.
+static Py_hash_t PyUpb_Message_Hash(PyObject* _self) {
+  PyUpb_Message* self = (void*)_self;
+  PyObject* cache;
+  if (!PyUpb_Message_GetFrozenCache(self, &cache)) return -1;
+  if (!cache) return PyObject_HashNotImplemented(_self);
+  PyUpb_ModuleState* state = PyUpb_ModuleState_Get();
+  PyObject* hash_func =
+      PyObject_GetAttrString(state->message_class, "__hash__");
+  if (!hash_func) return -1;
+  PyObject* value = PyObject_CallFunctionObjArgs(hash_func, _self, NULL);
+  Py_DECREF(hash_func);
+  if (!value) return -1;
+  Py_hash_t hash = PyLong_AsSsize_t(value);
+  Py_DECREF(value);
+  return hash;
+}
+
 static PyObject* PyUpb_Message_WhichOneof(PyObject* _self, PyObject* name) {
   PyUpb_Message* self = (void*)_self;
   const upb_OneofDef* o;
@@ -1673,6 +1893,415 @@ static PyObject* PyUpb_Message_WhichOneof(PyObject* _self, PyObject* name) {
   return PyUnicode_FromString(upb_FieldDef_Name(f));
 }
 
+static PyObject* PyUpb_Message_Freeze(PyObject* _self, PyObject* args) {
+  PyUpb_Message* self = (void*)_self;
+  if (PyUpb_Message_IsFrozen(self)) Py_RETURN_NONE;
+  PyUpb_Message_EnsureReified(self);
+  const upb_MessageDef* msgdef = _PyUpb_Message_GetMsgdef(self);
+  upb_Message_Freeze(self->ptr.msg, upb_MessageDef_MiniTable(msgdef));
+  Py_RETURN_NONE;
+}
+
+static PyObject* PyUpb_Message_FrozenCache(PyObject* _self, PyObject* args) {
+  PyObject* cache;
+  if (!PyUpb_Message_GetFrozenCache((PyUpb_Message*)_self, &cache)) {
+    return NULL;
+  }
+  if (!cache) Py_RETURN_NONE;
+  return PyUpb_NewRef(cache);
+}
+
+static PyObject* PyUpb_Message_View(PyObject* _self, PyObject* args) {
+  PyUpb_Message* self = (void*)_self;
+  // The class keeps the message definition alive.
+  return PyUpb_MessageView_New(self->arena, (PyObject*)Py_TYPE(_self),
+                               _PyUpb_Message_GetMsgdef(self),
+                               PyUpb_Message_GetIfReified(_self));
+}
+
+static PyObject* PyUpb_Message_MessageToDict(const upb_Message* msg,
+                                             const upb_MessageDef* m,
+                                             PyObject* arena,
+                                             PyObject* converters);
+
+// Converts a value of field `f` for _ToDict(): sub-messages are converted with
+// the converter registered for their type, or to dicts.
+static PyObject* PyUpb_Message_ValueToDict(upb_MessageValue val,
+                                           const upb_FieldDef* f,
+                                           PyObject* arena,
+                                           PyObject* converters) {
+  if (!upb_FieldDef_IsSubMessage(f)) return PyUpb_UpbToPy(val, f, arena);
+  const upb_MessageDef* sub_m = upb_FieldDef_MessageSubDef(f);
+  if (converters != Py_None) {
+    PyObject* converter =
+        PyDict_GetItemString(converters, upb_MessageDef_FullName(sub_m));
+    if (converter) {
+      PyObject* sub_msg =
+          PyUpb_Message_Get((upb_Message*)val.msg_val, sub_m, arena);
+      if (!sub_msg) return NULL;
+      PyObject* ret = PyObject_CallFunctionObjArgs(converter, sub_msg, NULL);
+      Py_DECREF(sub_msg);
+      return ret;
+    }
+  }
+  return PyUpb_Message_MessageToDict(val.msg_val, sub_m, arena, converters);
+}
+
+static PyObject* PyUpb_Message_ArrayToList(const upb_Array* arr,
+                                           const upb_FieldDef* f,
+                                           PyObject* arena,
+                                           PyObject* converters) {
+  size_t size = upb_Array_Size(arr);
+  PyObject* list = PyList_New(size);
+  if (!list) return NULL;
+  for (size_t i = 0; i < size; i++) {
+    PyObject* item = PyUpb_Message_ValueToDict(upb_Array_Get(arr, i), f, arena,
+                                               converters);
+    if (!item) {
+      Py_DECREF(list);
+      return NULL;
+    }
+    PyList_SET_ITEM(list, i, item);
+  }
+  return list;
+}
+
+static PyObject* PyUpb_Message_MapToDict(const upb_Map* map,
+                                         const upb_FieldDef* f,
+                                         PyObject* arena,
+                                         PyObject* converters) {
+  const upb_MessageDef* entry_m = upb_FieldDef_MessageSubDef(f);
+  const upb_FieldDef* key_f = upb_MessageDef_Field(entry_m, 0);
+  const upb_FieldDef* val_f = upb_MessageDef_Field(entry_m, 1);
+  PyObject* dict = PyDict_New();
+  if (!dict) return NULL;
+  upb_MessageValue key, val;
+  size_t iter = kUpb_Map_Begin;
+  while (upb_Map_Next(map, &key, &val, &iter)) {
+    PyObject* py_key = PyUpb_UpbToPy(key, key_f, arena);
+    PyObject* py_val =
+        py_key ? PyUpb_Message_ValueToDict(val, val_f, arena, converters)
+               : NULL;
+    bool ok = py_val && PyDict_SetItem(dict, py_key, py_val) == 0;
+    Py_XDECREF(py_key);
+    Py_XDECREF(py_val);
+    if (!ok) {
+      Py_DECREF(dict);
+      return NULL;
+    }
+  }
+  return dict;
+}
+
+static PyObject* PyUpb_Message_MessageToDict(const upb_Message* msg,
+                                             const upb_MessageDef* m,
+                                             PyObject* arena,
+                                             PyObject* converters) {
+  PyObject* dict = PyDict_New();
+  if (!dict || !msg) return dict;
+  size_t iter = kUpb_Message_Begin;
+  const upb_FieldDef* f;
+  upb_MessageValue val;
+  // No extension pool is passed, so extensions are skipped.
+  while (upb_Message_Next(msg, m, NULL, &f, &val, &iter)) {
+    PyObject* py_val;
+    if (upb_FieldDef_IsMap(f)) {
+      py_val = PyUpb_Message_MapToDict(val.map_val, f, arena, converters);
+    } else if (upb_FieldDef_IsRepeated(f)) {
+      py_val = PyUpb_Message_ArrayToList(val.array_val, f, arena, converters);
+    } else {
+      py_val = PyUpb_Message_ValueToDict(val, f, arena, converters);
+    }
+    bool ok =
+        py_val && PyDict_SetItemString(dict, upb_FieldDef_Name(f), py_val) == 0;
+    Py_XDECREF(py_val);
+    if (!ok) {
+      Py_DECREF(dict);
+      return NULL;
+    }
+  }
+  return dict;
+}
+
+static PyObject* PyUpb_Message_ToDict(PyObject* _self, PyObject* converters) {
+  PyUpb_Message* self = (void*)_self;
+  if (converters != Py_None && !PyDict_Check(converters)) {
+    PyErr_SetString(PyExc_TypeError, "converters must be a dict or None");
+    return NULL;
+  }
+  return PyUpb_Message_MessageToDict(PyUpb_Message_GetIfReified(_self),
+                                     PyUpb_Message_GetMsgdef(_self),
+                                     self->arena, converters);
+}
+
+// -----------------------------------------------------------------------------
+// Comparison with options
+// -----------------------------------------------------------------------------
+
+typedef struct {
+  bool ignore_repeated_order;
+  bool has_float_tolerance;
+  double float_tolerance;
+  const upb_DefPool* ext_pool;
+  bool out_of_memory;
+} PyUpb_CompareOptions;
+
+static bool PyUpb_Message_MessagesEqual(const upb_Message* msg1,
+                                        const upb_Message* msg2,
+                                        const upb_MessageDef* m,
+                                        PyUpb_CompareOptions* options);
+
+static bool PyUpb_Message_FloatsEqual(double a, double b,
+                                      const PyUpb_CompareOptions* options) {
+  if (a == b) return true;
+  return options->has_float_tolerance && fabs(a - b) <= options->float_tolerance;
+}
+
+static bool PyUpb_Message_ValuesEqual(upb_MessageValue val1,
+                                      upb_MessageValue val2,
+                                      const upb_FieldDef* f,
+                                      PyUpb_CompareOptions* options) {
+  switch (upb_FieldDef_CType(f)) {
+    case kUpb_CType_Float:
+      return PyUpb_Message_FloatsEqual(val1.float_val, val2.float_val, options);
+    case kUpb_CType_Double:
+      return PyUpb_Message_FloatsEqual(val1.double_val, val2.double_val,
+                                       options);
+    case kUpb_CType_Message:
+      return PyUpb_Message_MessagesEqual(val1.msg_val, val2.msg_val,
+                                         upb_FieldDef_MessageSubDef(f),
+                                         options);
+    default:
+      return upb_MessageValue_IsEqual(val1, val2, upb_FieldDef_CType(f), NULL,
+                                      0);
+  }
+}
+
+// Matches the elements of two arrays from index `start` on, in any order.
+static bool PyUpb_Message_UnorderedEqual(const upb_Array* arr1,
+                                         const upb_Array* arr2, size_t start,
+                                         const upb_FieldDef* f,
+                                         PyUpb_CompareOptions* options) {
+  size_t size = upb_Array_Size(arr1);
+  bool* matched = PyMem_Calloc(size - start, sizeof(*matched));
+  if (!matched) {
+    options->out_of_memory = true;
+    return false;
+  }
+  bool ret = true;
+  for (size_t i = start; ret && i < size; i++) {
+    upb_MessageValue val1 = upb_Array_Get(arr1, i);
+    ret = false;
+    for (size_t j = start; j < size; j++) {
+      if (matched[j - start]) continue;
+      if (PyUpb_Message_ValuesEqual(val1, upb_Array_Get(arr2, j), f, options)) {
+        matched[j - start] = true;
+        ret = true;
+        break;
+      }
+    }
+  }
+  PyMem_Free(matched);
+  return ret;
+}
+
+// Matches each element of `arr1` with an equal element of `arr2`, of the same
+// size.  Equality within a float tolerance is not transitive, so an element
+// may have to be matched with another element than the first equal one: the
+// elements are matched along augmenting paths, which rematch the elements
+// matched before (Kuhn's algorithm).
+static bool PyUpb_Message_MatchedEqual(const upb_Array* arr1,
+                                       const upb_Array* arr2,
+                                       const upb_FieldDef* f,
+                                       PyUpb_CompareOptions* options) {
+  size_t size = upb_Array_Size(arr1);
+  // Indices plus one, 0 meaning none: `match1` and `match2` of the matched
+  // elements, `reached` of the element of `arr1` from which the search
+  // reached each element of `arr2`, and `rows` of the elements of `arr1` left
+  // to search from.
+  size_t* buf = PyMem_Calloc(4 * size + 1, sizeof(*buf));
+  if (!buf) {
+    options->out_of_memory = true;
+    return false;
+  }
+  size_t* match1 = buf;
+  size_t* match2 = buf + size;
+  size_t* reached = buf + 2 * size;
+  size_t* rows = buf + 3 * size;
+  bool ret = true;
+  for (size_t i = 0; ret && i < size; i++) {
+    memset(reached, 0, size * sizeof(*reached));
+    size_t num_rows = 0;
+    rows[num_rows++] = i;
+    size_t free = 0;
+    while (num_rows && !free) {
+      size_t row = rows[--num_rows];
+      upb_MessageValue val1 = upb_Array_Get(arr1, row);
+      for (size_t j = 0; j < size; j++) {
+        if (reached[j] || !PyUpb_Message_ValuesEqual(
+                              val1, upb_Array_Get(arr2, j), f, options)) {
+          continue;
+        }
+        reached[j] = row + 1;
+        if (!match2[j]) {
+          free = j + 1;
+          break;
+        }
+        rows[num_rows++] = match2[j] - 1;
+      }
+    }
+    if (!free) {
+      ret = false;
+      break;
+    }
+    // Rematches the elements along the path, from its unmatched end.
+    size_t j = free - 1;
+    while (true) {
+      size_t row = reached[j] - 1;
+      size_t previous = match1[row];
+      match1[row] = j + 1;
+      match2[j] = row + 1;
+      if (!previous) break;
+      j = previous - 1;
+    }
+  }
+  PyMem_Free(buf);
+  return ret;
+}
+
+static bool PyUpb_Message_ArraysEqual(const upb_Array* arr1,
+                                      const upb_Array* arr2,
+                                      const upb_FieldDef* f,
+                                      PyUpb_CompareOptions* options) {
+  size_t size = arr1 ? upb_Array_Size(arr1) : 0;
+  if ((arr2 ? upb_Array_Size(arr2) : 0) != size) return false;
+  for (size_t i = 0; i < size; i++) {
+    if (!PyUpb_Message_ValuesEqual(upb_Array_Get(arr1, i),
+                                   upb_Array_Get(arr2, i), f, options)) {
+      if (!options->ignore_repeated_order) return false;
+      if (options->has_float_tolerance) {
+        // Elements equal within the tolerance may have to be matched with
+        // other elements than those at the same index.
+        return PyUpb_Message_MatchedEqual(arr1, arr2, f, options);
+      }
+      return PyUpb_Message_UnorderedEqual(arr1, arr2, i, f, options);
+    }
+  }
+  return true;
+}
+
+static bool PyUpb_Message_MapsEqual(const upb_Map* map1, const upb_Map* map2,
+                                    const upb_FieldDef* f,
+                                    PyUpb_CompareOptions* options) {
+  size_t size = map1 ? upb_Map_Size(map1) : 0;
+  if ((map2 ? upb_Map_Size(map2) : 0) != size) return false;
+  if (size == 0) return true;
+  const upb_FieldDef* val_f =
+      upb_MessageDef_Field(upb_FieldDef_MessageSubDef(f), 1);
+  upb_MessageValue key, val1, val2;
+  size_t iter = kUpb_Map_Begin;
+  while (upb_Map_Next(map1, &key, &val1, &iter)) {
+    if (!upb_Map_Get(map2, key, &val2) ||
+        !PyUpb_Message_ValuesEqual(val1, val2, val_f, options)) {
+      return false;
+    }
+  }
+  return true;
+}
+
+// Compares field `f`, which is set to `val` in one message, with the same
+// field of `other`, which may be NULL for an empty message.
+static bool PyUpb_Message_FieldEqual(upb_MessageValue val,
+                                     const upb_Message* other,
+                                     const upb_FieldDef* f,
+                                     PyUpb_CompareOptions* options) {
+  if (upb_FieldDef_IsMap(f)) {
+    return PyUpb_Message_MapsEqual(
+        val.map_val, other ? upb_Message_GetFieldByDef(other, f).map_val : NULL,
+        f, options);
+  }
+  if (upb_FieldDef_IsRepeated(f)) {
+    return PyUpb_Message_ArraysEqual(
+        val.array_val,
+        other ? upb_Message_GetFieldByDef(other, f).array_val : NULL, f,
+        options);
+  }
+  if (upb_FieldDef_HasPresence(f) &&
+      !(other && upb_Message_HasFieldByDef(other, f))) {
+    return false;
+  }
+  upb_MessageValue other_val =
+      other ? upb_Message_GetFieldByDef(other, f) : upb_FieldDef_Default(f);
+  return PyUpb_Message_ValuesEqual(val, other_val, f, options);
+}
+
+// Returns whether `f`, set in the other message, was already compared while
+// iterating over the fields set in `msg`.
+static bool PyUpb_Message_FieldIsSet(const upb_Message* msg,
+                                     const upb_FieldDef* f) {
+  if (!msg) return false;
+  if (upb_FieldDef_IsMap(f)) {
+    const upb_Map* map = upb_Message_GetFieldByDef(msg, f).map_val;
+    return map && upb_Map_Size(map);
+  }
+  if (upb_FieldDef_IsRepeated(f)) {
+    const upb_Array* arr = upb_Message_GetFieldByDef(msg, f).array_val;
+    return arr && upb_Array_Size(arr);
+  }
+  // Fields without presence are compared again, which is cheap for scalars.
+  return upb_FieldDef_HasPresence(f) && upb_Message_HasFieldByDef(msg, f);
+}
+
+static bool PyUpb_Message_MessagesEqual(const upb_Message* msg1,
+                                        const upb_Message* msg2,
+                                        const upb_MessageDef* m,
+                                        PyUpb_CompareOptions* options) {
+  if (msg1 == msg2) return true;
+  size_t iter = kUpb_Message_Begin;
+  const upb_FieldDef* f;
+  upb_MessageValue val;
+  while (msg1 && upb_Message_Next(msg1, m, options->ext_pool, &f, &val,
+                                  &iter)) {
+    if (!PyUpb_Message_FieldEqual(val, msg2, f, options)) return false;
+  }
+  iter = kUpb_Message_Begin;
+  while (msg2 && upb_Message_Next(msg2, m, options->ext_pool, &f, &val,
+                                  &iter)) {
+    if (PyUpb_Message_FieldIsSet(msg1, f)) continue;
+    if (!PyUpb_Message_FieldEqual(val, msg1, f, options)) return false;
+  }
+  size_t len1 = 0, len2 = 0;
+  const char* unknown1 = msg1 ? upb_Message_GetUnknown(msg1, &len1) : NULL;
+  const char* unknown2 = msg2 ? upb_Message_GetUnknown(msg2, &len2) : NULL;
+  return len1 == len2 && (len1 == 0 || memcmp(unknown1, unknown2, len1) == 0);
+}
+
+static PyObject* PyUpb_Message_Equals(PyObject* _self, PyObject* args) {
+  PyObject* other;
+  int ignore_repeated_order;
+  PyObject* float_tolerance;
+  if (!PyArg_ParseTuple(args, "OpO", &other, &ignore_repeated_order,
+                        &float_tolerance)) {
+    return NULL;
+  }
+  const upb_MessageDef* m = PyUpb_Message_GetMsgdef(_self);
+  PyUpb_CompareOptions options = {
+      .ignore_repeated_order = ignore_repeated_order,
+      .has_float_tolerance = float_tolerance != Py_None,
+      .ext_pool = upb_FileDef_Pool(upb_MessageDef_File(m)),
+  };
+  if (options.has_float_tolerance) {
+    options.float_tolerance = PyFloat_AsDouble(float_tolerance);
+    if (options.float_tolerance == -1.0 && PyErr_Occurred()) return NULL;
+  }
+  if (!PyObject_TypeCheck(other, Py_TYPE(_self))) Py_RETURN_FALSE;
+  bool ret = PyUpb_Message_MessagesEqual(PyUpb_Message_GetIfReified(_self),
+                                         PyUpb_Message_GetIfReified(other), m,
+                                         &options);
+  if (options.out_of_memory) return PyErr_NoMemory();
+  return PyBool_FromLong(ret);
+}
+
 PyObject* DeepCopy(PyObject* _self, PyObject* arg) {
   const upb_MessageDef* def = PyUpb_Message_GetMsgdef(_self);
   const upb_MiniTable* mini_table = upb_MessageDef_MiniTable(def);
@@ -1737,7 +2366,8 @@ static PyMethodDef PyUpb_Message_Methods[] = {
      METH_NOARGS, "Discards the unknown fields."},
     {"FindInitializationErrors", PyUpb_Message_FindInitializationErrors,
      METH_NOARGS, "Finds unset required fields."},
-    {"FromString", PyUpb_Message_FromString, METH_O | METH_CLASS,
+    {"FromString", (PyCFunction)PyUpb_Message_FromString,
+     METH_VARARGS | METH_KEYWORDS | METH_CLASS,
      "Creates new method instance from given serialized data."},
     {"HasExtension", PyUpb_Message_HasExtension, METH_O,
      "Checks if a message field is set."},
@@ -1767,12 +2397,22 @@ static PyMethodDef PyUpb_Message_Methods[] = {
     {"WhichOneof", PyUpb_Message_WhichOneof, METH_O,
      "Returns the name of the field set inside a oneof, "
      "or None if no field is set."},
+    {"view", PyUpb_Message_View, METH_NOARGS,
+     "Returns a read-only view of the message."},
     {"_ListFieldsItemKey", PyUpb_Message_ListFieldsItemKey,
      METH_O | METH_STATIC,
      "Compares ListFields() list entries by field number"},
     {"_CheckCalledFromGeneratedFile",
      PyUpb_Message_CheckCalledFromGeneratedFile, METH_NOARGS | METH_STATIC,
      "Raises TypeError if the caller is not in a _pb2.py file."},
+    {"_Freeze", PyUpb_Message_Freeze, METH_NOARGS,
+     "Makes the message and all of its sub-messages immutable."},
+    {"_FrozenCache", PyUpb_Message_FrozenCache, METH_NOARGS,
+     "Returns the dict of cached values of a frozen message, or None."},
+    {"_ToDict", PyUpb_Message_ToDict, METH_O,
+     "Returns the fields set in the message as a dict."},
+    {"_Equals", PyUpb_Message_Equals, METH_VARARGS,
+     "Compares the message with another one, with options."},
     {NULL, NULL}};
 
 static PyType_Slot PyUpb_Message_Slots[] = {
@@ -1780,7 +2420,7 @@ static PyType_Slot PyUpb_Message_Slots[] = {
     {Py_tp_doc, "A ProtocolMessage"},
     {Py_tp_getattro, PyUpb_Message_GetAttr},
     {Py_tp_getset, PyUpb_Message_Getters},
-    {Py_tp_hash, PyObject_HashNotImplemented},
+    {Py_tp_hash, PyUpb_Message_Hash},
     {Py_tp_methods, PyUpb_Message_Methods},
     {Py_tp_new, PyUpb_Message_New},
     {Py_tp_str, PyUpb_Message_ToString},
@@ -32,6 +32,14 @@ PyObject* PyUpb_Message_Get(upb_Message* u_msg, const upb_MessageDef* m,
 // returns false on failure.
 bool PyUpb_Message_Verify(PyObject* self);
 
+// Verifies that a message is not frozen.  Sets a ValueError and returns false
+// on failure.
+bool PyUpb_Message_VerifyMutable(PyObject* self);
+
+// Sets a ValueError for an attempt to modify a frozen message or one of its
+// containers.
+void PyUpb_Message_SetFrozenError(void);
+
 // Gets the upb_Message* for this message object if the message is reified.
 // Otherwise returns NULL.
 upb_Message* PyUpb_Message_GetIfReified(PyObject* _self);
@@ -51,6 +59,27 @@ PyObject* PyUpb_Message_SerializePartialToString(PyObject* self, PyObject* args,
 int PyUpb_Message_InitAttributes(PyObject* _self, PyObject* args,
                                  PyObject* kwargs);
 
+// Returns the field named `py_name` of message type `m`, or NULL and sets a
+// ValueError if there is no such field.
+const upb_FieldDef* PyUpb_Message_LookupField(const upb_MessageDef* m,
+                                              PyObject* py_name);
+
+// Sets fields of `msg`, a new message of type `m` in `arena`, like
+// PyUpb_Message_InitAttributes() would from the keyword arguments `kwargs`.
+// Unlike it, no Python object is created for the message unless a field is a
+// message, repeated or map field.  Returns false with an exception set on
+// failure.
+bool PyUpb_Message_InitNewFromDict(upb_Message* msg, const upb_MessageDef* m,
+                                   PyObject* arena, PyObject* kwargs);
+
+// Same as PyUpb_Message_InitNewFromDict() with the keyword arguments given as
+// a tuple of `names`, their resolved `fields` and their `values`, all of the
+// same length.
+bool PyUpb_Message_InitNewFromValues(upb_Message* msg, const upb_MessageDef* m,
+                                     PyObject* arena, PyObject* names,
+                                     const upb_FieldDef* const* fields,
+                                     PyObject* const* values);
+
 // Checks that `key` is a field descriptor for an extension type, and that the
 // extendee is this message.  Otherwise returns NULL and sets a KeyError.
 const upb_FieldDef* PyUpb_Message_GetExtensionDef(PyObject* _self,
@@ -0,0 +1,344 @@
+// Protocol Buffers - Google's data interchange format
+// Copyright 2023 Google LLC.  All rights reserved.
+//
+// Use of this source code is governed by a BSD-style
+// license that can be found in the LICENSE file or at
+// https://developers.google.com/open-source/licenses/bsd
+
+#include "python/message_columns.h"
+
+#include <stdint.h>
+#include <string.h>
+
+#include "python/descriptor.h"
+#include "python/message.h"
+#include "python/protobuf.h"
+#include "python/repeated.h"
+#include "upb/message/array.h"
+#include "upb/reflection/def.h"
+#include "upb/reflection/message.h"
+
+// -----------------------------------------------------------------------------
+// ColumnBuffer
+// -----------------------------------------------------------------------------
+
+// A bytearray which is appended to, with amortized growth.
+typedef struct {
+  PyObject* bytes;
+  size_t size;
+  size_t capacity;
+} PyUpb_ColumnBuffer;
+
+// Reserves `n` bytes at the end of the buffer and returns a pointer to them,
+// or NULL with an exception set.
+static char* PyUpb_ColumnBuffer_Append(PyUpb_ColumnBuffer* buf, size_t n) {
+  if (buf->size + n > buf->capacity) {
+    size_t capacity = buf->capacity ? buf->capacity * 2 : 64;
+    while (capacity < buf->size + n) capacity *= 2;
+    if (buf->bytes) {
+      if (PyByteArray_Resize(buf->bytes, capacity) < 0) return NULL;
+    } else {
+      buf->bytes = PyByteArray_FromStringAndSize(NULL, capacity);
+      if (!buf->bytes) return NULL;
+    }
+    buf->capacity = capacity;
+  }
+  char* ptr = PyByteArray_AsString(buf->bytes) + buf->size;
+  buf->size += n;
+  return ptr;
+}
+
+static bool PyUpb_ColumnBuffer_Write(PyUpb_ColumnBuffer* buf, const void* data,
+                                     size_t n) {
+  if (n == 0) return true;
+  char* ptr = PyUpb_ColumnBuffer_Append(buf, n);
+  if (!ptr) return false;
+  memcpy(ptr, data, n);
+  return true;
+}
+
+static bool PyUpb_ColumnBuffer_WriteOffset(PyUpb_ColumnBuffer* buf,
+                                           int64_t offset) {
+  return PyUpb_ColumnBuffer_Write(buf, &offset, sizeof(offset));
+}
+
+// Returns the bytearray, truncated to the data written, and releases the
+// buffer's reference to it.
+static PyObject* PyUpb_ColumnBuffer_Finish(PyUpb_ColumnBuffer* buf) {
+  if (!buf->bytes) return PyByteArray_FromStringAndSize(NULL, 0);
+  PyObject* bytes = buf->bytes;
+  buf->bytes = NULL;
+  if (PyByteArray_Resize(bytes, buf->size) < 0) {
+    Py_DECREF(bytes);
+    return NULL;
+  }
+  return bytes;
+}
+
+// -----------------------------------------------------------------------------
+// Column
+// -----------------------------------------------------------------------------
+
+typedef struct {
+  // The fields from the message type to the field of the column.
+  const upb_FieldDef** path;
+  Py_ssize_t depth;
+  // The size of a value in the buffers, or 0 for strings and bytes, whose
+  // values are delimited by offsets into a data buffer.
+  size_t value_size;
+  bool repeated;
+  // The number of values, and the size of the string data appended so far.
+  int64_t count;
+  int64_t data_size;
+  // The offsets of the rows in the values if the field is repeated, then the
+  // offsets of the string values if the field is a string or bytes field,
+  // then the values or string data.
+  PyUpb_ColumnBuffer buffers[3];
+  int buffer_count;
+} PyUpb_Column;
+
+static size_t PyUpb_Column_ValueSize(const upb_FieldDef* f) {
+  switch (upb_FieldDef_CType(f)) {
+    case kUpb_CType_Bool:
+      return 1;
+    case kUpb_CType_Int32:
+    case kUpb_CType_UInt32:
+    case kUpb_CType_Enum:
+    case kUpb_CType_Float:
+      return 4;
+    case kUpb_CType_Int64:
+    case kUpb_CType_UInt64:
+    case kUpb_CType_Double:
+      return 8;
+    default:
+      return 0;
+  }
+}
+
+// Reads the field descriptors of a path, which must lead from message type
+// `*m` to a scalar field.  If `*m` is NULL, it is set to the type of the first
+// field of the path.
+static bool PyUpb_Column_Init(PyUpb_Column* col, PyObject* py_path,
+                              const upb_MessageDef** m) {
+  PyObject* it = PyObject_GetIter(py_path);
+  if (!it) return false;
+  Py_ssize_t size = PyObject_Length(py_path);
+  if (size <= 0) {
+    Py_DECREF(it);
+    if (size == 0) PyErr_SetString(PyExc_ValueError, "Empty column path.");
+    return false;
+  }
+  col->path = PyMem_New(const upb_FieldDef*, size);
+  if (!col->path) {
+    Py_DECREF(it);
+    PyErr_NoMemory();
+    return false;
+  }
+  const upb_MessageDef* parent = *m;
+  PyObject* item;
+  while (col->depth < size && (item = PyIter_Next(it)) != NULL) {
+    const upb_FieldDef* f = PyUpb_FieldDescriptor_GetDef(item);
+    Py_DECREF(item);
+    if (!f) break;
+    if (parent && upb_FieldDef_ContainingType(f) != parent) {
+      PyErr_Format(PyExc_ValueError, "Field %s is not a field of %s.",
+                   upb_FieldDef_FullName(f), upb_MessageDef_FullName(parent));
+      break;
+    }
+    if (!*m) *m = upb_FieldDef_ContainingType(f);
+    col->path[col->depth++] = f;
+    parent = upb_FieldDef_IsSubMessage(f) && !upb_FieldDef_IsRepeated(f)
+                 ? upb_FieldDef_MessageSubDef(f)
+                 : NULL;
+    if (col->depth < size && !parent) {
+      PyErr_Format(PyExc_ValueError,
+                   "Field %s is not a singular message field.",
+                   upb_FieldDef_FullName(f));
+      break;
+    }
+  }
+  Py_DECREF(it);
+  if (PyErr_Occurred()) return false;
+  const upb_FieldDef* f = col->path[col->depth - 1];
+  if (upb_FieldDef_IsSubMessage(f)) {
+    PyErr_Format(PyExc_ValueError, "Field %s is not a scalar field.",
+                 upb_FieldDef_FullName(f));
+    return false;
+  }
+  col->value_size = PyUpb_Column_ValueSize(f);
+  col->repeated = upb_FieldDef_IsRepeated(f);
+  col->buffer_count = 1 + col->repeated + (col->value_size == 0);
+  if (col->repeated && !PyUpb_ColumnBuffer_WriteOffset(&col->buffers[0], 0)) {
+    return false;
+  }
+  if (col->value_size == 0 &&
+      !PyUpb_ColumnBuffer_WriteOffset(&col->buffers[col->buffer_count - 2],
+                                      0)) {
+    return false;
+  }
+  return true;
+}
+
+static void PyUpb_Column_Free(PyUpb_Column* col) {
+  PyMem_Free(col->path);
+  for (int i = 0; i < 3; i++) Py_XDECREF(col->buffers[i].bytes);
+}
+
+static bool PyUpb_Column_AppendValue(PyUpb_Column* col, upb_MessageValue val) {
+  PyUpb_ColumnBuffer* data = &col->buffers[col->buffer_count - 1];
+  if (col->value_size) {
+    return PyUpb_ColumnBuffer_Write(data, &val, col->value_size);
+  }
+  col->data_size += val.str_val.size;
+  return PyUpb_ColumnBuffer_Write(data, val.str_val.data, val.str_val.size) &&
+         PyUpb_ColumnBuffer_WriteOffset(&col->buffers[col->buffer_count - 2],
+                                        col->data_size);
+}
+
+// Appends the value of the column in `msg`, which is NULL for an empty message.
+static bool PyUpb_Column_AppendRow(PyUpb_Column* col, const upb_Message* msg) {
+  for (Py_ssize_t i = 0; msg && i < col->depth - 1; i++) {
+    msg = upb_Message_GetFieldByDef(msg, col->path[i]).msg_val;
+  }
+  const upb_FieldDef* f = col->path[col->depth - 1];
+  if (!col->repeated) {
+    return PyUpb_Column_AppendValue(
+        col, msg ? upb_Message_GetFieldByDef(msg, f) : upb_FieldDef_Default(f));
+  }
+  const upb_Array* arr =
+      msg ? upb_Message_GetFieldByDef(msg, f).array_val : NULL;
+  size_t size = arr ? upb_Array_Size(arr) : 0;
+  if (col->value_size) {
+    // The values of a repeated scalar field are stored contiguously, in the
+    // same layout as in the column.
+    if (size && !PyUpb_ColumnBuffer_Write(&col->buffers[1],
+                                          upb_Array_DataPtr(arr),
+                                          size * col->value_size)) {
+      return false;
+    }
+  } else {
+    for (size_t i = 0; i < size; i++) {
+      if (!PyUpb_Column_AppendValue(col, upb_Array_Get(arr, i))) return false;
+    }
+  }
+  col->count += size;
+  return PyUpb_ColumnBuffer_WriteOffset(&col->buffers[0], col->count);
+}
+
+static bool PyUpb_Columns_AppendRow(PyUpb_Column* cols, Py_ssize_t n,
+                                    const upb_Message* msg) {
+  for (Py_ssize_t i = 0; i < n; i++) {
+    if (!PyUpb_Column_AppendRow(&cols[i], msg)) return false;
+  }
+  return true;
+}
+
+// Appends a row per message of a sequence of message objects of type `m`.
+static bool PyUpb_Columns_AppendMessages(PyUpb_Column* cols, Py_ssize_t n,
+                                         const upb_MessageDef* m,
+                                         PyObject* messages) {
+  PyObject* it = PyObject_GetIter(messages);
+  if (!it) return false;
+  PyObject* item;
+  bool ok = true;
+  while (ok && (item = PyIter_Next(it)) != NULL) {
+    ok = PyUpb_Message_Verify(item);
+    if (ok && PyUpb_Message_GetMsgdef(item) != m) {
+      PyErr_Format(PyExc_TypeError, "Expected message of type %s, got %s.",
+                   upb_MessageDef_FullName(m),
+                   upb_MessageDef_FullName(PyUpb_Message_GetMsgdef(item)));
+      ok = false;
+    }
+    ok = ok && PyUpb_Columns_AppendRow(cols, n,
+                                       PyUpb_Message_GetIfReified(item));
+    Py_DECREF(item);
+  }
+  Py_DECREF(it);
+  return ok && !PyErr_Occurred();  // Check PyIter_Next() exit.
+}
+
+// Appends a row per element of a repeated message field, reading the elements
+// directly from the underlying array.
+static bool PyUpb_Columns_AppendContainer(PyUpb_Column* cols, Py_ssize_t n,
+                                          const upb_MessageDef* m,
+                                          PyObject* container) {
+  const upb_FieldDef* f;
+  const upb_Array* arr = PyUpb_RepeatedContainer_GetArray(container, &f);
+  if (upb_FieldDef_MessageSubDef(f) != m) {
+    PyErr_Format(PyExc_TypeError, "Expected messages of type %s, got %s.",
+                 upb_MessageDef_FullName(m),
+                 upb_MessageDef_FullName(upb_FieldDef_MessageSubDef(f)));
+    return false;
+  }
+  size_t size = arr ? upb_Array_Size(arr) : 0;
+  for (size_t i = 0; i < size; i++) {
+    if (!PyUpb_Columns_AppendRow(cols, n, upb_Array_Get(arr, i).msg_val)) {
+      return false;
+    }
+  }
+  return true;
+}
+
+static PyObject* PyUpb_Column_Finish(PyUpb_Column* col) {
+  PyObject* ret = PyTuple_New(col->buffer_count);
+  if (!ret) return NULL;
+  for (int i = 0; i < col->buffer_count; i++) {
+    PyObject* bytes = PyUpb_ColumnBuffer_Finish(&col->buffers[i]);
+    if (!bytes) {
+      Py_DECREF(ret);
+      return NULL;
+    }
+    PyTuple_SetItem(ret, i, bytes);
+  }
+  return ret;
+}
+
+PyObject* PyUpb_ColumnBuffers(PyObject* module, PyObject* args) {
+  PyObject* messages;
+  PyObject* paths;
+  if (!PyArg_ParseTuple(args, "OO", &messages, &paths)) return NULL;
+  Py_ssize_t n = PyObject_Length(paths);
+  if (n < 0) return NULL;
+  PyUpb_Column* cols = PyMem_Calloc(n ? n : 1, sizeof(*cols));
+  if (!cols) return PyErr_NoMemory();
+
+  PyObject* ret = NULL;
+  const upb_MessageDef* m = NULL;
+  Py_ssize_t initialized = 0;
+  for (; initialized < n; initialized++) {
+    PyObject* py_path = PySequence_GetItem(paths, initialized);
+    bool ok = py_path && PyUpb_Column_Init(&cols[initialized], py_path, &m);
+    Py_XDECREF(py_path);
+    if (!ok) {
+      initialized++;  // Frees the partially initialized column.
+      goto done;
+    }
+  }
+  if (n == 0) {
+    ret = PyList_New(0);
+    goto done;
+  }
+
+  PyUpb_ModuleState* state = PyUpb_ModuleState_Get();
+  bool ok = PyObject_TypeCheck(messages,
+                               state->repeated_composite_container_type)
+                ? PyUpb_Columns_AppendContainer(cols, n, m, messages)
+                : PyUpb_Columns_AppendMessages(cols, n, m, messages);
+  if (!ok) goto done;
+
+  ret = PyList_New(n);
+  if (!ret) goto done;
+  for (Py_ssize_t i = 0; i < n; i++) {
+    PyObject* column = PyUpb_Column_Finish(&cols[i]);
+    if (!column) {
+      Py_CLEAR(ret);
+      goto done;
+    }
+    PyList_SetItem(ret, i, column);
+  }
+
+done:
+  for (Py_ssize_t i = 0; i < initialized; i++) PyUpb_Column_Free(&cols[i]);
+  PyMem_Free(cols);
+  return ret;
+}
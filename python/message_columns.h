@@ -0,0 +1,24 @@
+// Protocol Buffers - Google's data interchange format
+// Copyright 2023 Google LLC.  All rights reserved.
+//
+// Use of this source code is governed by a BSD-style
+// license that can be found in the LICENSE file or at
+// https://developers.google.com/open-source/licenses/bsd
+
+#ifndef PYUPB_MESSAGE_COLUMNS_H__
+#define PYUPB_MESSAGE_COLUMNS_H__
+
+#include "python/python_api.h"
+
+// Implements _ColumnBuffers(messages, paths), the upb version of
+// google.protobuf.internal.message_columns.ColumnBuffers().
+//
+// `messages` is a repeated message field or a sequence of messages of the same
+// type, and `paths` a list of lists of field descriptors, each leading from the
+// message type to a scalar or repeated scalar field.  Returns a list with a
+// tuple of bytearrays per path, in the layout documented in message_columns.py.
+// The fields are read directly from the upb messages, without creating wrappers
+// for the messages or their fields.
+PyObject* PyUpb_ColumnBuffers(PyObject* module, PyObject* args);
+
+#endif  // PYUPB_MESSAGE_COLUMNS_H__
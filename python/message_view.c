@@ -0,0 +1,336 @@
+// Protocol Buffers - Google's data interchange format
+// Copyright 2023 Google LLC.  All rights reserved.
+//
+// Use of this source code is governed by a BSD-style
+// license that can be found in the LICENSE file or at
+// https://developers.google.com/open-source/licenses/bsd
+
+#include "python/message_view.h"
+
+#include "python/convert.h"
+#include "python/descriptor.h"
+#include "python/protobuf.h"
+#include "upb/message/array.h"
+#include "upb/message/map.h"
+#include "upb/reflection/def.h"
+#include "upb/reflection/message.h"
+
+// -----------------------------------------------------------------------------
+// MessageView
+// -----------------------------------------------------------------------------
+
+typedef struct {
+  PyObject_HEAD;
+  PyObject* arena;
+  PyObject* owner;  // Keeps `def` alive.
+  const upb_MessageDef* def;
+  const upb_Message* msg;  // NULL if the message is not present.
+} PyUpb_MessageView;
+
+typedef struct {
+  PyObject_HEAD;
+  PyObject* arena;
+  PyObject* owner;  // Keeps `field` alive.
+  const upb_FieldDef* field;
+  const upb_Array* arr;  // NULL if the field is empty.
+} PyUpb_RepeatedView;
+
+static PyObject* PyUpb_RepeatedView_New(PyObject* arena, PyObject* owner,
+                                        const upb_FieldDef* f,
+                                        const upb_Array* arr);
+
+PyObject* PyUpb_MessageView_New(PyObject* arena, PyObject* owner,
+                                const upb_MessageDef* m,
+                                const upb_Message* msg) {
+  PyUpb_ModuleState* state = PyUpb_ModuleState_Get();
+  PyUpb_MessageView* view =
+      (void*)PyType_GenericAlloc(state->message_view_type, 0);
+  if (!view) return NULL;
+  view->arena = PyUpb_NewRef(arena);
+  view->owner = PyUpb_NewRef(owner);
+  view->def = m;
+  view->msg = msg;
+  return &view->ob_base;
+}
+
+static void PyUpb_MessageView_Dealloc(PyObject* _self) {
+  PyUpb_MessageView* self = (void*)_self;
+  Py_DECREF(self->arena);
+  Py_DECREF(self->owner);
+  PyUpb_Dealloc(self);
+}
+
+// Converts a value of field `f` to a Python object, creating views rather than
+// wrappers for sub-messages and containers.
+static PyObject* PyUpb_MessageView_ToPy(PyObject* arena, PyObject* owner,
+                                        const upb_FieldDef* f,
+                                        upb_MessageValue val) {
+  if (upb_FieldDef_IsSubMessage(f)) {
+    return PyUpb_MessageView_New(arena, owner, upb_FieldDef_MessageSubDef(f),
+                                 val.msg_val);
+  }
+  return PyUpb_UpbToPy(val, f, arena);
+}
+
+// Returns a new dict with the entries of map field `f`.
+static PyObject* PyUpb_MessageView_MapToDict(PyObject* arena, PyObject* owner,
+                                             const upb_FieldDef* f,
+                                             const upb_Map* map) {
+  PyObject* dict = PyDict_New();
+  if (!dict || !map) return dict;
+  const upb_MessageDef* entry_m = upb_FieldDef_MessageSubDef(f);
+  const upb_FieldDef* key_f = upb_MessageDef_Field(entry_m, 0);
+  const upb_FieldDef* val_f = upb_MessageDef_Field(entry_m, 1);
+  upb_MessageValue key, val;
+  size_t iter = kUpb_Map_Begin;
+  while (upb_Map_Next(map, &key, &val, &iter)) {
+    PyObject* py_key = PyUpb_UpbToPy(key, key_f, arena);
+    PyObject* py_val =
+        py_key ? PyUpb_MessageView_ToPy(arena, owner, val_f, val) : NULL;
+    int err = py_val ? PyDict_SetItem(dict, py_key, py_val) : -1;
+    Py_XDECREF(py_key);
+    Py_XDECREF(py_val);
+    if (err < 0) {
+      Py_DECREF(dict);
+      return NULL;
+    }
+  }
+  return dict;
+}
+
+static PyObject* PyUpb_MessageView_GetFieldValue(PyUpb_MessageView* self,
+                                                 const upb_FieldDef* f) {
+  if (upb_FieldDef_IsMap(f)) {
+    const upb_Map* map =
+        self->msg ? upb_Message_GetFieldByDef(self->msg, f).map_val : NULL;
+    PyObject* dict =
+        PyUpb_MessageView_MapToDict(self->arena, self->owner, f, map);
+    if (!dict) return NULL;
+    // Like the views of the python backend, the mapping is read-only.
+    PyObject* proxy = PyDictProxy_New(dict);
+    Py_DECREF(dict);
+    return proxy;
+  }
+  if (upb_FieldDef_IsRepeated(f)) {
+    const upb_Array* arr =
+        self->msg ? upb_Message_GetFieldByDef(self->msg, f).array_val : NULL;
+    return PyUpb_RepeatedView_New(self->arena, self->owner, f, arr);
+  }
+  if (upb_FieldDef_IsSubMessage(f)) {
+    const upb_Message* sub =
+        self->msg && upb_Message_HasFieldByDef(self->msg, f)
+            ? upb_Message_GetFieldByDef(self->msg, f).msg_val
+            : NULL;
+    return PyUpb_MessageView_New(self->arena, self->owner,
+                                 upb_FieldDef_MessageSubDef(f), sub);
+  }
+  upb_MessageValue val = self->msg ? upb_Message_GetFieldByDef(self->msg, f)
+                                   : upb_FieldDef_Default(f);
+  return PyUpb_UpbToPy(val, f, self->arena);
+}
+
+static PyObject* PyUpb_MessageView_GetAttr(PyObject* _self, PyObject* attr) {
+  PyUpb_MessageView* self = (void*)_self;
+  Py_ssize_t size;
+  const char* name = PyUnicode_AsUTF8AndSize(attr, &size);
+  const upb_FieldDef* f = NULL;
+  const upb_OneofDef* o = NULL;
+  if (name &&
+      upb_MessageDef_FindByNameWithSize(self->def, name, size, &f, &o) && f) {
+    return PyUpb_MessageView_GetFieldValue(self, f);
+  }
+  PyErr_Clear();
+  return PyObject_GenericGetAttr(_self, attr);
+}
+
+static int PyUpb_MessageView_SetAttr(PyObject* _self, PyObject* attr,
+                                     PyObject* value) {
+  PyErr_Format(PyExc_AttributeError,
+               "Cannot set attribute %R of a read-only message view.", attr);
+  return -1;
+}
+
+static bool PyUpb_MessageView_LookupName(PyUpb_MessageView* self,
+                                         PyObject* py_name,
+                                         const upb_FieldDef** f,
+                                         const upb_OneofDef** o) {
+  Py_ssize_t size;
+  const char* name = NULL;
+  if (PyUnicode_Check(py_name)) {
+    name = PyUnicode_AsUTF8AndSize(py_name, &size);
+  }
+  if (!name) {
+    PyErr_Format(PyExc_ValueError,
+                 "Expected a field name, but got non-string argument %S.",
+                 py_name);
+    return false;
+  }
+  if (!upb_MessageDef_FindByNameWithSize(self->def, name, size, f, o) ||
+      (!o && !*f)) {
+    PyErr_Format(PyExc_ValueError, "Protocol message %s has no \"%s\" field.",
+                 upb_MessageDef_Name(self->def), name);
+    return false;
+  }
+  return true;
+}
+
+static PyObject* PyUpb_MessageView_HasField(PyObject* _self, PyObject* arg) {
+  PyUpb_MessageView* self = (void*)_self;
+  const upb_FieldDef* field;
+  const upb_OneofDef* oneof;
+  if (!PyUpb_MessageView_LookupName(self, arg, &field, &oneof)) return NULL;
+  if (field && !upb_FieldDef_HasPresence(field)) {
+    PyErr_Format(PyExc_ValueError, "Field %s does not have presence.",
+                 upb_FieldDef_FullName(field));
+    return NULL;
+  }
+  if (!self->msg) Py_RETURN_FALSE;
+  return PyBool_FromLong(
+      field ? upb_Message_HasFieldByDef(self->msg, field)
+            : upb_Message_WhichOneofByDef(self->msg, oneof) != NULL);
+}
+
+static PyObject* PyUpb_MessageView_WhichOneof(PyObject* _self,
+                                              PyObject* name) {
+  PyUpb_MessageView* self = (void*)_self;
+  const upb_OneofDef* o;
+  if (!PyUpb_MessageView_LookupName(self, name, NULL, &o)) return NULL;
+  if (!self->msg) Py_RETURN_NONE;
+  const upb_FieldDef* f = upb_Message_WhichOneofByDef(self->msg, o);
+  if (!f) Py_RETURN_NONE;
+  return PyUnicode_FromString(upb_FieldDef_Name(f));
+}
+
+static PyObject* PyUpb_MessageView_View(PyObject* self, PyObject* args) {
+  return PyUpb_NewRef(self);
+}
+
+static PyObject* PyUpb_MessageView_GetDescriptor(PyObject* _self,
+                                                 void* closure) {
+  PyUpb_MessageView* self = (void*)_self;
+  return PyUpb_Descriptor_Get(self->def);
+}
+
+static PyMethodDef PyUpb_MessageView_Methods[] = {
+    {"HasField", PyUpb_MessageView_HasField, METH_O,
+     "Checks if a message field is set."},
+    {"WhichOneof", PyUpb_MessageView_WhichOneof, METH_O,
+     "Returns the name of the field set inside a oneof, "
+     "or None if no field is set."},
+    {"view", PyUpb_MessageView_View, METH_NOARGS, "Returns the view itself."},
+    {NULL, NULL}};
+
+static PyGetSetDef PyUpb_MessageView_Getters[] = {
+    {"DESCRIPTOR", PyUpb_MessageView_GetDescriptor, NULL,
+     "Descriptor of the viewed message."},
+    {NULL}};
+
+static PyType_Slot PyUpb_MessageView_Slots[] = {
+    {Py_tp_new, PyUpb_Forbidden_New},
+    {Py_tp_dealloc, PyUpb_MessageView_Dealloc},
+    {Py_tp_getattro, PyUpb_MessageView_GetAttr},
+    {Py_tp_setattro, PyUpb_MessageView_SetAttr},
+    {Py_tp_methods, PyUpb_MessageView_Methods},
+    {Py_tp_getset, PyUpb_MessageView_Getters},
+    {Py_tp_hash, PyObject_HashNotImplemented},
+    {0, NULL},
+};
+
+static PyType_Spec PyUpb_MessageView_Spec = {
+    PYUPB_MODULE_NAME ".MessageView",  // tp_name
+    sizeof(PyUpb_MessageView),         // tp_basicsize
+    0,                                 // tp_itemsize
+    Py_TPFLAGS_DEFAULT,                // tp_flags
+    PyUpb_MessageView_Slots,
+};
+
+// -----------------------------------------------------------------------------
+// RepeatedView
+// -----------------------------------------------------------------------------
+
+static PyObject* PyUpb_RepeatedView_New(PyObject* arena, PyObject* owner,
+                                        const upb_FieldDef* f,
+                                        const upb_Array* arr) {
+  PyUpb_ModuleState* state = PyUpb_ModuleState_Get();
+  PyUpb_RepeatedView* view =
+      (void*)PyType_GenericAlloc(state->repeated_view_type, 0);
+  if (!view) return NULL;
+  view->arena = PyUpb_NewRef(arena);
+  view->owner = PyUpb_NewRef(owner);
+  view->field = f;
+  view->arr = arr;
+  return &view->ob_base;
+}
+
+static void PyUpb_RepeatedView_Dealloc(PyObject* _self) {
+  PyUpb_RepeatedView* self = (void*)_self;
+  Py_DECREF(self->arena);
+  Py_DECREF(self->owner);
+  PyUpb_Dealloc(self);
+}
+
+static Py_ssize_t PyUpb_RepeatedView_Length(PyObject* _self) {
+  PyUpb_RepeatedView* self = (void*)_self;
+  return self->arr ? upb_Array_Size(self->arr) : 0;
+}
+
+static PyObject* PyUpb_RepeatedView_Item(PyObject* _self, Py_ssize_t index) {
+  PyUpb_RepeatedView* self = (void*)_self;
+  Py_ssize_t size = PyUpb_RepeatedView_Length(_self);
+  if (index < 0 || index >= size) {
+    PyErr_Format(PyExc_IndexError, "list index (%zd) out of range", index);
+    return NULL;
+  }
+  upb_MessageValue val = upb_Array_Get(self->arr, index);
+  return PyUpb_MessageView_ToPy(self->arena, self->owner, self->field, val);
+}
+
+static PyObject* PyUpb_RepeatedView_Subscript(PyObject* _self,
+                                              PyObject* key) {
+  Py_ssize_t size = PyUpb_RepeatedView_Length(_self);
+  Py_ssize_t idx, count, step;
+  if (!PyUpb_IndexToRange(key, size, &idx, &count, &step)) return NULL;
+  if (step == 0) return PyUpb_RepeatedView_Item(_self, idx);
+  PyObject* list = PyList_New(count);
+  for (Py_ssize_t i = 0; list && i < count; i++, idx += step) {
+    PyObject* item = PyUpb_RepeatedView_Item(_self, idx);
+    if (!item) {
+      Py_CLEAR(list);
+      break;
+    }
+    PyList_SET_ITEM(list, i, item);
+  }
+  return list;
+}
+
+static PyType_Slot PyUpb_RepeatedView_Slots[] = {
+    {Py_tp_new, PyUpb_Forbidden_New},
+    {Py_tp_dealloc, PyUpb_RepeatedView_Dealloc},
+    {Py_sq_length, PyUpb_RepeatedView_Length},
+    {Py_sq_item, PyUpb_RepeatedView_Item},
+    {Py_mp_length, PyUpb_RepeatedView_Length},
+    {Py_mp_subscript, PyUpb_RepeatedView_Subscript},
+    {Py_tp_hash, PyObject_HashNotImplemented},
+    {0, NULL},
+};
+
+static PyType_Spec PyUpb_RepeatedView_Spec = {
+    PYUPB_MODULE_NAME ".RepeatedView",  // tp_name
+    sizeof(PyUpb_RepeatedView),         // tp_basicsize
+    0,                                  // tp_itemsize
+    Py_TPFLAGS_DEFAULT,                 // tp_flags
+    PyUpb_RepeatedView_Slots,
+};
+
+// -----------------------------------------------------------------------------
+// Top Level
+// -----------------------------------------------------------------------------
+
+bool PyUpb_MessageView_Init(PyObject* m) {
+  PyUpb_ModuleState* s = PyUpb_ModuleState_GetFromModule(m);
+
+  s->message_view_type = PyUpb_AddClass(m, &PyUpb_MessageView_Spec);
+  s->repeated_view_type = PyUpb_AddClass(m, &PyUpb_RepeatedView_Spec);
+
+  return s->message_view_type && s->repeated_view_type;
+}
@@ -0,0 +1,31 @@
+// Protocol Buffers - Google's data interchange format
+// Copyright 2023 Google LLC.  All rights reserved.
+//
+// Use of this source code is governed by a BSD-style
+// license that can be found in the LICENSE file or at
+// https://developers.google.com/open-source/licenses/bsd
+
+#ifndef PYUPB_MESSAGE_VIEW_H__
+#define PYUPB_MESSAGE_VIEW_H__
+
+#include <stdbool.h>
+
+#include "python/python_api.h"
+#include "upb/reflection/def.h"
+#include "upb/reflection/message.h"
+
+// Returns a read-only view of message `msg` of type `m`, which must be owned
+// by `arena`.  `owner` is kept alive for the lifetime of the view, and must
+// keep `m` alive (eg. the class of the viewed message).  `msg` may be NULL, in
+// which case the view reads the default values of the fields.
+//
+// Unlike message wrappers, views are not registered in the object cache, and
+// reading a sub-message or repeated field through a view creates a new view
+// every time.  This makes read-only traversal of large messages cheaper.
+PyObject* PyUpb_MessageView_New(PyObject* arena, PyObject* owner,
+                                const upb_MessageDef* m,
+                                const upb_Message* msg);
+
+bool PyUpb_MessageView_Init(PyObject* m);
+
+#endif  // PYUPB_MESSAGE_VIEW_H__
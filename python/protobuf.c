@@ -13,6 +13,8 @@
 #include "python/extension_dict.h"
 #include "python/map.h"
 #include "python/message.h"
+#include "python/message_columns.h"
+#include "python/message_view.h"
 #include "python/repeated.h"
 #include "python/unknown_fields.h"
 
@@ -41,6 +43,8 @@ PyObject* PyUpb_SetAllowOversizeProtos(PyObject* m, PyObject* arg) {
 static PyMethodDef PyUpb_ModuleMethods[] = {
     {"SetAllowOversizeProtos", PyUpb_SetAllowOversizeProtos, METH_O,
      "Enable/disable oversize proto parsing."},
+    {"_ColumnBuffers", PyUpb_ColumnBuffers, METH_VARARGS,
+     "Returns the buffers of columns of messages, see proto.to_columns()."},
     {NULL, NULL}};
 
 static struct PyModuleDef module_def = {PyModuleDef_HEAD_INIT,
@@ -198,9 +202,20 @@ PyObject* PyUpb_ObjCache_Get(const void* key) {
 // Arena
 // -----------------------------------------------------------------------------
 
+// Every top-level message owns an arena, which is shared with its
+// sub-objects.  Arena objects can also be created from Python, so that many
+// messages can be allocated from a single arena:
+//
+//   with proto.arena() as a:
+//     msgs = [Foo.FromString(b, arena=a) for b in payloads]
+//
+// The memory of the arena is released in one go once the last message
+// referencing it is deleted.  Closing the arena only prevents new messages
+// from being allocated in it.
 typedef struct {
   PyObject_HEAD;
   upb_Arena* arena;
+  bool closed;
 } PyUpb_Arena;
 
 #ifdef __GLIBC__
@@ -245,6 +260,20 @@ PyObject* PyUpb_Arena_New(void) {
   PyUpb_ModuleState* state = PyUpb_ModuleState_Get();
   PyUpb_Arena* arena = (void*)PyType_GenericAlloc(state->arena_type, 0);
   arena->arena = PyUpb_NewArena();
+  arena->closed = false;
+  return &arena->ob_base;
+}
+
+static PyObject* PyUpb_Arena_PyNew(PyTypeObject* type, PyObject* args,
+                                   PyObject* kwargs) {
+  static const char* kwlist[] = {NULL};
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, ":Arena", (char**)kwlist)) {
+    return NULL;
+  }
+  PyUpb_Arena* arena = (void*)PyType_GenericAlloc(type, 0);
+  if (!arena) return NULL;
+  arena->arena = PyUpb_NewArena();
+  arena->closed = false;
   return &arena->ob_base;
 }
 
@@ -257,8 +286,63 @@ upb_Arena* PyUpb_Arena_Get(PyObject* arena) {
   return ((PyUpb_Arena*)arena)->arena;
 }
 
+bool PyUpb_Arena_Verify(PyObject* obj) {
+  PyUpb_ModuleState* state = PyUpb_ModuleState_Get();
+  if (!PyObject_TypeCheck(obj, state->arena_type)) {
+    PyErr_Format(PyExc_TypeError, "Expected an Arena, but got %R.", obj);
+    return false;
+  }
+  if (((PyUpb_Arena*)obj)->closed) {
+    PyErr_SetString(PyExc_ValueError, "Arena is closed.");
+    return false;
+  }
+  return true;
+}
+
+static PyObject* PyUpb_Arena_Enter(PyObject* self, PyObject* args) {
+  if (!PyUpb_Arena_Verify(self)) return NULL;
+  Py_INCREF(self);
+  return self;
+}
+
+static PyObject* PyUpb_Arena_Close(PyObject* self, PyObject* args) {
+  ((PyUpb_Arena*)self)->closed = true;
+  Py_RETURN_NONE;
+}
+
+static PyObject* PyUpb_Arena_Exit(PyObject* self, PyObject* args) {
+  return PyUpb_Arena_Close(self, NULL);
+}
+
+static PyObject* PyUpb_Arena_GetClosed(PyObject* self, void* closure) {
+  return PyBool_FromLong(((PyUpb_Arena*)self)->closed);
+}
+
+static PyObject* PyUpb_Arena_GetSpaceAllocated(PyObject* self,
+                                               void* closure) {
+  upb_Arena* arena = PyUpb_Arena_Get(self);
+  return PyLong_FromSize_t(upb_Arena_SpaceAllocated(arena, NULL));
+}
+
+static PyMethodDef PyUpb_Arena_Methods[] = {
+    {"close", PyUpb_Arena_Close, METH_NOARGS,
+     "Prevents new messages from being allocated in the arena."},
+    {"__enter__", PyUpb_Arena_Enter, METH_NOARGS, NULL},
+    {"__exit__", PyUpb_Arena_Exit, METH_VARARGS, NULL},
+    {NULL, NULL}};
+
+static PyGetSetDef PyUpb_Arena_Getters[] = {
+    {"closed", PyUpb_Arena_GetClosed, NULL,
+     "Whether the arena has been closed."},
+    {"space_allocated", PyUpb_Arena_GetSpaceAllocated, NULL,
+     "The number of bytes allocated by the arena."},
+    {NULL}};
+
 static PyType_Slot PyUpb_Arena_Slots[] = {
+    {Py_tp_new, PyUpb_Arena_PyNew},
     {Py_tp_dealloc, PyUpb_Arena_Dealloc},
+    {Py_tp_methods, PyUpb_Arena_Methods},
+    {Py_tp_getset, PyUpb_Arena_Getters},
     {0, NULL},
 };
 
@@ -413,8 +497,8 @@ __attribute__((visibility("default"))) PyMODINIT_FUNC PyInit__message(void) {
   if (!PyUpb_InitDescriptorContainers(m) || !PyUpb_InitDescriptorPool(m) ||
       !PyUpb_InitDescriptor(m) || !PyUpb_InitArena(m) ||
       !PyUpb_InitExtensionDict(m) || !PyUpb_Map_Init(m) ||
-      !PyUpb_InitMessage(m) || !PyUpb_Repeated_Init(m) ||
-      !PyUpb_UnknownFields_Init(m)) {
+      !PyUpb_InitMessage(m) || !PyUpb_MessageView_Init(m) ||
+      !PyUpb_Repeated_Init(m) || !PyUpb_UnknownFields_Init(m)) {
     Py_DECREF(m);
     return NULL;
   }
@@ -69,6 +69,10 @@ typedef struct {
   PyTypeObject* message_meta_type;
   PyObject* listfields_item_key;
 
+  // From message_view.c
+  PyTypeObject* message_view_type;
+  PyTypeObject* repeated_view_type;
+
   // From protobuf.c
   bool allow_oversize_protos;
   PyObject* wkt_bases;
@@ -157,6 +161,10 @@ PyUpb_WeakMap* PyUpb_ObjCache_Instance(void);
 PyObject* PyUpb_Arena_New(void);
 upb_Arena* PyUpb_Arena_Get(PyObject* arena);
 
+// Returns true if `obj` is an Arena object that has not been closed yet.
+// Otherwise returns false and sets an exception.
+bool PyUpb_Arena_Verify(PyObject* obj);
+
 // -----------------------------------------------------------------------------
 // Utilities
 // -----------------------------------------------------------------------------
@@ -53,6 +53,13 @@ static upb_Array* PyUpb_RepeatedContainer_GetIfReified(
   return PyUpb_RepeatedContainer_IsStub(self) ? NULL : self->ptr.arr;
 }
 
+const upb_Array* PyUpb_RepeatedContainer_GetArray(PyObject* _self,
+                                                  const upb_FieldDef** f) {
+  PyUpb_RepeatedContainer* self = (PyUpb_RepeatedContainer*)_self;
+  if (f) *f = PyUpb_RepeatedContainer_GetField(self);
+  return PyUpb_RepeatedContainer_GetIfReified(self);
+}
+
 void PyUpb_RepeatedContainer_Reify(PyObject* _self, upb_Array* arr) {
   PyUpb_RepeatedContainer* self = (PyUpb_RepeatedContainer*)_self;
   assert(PyUpb_RepeatedContainer_IsStub(self));
@@ -71,7 +78,12 @@ void PyUpb_RepeatedContainer_Reify(PyObject* _self, upb_Array* arr) {
 upb_Array* PyUpb_RepeatedContainer_EnsureReified(PyObject* _self) {
   PyUpb_RepeatedContainer* self = (PyUpb_RepeatedContainer*)_self;
   upb_Array* arr = PyUpb_RepeatedContainer_GetIfReified(self);
-  if (arr) return arr;  // Already writable.
+  if (arr) {
+    if (!upb_Array_IsFrozen(arr)) return arr;  // Already writable.
+    PyUpb_Message_SetFrozenError();
+    return NULL;
+  }
+  if (!PyUpb_Message_VerifyMutable(self->ptr.parent)) return NULL;
 
   const upb_FieldDef* f = PyUpb_RepeatedContainer_GetField(self);
   upb_Arena* arena = PyUpb_Arena_Get(self->arena);
@@ -168,6 +180,7 @@ PyObject* PyUpb_RepeatedContainer_DeepCopy(PyObject* _self, PyObject* value) {
 PyObject* PyUpb_RepeatedContainer_Extend(PyObject* _self, PyObject* value) {
   PyUpb_RepeatedContainer* self = (PyUpb_RepeatedContainer*)_self;
   upb_Array* arr = PyUpb_RepeatedContainer_EnsureReified(_self);
+  if (!arr) return NULL;
   size_t start_size = upb_Array_Size(arr);
   PyObject* it = PyObject_GetIter(value);
   if (!it) {
@@ -387,7 +400,8 @@ static int PyUpb_RepeatedContainer_AssignSubscript(PyObject* _self,
   PyUpb_RepeatedContainer* self = (PyUpb_RepeatedContainer*)_self;
   const upb_FieldDef* f = PyUpb_RepeatedContainer_GetField(self);
   upb_Array* arr = PyUpb_RepeatedContainer_EnsureReified(_self);
-  Py_ssize_t size = arr ? upb_Array_Size(arr) : 0;
+  if (!arr) return -1;
+  Py_ssize_t size = upb_Array_Size(arr);
   Py_ssize_t idx, count, step;
   if (!PyUpb_IndexToRange(key, size, &idx, &count, &step)) return -1;
   if (value) {
@@ -403,6 +417,7 @@ static PyObject* PyUpb_RepeatedContainer_Pop(PyObject* _self, PyObject* args) {
   Py_ssize_t index = -1;
   if (!PyArg_ParseTuple(args, "|n", &index)) return NULL;
   upb_Array* arr = PyUpb_RepeatedContainer_EnsureReified(_self);
+  if (!arr) return NULL;
   size_t size = upb_Array_Size(arr);
   if (index < 0) index += size;
   if (index >= size) index = size - 1;
@@ -415,6 +430,7 @@ static PyObject* PyUpb_RepeatedContainer_Pop(PyObject* _self, PyObject* args) {
 static PyObject* PyUpb_RepeatedContainer_Remove(PyObject* _self,
                                                 PyObject* value) {
   upb_Array* arr = PyUpb_RepeatedContainer_EnsureReified(_self);
+  if (!arr) return NULL;
   Py_ssize_t match_index = -1;
   Py_ssize_t n = PyUpb_RepeatedContainer_Length(_self);
   for (Py_ssize_t i = 0; i < n; ++i) {
@@ -442,6 +458,7 @@ static bool PyUpb_RepeatedContainer_Assign(PyObject* _self, PyObject* list) {
   PyUpb_RepeatedContainer* self = (PyUpb_RepeatedContainer*)_self;
   const upb_FieldDef* f = PyUpb_RepeatedContainer_GetField(self);
   upb_Array* arr = PyUpb_RepeatedContainer_EnsureReified(_self);
+  if (!arr) return false;
   Py_ssize_t size = PyList_Size(list);
   bool submsg = upb_FieldDef_IsSubMessage(f);
   upb_Arena* arena = PyUpb_Arena_Get(self->arena);
@@ -499,6 +516,7 @@ static PyObject* PyUpb_RepeatedContainer_Sort(PyObject* pself, PyObject* args,
 
 static PyObject* PyUpb_RepeatedContainer_Reverse(PyObject* _self) {
   upb_Array* arr = PyUpb_RepeatedContainer_EnsureReified(_self);
+  if (!arr) return NULL;
   size_t n = upb_Array_Size(arr);
   size_t half = n / 2;  // Rounds down.
   for (size_t i = 0; i < half; i++) {
@@ -561,6 +579,111 @@ static PyObject* PyUpb_RepeatedCompositeContainer_Append(PyObject* _self,
   return py_msg;
 }
 
+// Appends a new message for each of `rows`.  If `names` is NULL, each row is a
+// dict of field values by field name.  Otherwise `names` is a tuple of field
+// names, and each row a sequence of the values of these fields.  The fields are
+// resolved and the array is grown once for all rows.  If a row is invalid, no
+// message is appended.
+static PyObject* PyUpb_RepeatedCompositeContainer_ExtendFromRows(
+    PyObject* _self, PyObject* rows, PyObject* names) {
+  PyUpb_RepeatedContainer* self = (PyUpb_RepeatedContainer*)_self;
+  upb_Array* arr = PyUpb_RepeatedContainer_EnsureReified(_self);
+  if (!arr) return NULL;
+  const upb_FieldDef* f = PyUpb_RepeatedContainer_GetField(self);
+  const upb_MessageDef* m = upb_FieldDef_MessageSubDef(f);
+  const upb_MiniTable* layout = upb_MessageDef_MiniTable(m);
+  upb_Arena* arena = PyUpb_Arena_Get(self->arena);
+  size_t start_size = upb_Array_Size(arr);
+  const upb_FieldDef** fields = NULL;
+  Py_ssize_t num_fields = 0;
+  PyObject* values = NULL;
+
+  PyObject* seq = PySequence_Fast(rows, "Rows must be iterable");
+  if (!seq) return NULL;
+  if (names) {
+    num_fields = PyTuple_GET_SIZE(names);
+    fields = PyMem_New(const upb_FieldDef*, num_fields ? num_fields : 1);
+    if (!fields) {
+      PyErr_NoMemory();
+      goto err;
+    }
+    for (Py_ssize_t i = 0; i < num_fields; i++) {
+      fields[i] = PyUpb_Message_LookupField(m, PyTuple_GET_ITEM(names, i));
+      if (!fields[i]) goto err;
+    }
+  }
+
+  Py_ssize_t num_rows = PySequence_Fast_GET_SIZE(seq);
+  if (!upb_Array_Reserve(arr, start_size + num_rows, arena)) {
+    PyErr_NoMemory();
+    goto err;
+  }
+  for (Py_ssize_t i = 0; i < num_rows; i++) {
+    PyObject* row = PySequence_Fast_GET_ITEM(seq, i);
+    upb_Message* msg = upb_Message_New(layout, arena);
+    upb_MessageValue msgval = {.msg_val = msg};
+    if (!msg || !upb_Array_Append(arr, msgval, arena)) {
+      PyErr_NoMemory();
+      goto err;
+    }
+    if (names) {
+      values = PySequence_Fast(row, "Rows must be sequences of field values");
+      if (!values) goto err;
+      if (PySequence_Fast_GET_SIZE(values) != num_fields) {
+        PyErr_Format(PyExc_ValueError, "Expected %zd field values, got %zd.",
+                     num_fields, PySequence_Fast_GET_SIZE(values));
+        goto err;
+      }
+      if (!PyUpb_Message_InitNewFromValues(msg, m, self->arena, names, fields,
+                                           PySequence_Fast_ITEMS(values))) {
+        goto err;
+      }
+      Py_CLEAR(values);
+    } else {
+      if (!PyDict_Check(row)) {
+        PyErr_Format(PyExc_TypeError,
+                     "Expected a dict of field values, got %s.",
+                     Py_TYPE(row)->tp_name);
+        goto err;
+      }
+      if (!PyUpb_Message_InitNewFromDict(msg, m, self->arena, row)) goto err;
+    }
+  }
+
+  PyMem_Free(fields);
+  Py_DECREF(seq);
+  Py_RETURN_NONE;
+
+err:
+  Py_XDECREF(values);
+  PyMem_Free(fields);
+  Py_DECREF(seq);
+  upb_Array_Resize(arr, start_size, NULL);
+  return NULL;
+}
+
+static PyObject* PyUpb_RepeatedCompositeContainer_ExtendFromDicts(
+    PyObject* _self, PyObject* rows) {
+  return PyUpb_RepeatedCompositeContainer_ExtendFromRows(_self, rows, NULL);
+}
+
+static PyObject* PyUpb_RepeatedCompositeContainer_ExtendFromTuples(
+    PyObject* _self, PyObject* args, PyObject* kwargs) {
+  static const char* kwlist[] = {"rows", "fields", NULL};
+  PyObject* rows;
+  PyObject* fields;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO:extend_from_tuples",
+                                   (char**)kwlist, &rows, &fields)) {
+    return NULL;
+  }
+  PyObject* names = PySequence_Tuple(fields);
+  if (!names) return NULL;
+  PyObject* ret =
+      PyUpb_RepeatedCompositeContainer_ExtendFromRows(_self, rows, names);
+  Py_DECREF(names);
+  return ret;
+}
+
 static PyObject* PyUpb_RepeatedContainer_Insert(PyObject* _self,
                                                 PyObject* args) {
   PyUpb_RepeatedContainer* self = (PyUpb_RepeatedContainer*)_self;
@@ -611,6 +734,12 @@ static PyMethodDef PyUpb_RepeatedCompositeContainer_Methods[] = {
      "Inserts a message before the specified index."},
     {"extend", PyUpb_RepeatedContainer_Extend, METH_O,
      "Adds objects to the repeated container."},
+    {"extend_from_dicts", PyUpb_RepeatedCompositeContainer_ExtendFromDicts,
+     METH_O, "Adds a message for each dict of field values."},
+    {"extend_from_tuples",
+     (PyCFunction)PyUpb_RepeatedCompositeContainer_ExtendFromTuples,
+     METH_VARARGS | METH_KEYWORDS,
+     "Adds a message for each tuple of values of the given fields."},
     {"pop", PyUpb_RepeatedContainer_Pop, METH_VARARGS,
      "Removes an object from the repeated container and returns it."},
     {"remove", PyUpb_RepeatedContainer_Remove, METH_O,
@@ -653,6 +782,7 @@ static PyObject* PyUpb_RepeatedScalarContainer_Append(PyObject* _self,
                                                       PyObject* value) {
   PyUpb_RepeatedContainer* self = (PyUpb_RepeatedContainer*)_self;
   upb_Array* arr = PyUpb_RepeatedContainer_EnsureReified(_self);
+  if (!arr) return NULL;
   upb_Arena* arena = PyUpb_Arena_Get(self->arena);
   const upb_FieldDef* f = PyUpb_RepeatedContainer_GetField(self);
   upb_MessageValue msgval;
@@ -32,8 +32,16 @@ PyObject* PyUpb_RepeatedContainer_GetOrCreateWrapper(upb_Array* arr,
 void PyUpb_RepeatedContainer_Reify(PyObject* self, upb_Array* arr);
 
 // Reifies this repeated object if it is not already reified.
+// Returns NULL and sets a ValueError if the message it belongs to is frozen.
 upb_Array* PyUpb_RepeatedContainer_EnsureReified(PyObject* self);
 
+// Returns the data of a repeated field, or NULL if the field is empty and has
+// no underlying data.  Unlike PyUpb_RepeatedContainer_EnsureReified(), this
+// never modifies the parent message.  If `f` is not NULL, sets it to the
+// definition of the field.
+const upb_Array* PyUpb_RepeatedContainer_GetArray(PyObject* self,
+                                                  const upb_FieldDef** f);
+
 // Implements repeated_field.extend(iterable).  `_self` must be a repeated
 // field (either repeated composite or repeated scalar).
 PyObject* PyUpb_RepeatedContainer_Extend(PyObject* _self, PyObject* value);